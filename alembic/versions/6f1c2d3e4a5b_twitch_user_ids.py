@@ -0,0 +1,40 @@
+"""Store twitch user IDs for twitch alerts
+
+Revision ID: 6f1c2d3e4a5b
+Revises:
+Create Date: 2026-10-18 12:00:00.000000
+
+The IDs of existing rows are resolved by the TwitchAlert cog when it next starts,
+as that requires the Twitch API (see TwitchAlertDBManager.translate_names_to_ids)
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6f1c2d3e4a5b'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+TABLES = ('UserInTwitchAlert', 'UserInTwitchTeam')
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    for table in TABLES:
+        if table not in inspector.get_table_names():
+            continue
+        # Tables the TwitchAlert cog created since the model gained twitch_user_id don't need altering
+        if 'twitch_user_id' in [column['name'] for column in inspector.get_columns(table)]:
+            continue
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(sa.Column('twitch_user_id', sa.String(), nullable=True))
+            batch_op.create_index(f'ix_{table}_twitch_user_id', ['twitch_user_id'])
+
+
+def downgrade():
+    for table in TABLES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_index(f'ix_{table}_twitch_user_id')
+            batch_op.drop_column('twitch_user_id')
@@ -0,0 +1,34 @@
+"""Index vote messages by message ID
+
+Revision ID: 8a3b4c5d6e7f
+Revises: 6f1c2d3e4a5b
+Create Date: 2026-10-18 13:00:00.000000
+
+Vote messages are looked up by message ID when they're sent and loaded
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a3b4c5d6e7f'
+down_revision = '6f1c2d3e4a5b'
+branch_labels = None
+depends_on = None
+
+TABLE = 'VoteSent'
+INDEX = 'ix_VoteSent_vote_receiver_message'
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if TABLE not in inspector.get_table_names():
+        return
+    # create_all builds the index with VoteSent tables created since it was added to the model
+    if INDEX in [index['name'] for index in inspector.get_indexes(TABLE)]:
+        return
+    op.create_index(INDEX, TABLE, ['vote_receiver_message'])
+
+
+def downgrade():
+    op.drop_index(INDEX, table_name=TABLE)
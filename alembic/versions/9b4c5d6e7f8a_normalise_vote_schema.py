@@ -0,0 +1,124 @@
+"""Give the vote tables a single primary key, indexes and cascading deletes
+
+Revision ID: 9b4c5d6e7f8a
+Revises: 8a3b4c5d6e7f
+Create Date: 2026-10-19 12:00:00.000000
+
+Votes were keyed on every column, so changing a vote's chair, voice channel or end time changed its key,
+and the tables of a vote's roles, options, recipients and choices weren't tied to the vote at all.
+SQLite can't alter a table's keys, so each table is rebuilt and its rows copied across. Duplicate votes and
+rows of votes that no longer exist are dropped.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b4c5d6e7f8a'
+down_revision = '8a3b4c5d6e7f'
+branch_labels = None
+depends_on = None
+
+CHILD_TABLES = ('VoteTargetRoles', 'VoteOptions', 'VoteSent', 'VoteChoices', 'VoteDeliveries', 'VoteRecipients')
+
+
+def vote_id_column(normalised):
+    if normalised:
+        return sa.Column('vote_id', sa.Integer(), sa.ForeignKey('Votes.vote_id', ondelete='CASCADE'),
+                         primary_key=True)
+    return sa.Column('vote_id', sa.Integer(), primary_key=True)
+
+
+def get_columns(table, normalised):
+    """
+    Gets the columns of a vote table
+    :param table: name of the table
+    :param normalised: whether to get the columns after this change, or before it
+    :return: list of columns
+    """
+    if table == 'Votes':
+        return [sa.Column('vote_id', sa.Integer(), primary_key=True, autoincrement=False),
+                sa.Column('author_id', sa.Integer(), nullable=False, primary_key=not normalised),
+                sa.Column('guild_id', sa.Integer(), nullable=False, primary_key=not normalised),
+                sa.Column('title', sa.String(), nullable=False, primary_key=not normalised),
+                sa.Column('chair_id', sa.Integer(), nullable=True, primary_key=not normalised),
+                sa.Column('voice_id', sa.Integer(), nullable=True, primary_key=not normalised),
+                sa.Column('end_time', sa.Float(), nullable=True, primary_key=not normalised)]
+    if table == 'VoteTargetRoles':
+        return [vote_id_column(normalised),
+                sa.Column('role_id', sa.Integer(), primary_key=True)]
+    if table == 'VoteOptions':
+        return [vote_id_column(normalised),
+                sa.Column('opt_id', sa.Integer(), primary_key=True),
+                sa.Column('option_title', sa.String(), primary_key=not normalised),
+                sa.Column('option_desc', sa.String(), primary_key=not normalised)]
+    if table == 'VoteSent':
+        return [vote_id_column(normalised),
+                sa.Column('vote_receiver_id', sa.Integer(), primary_key=True),
+                sa.Column('vote_receiver_message', sa.Integer(), primary_key=not normalised)]
+    if table == 'VoteChoices':
+        return [vote_id_column(normalised),
+                sa.Column('voter_id', sa.Integer(), primary_key=True),
+                sa.Column('opt_id', sa.Integer(), primary_key=True)]
+    if table == 'VoteDeliveries':
+        return [vote_id_column(normalised),
+                sa.Column('channel_id', sa.Integer()),
+                sa.Column('progress_message_id', sa.Integer(), nullable=True)]
+    if table == 'VoteRecipients':
+        return [vote_id_column(normalised),
+                sa.Column('recipient_id', sa.Integer(), primary_key=True),
+                sa.Column('failed', sa.Boolean())]
+
+
+def get_indexes(table, normalised):
+    """
+    Gets the indexes of a vote table
+    :param table: name of the table
+    :param normalised: whether to get the indexes after this change, or before it
+    :return: list of (index name, column names)
+    """
+    if table == 'Votes' and normalised:
+        return [('ix_Votes_guild_id', ['guild_id']),
+                ('ix_Votes_end_time', ['end_time']),
+                ('ix_Votes_author_id_title', ['author_id', 'title'])]
+    if table == 'VoteSent':
+        return [('ix_VoteSent_vote_receiver_message', ['vote_receiver_message'])]
+    return []
+
+
+def rebuild_table(table, normalised):
+    """
+    Replaces a vote table with a new one with the given keys, copying its rows across
+    :param table: name of the table
+    :param normalised: whether to rebuild the table as it is after this change, or before it
+    :return: None
+    """
+    columns = get_columns(table, normalised)
+    names = ', '.join(column.name for column in columns)
+    new_table = f'_new_{table}'
+    op.create_table(new_table, *columns)
+    query = f'INSERT OR IGNORE INTO "{new_table}" ({names}) SELECT {names} FROM "{table}"'
+    if normalised and table != 'Votes':
+        query += ' WHERE vote_id IN (SELECT vote_id FROM "Votes")'
+    op.execute(query)
+    op.drop_table(table)
+    op.rename_table(new_table, table)
+    for index, index_columns in get_indexes(table, normalised):
+        op.create_index(index, table, index_columns)
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    table_names = inspector.get_table_names()
+    # Tables created from the current models are already keyed on vote_id, and the child tables have foreign keys
+    if 'Votes' in table_names and inspector.get_pk_constraint('Votes')['constrained_columns'] != ['vote_id']:
+        rebuild_table('Votes', True)
+    for table in CHILD_TABLES:
+        if table in table_names and not inspector.get_foreign_keys(table):
+            rebuild_table(table, True)
+
+
+def downgrade():
+    for table in CHILD_TABLES:
+        rebuild_table(table, False)
+    rebuild_table('Votes', False)
@@ -0,0 +1,34 @@
+"""Store the progress of rfr reconciliation passes
+
+Revision ID: ac5d6e7f8a9b
+Revises: 9b4c5d6e7f8a
+Create Date: 2026-10-19 18:00:00.000000
+
+Each rfr message reconciled in the current pass is stored, so a pass interrupted by a restart resumes where it
+stopped instead of fetching every rfr message again
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'ac5d6e7f8a9b'
+down_revision = '9b4c5d6e7f8a'
+branch_labels = None
+depends_on = None
+
+TABLE = 'RFRReconcileCheckpoints'
+
+
+def upgrade():
+    # The ReactForRole cog creates the table on startup if it ran since the model was added
+    if TABLE in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(TABLE,
+                    sa.Column('guild_id', sa.Integer(), primary_key=True),
+                    sa.Column('channel_id', sa.Integer(), primary_key=True),
+                    sa.Column('message_id', sa.Integer(), primary_key=True))
+
+
+def downgrade():
+    op.drop_table(TABLE)
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+
+"""
+Microbenchmarks how long ReactForRole takes to resolve the role of a single reaction, once the rfr message is known.
+
+Usage: python -m benchmarks.react_for_role --roles 20 --reactions 100000
+
+Three paths are compared, each on the same mix of unicode and custom emoji reactions:
+  emojize   emoji.emojize on the reaction, then a scan of the rfr embed fields, as before the message index
+  demojize  emoji.demojize on the reaction, then a dict lookup by emoji_raw
+  key       get_emoji_key on the reaction, then a dict lookup by the key computed when the combo was stored
+
+Commented using reStructuredText (reST)
+"""
+# Futures
+
+# Built-in/Generic Imports
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+# The benchmark always uses its own database, and never a real Discord account
+os.environ["CONFIG_PATH"] = tempfile.mkdtemp(prefix="koala-benchmark-")
+os.environ["ENCRYPTED"] = "False"
+os.environ.setdefault("DISCORD_TOKEN", "benchmark")
+os.environ.setdefault("LOGGING_FILE", "False")
+
+# Libs
+import discord
+import emoji
+
+# Own modules
+from koala.cogs.react_for_role.index import RFRMessageIndex
+from koala.cogs.react_for_role.utils import get_emoji_raw, get_emoji_key
+
+# Constants
+GUILD_ID = 1
+CHANNEL_ID = 2
+MESSAGE_ID = 3
+EMOJI_ROLE_ID = 4
+ROLE_ID_OFFSET = 1000
+CUSTOM_EMOJI_ID_OFFSET = 2000
+
+# Variables
+
+
+def make_emojis(roles, custom_ratio, rng):
+    """
+    Makes the emojis of an rfr message, as they are stored and as they arrive in reaction payloads
+    :param roles: The number of emoji-role combos on the message
+    :param custom_ratio: The fraction of the emojis that are custom
+    :param rng: The random number generator
+    :return: A list of (emoji_raw, payload emoji)
+    """
+    unicode_emojis = rng.sample(sorted(emoji.EMOJI_DATA), roles)
+    emojis = []
+    for i in range(roles):
+        if rng.random() < custom_ratio:
+            partial_emoji = discord.PartialEmoji(name=f"custom{i}", id=CUSTOM_EMOJI_ID_OFFSET + i)
+            emojis.append((str(partial_emoji), partial_emoji))
+        else:
+            emojis.append((get_emoji_raw(unicode_emojis[i]), discord.PartialEmoji(name=unicode_emojis[i])))
+    return emojis
+
+
+def emojize_path(embed):
+    """
+    Resolves a reaction as before the message index, without fetching the message
+    """
+    fields = embed.fields
+
+    def resolve(partial_emoji):
+        if partial_emoji.is_unicode_emoji():
+            rep = emoji.emojize(partial_emoji.name)
+            if not rep:
+                rep = emoji.emojize(partial_emoji.name, language='alias')
+        else:
+            rep = str(partial_emoji)
+        field = discord.utils.get(fields, name=rep)
+        return field.value if field else None
+    return resolve
+
+
+def demojize_path(emoji_roles):
+    """
+    Resolves a reaction by its emoji_raw
+    """
+    def resolve(partial_emoji):
+        return emoji_roles.get(get_emoji_raw(partial_emoji))
+    return resolve
+
+
+def key_path(index):
+    """
+    Resolves a reaction by its canonical emoji key
+    """
+    def resolve(partial_emoji):
+        return index.get_role_id(GUILD_ID, CHANNEL_ID, MESSAGE_ID, get_emoji_key(partial_emoji))
+    return resolve
+
+
+def time_path(resolve, payloads, repeats):
+    """
+    Times a path over every payload
+    :param resolve: The function resolving a payload emoji to its role
+    :param payloads: The payload emojis
+    :param repeats: The number of times to time the payloads
+    :return: The nanoseconds per reaction of each repeat
+    """
+    results = []
+    for _ in range(repeats):
+        start = time.perf_counter_ns()
+        for partial_emoji in payloads:
+            resolve(partial_emoji)
+        results.append((time.perf_counter_ns() - start) / len(payloads))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--roles", type=int, default=20, help="emoji-role combos on the rfr message")
+    parser.add_argument("--reactions", type=int, default=100000, help="reactions timed per repeat")
+    parser.add_argument("--custom-ratio", type=float, default=0.25, help="fraction of emojis that are custom")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="file to write the full results to")
+    args = parser.parse_args(argv)
+    rng = random.Random(args.seed)
+
+    emojis = make_emojis(args.roles, args.custom_ratio, rng)
+    embed = discord.Embed(title="React for Role")
+    index = RFRMessageIndex()
+    index.add_message(GUILD_ID, CHANNEL_ID, MESSAGE_ID, EMOJI_ROLE_ID)
+    for i, (emoji_raw, partial_emoji) in enumerate(emojis):
+        embed.add_field(name=str(partial_emoji), value=f"<@&{ROLE_ID_OFFSET + i}>")
+        index.add_emoji_role(EMOJI_ROLE_ID, emoji_raw, ROLE_ID_OFFSET + i)
+    payloads = [rng.choice(emojis)[1] for _ in range(args.reactions)]
+
+    paths = {"emojize": emojize_path(embed),
+             "demojize": demojize_path(index.emoji_roles[EMOJI_ROLE_ID]),
+             "key": key_path(index)}
+    for name, resolve in paths.items():
+        unresolved = [partial_emoji for _, partial_emoji in emojis if resolve(partial_emoji) is None]
+        if unresolved:
+            raise RuntimeError(f"The {name} path couldn't resolve {unresolved}")
+
+    results = {"roles": args.roles, "reactions": args.reactions, "custom_ratio": args.custom_ratio, "paths": {}}
+    print(f"{args.roles} roles, {args.reactions} reactions, {args.custom_ratio:.0%} custom emoji")
+    print(f"  {'path':<10}{'median ns':>12}{'min ns':>10}{'speedup':>9}")
+    baseline = None
+    for name, resolve in paths.items():
+        timings = time_path(resolve, payloads, args.repeats)
+        median = statistics.median(timings)
+        baseline = baseline or median
+        results["paths"][name] = {"ns_per_reaction": timings, "median": median}
+        print(f"  {name:<10}{median:>12.0f}{min(timings):>10.0f}{baseline / median:>8.1f}x")
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+
+"""
+A local fake of the Twitch Helix API, used to benchmark the TwitchAlert loops without Twitch
+
+Commented using reStructuredText (reST)
+"""
+# Futures
+
+# Built-in/Generic Imports
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# Libs
+
+# Own modules
+
+# Constants
+DEFAULT_RATE_LIMIT = 800
+STARTED_AT = "2021-01-01T00:00:00Z"
+
+# Variables
+
+
+class FakeHelix:
+    """
+    A fake Helix server for a fixed set of streamers and teams, that can simulate latency,
+    streamers going live and offline, and Helix's token bucket rate limit
+    """
+
+    def __init__(self, streamers, teams=None, latency=0.0, live_ratio=0.1, rate_limit=DEFAULT_RATE_LIMIT, seed=0):
+        """
+        Initialises local variables
+        :param streamers: A dict of twitch user ID to login of every streamer that exists
+        :param teams: A dict of team name to the list of user IDs in the team
+        :param latency: The delay in seconds before each response
+        :param live_ratio: The fraction of streamers that are live at once
+        :param rate_limit: The number of requests allowed per minute, None for no limit
+        :param seed: The random seed used to choose live streamers
+        """
+        self.streamers = streamers
+        self.logins = {login: user_id for user_id, login in streamers.items()}
+        self.teams = teams or {}
+        self.latency = latency
+        self.live_ratio = live_ratio
+        self.rate_limit = rate_limit
+        self.random = random.Random(seed)
+        self.live = set()
+        self.calls = Counter()
+        self.rate_limited = 0
+        self._tokens = rate_limit
+        self._refilled_at = time.time()
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/"
+
+    def start(self):
+        """
+        Starts the server on a free local port in a background thread
+        :return:
+        """
+        helix = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                helix.handle(self)
+
+            def do_POST(self):
+                helix.handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops the server
+        :return:
+        """
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset_calls(self):
+        """
+        Resets the request counts, returning the counts since the last reset
+        :return: A Counter of endpoint to number of requests
+        """
+        with self._lock:
+            calls, self.calls = self.calls, Counter()
+            calls["rate_limited"], self.rate_limited = self.rate_limited, 0
+        return calls
+
+    def cycle(self, churn=0.5):
+        """
+        Changes which streamers are live, keeping the number live at the live ratio
+        :param churn: The fraction of live streamers that go offline and are replaced
+        :return: The set of user IDs that went live and the set that went offline
+        """
+        target = int(len(self.streamers) * self.live_ratio)
+        went_offline = set(self.random.sample(sorted(self.live), int(len(self.live) * churn)))
+        offline = sorted(self.streamers.keys() - self.live)
+        went_live = set(self.random.sample(offline, min(len(offline), target - len(self.live) + len(went_offline))))
+        self.live = (self.live - went_offline) | went_live
+        return went_live, went_offline
+
+    def _take_token(self):
+        """
+        Takes a request from the rate limit bucket, which refills continuously
+        :return: True if the request is allowed, and the rate limit headers
+        """
+        if self.rate_limit is None:
+            return True, {"Ratelimit-Limit": "0", "Ratelimit-Remaining": "1", "Ratelimit-Reset": "0"}
+        with self._lock:
+            now = time.time()
+            self._tokens = min(self.rate_limit, self._tokens + (now - self._refilled_at) * self.rate_limit / 60)
+            self._refilled_at = now
+            allowed = self._tokens >= 1
+            if allowed:
+                self._tokens -= 1
+            else:
+                self.rate_limited += 1
+            reset = int(now + (self.rate_limit - self._tokens) * 60 / self.rate_limit)
+            return allowed, {"Ratelimit-Limit": str(self.rate_limit),
+                             "Ratelimit-Remaining": str(int(self._tokens)),
+                             "Ratelimit-Reset": str(reset)}
+
+    def handle(self, request: BaseHTTPRequestHandler):
+        """
+        Responds to a request as Helix would
+        :param request: The http request
+        :return:
+        """
+        url = urlparse(request.path)
+        path = url.path.strip("/")
+        params = parse_qs(url.query)
+        if self.latency:
+            time.sleep(self.latency)
+
+        if path == "oauth2/token":
+            return self._respond(request, 200, {"access_token": "token", "expires_in": 5000000,
+                                                "token_type": "bearer"})
+
+        endpoint = path.replace("helix/", "", 1)
+        with self._lock:
+            self.calls[endpoint] += 1
+        allowed, headers = self._take_token()
+        if not allowed:
+            return self._respond(request, 429, {"error": "Too Many Requests", "status": 429}, headers)
+
+        if endpoint == "streams":
+            user_ids = params.get("user_id", []) + [self.logins.get(login) for login in params.get("user_login", [])]
+            data = [self._stream(user_id) for user_id in user_ids if user_id in self.live]
+        elif endpoint == "users":
+            user_ids = params.get("id", []) + [self.logins.get(login) for login in params.get("login", [])]
+            data = [self._user(user_id) for user_id in user_ids if user_id in self.streamers]
+        elif endpoint == "games":
+            data = [{"id": game_id, "name": "Music", "box_art_url": ""} for game_id in params.get("id", [])]
+        elif endpoint == "teams":
+            name = params.get("name", [None])[0]
+            if name not in self.teams:
+                return self._respond(request, 404, {"error": "Not Found", "status": 404}, headers)
+            data = [{"id": name, "team_name": name, "created_at": STARTED_AT, "updated_at": STARTED_AT,
+                     "users": [{"user_id": user_id, "user_login": self.streamers[user_id],
+                                "user_name": self.streamers[user_id]} for user_id in self.teams[name]]}]
+        else:
+            return self._respond(request, 404, {"error": "Not Found", "status": 404}, headers)
+        return self._respond(request, 200, {"data": data, "pagination": {}}, headers)
+
+    def _stream(self, user_id):
+        login = self.streamers[user_id]
+        return {"id": "stream" + user_id, "user_id": user_id, "user_login": login, "user_name": login,
+                "game_id": "26936", "type": "live", "title": "Benchmark stream", "viewer_count": 1,
+                "started_at": STARTED_AT, "language": "en", "thumbnail_url": "", "tag_ids": []}
+
+    def _user(self, user_id):
+        login = self.streamers[user_id]
+        return {"id": user_id, "login": login, "display_name": login, "profile_image_url": "",
+                "created_at": STARTED_AT}
+
+    @staticmethod
+    def _respond(request, status, body, headers=None):
+        content = json.dumps(body).encode("utf-8")
+        request.send_response(status)
+        request.send_header("Content-Type", "application/json")
+        request.send_header("Content-Length", str(len(content)))
+        for key, value in (headers or {}).items():
+            request.send_header(key, value)
+        request.end_headers()
+        request.wfile.write(content)
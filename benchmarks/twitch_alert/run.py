@@ -0,0 +1,306 @@
+#!/usr/bin/env python
+
+"""
+Benchmarks the TwitchAlert loops against a local fake Helix server and a synthetic database,
+to find how many streamers and alert channels one bot can handle before a tick takes too long.
+
+Usage: python -m benchmarks.twitch_alert --scales 10x5x10 100x5x10 --latency 0.05
+
+Each scale is <guilds>x<channels per guild>x<users per channel>. Every channel also has --teams
+teams of --team-size members. For each scale, the team members are refreshed, then for each
+cycle some live streamers go offline and others go live before the user and team loops are run.
+The loops poll every streamer each cycle, ignoring the poll tiers, to measure a full tick's throughput.
+
+Commented using reStructuredText (reST)
+"""
+# Futures
+
+# Built-in/Generic Imports
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+# The benchmark always uses its own database, and never a real Twitch or Discord account
+os.environ["CONFIG_PATH"] = tempfile.mkdtemp(prefix="koala-benchmark-")
+os.environ["ENCRYPTED"] = "False"
+os.environ.setdefault("DISCORD_TOKEN", "benchmark")
+os.environ.setdefault("LOGGING_FILE", "False")
+os.environ["TWITCH_TOKEN"] = "benchmark"
+os.environ["TWITCH_SECRET"] = "benchmark"
+
+# Libs
+import twitchAPI.twitch
+from sqlalchemy import delete, event, insert
+
+# Own modules
+from koala.db import engine, insert_extension, session_manager
+from koala.models import GuildExtensions
+from koala.cogs.twitch_alert import core
+from koala.cogs.twitch_alert.db import TwitchAlertDBManager
+from koala.cogs.twitch_alert.models import TwitchAlerts, UserInTwitchAlert, TeamInTwitchAlert, UserInTwitchTeam
+from koala.cogs.twitch_alert.poller import StreamPoller, POLL_MODE_THREAD
+from .fake_helix import FakeHelix, DEFAULT_RATE_LIMIT
+
+# Constants
+DEFAULT_SCALES = ["10x5x10", "50x5x10", "200x5x10"]
+TICK_BUDGET = 60
+USER_ID_OFFSET = 1000000
+
+# Variables
+
+
+class Stats:
+    """
+    Counts the database queries and Discord requests made during a tick
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.sends = 0
+        self.deletes = 0
+
+    def reset(self):
+        counts = {"queries": self.queries, "sends": self.sends, "deletes": self.deletes}
+        self.queries = self.sends = self.deletes = 0
+        return counts
+
+
+class FakeMessage:
+    def __init__(self, message_id):
+        self.id = message_id
+
+
+class FakePartialMessage:
+    def __init__(self, channel):
+        self.channel = channel
+
+    async def delete(self):
+        await asyncio.sleep(self.channel.latency)
+        self.channel.stats.deletes += 1
+
+
+class FakeChannel:
+    """
+    A Discord text channel that only counts the alerts sent to it
+    """
+    message_ids = itertools.count(1)
+
+    def __init__(self, channel_id, stats, latency):
+        self.id = channel_id
+        self.stats = stats
+        self.latency = latency
+
+    async def send(self, embed=None):
+        await asyncio.sleep(self.latency)
+        self.stats.sends += 1
+        return FakeMessage(next(self.message_ids))
+
+    def get_partial_message(self, message_id):
+        return FakePartialMessage(self)
+
+
+class FakeBot:
+    """
+    A Discord bot that only has the benchmark's alert channels
+    """
+
+    def __init__(self):
+        self.channels = {}
+
+    def get_channel(self, id):
+        return self.channels.get(id)
+
+
+def parse_scale(scale):
+    """
+    Parses a scale argument
+    :param scale: The scale in the form <guilds>x<channels>x<users>
+    :return: The number of guilds, channels per guild, and users per channel
+    """
+    guilds, channels, users = (int(value) for value in scale.lower().split("x"))
+    return guilds, channels, users
+
+
+def populate(bot, stats, args, guilds, channels, users, rng):
+    """
+    Fills the database with a synthetic set of twitch alerts
+    :param bot: The fake bot to add the alert channels to
+    :param stats: The stats counter of the fake channels
+    :param args: The command line arguments
+    :param guilds: The number of guilds
+    :param channels: The number of alert channels per guild
+    :param users: The number of users per alert channel
+    :param rng: The random number generator
+    :return: The streamers and the teams, for the fake Helix server
+    """
+    streamer_count = max(users, guilds * channels * users // args.overlap)
+    streamers = {str(USER_ID_OFFSET + i): f"streamer{i}" for i in range(streamer_count)}
+    user_ids = list(streamers.keys())
+    teams = {f"team{i}": rng.sample(user_ids, min(args.team_size, len(user_ids))) for i in range(args.team_pool)}
+
+    guild_rows, alert_rows, user_rows, team_rows = [], [], [], []
+    bot.channels = {}
+    for guild in range(guilds):
+        guild_id = (guild + 1) * USER_ID_OFFSET
+        guild_rows.append({"extension_id": "TwitchAlert", "guild_id": guild_id})
+        for channel in range(channels):
+            channel_id = guild_id + channel + 1
+            bot.channels[channel_id] = FakeChannel(channel_id, stats, args.discord_latency)
+            alert_rows.append({"guild_id": guild_id, "channel_id": channel_id, "default_message": ""})
+            user_rows += [{"channel_id": channel_id, "twitch_username": streamers[user_id], "twitch_user_id": user_id}
+                          for user_id in rng.sample(user_ids, users)]
+            team_rows += [{"channel_id": channel_id, "twitch_team_name": team}
+                          for team in rng.sample(sorted(teams), min(args.teams, len(teams)))]
+
+    with session_manager() as session:
+        for table in (UserInTwitchTeam, TeamInTwitchAlert, UserInTwitchAlert, TwitchAlerts, GuildExtensions):
+            session.execute(delete(table))
+        for table, rows in ((GuildExtensions, guild_rows), (TwitchAlerts, alert_rows),
+                            (UserInTwitchAlert, user_rows), (TeamInTwitchAlert, team_rows)):
+            if rows:
+                session.execute(insert(table), rows)
+        session.commit()
+    return streamers, teams
+
+
+async def measure(name, coro_func, helix, stats):
+    """
+    Runs one tick and records what it did
+    :param name: The name of the tick
+    :param coro_func: A function returning the coroutine of the tick
+    :param helix: The fake Helix server
+    :param stats: The database and Discord stats
+    :return: A dict of the tick's results
+    """
+    helix.reset_calls()
+    stats.reset()
+    error = None
+    start = time.perf_counter()
+    try:
+        await coro_func()
+    except Exception as err:
+        error = repr(err)
+    duration = time.perf_counter() - start
+    calls = helix.reset_calls()
+    rate_limited = calls.pop("rate_limited")
+    return {"tick": name, "duration": duration, "api_calls": sum(calls.values()), "api_calls_by_endpoint": dict(calls),
+            "rate_limited": rate_limited, **stats.reset(), "error": error}
+
+
+async def run_scale(scale, args):
+    """
+    Runs the benchmark at one scale
+    :param scale: The scale in the form <guilds>x<channels>x<users>
+    :param args: The command line arguments
+    :return: The results of every tick
+    """
+    guilds, channels, users = parse_scale(scale)
+    rng = random.Random(args.seed)
+    stats = Stats()
+    bot = FakeBot()
+    streamers, teams = populate(bot, stats, args, guilds, channels, users, rng)
+
+    helix = FakeHelix(streamers, teams, latency=args.latency, live_ratio=args.live_ratio,
+                      rate_limit=args.rate_limit or None, seed=args.seed)
+    helix.start()
+    twitchAPI.twitch.TWITCH_API_BASE_URL = helix.url + "helix/"
+    twitchAPI.twitch.TWITCH_AUTH_BASE_URL = helix.url
+    try:
+        manager = TwitchAlertDBManager(bot)
+        manager.poller.shutdown()
+        manager.poller = StreamPoller(manager.twitch_handler, args.workers, args.poll_mode,
+                                      "benchmark", "benchmark")
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def count_query(*_):
+            stats.queries += 1
+
+        ticks = [await measure("team_refresh", manager.update_all_teams_members, helix, stats)]
+        for cycle in range(args.cycles):
+            went_live, went_offline = helix.cycle(args.churn)
+            for name, alerts in (("user_alerts", core.create_user_alerts), ("team_alerts", core.create_team_alerts)):
+                # Every streamer is polled each cycle, rather than only those the poll tiers have due this tick
+                tick = await measure(name, lambda: alerts(bot, manager, scheduled=False), helix, stats)
+                tick.update(cycle=cycle, went_live=len(went_live), went_offline=len(went_offline))
+                ticks.append(tick)
+        event.remove(engine, "before_cursor_execute", count_query)
+        manager.poller.shutdown()
+    finally:
+        helix.stop()
+
+    return {"scale": scale, "guilds": guilds, "channels": guilds * channels, "users_per_channel": users,
+            "streamers": len(streamers), "teams": len(teams), "ticks": ticks}
+
+
+def summarise(result):
+    """
+    Prints the results of a scale
+    :param result: The results of run_scale
+    :return: The slowest tick duration
+    """
+    print(f"\n{result['scale']}: {result['guilds']} guilds, {result['channels']} channels, "
+          f"{result['streamers']} streamers, {result['teams']} teams")
+    print(f"  {'tick':<14}{'mean s':>10}{'max s':>10}{'api':>8}{'429s':>7}{'queries':>9}{'sends':>8}{'deletes':>9}")
+    slowest = 0
+    for name in ("team_refresh", "user_alerts", "team_alerts"):
+        ticks = [tick for tick in result["ticks"] if tick["tick"] == name]
+        durations = [tick["duration"] for tick in ticks]
+        slowest = max(slowest, max(durations))
+        print(f"  {name:<14}{statistics.mean(durations):>10.3f}{max(durations):>10.3f}"
+              f"{statistics.mean(tick['api_calls'] for tick in ticks):>8.0f}"
+              f"{sum(tick['rate_limited'] for tick in ticks):>7}"
+              f"{statistics.mean(tick['queries'] for tick in ticks):>9.0f}"
+              f"{statistics.mean(tick['sends'] for tick in ticks):>8.0f}"
+              f"{statistics.mean(tick['deletes'] for tick in ticks):>9.0f}")
+        for error in {tick["error"] for tick in ticks if tick["error"]}:
+            print(f"    error: {error}")
+    return slowest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", nargs="+", default=DEFAULT_SCALES,
+                        help="<guilds>x<channels per guild>x<users per channel>")
+    parser.add_argument("--teams", type=int, default=1, help="teams per channel")
+    parser.add_argument("--team-size", type=int, default=20, help="members per team")
+    parser.add_argument("--team-pool", type=int, default=20, help="number of distinct teams")
+    parser.add_argument("--overlap", type=int, default=2, help="average number of channels tracking each streamer")
+    parser.add_argument("--live-ratio", type=float, default=0.1, help="fraction of streamers live at once")
+    parser.add_argument("--churn", type=float, default=0.5, help="fraction of live streamers replaced each cycle")
+    parser.add_argument("--cycles", type=int, default=3, help="live/offline cycles per scale")
+    parser.add_argument("--latency", type=float, default=0.05, help="Helix response latency in seconds")
+    parser.add_argument("--rate-limit", type=int, default=DEFAULT_RATE_LIMIT,
+                        help="Helix requests per minute, 0 for no limit")
+    parser.add_argument("--discord-latency", type=float, default=0.05, help="Discord request latency in seconds")
+    parser.add_argument("--workers", type=int, default=0, help="poller workers")
+    parser.add_argument("--poll-mode", default=POLL_MODE_THREAD, help="poller worker mode (thread or process)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--log-level", default="WARNING", help="level of the TwitchAlert log")
+    parser.add_argument("--json", help="file to write the full results to")
+    args = parser.parse_args(argv)
+    core.logger.setLevel(args.log_level)
+
+    insert_extension("TwitchAlert", 0, True, True)
+    results = []
+    within_budget = None
+    for scale in args.scales:
+        result = asyncio.run(run_scale(scale, args))
+        results.append(result)
+        if summarise(result) <= TICK_BUDGET:
+            within_budget = result
+
+    if within_budget:
+        print(f"\nLargest scale with every tick under {TICK_BUDGET}s: {within_budget['scale']} "
+              f"({within_budget['streamers']} streamers, {within_budget['channels']} channels)")
+    else:
+        print(f"\nNo scale had every tick under {TICK_BUDGET}s")
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
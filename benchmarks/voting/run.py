@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+
+"""
+Benchmarks how long the Vote cog takes to load its open votes from the database on startup.
+
+Usage: python -m benchmarks.voting --votes 100 --recipients 10000
+
+Every vote has --options options and is sent to --recipients users, --choice-ratio of whom have reacted.
+The votes are loaded into a new VoteManager --repeats times, counting the database queries of each load.
+With --legacy the votes are also loaded one query (and write) at a time, as before bulk loading. This is slow.
+
+Commented using reStructuredText (reST)
+"""
+# Futures
+
+# Built-in/Generic Imports
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+# The benchmark always uses its own database, and never a real Discord account
+os.environ["CONFIG_PATH"] = tempfile.mkdtemp(prefix="koala-benchmark-")
+os.environ["ENCRYPTED"] = "False"
+os.environ.setdefault("DISCORD_TOKEN", "benchmark")
+os.environ.setdefault("LOGGING_FILE", "False")
+
+# Libs
+from sqlalchemy import event, insert, select
+
+# Own modules
+from koala.db import engine, session_manager
+from koala.cogs.voting.db import VoteManager
+from koala.cogs.voting.models import Votes, VoteTargetRoles, VoteOptions, VoteSent, VoteChoices
+from koala.cogs.voting.option import Option
+from koala.cogs.voting.vote import Vote
+
+# Constants
+GUILD_ID = 1
+ROLE_ID = 2
+VOTE_ID_OFFSET = 1000
+OPT_ID_OFFSET = 100000
+USER_ID_OFFSET = 1000000
+MESSAGE_ID_OFFSET = 10000000000
+
+# Variables
+
+
+def populate(votes, recipients, options, choice_ratio, rng):
+    """
+    Fills the database with sent votes
+    :param votes: The number of votes
+    :param recipients: The number of users each vote was sent to
+    :param options: The number of options of each vote
+    :param choice_ratio: The fraction of recipients who have chosen an option
+    :param rng: The random number generator
+    :return:
+    """
+    with session_manager() as session:
+        for v in range(votes):
+            v_id = VOTE_ID_OFFSET + v
+            session.execute(insert(Votes), [{"vote_id": v_id, "author_id": v, "guild_id": GUILD_ID,
+                                             "title": f"Vote {v}", "end_time": time.time() + 86400}])
+            session.execute(insert(VoteTargetRoles), [{"vote_id": v_id, "role_id": ROLE_ID}])
+            session.execute(insert(VoteOptions), [{"vote_id": v_id, "opt_id": OPT_ID_OFFSET + v * options + o,
+                                                   "option_title": f"Option {o}", "option_desc": "description"}
+                                                  for o in range(options)])
+            session.execute(insert(VoteSent), [{"vote_id": v_id, "vote_receiver_id": USER_ID_OFFSET + r,
+                                                "vote_receiver_message": MESSAGE_ID_OFFSET + v * recipients + r}
+                                               for r in range(recipients)])
+            session.execute(insert(VoteChoices), [{"vote_id": v_id, "voter_id": USER_ID_OFFSET + r,
+                                                   "opt_id": OPT_ID_OFFSET + v * options + rng.randrange(options)}
+                                                  for r in range(recipients) if rng.random() < choice_ratio])
+        session.commit()
+
+
+def legacy_load_from_db(manager):
+    """
+    Loads the votes as before bulk loading, with three queries per vote and the state written back as it's restored
+    :param manager: The VoteManager to load the votes into
+    :return:
+    """
+    with session_manager() as session:
+        existing_votes = session.execute(select(Votes.vote_id, Votes.author_id, Votes.guild_id,
+                                                Votes.title, Votes.chair_id, Votes.voice_id, Votes.end_time)).all()
+        for v_id, a_id, g_id, title, chair_id, voice_id, end_time in existing_votes:
+            vote = Vote(v_id, title, a_id, g_id)
+            vote.set_chair(chair_id)
+            vote.set_vc(voice_id)
+            manager.vote_lookup[(a_id, title)] = v_id
+            for r_id, in session.execute(select(VoteTargetRoles.role_id).filter_by(vote_id=v_id)).all():
+                vote.add_role(r_id)
+            for o_id, o_title, o_desc in session.execute(select(VoteOptions.opt_id, VoteOptions.option_title,
+                                                                VoteOptions.option_desc).filter_by(vote_id=v_id)):
+                vote.add_option(Option(o_title, o_desc, opt_id=o_id))
+            delivered = session.execute(select(VoteSent.vote_receiver_id, VoteSent.vote_receiver_message)
+                                        .filter_by(vote_id=v_id)).all()
+            manager.sent_votes[v_id] = vote
+            for rec_id, msg_id in delivered:
+                manager.register_sent(vote, rec_id, msg_id)
+
+
+def time_load(load, repeats):
+    """
+    Times loading the votes into a new VoteManager
+    :param load: The function loading the votes into a VoteManager
+    :param repeats: The number of times to load the votes
+    :return: The seconds and database queries of each load
+    """
+    queries = 0
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count_query(*_):
+        nonlocal queries
+        queries += 1
+
+    loads = []
+    for _ in range(repeats):
+        queries = 0
+        manager = VoteManager()
+        start = time.perf_counter()
+        load(manager)
+        loads.append({"seconds": time.perf_counter() - start, "queries": queries,
+                      "sent_votes": len(manager.sent_votes)})
+    event.remove(engine, "before_cursor_execute", count_query)
+    return loads
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--votes", type=int, default=100, help="open votes in the database")
+    parser.add_argument("--recipients", type=int, default=10000, help="users each vote was sent to")
+    parser.add_argument("--options", type=int, default=4, help="options of each vote")
+    parser.add_argument("--choice-ratio", type=float, default=0.5, help="fraction of recipients who have chosen")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--legacy", action="store_true", help="also time the per-vote loader (slow)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="file to write the full results to")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    populate(args.votes, args.recipients, args.options, args.choice_ratio, random.Random(args.seed))
+    print(f"{args.votes} votes x {args.recipients} recipients, {args.options} options, "
+          f"{args.choice_ratio:.0%} chosen (populated in {time.perf_counter() - start:.1f}s)")
+
+    loaders = {"bulk": lambda manager: manager.load_from_db()}
+    if args.legacy:
+        loaders["legacy"] = legacy_load_from_db
+    results = {"votes": args.votes, "recipients": args.recipients, "options": args.options,
+               "choice_ratio": args.choice_ratio, "loaders": {}}
+    print(f"  {'loader':<8}{'median s':>10}{'min s':>9}{'queries':>9}")
+    for name, load in loaders.items():
+        # The legacy loader writes as it goes, so it's only timed once
+        loads = time_load(load, args.repeats if name == "bulk" else 1)
+        seconds = [result["seconds"] for result in loads]
+        results["loaders"][name] = {"loads": loads, "median": statistics.median(seconds)}
+        print(f"  {name:<8}{statistics.median(seconds):>10.2f}{min(seconds):>9.2f}{loads[0]['queries']:>9}")
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
@@ -0,0 +1,298 @@
+#!/usr/bin/env python
+
+"""
+Benchmarks the Vote cog under load in dpytest, from sending a vote to synthetic guilds of thousands of members
+through to closing it.
+
+Usage: python -m benchmarks.voting_load --members 1000 10000 50000 --fail-ratio 0.05
+
+For each member count, a guild is made with that many members, --role-ratio of whom have the vote's target role.
+A vote with --options options is created and sent to the role with the bot's commands. Every DM and reaction the
+bot makes takes --dm-latency seconds, and --fail-ratio of the recipients can't be sent DMs. Then --reactions
+recipients react, each reaction being timed until the recipient's vote message has been updated. The results are
+checked with `vote checkResults`, the sent votes are loaded into a new VoteManager as on startup, and the vote is
+closed with `vote close`.
+
+Commented using reStructuredText (reST)
+"""
+# Futures
+
+# Built-in/Generic Imports
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+# The benchmark always uses its own database, and never a real Discord account
+os.environ["CONFIG_PATH"] = tempfile.mkdtemp(prefix="koala-benchmark-")
+os.environ["ENCRYPTED"] = "False"
+os.environ.setdefault("DISCORD_TOKEN", "benchmark")
+os.environ.setdefault("LOGGING_FILE", "False")
+
+# Libs
+import discord
+import discord.ext.commands as commands
+import discord.ext.test as dpytest
+import mock
+from sqlalchemy import delete
+
+# Own modules
+import koalabot
+from koala.db import insert_extension, session_manager
+from koala.cogs import Voting
+from koala.cogs.voting.db import VoteManager
+from koala.cogs.voting.log import logger
+from koala.cogs.voting.models import Votes, VoteSent, VoteOptions, VoteTargetRoles, VoteChoices, \
+    VoteDeliveries, VoteRecipients
+from koala.cogs.voting.utils import IdGenerator
+from tests.tests_utils import utils as testutils
+
+# Constants
+DEFAULT_MEMBERS = [1000, 10000]
+TITLE = "Benchmark Vote"
+
+# Variables
+
+
+class FakeResponse:
+    status = 403
+    reason = "Forbidden"
+
+
+class FakeDiscord:
+    """
+    Adds latency to the DMs and reactions the bot makes, and fails the DMs of some users
+    """
+
+    def __init__(self, latency, failing_ids):
+        self.latency = latency
+        self.failing_ids = failing_ids
+        self.dms = 0
+        self.failed_dms = 0
+        self.reactions = 0
+        self.edits = 0
+
+    def patch(self):
+        """
+        Patches discord.py's requests
+        :return: The patches, to be entered as context managers
+        """
+        send = discord.abc.Messageable.send
+        add_reaction = discord.Message.add_reaction
+        fake = self
+
+        async def fake_send(messageable, *args, **kwargs):
+            if isinstance(messageable, discord.abc.User):
+                await asyncio.sleep(fake.latency)
+                fake.dms += 1
+                if messageable.id in fake.failing_ids:
+                    fake.failed_dms += 1
+                    raise discord.Forbidden(FakeResponse(), "Cannot send messages to this user")
+            return await send(messageable, *args, **kwargs)
+
+        async def fake_add_reaction(message, emoji):
+            await asyncio.sleep(fake.latency)
+            fake.reactions += 1
+            return await add_reaction(message, emoji)
+
+        async def fake_edit(message, **kwargs):
+            # dpytest can't edit partial messages, so edits of vote messages are only counted
+            await asyncio.sleep(fake.latency)
+            fake.edits += 1
+
+        return [mock.patch("discord.abc.Messageable.send", fake_send),
+                mock.patch("discord.Message.add_reaction", fake_add_reaction),
+                mock.patch("discord.PartialMessage.edit", fake_edit)]
+
+
+def clear_tables():
+    with session_manager() as session:
+        for table in (Votes, VoteTargetRoles, VoteOptions, VoteSent, VoteChoices, VoteDeliveries, VoteRecipients):
+            session.execute(delete(table))
+        session.commit()
+
+
+def make_bot(loop):
+    """
+    Makes a bot configured with dpytest, as in the tests
+    :param loop: The event loop of the bot
+    :return: The bot
+    """
+    intents = discord.Intents.default()
+    intents.members = True
+    intents.guilds = True
+    intents.messages = True
+    bot = commands.Bot(koalabot.COMMAND_PREFIX, loop=loop, intents=intents)
+    dpytest.configure(bot)
+    return bot
+
+
+def populate_guild(guild, members, role_ratio, rng):
+    """
+    Adds members to a guild, some of whom have the role the vote is sent to
+    :param guild: The dpytest guild
+    :param members: The number of members to add
+    :param role_ratio: The fraction of members with the role
+    :param rng: The random number generator
+    :return: The role
+    """
+    role = testutils.fake_guild_role(guild)
+    for i in range(members):
+        user = dpytest.backend.make_user(f"member{i}", f"{i % 9999 + 1:04}")
+        dpytest.backend.make_member(user, guild, roles=[role] if rng.random() < role_ratio else [])
+    return role
+
+
+def summarise_latencies(latencies):
+    """
+    Summarises a list of latencies
+    :param latencies: The latencies in seconds
+    :return: dict of the mean, median, 95th and 99th percentile and max in milliseconds
+    """
+    if not latencies:
+        return None
+    ordered = sorted(latencies)
+    return {"mean_ms": statistics.mean(ordered) * 1000, "median_ms": statistics.median(ordered) * 1000,
+            "p95_ms": ordered[int(0.95 * (len(ordered) - 1))] * 1000,
+            "p99_ms": ordered[int(0.99 * (len(ordered) - 1))] * 1000, "max_ms": ordered[-1] * 1000}
+
+
+async def timed_command(command):
+    """
+    Times a command, until its response has been sent
+    :param command: The command, without the prefix
+    :return: The seconds taken
+    """
+    start = time.perf_counter()
+    await dpytest.message(koalabot.COMMAND_PREFIX + command)
+    duration = time.perf_counter() - start
+    await dpytest.empty_queue()
+    return duration
+
+
+async def run_scale(members, args):
+    """
+    Runs the benchmark with a guild of the given size
+    :param members: The number of members in the guild
+    :param args: The command line arguments
+    :return: The results
+    """
+    rng = random.Random(args.seed)
+    clear_tables()
+    bot = make_bot(asyncio.get_event_loop())
+    guild = dpytest.get_config().guilds[0]
+    author = guild.members[0]
+    start = time.perf_counter()
+    role = populate_guild(guild, members, args.role_ratio, rng)
+    setup_seconds = time.perf_counter() - start
+
+    cog = Voting(bot)
+    bot.add_cog(cog)
+    cog.vote_message_updater.delay = 0
+    recipients = [member for member in role.members if not member.bot]
+    failing_ids = {member.id for member in recipients if rng.random() < args.fail_ratio}
+    fake = FakeDiscord(args.dm_latency, failing_ids)
+
+    with contextlib.ExitStack() as stack:
+        for patch in fake.patch():
+            stack.enter_context(patch)
+        await timed_command(f"vote create {TITLE}")
+        for i in range(args.options):
+            await timed_command(f"vote addOption Option {i}+Description of option {i}")
+        await timed_command(f"vote addRole {role.id}")
+
+        start = time.perf_counter()
+        await dpytest.message(koalabot.COMMAND_PREFIX + "vote send")
+        await asyncio.gather(*cog.deliveries.values())
+        send_seconds = time.perf_counter() - start
+        await dpytest.empty_queue()
+        vote = cog.vote_manager.get_vote_from_id(cog.vote_manager.vote_lookup[(author.id, TITLE)])
+
+        reaction_latencies, update_latencies = [], []
+        reactors = rng.sample(sorted(vote.sent_to), min(args.reactions, len(vote.sent_to)))
+        for user_id in reactors:
+            user = bot.get_user(user_id)
+            message = await user.fetch_message(vote.sent_to[user_id])
+            emoji = VoteManager.emote_reference[rng.randrange(args.options)]
+            start = time.perf_counter()
+            await dpytest.add_reaction(user, message, emoji)
+            reacted = time.perf_counter()
+            await asyncio.gather(*cog.vote_message_updater._timers.values())
+            updated = time.perf_counter()
+            reaction_latencies.append(reacted - start)
+            update_latencies.append(updated - start)
+
+        check_results_seconds = await timed_command(f"vote checkResults {TITLE}")
+        start = time.perf_counter()
+        VoteManager().load_from_db()
+        load_seconds = time.perf_counter() - start
+        close_seconds = await timed_command(f"vote close {TITLE}")
+
+    cog.cog_unload()
+    return {"members": members, "recipients": len(recipients), "failing_recipients": len(failing_ids),
+            "options": args.options, "setup_seconds": setup_seconds,
+            "send_vote": {"seconds": send_seconds, "delivered": len(vote.sent_to),
+                          "failed": fake.failed_dms, "dms": fake.dms, "reactions": fake.reactions,
+                          "recipients_per_second": len(recipients) / send_seconds if send_seconds else None},
+            "reactions": {"count": len(reactors), "handled": summarise_latencies(reaction_latencies),
+                          "message_updated": summarise_latencies(update_latencies), "edits": fake.edits},
+            "check_results_seconds": check_results_seconds, "load_from_db_seconds": load_seconds,
+            "close_seconds": close_seconds}
+
+
+def summarise(result):
+    """
+    Prints the results of a scale
+    :param result: The results of run_scale
+    :return: None
+    """
+    send = result["send_vote"]
+    print(f"\n{result['members']} members, {result['recipients']} recipients, "
+          f"{result['failing_recipients']} failing (set up in {result['setup_seconds']:.1f}s)")
+    print(f"  send_vote       {send['seconds']:>9.2f}s  {send['delivered']} delivered, {send['failed']} failed, "
+          f"{send['recipients_per_second'] or 0:.0f} recipients/s")
+    for name in ("handled", "message_updated"):
+        latencies = result["reactions"][name]
+        if latencies:
+            print(f"  reaction {name:<15}{latencies['median_ms']:>7.2f}ms median, {latencies['p95_ms']:.2f}ms p95, "
+                  f"{latencies['max_ms']:.2f}ms max over {result['reactions']['count']} reactions")
+    print(f"  checkResults    {result['check_results_seconds']:>9.3f}s")
+    print(f"  load_from_db    {result['load_from_db_seconds']:>9.3f}s")
+    print(f"  close           {result['close_seconds']:>9.3f}s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--members", type=int, nargs="+", default=DEFAULT_MEMBERS, help="members of each guild")
+    parser.add_argument("--role-ratio", type=float, default=1.0, help="fraction of members with the target role")
+    parser.add_argument("--options", type=int, default=4, help="options of the vote")
+    parser.add_argument("--fail-ratio", type=float, default=0.05, help="fraction of recipients whose DMs fail")
+    parser.add_argument("--dm-latency", type=float, default=0.0, help="latency of DMs and reactions in seconds")
+    parser.add_argument("--reactions", type=int, default=1000, help="recipients who react")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--log-level", default="CRITICAL", help="level of the Vote log")
+    parser.add_argument("--json", help="file to write the full results to")
+    args = parser.parse_args(argv)
+    logger.setLevel(args.log_level)
+    koalabot.logger.setLevel(args.log_level)
+
+    koalabot.is_dpytest = True
+    insert_extension("Vote", 0, True, True)
+    results = []
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    # dpytest's ids overflow after 4096 are made in a millisecond
+    with mock.patch("discord.ext.test.factories.make_id", IdGenerator().next_id):
+        for members in args.members:
+            result = loop.run_until_complete(run_scale(members, args))
+            results.append(result)
+            summarise(result)
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
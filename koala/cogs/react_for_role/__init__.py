@@ -1,2 +1,9 @@
-from . import utils, db, models
-from .cog import ReactForRole, setup
+from . import utils, db, models, api
+from . import cog
+from .cog import ReactForRole
+
+
+def setup(bot):
+    cog.setup(bot)
+    if bot.get_cog("ReactForRole") is not None:
+        api.setup(bot)
@@ -0,0 +1,71 @@
+# Futures
+# Built-in/Generic Imports
+from http.client import OK, UNPROCESSABLE_ENTITY
+
+# Libs
+from aiohttp import web
+from discord.ext.commands import Bot
+
+# Own modules
+from koala.db import extension_enabled
+from koala.rest.api import parse_request, build_response
+from .log import logger
+from .provision import RFRSpecError, parse_rfr_spec, validate_rfr_spec
+
+# Constants
+REACT_FOR_ROLE_ENDPOINT = 'react-for-role'
+PROVISION_ENDPOINT = 'provision'  # POST
+
+# Variables
+
+
+class ReactForRoleEndpoint:
+    """
+    The API endpoints for ReactForRole
+    """
+    def __init__(self, bot):
+        self._bot = bot
+
+    def register(self, app):
+        """
+        Register the routes for the given application
+        :param app: The aiohttp.web.Application (likely of the sub app)
+        :return: app
+        """
+        app.add_routes([web.post('/{endpoint}'.format(endpoint=PROVISION_ENDPOINT), self.post_provision)])
+        return app
+
+    @parse_request(raw_response=True)
+    async def post_provision(self, guild_id, spec):
+        """
+        Create or update the rfr messages of a guild from a JSON or YAML spec
+        :param guild_id: The ID of the guild
+        :param spec: The spec of the rfr messages
+        :return: The provisioning report, or the problems found in the spec
+        """
+        rfr_cog = self._bot.get_cog("ReactForRole")
+        if rfr_cog is None:
+            raise web.HTTPNotFound(reason="ReactForRole is not loaded")
+        guild = self._bot.get_guild(int(guild_id)) if guild_id.isdigit() else None
+        if guild is None:
+            raise web.HTTPNotFound(reason="Guild not found")
+        if not extension_enabled(guild.id, "ReactForRole"):
+            raise web.HTTPForbidden(reason="ReactForRole is not enabled in this guild")
+
+        try:
+            message_specs = validate_rfr_spec(self._bot, guild, parse_rfr_spec(spec), rfr_cog.rfr_database_manager)
+        except RFRSpecError as err:
+            return build_response(UNPROCESSABLE_ENTITY, {'errors': err.errors})
+        return build_response(OK, await rfr_cog.provisioner.provision(guild, message_specs))
+
+
+def setup(bot: Bot):
+    """
+    Load this cog to the KoalaBot.
+    :param bot: the bot client for KoalaBot
+    """
+    sub_app = web.Application()
+    endpoint = ReactForRoleEndpoint(bot)
+    endpoint.register(sub_app)
+    getattr(bot, "koala_web_app").add_subapp('/{extension}'.format(extension=REACT_FOR_ROLE_ENDPOINT), sub_app)
+    logger.info("ReactForRole API is ready.")
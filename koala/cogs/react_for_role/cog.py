@@ -9,6 +9,7 @@ Commented using reStructuredText (reST)
 # Futures
 
 # Built-in/Generic Imports
+import asyncio
 from io import BytesIO
 from typing import *
 
@@ -23,8 +24,13 @@ from koala.colours import KOALA_GREEN
 from koala.utils import wait_for_message
 from koala.db import insert_extension
 from .db import ReactForRoleDBManager
+from .env import RFR_RECONCILE_REMOVE_ROLES
+from .index import RFRMemberReactions
 from .log import logger
-from .utils import CUSTOM_EMOJI_REGEXP, UNICODE_EMOJI_REGEXP
+from .provision import RFRProvisioner, RFRSpecError, parse_rfr_spec, validate_rfr_spec
+from .reconcile import RFRReconciler
+from .role_updates import RoleUpdateQueue
+from .utils import CUSTOM_EMOJI_REGEXP, UNICODE_EMOJI_REGEXP, get_emoji_key, get_reaction_emoji
 
 
 def rfr_is_enabled(ctx):
@@ -51,6 +57,25 @@ class ReactForRole(commands.Cog):
         self.bot = bot
         insert_extension("ReactForRole", 0, True, True)
         self.rfr_database_manager = ReactForRoleDBManager()
+        self.rfr_database_manager.load_rfr_message_index()
+        self.role_updates = RoleUpdateQueue()
+        self.member_reactions = RFRMemberReactions()
+        self.reconciler = RFRReconciler(bot, self.rfr_database_manager, self.role_updates, self.can_have_rfr_role,
+                                        RFR_RECONCILE_REMOVE_ROLES, self.member_reactions)
+        self.provisioner = RFRProvisioner(bot, self.rfr_database_manager, self.overwrite_channel_add_reaction_perms)
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        """
+        Reconciles reaction roles in the background, for reactions added or removed while the bot was offline
+        :return:
+        """
+        self.reconciler.start()
+
+    def cog_unload(self):
+        self.reconciler.stop()
+        # Role changes still waiting to be coalesced are applied now, rather than lost with the cog
+        asyncio.ensure_future(self.role_updates.flush())
 
     @commands.check(koalabot.is_guild_channel)
     @commands.check(koalabot.is_admin)
@@ -217,6 +242,36 @@ class ReactForRole(commands.Cog):
         else:
             await ctx.send("Cancelled command.")
 
+    @commands.check(koalabot.is_admin)
+    @commands.check(rfr_is_enabled)
+    @react_for_role_group.command(name="provision", aliases=["bulk"])
+    async def rfr_provision(self, ctx: commands.Context, *, spec_str: str = ""):
+        """
+        Creates or updates many rfr messages at once from a JSON or YAML spec, given in the command or as an attached
+        file. Only what differs from the spec is changed, so the same spec can be applied again after editing it.
+        \\\n{"messages": [{"channel": <channel>, "title": <title>, "description": <description>,
+        "roles": [{"emoji": <emoji>, "role": <role>}, ...]}, ...]}
+        \\\nUser needs admin perms to use.
+        :param ctx: Context of the command
+        :param spec_str: The spec, if not attached
+        :return:
+        """
+        if ctx.message.attachments:
+            spec_str = (await ctx.message.attachments[0].read()).decode("utf-8")
+        if not spec_str:
+            await ctx.send("Please give me a JSON or YAML spec of the rfr messages, or attach it as a file.")
+            return
+        try:
+            spec = parse_rfr_spec(spec_str)
+            message_specs = validate_rfr_spec(self.bot, ctx.guild, spec, self.rfr_database_manager)
+        except RFRSpecError as err:
+            await ctx.send("Found some issues with your spec, nothing was changed:\n" + "\n".join(err.errors[:20]))
+            return
+        await ctx.send(f"Okay, provisioning {len(message_specs)} react for role messages. This may take a while.")
+        report = await self.provisioner.provision(ctx.guild, message_specs)
+        await ctx.send(f"Okay, done. {report['created']} created, {report['updated']} updated, "
+                       f"{report['unchanged']} unchanged, {report['failed']} failed.")
+
     @react_for_role_group.group(name="edit", pass_context=True)
     async def edit_group(self, ctx: commands.Context):
         return
@@ -626,15 +681,15 @@ class ReactForRole(commands.Cog):
     async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent):
         """
         Event listener for adding a reaction. Doesn't need message to be in loaded cache.
-        Gives the user a role if they can get it, if not strips all their roles and removes their reacts.
+        Gives the user a role if they can get it, if not strips all their roles and removes their reacts. Role changes
+        are queued so a burst of reactions from one member is applied in a single request.
         :param payload: RawReactionActionEvent that happened
         :return:
         """
         if payload.guild_id is not None:
             if not payload.member.bot:
-                rfr_message = self.rfr_database_manager.get_rfr_message(payload.guild_id, payload.channel_id,
-                                                                        payload.message_id)
-                if not rfr_message:
+                if not self.rfr_database_manager.is_rfr_message(payload.guild_id, payload.channel_id,
+                                                                payload.message_id):
                     return
 
                 member_role = await self.get_role_member_info(payload.emoji, payload.guild_id,
@@ -644,36 +699,15 @@ class ReactForRole(commands.Cog):
                     # Remove the reaction
                     guild: discord.Guild = self.bot.get_guild(payload.guild_id)
                     channel: discord.TextChannel = guild.get_channel(payload.channel_id)
-                    msg: discord.Message = await channel.fetch_message(payload.message_id)
-                    await msg.clear_reaction(payload.emoji)
+                    await channel.get_partial_message(payload.message_id).clear_reaction(payload.emoji)
                 else:
+                    self.member_reactions.add(payload.guild_id, payload.user_id, payload.channel_id,
+                                              payload.message_id, get_emoji_key(payload.emoji))
                     if self.can_have_rfr_role(member_role[0]):
-                        await member_role[0].add_roles(member_role[1])
+                        self.role_updates.add(member_role[0], member_role[1])
                     else:
-                        # Remove all rfr roles from member
-                        role_ids = self.rfr_database_manager.get_guild_rfr_roles(payload.guild_id)
-                        roles: List[discord.Role] = []
-                        for role_id in role_ids:
-                            role = discord.utils.get(member_role[0].guild.roles, id=role_id)
-                            if not role:
-                                continue
-                            roles.append(role)
-                        for role_to_remove in roles:
-                            await member_role[0].remove_roles(role_to_remove)
-                        # Remove members' reaction from all rfr messages in guild
-                        guild_rfr_messages = self.rfr_database_manager.get_guild_rfr_messages(payload.guild_id)
-                        if not guild_rfr_messages:
-                            logger.error(
-                                f"ReactForRole: Guild RFR messages is empty on raw reaction add. Please check"
-                                f" guild ID {payload.guild_id}")
-
-                        else:
-                            for guild_rfr_message in guild_rfr_messages:
-                                guild: discord.Guild = member_role[0].guild
-                                channel: discord.TextChannel = guild.get_channel(guild_rfr_message[1])
-                                msg: discord.Message = await channel.fetch_message(guild_rfr_message[2])
-                                for x in msg.reactions:
-                                    await x.remove(payload.member)
+                        await self.remove_member_rfr_roles(member_role[0], payload.channel_id,
+                                                           payload.message_id, get_emoji_key(payload.emoji))
 
     @commands.check(koalabot.is_admin)
     @commands.check(rfr_is_enabled)
@@ -749,16 +783,17 @@ class ReactForRole(commands.Cog):
         """
 
         if payload.guild_id is not None:
-            rfr_message = self.rfr_database_manager.get_rfr_message(payload.guild_id, payload.channel_id,
-                                                                    payload.message_id)
-            if not rfr_message:
+            if not self.rfr_database_manager.is_rfr_message(payload.guild_id, payload.channel_id,
+                                                            payload.message_id):
                 return
+            self.member_reactions.remove(payload.guild_id, payload.user_id, payload.channel_id,
+                                         payload.message_id, get_emoji_key(payload.emoji))
             member_role = await self.get_role_member_info(payload.emoji, payload.guild_id,
                                                           payload.channel_id,
                                                           payload.message_id, payload.user_id)
             if not member_role or member_role[0].bot:
                 return
-            await member_role[0].remove_roles(member_role[1])
+            self.role_updates.remove(member_role[0], member_role[1])
 
     def can_have_rfr_role(self, member: discord.Member) -> bool:
         """
@@ -766,10 +801,70 @@ class ReactForRole(commands.Cog):
         :param member: Member to check rfr perms for
         :return: True if member has one of the required roles, or if there are no required roles. False otherwise
         """
-        required_roles: List[int] = self.rfr_database_manager.get_guild_rfr_required_roles(member.guild.id)
-        if not required_roles or len(required_roles) == 0:
+        required_roles = self.rfr_database_manager.get_guild_rfr_role_sets(member.guild.id).required_role_set
+        if not required_roles:
             return True
-        return any(x in required_roles for x in [y.id for y in member.roles])
+        return any(role.id in required_roles for role in member.roles)
+
+    async def remove_member_rfr_roles(self, member: discord.Member, channel_id: int, message_id: int,
+                                      emoji_key: str):
+        """
+        Takes every rfr role from a member who isn't allowed them, and removes their reactions from the guild's rfr
+        messages. Only the reactions recorded for the member are removed, along with the reaction that triggered this,
+        and the messages are handled concurrently without being fetched.
+        :param member: The member who isn't allowed rfr roles
+        :param channel_id: ID of the channel of the reaction that triggered this
+        :param message_id: ID of the message of the reaction that triggered this
+        :param emoji_key: canonical key of the emoji of the reaction that triggered this
+        :return:
+        """
+        guild: discord.Guild = member.guild
+        guild_emoji_roles = self.rfr_database_manager.get_guild_rfr_emoji_roles(guild.id)
+        if not guild_emoji_roles:
+            logger.error(f"ReactForRole: Guild RFR messages is empty on raw reaction add. Please check guild ID "
+                         f"{guild.id}")
+            return
+
+        reacted = self.member_reactions.get(guild.id, member.id) | {(channel_id, message_id, emoji_key)}
+        message_reactions = []
+        for rfr_channel_id, rfr_message_id, emoji_roles in guild_emoji_roles:
+            for rfr_emoji_raw, role_id in emoji_roles.items():
+                role = guild.get_role(role_id)
+                if role:
+                    # Queued with any other changes to the member, so all their rfr roles are taken in one edit
+                    self.role_updates.remove(member, role)
+            reactions = [rfr_emoji_raw for rfr_emoji_raw in emoji_roles
+                         if (rfr_channel_id, rfr_message_id, get_emoji_key(rfr_emoji_raw)) in reacted]
+            if reactions:
+                message_reactions.append((rfr_channel_id, rfr_message_id, reactions))
+
+        results = await asyncio.gather(*[self.remove_member_reactions(member, *reactions)
+                                         for reactions in message_reactions], return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"ReactForRole: Couldn't remove reactions of member {member.id} in guild {guild.id}: "
+                             f"{result}")
+
+    async def remove_member_reactions(self, member: discord.Member, channel_id: int, message_id: int,
+                                      emojis_raw: List[str]):
+        """
+        Removes a member's reactions from a message without fetching it
+        :param member: The member whose reactions are removed
+        :param channel_id: ID of the channel the message is in
+        :param message_id: ID of the message
+        :param emojis_raw: raw string representations of the emojis to remove
+        :return:
+        """
+        channel: discord.TextChannel = member.guild.get_channel(channel_id)
+        if not channel:
+            return
+        message: discord.PartialMessage = channel.get_partial_message(message_id)
+        for emoji_raw in emojis_raw:
+            try:
+                await message.remove_reaction(get_reaction_emoji(emoji_raw), member)
+            except discord.NotFound:
+                # The member didn't have this reaction, or the message was deleted
+                continue
 
     async def get_rfr_message_from_prompts(self, ctx: commands.Context) -> Tuple[discord.Message, discord.TextChannel]:
         """
@@ -799,9 +894,8 @@ class ReactForRole(commands.Cog):
         Tuple[discord.Member, discord.Role]]:
         """
         Gets the role that should be added/removed to/from a Member on reacting to a known RFR message, and works out
-        which Member reacted.
+        which Member reacted. Uses the stored emoji-role combos and the guild cache, so no message is fetched.
         :param emoji_reacted: Emoji of the raw reaction payload
-        :param emoji_role_id: DB key identifying specific RFR message in a Guild
         :param guild_id: ID of the guild this event occurred in
         :param channel_id: ID of the channel that the message was in
         :param message_id: ID of the message that was reacted to
@@ -811,42 +905,19 @@ class ReactForRole(commands.Cog):
         """
 
         guild: discord.Guild = self.bot.get_guild(guild_id)
-        member: discord.Member = discord.utils.get(guild.members, id=user_id)
-        if not member:
+        if not guild:
             return
-        channel: discord.TextChannel = discord.utils.get(guild.text_channels, id=channel_id)
-        if not channel:
+        member: discord.Member = guild.get_member(user_id)
+        if not member:
             return
-        message: discord.Message = await channel.fetch_message(message_id)
-        if not message:
+        role_id = self.rfr_database_manager.get_rfr_reaction_role_id(guild_id, channel_id, message_id,
+                                                                     get_emoji_key(emoji_reacted))
+        if not role_id:
             return
-        embed: discord.Embed = self.get_embed_from_message(message)
-
-        if emoji_reacted.is_unicode_emoji():
-            rep = emoji.emojize(emoji_reacted.name)
-            if not rep:
-                rep = emoji.emojize(emoji_reacted.name, use_aliases=True)
-
-            field = await self.get_field_by_emoji(embed, rep)
-            if not field:
-                return
-            role_str: str = field
-            if not role_str:
-                return
-            role: discord.Role = discord.utils.get(guild.roles, mention=role_str.lstrip().rstrip())
-            if not role:
-                return
-        elif emoji_reacted.is_custom_emoji():
-            rep = str(emoji_reacted)
-            field = await self.get_field_by_emoji(embed, rep)
-            if not field:
-                return
-            role_str = field
-            role: discord.Role = discord.utils.get(guild.roles, mention=role_str.lstrip().rstrip())
-        else:
-            logger.error(
-                f"ReactForRole: Database error, guild {guild_id} has no entry in rfr database for message_id "
-                f"{message_id} in channel_id {channel_id}. Please check this.")
+        role: discord.Role = guild.get_role(role_id)
+        if not role:
+            logger.error(f"ReactForRole: Couldn't find role {role_id} of rfr message {message_id} in guild "
+                         f"{guild_id}. Please check.")
             return
         return member, role
 
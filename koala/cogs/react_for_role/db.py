@@ -12,12 +12,13 @@ Commented using reStructuredText (reST)
 from typing import *
 
 import sqlalchemy.exc
-from sqlalchemy import select, delete, and_
+from sqlalchemy import select, delete, and_, literal, union_all
 
 # Own modules
 from koala.db import session_manager
+from .index import RFRMessageIndex
 from .log import logger
-from .models import GuildRFRMessages, RFRMessageEmojiRoles, GuildRFRRequiredRoles
+from .models import GuildRFRMessages, RFRMessageEmojiRoles, GuildRFRRequiredRoles, RFRReconcileCheckpoints
 
 
 # Libs
@@ -25,11 +26,87 @@ from .models import GuildRFRMessages, RFRMessageEmojiRoles, GuildRFRRequiredRole
 # Constants
 
 
+class GuildRFRRoles(NamedTuple):
+    """
+    The rfr roles and required roles of a guild, as cached by ReactForRoleDBManager
+    """
+    role_ids: Tuple[int, ...]
+    required_role_ids: Tuple[int, ...]
+    required_role_set: FrozenSet[int]
+
+
 class ReactForRoleDBManager:
     """
     A class for interacting with the KoalaBot ReactForRole database
     """
 
+    def __init__(self):
+        """
+        Initialises local variables
+        """
+        self.index = RFRMessageIndex()
+        # guild_id -> GuildRFRRoles, built on first use and invalidated by the add/remove methods
+        self.guild_roles: Dict[int, GuildRFRRoles] = {}
+
+    def load_rfr_message_index(self):
+        """
+        Loads every rfr message and emoji-role combo from the database into the in-memory index
+        :return:
+        """
+        with session_manager() as session:
+            messages = session.execute(select(GuildRFRMessages)).scalars().all()
+            emoji_roles = session.execute(select(RFRMessageEmojiRoles)).scalars().all()
+            self.index.clear()
+            for message in messages:
+                self.index.add_message(message.guild_id, message.channel_id, message.message_id,
+                                       message.emoji_role_id)
+            for emoji_role in emoji_roles:
+                self.index.add_emoji_role(emoji_role.emoji_role_id, emoji_role.emoji_raw, emoji_role.role_id)
+        self.guild_roles.clear()
+
+    def invalidate_guild_rfr_roles(self, guild_id: Optional[int]):
+        """
+        Removes a guild's cached rfr roles and required roles, so they are loaded again on next use
+        :param guild_id: ID of the guild, or None to invalidate every guild
+        :return:
+        """
+        if guild_id is None:
+            self.guild_roles.clear()
+        else:
+            self.guild_roles.pop(guild_id, None)
+
+    def invalidate_emoji_role_guild(self, emoji_role_id: int):
+        """
+        Removes the cached rfr roles of the guild an rfr message is in
+        :param emoji_role_id: emoji-role combo identifier of the rfr message
+        :return:
+        """
+        # An rfr message missing from the index could be in any guild
+        self.invalidate_guild_rfr_roles(self.index.get_guild_id(emoji_role_id))
+
+    def get_guild_rfr_role_sets(self, guild_id: int) -> GuildRFRRoles:
+        """
+        Gets the rfr roles and required roles of a guild, loading them with a single query if they aren't cached
+        :param guild_id: ID of the guild
+        :return: The guild's rfr role IDs and required role IDs
+        """
+        guild_roles = self.guild_roles.get(guild_id)
+        if guild_roles is not None:
+            return guild_roles
+
+        rfr_roles = select(RFRMessageEmojiRoles.role_id, literal(False).label("required"))\
+            .join(GuildRFRMessages, GuildRFRMessages.emoji_role_id == RFRMessageEmojiRoles.emoji_role_id)\
+            .where(GuildRFRMessages.guild_id == guild_id)
+        required_roles = select(GuildRFRRequiredRoles.role_id, literal(True).label("required"))\
+            .where(GuildRFRRequiredRoles.guild_id == guild_id)
+        with session_manager() as session:
+            rows = session.execute(union_all(rfr_roles, required_roles)).all()
+        role_ids = tuple(role_id for role_id, required in rows if not required)
+        required_role_ids = tuple(role_id for role_id, required in rows if required)
+        guild_roles = GuildRFRRoles(role_ids, required_role_ids, frozenset(required_role_ids))
+        self.guild_roles[guild_id] = guild_roles
+        return guild_roles
+
     def add_rfr_message(self, guild_id: int, channel_id: int, message_id: int):
         """
         Add an rfr message to a guild. Table stores a unique emoji_role_id to prevent the same combination
@@ -40,9 +117,10 @@ class ReactForRoleDBManager:
         :return:
         """
         with session_manager() as session:
-            session.add(
-                GuildRFRMessages(guild_id=guild_id, channel_id=channel_id, message_id=message_id))
+            message = GuildRFRMessages(guild_id=guild_id, channel_id=channel_id, message_id=message_id)
+            session.add(message)
             session.commit()
+            self.index.add_message(guild_id, channel_id, message_id, message.emoji_role_id)
 
     def add_rfr_message_emoji_role(self, emoji_role_id: int, emoji_raw: str, role_id: int):
         """
@@ -56,6 +134,8 @@ class ReactForRoleDBManager:
             try:
                 session.add(RFRMessageEmojiRoles(emoji_role_id=emoji_role_id, emoji_raw=emoji_raw, role_id=role_id))
                 session.commit()
+                self.index.add_emoji_role(emoji_role_id, emoji_raw, role_id)
+                self.invalidate_emoji_role_guild(emoji_role_id)
             except sqlalchemy.exc.IntegrityError:
                 logger.warning("RFRMessageEmojiRoles already exists for <%s, %s, %s>, continuing",
                                emoji_role_id, emoji_raw, role_id)
@@ -86,6 +166,8 @@ class ReactForRoleDBManager:
         with session_manager() as session:
             session.execute(delete_sql)
             session.commit()
+        self.index.remove_emoji_role(emoji_role_id, emoji_raw, role_id)
+        self.invalidate_emoji_role_guild(emoji_role_id)
 
     def remove_rfr_message_emoji_roles(self, emoji_role_id: int):
         """
@@ -99,6 +181,8 @@ class ReactForRoleDBManager:
 
             session.execute(delete_sql)
             session.commit()
+        self.index.remove_emoji_roles(emoji_role_id)
+        self.invalidate_emoji_role_guild(emoji_role_id)
 
     def remove_rfr_message(self, guild_id: int, channel_id: int, message_id: int):
         """
@@ -122,6 +206,8 @@ class ReactForRoleDBManager:
                         GuildRFRMessages.message_id == message_id))
             session.execute(delete_sql)
             session.commit()
+        self.index.remove_message(guild_id, channel_id, message_id)
+        self.invalidate_guild_rfr_roles(guild_id)
 
     def get_rfr_message(self, guild_id: int, channel_id: int, message_id: int) -> Optional[Tuple[int, int, int, int]]:
         """
@@ -141,6 +227,16 @@ class ReactForRoleDBManager:
             else:
                 return None
 
+    def is_rfr_message(self, guild_id: int, channel_id: int, message_id: int) -> bool:
+        """
+        Checks whether a message is an rfr message, using the in-memory index rather than the database.
+        :param guild_id: Guild ID of the message
+        :param channel_id: Channel ID of the message
+        :param message_id: Message ID of the message
+        :return: True if the message is an rfr message, otherwise False
+        """
+        return (guild_id, channel_id, message_id) in self.index
+
     def get_guild_rfr_messages(self, guild_id: int):
         """
         Gets all rfr messages in a given guild, from the guild ID
@@ -160,18 +256,7 @@ class ReactForRoleDBManager:
         :param guild_id: Guild ID to check in.
         :return: Role IDs of RFR roles in a specific guild
         """
-        with session_manager() as session:
-            rfr_messages = session.execute(select(GuildRFRMessages).filter_by(guild_id=guild_id)).scalars().all()
-            if not rfr_messages:
-                return []
-            role_ids: List[int] = []
-            for rfr_message in rfr_messages:
-                roles: List[Tuple[int, str, int]] = self.get_rfr_message_emoji_roles(rfr_message.emoji_role_id)
-                if not roles:
-                    continue
-                ids: List[int] = [x[2] for x in roles]
-                role_ids.extend(ids)
-            return role_ids
+        return list(self.get_guild_rfr_role_sets(guild_id).role_ids)
 
     def get_rfr_message_emoji_roles(self, emoji_role_id: int):
         """
@@ -216,6 +301,58 @@ class ReactForRoleDBManager:
                 return
             return row[0]
 
+    def get_rfr_reaction_role_id(self, guild_id: int, channel_id: int, message_id: int,
+                                 emoji_key: str) -> Optional[int]:
+        """
+        Gets the role ID given by reacting to an rfr message with an emoji, using the in-memory index rather than the
+        database.
+        :param guild_id: Guild ID of the rfr message
+        :param channel_id: Channel ID of the rfr message
+        :param message_id: Message ID of the rfr message
+        :param emoji_key: canonical key of the emoji, from get_emoji_key
+        :return: role ID of the emoji-role combo if found, otherwise None
+        """
+        return self.index.get_role_id(guild_id, channel_id, message_id, emoji_key)
+
+    def get_guild_rfr_emoji_roles(self, guild_id: int) -> List[Tuple[int, int, Dict[str, int]]]:
+        """
+        Gets the emoji-role combos of every rfr message in a guild, using the in-memory index rather than the database.
+        :param guild_id: ID of the guild
+        :return: A list of (channel_id, message_id, {emoji_raw: role_id}) for each rfr message in the guild
+        """
+        return self.index.get_guild_emoji_roles(guild_id)
+
+    def get_rfr_reconcile_checkpoint(self) -> List[Tuple[int, int, int]]:
+        """
+        Gets the rfr messages reconciled so far in the current reconciliation pass
+        :return: A list of (guild_id, channel_id, message_id) of each reconciled rfr message
+        """
+        with session_manager() as session:
+            return [tuple(row) for row in session.execute(
+                select(RFRReconcileCheckpoints.guild_id, RFRReconcileCheckpoints.channel_id,
+                       RFRReconcileCheckpoints.message_id)).all()]
+
+    def add_rfr_reconcile_checkpoint(self, guild_id: int, channel_id: int, message_id: int):
+        """
+        Marks an rfr message as reconciled in the current reconciliation pass
+        :param guild_id: Guild ID of the rfr message
+        :param channel_id: Channel ID of the rfr message
+        :param message_id: Message ID of the rfr message
+        :return:
+        """
+        with session_manager() as session:
+            session.merge(RFRReconcileCheckpoints(guild_id=guild_id, channel_id=channel_id, message_id=message_id))
+            session.commit()
+
+    def clear_rfr_reconcile_checkpoint(self):
+        """
+        Clears the reconciled rfr messages, once a reconciliation pass is complete
+        :return:
+        """
+        with session_manager() as session:
+            session.execute(delete(RFRReconcileCheckpoints))
+            session.commit()
+
     def add_guild_rfr_required_role(self, guild_id: int, role_id: int):
         """
         Adds a role to the list of roles required to use rfr functionality in a guild.
@@ -226,6 +363,7 @@ class ReactForRoleDBManager:
         with session_manager() as session:
             session.add(GuildRFRRequiredRoles(guild_id=guild_id, role_id=role_id))
             session.commit()
+        self.invalidate_guild_rfr_roles(guild_id)
 
     def remove_guild_rfr_required_role(self, guild_id: int, role_id: int):
         """
@@ -237,6 +375,7 @@ class ReactForRoleDBManager:
         with session_manager() as session:
             session.execute(delete(GuildRFRRequiredRoles).filter_by(guild_id=guild_id, role_id=role_id))
             session.commit()
+        self.invalidate_guild_rfr_roles(guild_id)
 
     def get_guild_rfr_required_roles(self, guild_id) -> List[int]:
         """
@@ -244,10 +383,4 @@ class ReactForRoleDBManager:
         :param guild_id: guild ID
         :return: List of role IDs
         """
-        with session_manager() as session:
-            rows = session.execute(select(GuildRFRRequiredRoles).filter_by(guild_id=guild_id)).scalars().all()
-
-            role_ids = [x.role_id for x in rows]
-            if not role_ids:
-                return []
-            return role_ids
+        return list(self.get_guild_rfr_role_sets(guild_id).required_role_ids)
@@ -0,0 +1,6 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+RFR_RECONCILE_REMOVE_ROLES = eval(os.environ.get('RFR_RECONCILE_REMOVE_ROLES', "False"))
@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+
+"""
+KoalaBot Reaction Roles Code
+
+Commented using reStructuredText (reST)
+"""
+# Futures
+
+# Built-in/Generic Imports
+from typing import *
+
+# Own modules
+from .utils import get_emoji_key
+
+# Libs
+
+# Constants
+
+# Variables
+
+
+class RFRMessageIndex:
+    """
+    An in-memory index of rfr messages and their emoji-role combos, so that reactions can be checked and resolved
+    without querying the database. Kept up to date by the ReactForRoleDBManager add and remove methods.
+    """
+
+    def __init__(self):
+        # (guild_id, channel_id, message_id) -> emoji_role_id
+        self.messages: Dict[Tuple[int, int, int], int] = {}
+        # emoji_role_id -> {emoji_raw: role_id}
+        self.emoji_roles: Dict[int, Dict[str, int]] = {}
+        # emoji_role_id -> {emoji_key: role_id}, for looking up reactions
+        self.emoji_keys: Dict[int, Dict[str, int]] = {}
+        # guild_id -> {(channel_id, message_id): emoji_role_id}
+        self.guilds: Dict[int, Dict[Tuple[int, int], int]] = {}
+        # emoji_role_id -> guild_id
+        self.emoji_role_guilds: Dict[int, int] = {}
+
+    def clear(self):
+        """
+        Removes every rfr message from the index
+        :return:
+        """
+        self.messages.clear()
+        self.emoji_roles.clear()
+        self.emoji_keys.clear()
+        self.guilds.clear()
+        self.emoji_role_guilds.clear()
+
+    def add_message(self, guild_id: int, channel_id: int, message_id: int, emoji_role_id: int):
+        """
+        Adds an rfr message to the index
+        :param guild_id: ID of the guild
+        :param channel_id: ID of the channel the rfr message is in
+        :param message_id: ID of the rfr message
+        :param emoji_role_id: emoji-role combo identifier of the message
+        :return:
+        """
+        self.messages[(guild_id, channel_id, message_id)] = emoji_role_id
+        self.emoji_roles.setdefault(emoji_role_id, {})
+        self.emoji_keys.setdefault(emoji_role_id, {})
+        self.guilds.setdefault(guild_id, {})[(channel_id, message_id)] = emoji_role_id
+        self.emoji_role_guilds[emoji_role_id] = guild_id
+
+    def remove_message(self, guild_id: int, channel_id: int, message_id: int):
+        """
+        Removes an rfr message and its emoji-role combos from the index
+        :param guild_id: ID of the guild
+        :param channel_id: ID of the channel the rfr message is in
+        :param message_id: ID of the rfr message
+        :return:
+        """
+        emoji_role_id = self.messages.pop((guild_id, channel_id, message_id), None)
+        if emoji_role_id is not None:
+            self.emoji_roles.pop(emoji_role_id, None)
+            self.emoji_keys.pop(emoji_role_id, None)
+            self.emoji_role_guilds.pop(emoji_role_id, None)
+            self.guilds.get(guild_id, {}).pop((channel_id, message_id), None)
+
+    def add_emoji_role(self, emoji_role_id: int, emoji_raw: str, role_id: int):
+        """
+        Adds an emoji-role combo to an rfr message in the index
+        :param emoji_role_id: emoji-role combo identifier
+        :param emoji_raw: raw string representation of the emoji
+        :param role_id: ID of the role to give on react
+        :return:
+        """
+        self.emoji_roles.setdefault(emoji_role_id, {})[emoji_raw] = role_id
+        self.emoji_keys.setdefault(emoji_role_id, {})[get_emoji_key(emoji_raw)] = role_id
+
+    def remove_emoji_role(self, emoji_role_id: int, emoji_raw: str = None, role_id: int = None):
+        """
+        Removes an emoji-role combo, identified by either its emoji or its role, from an rfr message in the index
+        :param emoji_role_id: emoji-role combo identifier
+        :param emoji_raw: raw string representation of the emoji
+        :param role_id: ID of the role to give on react
+        :return:
+        """
+        emoji_roles = self.emoji_roles.get(emoji_role_id)
+        if not emoji_roles:
+            return
+        if emoji_raw:
+            removed = [emoji_raw] if emoji_raw in emoji_roles else []
+        else:
+            removed = [key for key, value in emoji_roles.items() if value == role_id]
+        for key in removed:
+            del emoji_roles[key]
+        # Other emojis of the message may give the same role, and other forms of the emoji may still be used
+        remaining_keys = {get_emoji_key(key) for key in emoji_roles}
+        emoji_keys = self.emoji_keys.get(emoji_role_id, {})
+        for key in {get_emoji_key(key) for key in removed} - remaining_keys:
+            emoji_keys.pop(key, None)
+
+    def remove_emoji_roles(self, emoji_role_id: int):
+        """
+        Removes all emoji-role combos of an rfr message from the index
+        :param emoji_role_id: emoji-role combo identifier
+        :return:
+        """
+        if emoji_role_id in self.emoji_roles:
+            self.emoji_roles[emoji_role_id] = {}
+            self.emoji_keys[emoji_role_id] = {}
+
+    def get_emoji_role_id(self, guild_id: int, channel_id: int, message_id: int) -> Optional[int]:
+        """
+        Gets the emoji-role combo identifier of an rfr message
+        :param guild_id: Guild ID of the message
+        :param channel_id: Channel ID of the message
+        :param message_id: Message ID of the message
+        :return: The emoji_role_id if the message is an rfr message, otherwise None
+        """
+        return self.messages.get((guild_id, channel_id, message_id))
+
+    def get_role_id(self, guild_id: int, channel_id: int, message_id: int, emoji_key: str) -> Optional[int]:
+        """
+        Gets the role given by reacting to an rfr message with an emoji
+        :param guild_id: Guild ID of the message
+        :param channel_id: Channel ID of the message
+        :param message_id: Message ID of the message
+        :param emoji_key: canonical key of the emoji, from get_emoji_key
+        :return: The role ID if the message is an rfr message with that emoji, otherwise None
+        """
+        emoji_role_id = self.messages.get((guild_id, channel_id, message_id))
+        if emoji_role_id is None:
+            return None
+        return self.emoji_keys.get(emoji_role_id, {}).get(emoji_key)
+
+    def get_guild_id(self, emoji_role_id: int) -> Optional[int]:
+        """
+        Gets the guild of an rfr message from its emoji-role combo identifier
+        :param emoji_role_id: emoji-role combo identifier
+        :return: The guild ID if the rfr message is in the index, otherwise None
+        """
+        return self.emoji_role_guilds.get(emoji_role_id)
+
+    def get_guild_ids(self) -> List[int]:
+        """
+        Gets the IDs of every guild with an rfr message
+        :return: List of guild IDs
+        """
+        return [guild_id for guild_id, messages in self.guilds.items() if messages]
+
+    def get_guild_emoji_roles(self, guild_id: int) -> List[Tuple[int, int, Dict[str, int]]]:
+        """
+        Gets the emoji-role combos of every rfr message in a guild
+        :param guild_id: ID of the guild
+        :return: A list of (channel_id, message_id, {emoji_raw: role_id}) for each rfr message in the guild
+        """
+        return [(channel_id, message_id, self.emoji_roles.get(emoji_role_id, {}))
+                for (channel_id, message_id), emoji_role_id in self.guilds.get(guild_id, {}).items()]
+
+    def __contains__(self, key: Tuple[int, int, int]) -> bool:
+        return key in self.messages
+
+
+class RFRMemberReactions:
+    """
+    An in-memory record of the reactions members have made on rfr messages, so a member's reactions can be removed
+    without fetching every rfr message. Reactions are recorded as they are added and removed, and reactions made while
+    the bot was offline are recorded when the reconciler passes their message.
+    """
+
+    def __init__(self):
+        # (guild_id, member_id) -> {(channel_id, message_id, emoji_key)}
+        self.reactions: Dict[Tuple[int, int], Set[Tuple[int, int, str]]] = {}
+
+    def add(self, guild_id: int, member_id: int, channel_id: int, message_id: int, emoji_key: str):
+        """
+        Records a member's reaction on an rfr message
+        :param guild_id: ID of the guild
+        :param member_id: ID of the member who reacted
+        :param channel_id: ID of the channel the rfr message is in
+        :param message_id: ID of the rfr message
+        :param emoji_key: canonical key of the emoji, from get_emoji_key
+        :return:
+        """
+        self.reactions.setdefault((guild_id, member_id), set()).add((channel_id, message_id, emoji_key))
+
+    def remove(self, guild_id: int, member_id: int, channel_id: int, message_id: int, emoji_key: str):
+        """
+        Forgets a member's reaction on an rfr message
+        :param guild_id: ID of the guild
+        :param member_id: ID of the member who removed their reaction
+        :param channel_id: ID of the channel the rfr message is in
+        :param message_id: ID of the rfr message
+        :param emoji_key: canonical key of the emoji, from get_emoji_key
+        :return:
+        """
+        member_reactions = self.reactions.get((guild_id, member_id))
+        if member_reactions is not None:
+            member_reactions.discard((channel_id, message_id, emoji_key))
+            if not member_reactions:
+                del self.reactions[(guild_id, member_id)]
+
+    def get(self, guild_id: int, member_id: int) -> Set[Tuple[int, int, str]]:
+        """
+        Gets the recorded reactions of a member in a guild
+        :param guild_id: ID of the guild
+        :param member_id: ID of the member
+        :return: A set of (channel_id, message_id, emoji_key) for each of the member's reactions
+        """
+        return set(self.reactions.get((guild_id, member_id), ()))
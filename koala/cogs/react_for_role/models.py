@@ -47,4 +47,16 @@ class GuildRFRRequiredRoles:
                (self.guild_id, self.role_id)
 
 
+@mapper_registry.mapped
+class RFRReconcileCheckpoints:
+    __tablename__ = 'RFRReconcileCheckpoints'
+    guild_id = Column(Integer, primary_key=True)
+    channel_id = Column(Integer, primary_key=True)
+    message_id = Column(Integer, primary_key=True)
+
+    def __repr__(self):
+        return "<RFRReconcileCheckpoints(%s, %s, %s)>" % \
+               (self.guild_id, self.channel_id, self.message_id)
+
+
 setup()
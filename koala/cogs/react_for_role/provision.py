@@ -0,0 +1,388 @@
+#!/usr/bin/env python
+
+"""
+KoalaBot Reaction Roles Code
+
+Commented using reStructuredText (reST)
+"""
+# Futures
+
+# Built-in/Generic Imports
+import asyncio
+import json
+import re
+from typing import *
+
+# Own modules
+from koala.colours import KOALA_GREEN
+from .db import ReactForRoleDBManager
+from .log import logger
+from .utils import CUSTOM_EMOJI_REGEXP, UNICODE_EMOJI_REGEXP, RFR_MAX_ROLES, RFR_DEFAULT_TITLE, \
+    RFR_DEFAULT_DESCRIPTION, RFR_DEFAULT_THUMBNAIL, PROVISION_CONCURRENCY, get_emoji_raw, get_emoji_key, \
+    get_reaction_emoji
+
+# Libs
+import discord
+import emoji
+import yaml
+
+# Constants
+CODE_BLOCK_REGEXP: re.Pattern = re.compile(r"^```\w*\n?(.*?)\n?```$", re.DOTALL)
+CHANNEL_MENTION_REGEXP: re.Pattern = re.compile(r"^<#(\d+)>$")
+ROLE_MENTION_REGEXP: re.Pattern = re.compile(r"^<@&(\d+)>$")
+
+# Variables
+
+
+class RFRSpecError(ValueError):
+    """
+    Raised when an rfr provisioning spec is invalid, with every problem found in it
+    """
+
+    def __init__(self, errors: List[str]):
+        super().__init__("\n".join(errors))
+        self.errors = errors
+
+
+class RFRMessageSpec(NamedTuple):
+    """
+    A validated rfr message from a provisioning spec
+    """
+    channel: discord.TextChannel
+    message_id: Optional[int]
+    title: str
+    description: str
+    inline: bool
+    # [(emoji_raw, role)], in the order the fields and reactions are added
+    emoji_roles: List[Tuple[str, discord.Role]]
+
+
+def parse_rfr_spec(spec_str: str) -> dict:
+    """
+    Parses a provisioning spec given as JSON or YAML, optionally in a discord code block
+    :param spec_str: The spec
+    :return: The parsed spec
+    :raises RFRSpecError: If the spec can't be parsed
+    """
+    spec_str = spec_str.strip()
+    search_result = CODE_BLOCK_REGEXP.match(spec_str)
+    if search_result:
+        spec_str = search_result.group(1)
+    try:
+        spec = json.loads(spec_str)
+    except ValueError:
+        try:
+            spec = yaml.safe_load(spec_str)
+        except yaml.YAMLError as err:
+            raise RFRSpecError([f"Couldn't parse the spec as JSON or YAML: {err}"])
+    if not isinstance(spec, dict):
+        raise RFRSpecError(["The spec must be a mapping with a list of messages"])
+    return spec
+
+
+def _get_id(value, mention_regexp: re.Pattern = None) -> Optional[int]:
+    """
+    Gets an ID given as an int, a string of digits or a mention
+    :param value: The value from the spec
+    :param mention_regexp: Regex matching a mention, with the ID in its first group, if mentions are allowed
+    :return: The ID, or None if the value isn't one
+    """
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        if value.isdigit():
+            return int(value)
+        search_result = mention_regexp.match(value) if mention_regexp else None
+        if search_result:
+            return int(search_result.group(1))
+    return None
+
+
+def _get_channel(guild: discord.Guild, value) -> Optional[discord.TextChannel]:
+    channel_id = _get_id(value, CHANNEL_MENTION_REGEXP)
+    if channel_id is not None:
+        return discord.utils.get(guild.text_channels, id=channel_id)
+    if isinstance(value, str):
+        return discord.utils.get(guild.text_channels, name=value.lstrip("#"))
+    return None
+
+
+def _get_role(guild: discord.Guild, value) -> Optional[discord.Role]:
+    role_id = _get_id(value, ROLE_MENTION_REGEXP)
+    if role_id is not None:
+        return guild.get_role(role_id)
+    if isinstance(value, str):
+        return discord.utils.get(guild.roles, name=value.lstrip("@"))
+    return None
+
+
+def _get_emoji_raw(bot: discord.Client, value) -> Optional[str]:
+    """
+    Gets the raw string representation of an emoji the bot can react with
+    :param bot: The bot client
+    :param value: A unicode emoji, its :name:, or a custom emoji as <:name:id>
+    :return: The emoji_raw, or None if the bot can't use the emoji
+    """
+    if not isinstance(value, str):
+        return None
+    value = value.strip()
+    search_result = CUSTOM_EMOJI_REGEXP.match(value)
+    if search_result:
+        custom_emoji = bot.get_emoji(int(search_result.group(2)))
+        return str(custom_emoji) if custom_emoji else None
+    unicode_emoji = emoji.emojize(value, language='alias')
+    if UNICODE_EMOJI_REGEXP.fullmatch(unicode_emoji):
+        return get_emoji_raw(unicode_emoji)
+    return None
+
+
+def validate_rfr_spec(bot: discord.Client, guild: discord.Guild, spec: dict,
+                      rfr_database_manager: ReactForRoleDBManager) -> List[RFRMessageSpec]:
+    """
+    Validates a provisioning spec against a guild, resolving its channels, roles and emojis. A spec looks like
+    \n{"messages": [{"channel": <channel>, "title": <title>, "description": <description>, "inline": <bool>,
+    "message_id": <rfr message ID>, "roles": [{"emoji": <emoji>, "role": <role>}, ...]}, ...]}
+    \nwhere only channel and roles are required. Without message_id, the existing rfr message in the channel with the
+    same title is updated.
+    :param bot: The bot client
+    :param guild: The guild the spec is for
+    :param spec: The parsed spec
+    :param rfr_database_manager: The rfr database manager, to check given message IDs are rfr messages
+    :return: The validated messages
+    :raises RFRSpecError: With every problem found if the spec is invalid
+    """
+    errors = []
+    messages = spec.get("messages")
+    if not isinstance(messages, list) or not messages:
+        raise RFRSpecError(["The spec must have a non-empty list of messages"])
+
+    message_specs = []
+    for i, message in enumerate(messages):
+        path = f"messages[{i}]"
+        if not isinstance(message, dict):
+            errors.append(f"{path}: Must be a mapping")
+            continue
+        message_errors = []
+
+        channel = _get_channel(guild, message.get("channel"))
+        if not channel:
+            message_errors.append(f"{path}.channel: Couldn't find text channel {message.get('channel')!r}")
+        title = message.get("title", RFR_DEFAULT_TITLE)
+        description = message.get("description", RFR_DEFAULT_DESCRIPTION)
+        for field, value in (("title", title), ("description", description)):
+            if not isinstance(value, str) or not value:
+                message_errors.append(f"{path}.{field}: Must be a non-empty string")
+        inline = message.get("inline", False)
+        if not isinstance(inline, bool):
+            message_errors.append(f"{path}.inline: Must be true or false")
+
+        message_id = message.get("message_id")
+        if message_id is not None:
+            message_id = _get_id(message_id)
+            if message_id is None:
+                message_errors.append(f"{path}.message_id: Must be a message ID")
+            elif channel and not rfr_database_manager.is_rfr_message(guild.id, channel.id, message_id):
+                message_errors.append(f"{path}.message_id: {message_id} isn't an rfr message in {channel.name}")
+
+        roles = message.get("roles")
+        emoji_roles = []
+        if not isinstance(roles, list) or not roles:
+            message_errors.append(f"{path}.roles: Must be a non-empty list")
+            roles = []
+        elif len(roles) > RFR_MAX_ROLES:
+            message_errors.append(f"{path}.roles: An rfr message can only have {RFR_MAX_ROLES} roles")
+        for j, emoji_role in enumerate(roles):
+            role_path = f"{path}.roles[{j}]"
+            if not isinstance(emoji_role, dict):
+                message_errors.append(f"{role_path}: Must be a mapping with an emoji and a role")
+                continue
+            emoji_raw = _get_emoji_raw(bot, emoji_role.get("emoji"))
+            if not emoji_raw:
+                message_errors.append(f"{role_path}.emoji: {emoji_role.get('emoji')!r} isn't an emoji I can use")
+            elif emoji_raw in [x for x, _ in emoji_roles]:
+                message_errors.append(f"{role_path}.emoji: Duplicate emoji {emoji_role.get('emoji')}")
+            role = _get_role(guild, emoji_role.get("role"))
+            if not role:
+                message_errors.append(f"{role_path}.role: Couldn't find role {emoji_role.get('role')!r}")
+            elif role.is_default() or role.managed:
+                message_errors.append(f"{role_path}.role: {role.name} can't be given out")
+            elif role in [x for _, x in emoji_roles]:
+                message_errors.append(f"{role_path}.role: Duplicate role {role.name}")
+            if emoji_raw and role:
+                emoji_roles.append((emoji_raw, role))
+
+        if message_errors:
+            errors.extend(message_errors)
+        else:
+            message_specs.append(RFRMessageSpec(channel, message_id, title, description, inline, emoji_roles))
+
+    ids = [(x.channel.id, x.message_id) for x in message_specs if x.message_id is not None]
+    if len(ids) != len(set(ids)):
+        errors.append("messages: The same message_id is given more than once")
+    if errors:
+        raise RFRSpecError(errors)
+    return message_specs
+
+
+class RFRProvisioner:
+    """
+    Creates or updates the rfr messages of a guild to match a provisioning spec. Only what differs from the spec is
+    changed, so applying the same spec again makes no requests beyond fetching the messages. Channels are provisioned
+    concurrently, and rfr messages that aren't in the spec are left alone.
+    """
+
+    def __init__(self, bot: discord.Client, rfr_database_manager: ReactForRoleDBManager,
+                 overwrite_channel_add_reaction_perms: Callable[[discord.Guild, discord.TextChannel], Awaitable],
+                 concurrency=PROVISION_CONCURRENCY):
+        """
+        Initialises local variables
+        :param bot: The bot client
+        :param rfr_database_manager: The rfr database manager
+        :param overwrite_channel_add_reaction_perms: A coroutine function stopping members adding new reactions in a
+        channel, called for each channel an rfr message is created in
+        :param concurrency: The maximum number of channels provisioned at once
+        """
+        self.bot = bot
+        self.rfr_database_manager = rfr_database_manager
+        self.overwrite_channel_add_reaction_perms = overwrite_channel_add_reaction_perms
+        self.concurrency = concurrency
+
+    async def provision(self, guild: discord.Guild, message_specs: List[RFRMessageSpec]) -> dict:
+        """
+        Applies validated message specs to a guild
+        :param guild: The guild
+        :param message_specs: The validated message specs
+        :return: A report with the number of messages created, updated, unchanged and failed, and the result of each
+        """
+        channels: Dict[int, List[RFRMessageSpec]] = {}
+        for message_spec in message_specs:
+            channels.setdefault(message_spec.channel.id, []).append(message_spec)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def provision_channel(channel_specs: List[RFRMessageSpec]):
+            async with semaphore:
+                return await self.provision_channel(guild, channel_specs)
+
+        channel_results = await asyncio.gather(*[provision_channel(channel_specs)
+                                                 for channel_specs in channels.values()])
+        results = [result for channel_result in channel_results for result in channel_result]
+        report = {status: len([x for x in results if x["status"] == status])
+                  for status in ("created", "updated", "unchanged", "failed")}
+        report["messages"] = results
+        logger.info(f"ReactForRole: Provisioned rfr messages in guild {guild.id}: {report['created']} created, "
+                    f"{report['updated']} updated, {report['unchanged']} unchanged, {report['failed']} failed")
+        return report
+
+    async def provision_channel(self, guild: discord.Guild, channel_specs: List[RFRMessageSpec]) -> List[dict]:
+        """
+        Applies the message specs of one channel in order, as requests in a channel share a rate limit
+        :param guild: The guild
+        :param channel_specs: The validated message specs of the channel
+        :return: The result of each message spec
+        """
+        channel = channel_specs[0].channel
+        existing = await self.get_channel_rfr_messages(guild, channel)
+        # Messages given by ID can't be matched to another spec by title
+        claimed = {x.message_id for x in channel_specs if x.message_id is not None}
+        results = []
+        perms_set = False
+        for message_spec in channel_specs:
+            if message_spec.message_id is not None:
+                message = existing.get(message_spec.message_id)
+            else:
+                message = next((x for x in existing.values() if x.id not in claimed and x.embeds
+                                and x.embeds[0].title == message_spec.title), None)
+            if message:
+                claimed.add(message.id)
+            try:
+                if not message and not perms_set:
+                    await self.overwrite_channel_add_reaction_perms(guild, channel)
+                    perms_set = True
+                results.append(await self.provision_message(guild, message_spec, message))
+            except discord.HTTPException as err:
+                logger.error(f"ReactForRole: Couldn't provision rfr message {message_spec.title} in channel "
+                             f"{channel.id} of guild {guild.id}: {err}")
+                results.append({"channel_id": channel.id, "message_id": message.id if message else None,
+                                "status": "failed", "error": str(err)})
+        return results
+
+    async def get_channel_rfr_messages(self, guild: discord.Guild,
+                                       channel: discord.TextChannel) -> Dict[int, discord.Message]:
+        """
+        Fetches the rfr messages of a channel
+        :param guild: The guild
+        :param channel: The channel
+        :return: A dict of message ID to message, in the order the messages were sent
+        """
+        message_ids = sorted(message_id for channel_id, message_id, _
+                             in self.rfr_database_manager.get_guild_rfr_emoji_roles(guild.id)
+                             if channel_id == channel.id)
+        messages = await asyncio.gather(*[channel.fetch_message(message_id) for message_id in message_ids],
+                                        return_exceptions=True)
+        existing = {}
+        for message_id, message in zip(message_ids, messages):
+            if isinstance(message, discord.Message):
+                existing[message_id] = message
+            else:
+                logger.warning(f"ReactForRole: Couldn't fetch rfr message {message_id} in channel {channel.id}: "
+                               f"{message}")
+        return existing
+
+    async def provision_message(self, guild: discord.Guild, message_spec: RFRMessageSpec,
+                                message: Optional[discord.Message]) -> dict:
+        """
+        Creates an rfr message, or updates an existing one, to match its spec
+        :param guild: The guild
+        :param message_spec: The validated message spec
+        :param message: The existing rfr message, or None to create it
+        :return: The result of the message spec
+        """
+        channel = message_spec.channel
+        if message:
+            old_embed = message.embeds[0] if message.embeds else None
+            embed = old_embed.copy() if old_embed else discord.Embed(colour=KOALA_GREEN)
+            status = "unchanged"
+        else:
+            old_embed = None
+            embed = discord.Embed(colour=KOALA_GREEN)
+            embed.set_footer(text="ReactForRole")
+            embed.set_thumbnail(url=RFR_DEFAULT_THUMBNAIL)
+            status = "created"
+        embed.title = message_spec.title
+        embed.description = message_spec.description
+        embed.clear_fields()
+        for emoji_raw, role in message_spec.emoji_roles:
+            embed.add_field(name=str(get_reaction_emoji(emoji_raw)), value=role.mention, inline=message_spec.inline)
+
+        if not message:
+            message = await channel.send(embed=embed)
+            self.rfr_database_manager.add_rfr_message(guild.id, channel.id, message.id)
+        elif not old_embed or embed.to_dict() != old_embed.to_dict():
+            await message.edit(embed=embed)
+            status = "updated"
+
+        # Update the emoji-role combos in the database
+        emoji_role_id = self.rfr_database_manager.index.get_emoji_role_id(guild.id, channel.id, message.id)
+        current = dict(self.rfr_database_manager.index.emoji_roles.get(emoji_role_id, {}))
+        wanted = {emoji_raw: role.id for emoji_raw, role in message_spec.emoji_roles}
+        removed = [emoji_raw for emoji_raw, role_id in current.items() if wanted.get(emoji_raw) != role_id]
+        added = [emoji_raw for emoji_raw, role_id in wanted.items() if current.get(emoji_raw) != role_id]
+        for emoji_raw in removed:
+            self.rfr_database_manager.remove_rfr_message_emoji_role(emoji_role_id, emoji_raw=emoji_raw)
+        for emoji_raw in added:
+            self.rfr_database_manager.add_rfr_message_emoji_role(emoji_role_id, emoji_raw, wanted[emoji_raw])
+
+        # Update the bot's reactions
+        reactions = {get_emoji_key(reaction.emoji): reaction for reaction in message.reactions if reaction.me}
+        wanted_keys = {get_emoji_key(emoji_raw): emoji_raw for emoji_raw in wanted}
+        for emoji_key, reaction in reactions.items():
+            if emoji_key not in wanted_keys:
+                await message.clear_reaction(reaction.emoji)
+        for emoji_key, emoji_raw in wanted_keys.items():
+            if emoji_key not in reactions:
+                await message.add_reaction(get_reaction_emoji(emoji_raw))
+
+        if status == "unchanged" and (added or removed or reactions.keys() != wanted_keys.keys()):
+            status = "updated"
+        return {"channel_id": channel.id, "message_id": message.id, "status": status,
+                "added": added, "removed": removed}
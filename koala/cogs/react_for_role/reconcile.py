@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+
+"""
+KoalaBot Reaction Roles Code
+
+Commented using reStructuredText (reST)
+"""
+# Futures
+
+# Built-in/Generic Imports
+import asyncio
+from collections import Counter
+from typing import *
+
+# Own modules
+from .db import ReactForRoleDBManager
+from .index import RFRMemberReactions
+from .log import logger
+from .role_updates import RoleUpdateQueue
+from .utils import RECONCILE_YIELD_EVERY, get_emoji_key
+
+# Libs
+import discord
+
+# Constants
+
+# Variables
+
+
+class RFRReconciler:
+    """
+    Brings the roles of members back in line with their reactions on rfr messages, for reactions added or removed
+    while the bot was offline. Runs in the background, one rfr message at a time, with the changes applied through the
+    role update queue. Each reconciled message is stored, so a pass interrupted by a restart resumes where it stopped.
+
+    By default roles are only given. Roles can also be taken from members who hold them without a reaction, but
+    only roles on a single rfr message, as the role could have been given by hand or through another message.
+    """
+
+    def __init__(self, bot: discord.Client, rfr_database_manager: ReactForRoleDBManager,
+                 role_updates: RoleUpdateQueue, can_have_rfr_role: Callable[[discord.Member], bool],
+                 remove_roles: bool = False, member_reactions: RFRMemberReactions = None):
+        """
+        Initialises local variables
+        :param bot: The bot client
+        :param rfr_database_manager: The rfr database manager, whose index lists the rfr messages
+        :param role_updates: The queue role changes are made through
+        :param can_have_rfr_role: A function checking whether a member is allowed rfr roles
+        :param remove_roles: Whether to take roles from members who hold them without a reaction
+        :param member_reactions: The record of members' rfr reactions, which the reactors found are added to
+        """
+        self.bot = bot
+        self.rfr_database_manager = rfr_database_manager
+        self.role_updates = role_updates
+        self.can_have_rfr_role = can_have_rfr_role
+        self.remove_roles = remove_roles
+        self.member_reactions = member_reactions
+        # (guild_id, channel_id, message_id) of each message reconciled in the current pass
+        self.checkpoint: Set[Tuple[int, int, int]] = set()
+        self.progress = {"messages": 0, "reconciled": 0, "added": 0, "removed": 0, "failed": 0}
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> asyncio.Task:
+        """
+        Starts a reconciliation pass in the background. If a pass is already running it carries on, and if the last
+        pass was interrupted the new one resumes from its checkpoint.
+        :return: The task of the pass
+        """
+        if not self.running:
+            self._task = asyncio.ensure_future(self.run())
+        return self._task
+
+    def stop(self):
+        """
+        Stops the running pass, keeping its checkpoint so the next pass resumes from it
+        :return:
+        """
+        if self.running:
+            self._task.cancel()
+
+    async def run(self):
+        """
+        Reconciles every rfr message not yet reconciled in this pass
+        :return:
+        """
+        messages = [(guild_id, channel_id, message_id, emoji_roles)
+                    for guild_id in self.rfr_database_manager.index.get_guild_ids()
+                    for channel_id, message_id, emoji_roles
+                    in self.rfr_database_manager.get_guild_rfr_emoji_roles(guild_id)]
+        # The number of rfr messages giving each role
+        role_message_counts = Counter(role_id for _, _, _, emoji_roles in messages
+                                      for role_id in set(emoji_roles.values()))
+        if not self.checkpoint:
+            self.checkpoint = set(self.rfr_database_manager.get_rfr_reconcile_checkpoint())
+            self.progress = {"messages": len(messages), "reconciled": len(self.checkpoint), "added": 0, "removed": 0,
+                             "failed": 0}
+        logger.info(f"ReactForRole: Reconciling reaction roles of {len(messages) - len(self.checkpoint)} rfr messages")
+
+        for guild_id, channel_id, message_id, emoji_roles in messages:
+            key = (guild_id, channel_id, message_id)
+            if key in self.checkpoint:
+                continue
+            shared_role_ids = {role_id for role_id in emoji_roles.values() if role_message_counts[role_id] > 1}
+            try:
+                await self.reconcile_message(guild_id, channel_id, message_id, emoji_roles, shared_role_ids)
+            except (discord.HTTPException, AttributeError) as err:
+                self.progress["failed"] += 1
+                logger.error(f"ReactForRole: Couldn't reconcile rfr message {message_id} in guild {guild_id}: {err}")
+            self.checkpoint.add(key)
+            self.rfr_database_manager.add_rfr_reconcile_checkpoint(guild_id, channel_id, message_id)
+            self.progress["reconciled"] += 1
+            logger.info(f"ReactForRole: Reconciled {self.progress['reconciled']}/{self.progress['messages']} rfr "
+                        f"messages, {self.progress['added']} roles given, {self.progress['removed']} roles taken")
+
+        # The pass is complete, so the next one starts from the beginning
+        self.checkpoint.clear()
+        self.rfr_database_manager.clear_rfr_reconcile_checkpoint()
+
+    async def reconcile_message(self, guild_id: int, channel_id: int, message_id: int, emoji_roles: Dict[str, int],
+                                shared_role_ids: Set[int] = frozenset()):
+        """
+        Gives each role of an rfr message to the members who reacted for it. If removing roles is enabled, also takes
+        it from those who didn't, unless the role is given by another rfr message too.
+        :param guild_id: Guild ID of the rfr message
+        :param channel_id: Channel ID of the rfr message
+        :param message_id: Message ID of the rfr message
+        :param emoji_roles: The emoji-role combos of the message, as {emoji_raw: role_id}
+        :param shared_role_ids: IDs of the roles of the message that other rfr messages also give
+        :return:
+        """
+        guild: discord.Guild = self.bot.get_guild(guild_id)
+        channel: discord.TextChannel = guild.get_channel(channel_id)
+        message: discord.Message = await channel.fetch_message(message_id)
+        reactions = {get_emoji_key(reaction.emoji): reaction for reaction in message.reactions}
+
+        for emoji_raw, role_id in emoji_roles.items():
+            role: discord.Role = guild.get_role(role_id)
+            if not role:
+                continue
+            reactor_ids = set()
+            reaction = reactions.get(get_emoji_key(emoji_raw))
+            if reaction:
+                # Reactors are fetched 100 per request
+                async for user in reaction.users():
+                    reactor_ids.add(user.id)
+                    if self.member_reactions is not None:
+                        self.member_reactions.add(guild_id, user.id, channel_id, message_id, get_emoji_key(emoji_raw))
+            holder_ids = {member.id for member in role.members}
+
+            for count, member_id in enumerate(reactor_ids - holder_ids, 1):
+                member = guild.get_member(member_id)
+                if member and not member.bot and self.can_have_rfr_role(member):
+                    self.role_updates.add(member, role)
+                    self.progress["added"] += 1
+                if count % RECONCILE_YIELD_EVERY == 0:
+                    await asyncio.sleep(0)
+            if not self.remove_roles or role_id in shared_role_ids:
+                continue
+            for count, member_id in enumerate(holder_ids - reactor_ids, 1):
+                member = guild.get_member(member_id)
+                if member and not member.bot:
+                    self.role_updates.remove(member, role)
+                    self.progress["removed"] += 1
+                if count % RECONCILE_YIELD_EVERY == 0:
+                    await asyncio.sleep(0)
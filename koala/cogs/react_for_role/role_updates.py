@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+
+"""
+KoalaBot Reaction Roles Code
+
+Commented using reStructuredText (reST)
+"""
+# Futures
+
+# Built-in/Generic Imports
+import asyncio
+from typing import *
+
+# Own modules
+from koala.utils import retry_discord_request
+from .log import logger
+from .utils import ROLE_UPDATE_DELAY, ROLE_UPDATE_CONCURRENCY, ROLE_UPDATE_RETRIES, ROLE_UPDATE_BACKOFF, \
+    ROLE_UPDATE_SETTLE
+
+# Libs
+import aiohttp
+import discord
+
+# Constants
+
+# Variables
+
+
+class RoleUpdateQueue:
+    """
+    Coalesces the role changes of each member over a short window, so a burst of reactions results in a single
+    request per member. Only one request is made for a member at a time. Requests are limited globally and retried
+    with exponential backoff.
+    """
+
+    def __init__(self, delay=ROLE_UPDATE_DELAY, concurrency=ROLE_UPDATE_CONCURRENCY, retries=ROLE_UPDATE_RETRIES,
+                 backoff=ROLE_UPDATE_BACKOFF, settle=ROLE_UPDATE_SETTLE):
+        """
+        Initialises local variables
+        :param delay: The time in seconds changes to a member's roles are collected for before being applied
+        :param concurrency: The maximum number of requests in progress at once
+        :param retries: The number of times a failed request is retried
+        :param backoff: The delay in seconds before the first retry, doubled for each retry after
+        :param settle: The time in seconds the cached roles of a member may not show the changes of a request for
+        """
+        self.delay = delay
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.settle = settle
+        # (guild_id, member_id) -> (member, {role_id: (role, add)})
+        self._pending: Dict[Tuple[int, int], Tuple[discord.Member, Dict[int, Tuple[discord.Role, bool]]]] = {}
+        # (guild_id, member_id) -> the task waiting for or applying the member's changes
+        self._timers: Dict[Tuple[int, int], asyncio.Task] = {}
+        # Keys of the members whose changes are being applied
+        self._applying: Set[Tuple[int, int]] = set()
+        # (guild_id, member_id) -> (time, {role_id: (role, add)}) of the changes made by the member's last request
+        self._applied: Dict[Tuple[int, int], Tuple[float, Dict[int, Tuple[discord.Role, bool]]]] = {}
+        self._loop = None
+        self._semaphore = None
+
+    def add(self, member: discord.Member, role: discord.Role):
+        """
+        Queues a role to be given to a member
+        :param member: The member to give the role to
+        :param role: The role to give
+        :return:
+        """
+        self._queue(member, role, True)
+
+    def remove(self, member: discord.Member, role: discord.Role):
+        """
+        Queues a role to be taken from a member
+        :param member: The member to take the role from
+        :param role: The role to take
+        :return:
+        """
+        self._queue(member, role, False)
+
+    def _queue(self, member: discord.Member, role: discord.Role, add: bool):
+        """
+        Records a role change, replacing any earlier queued change of the same role, and starts the member's window
+        :param member: The member whose roles are changed
+        :param role: The role to change
+        :param add: True to give the role, False to take it
+        :return:
+        """
+        key = (member.guild.id, member.id)
+        _, changes = self._pending.get(key, (member, {}))
+        changes[role.id] = (role, add)
+        self._pending[key] = (member, changes)
+        if key not in self._timers:
+            self._timers[key] = asyncio.ensure_future(self._apply_later(key))
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        """
+        Gets the global semaphore, creating it for the running event loop
+        :return: The semaphore
+        """
+        loop = asyncio.get_event_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    async def _apply_later(self, key: Tuple[int, int]):
+        await asyncio.sleep(self.delay)
+        await self._apply(key)
+
+    async def _apply(self, key: Tuple[int, int]):
+        """
+        Applies the queued role changes of a member. The member's key is held until the request has finished, so
+        changes queued meanwhile wait for a new window instead of being sent alongside it
+        :param key: The guild ID and member ID
+        :return:
+        """
+        self._applying.add(key)
+        try:
+            await self._update_roles(key)
+        finally:
+            self._applying.discard(key)
+            self._timers.pop(key, None)
+            if key in self._pending:
+                self._timers[key] = asyncio.ensure_future(self._apply_later(key))
+
+    def _get_roles(self, key: Tuple[int, int], member: discord.Member) -> Dict[int, discord.Role]:
+        """
+        Gets the roles of a member, including the changes of their last request that may not be cached yet
+        :param key: The guild ID and member ID
+        :param member: The member
+        :return: A dict of role ID to role
+        """
+        roles = {role.id: role for role in member.roles}
+        now = asyncio.get_event_loop().time()
+        for applied_key, (applied_at, _) in list(self._applied.items()):
+            if now - applied_at > self.settle:
+                del self._applied[applied_key]
+        _, applied = self._applied.get(key, (None, {}))
+        for role_id, (role, add) in applied.items():
+            if add:
+                roles[role_id] = role
+            else:
+                roles.pop(role_id, None)
+        return roles
+
+    async def _update_roles(self, key: Tuple[int, int]):
+        """
+        Makes the queued role changes of a member in as few requests as possible
+        :param key: The guild ID and member ID
+        :return:
+        """
+        pending = self._pending.pop(key, None)
+        if not pending:
+            return
+        member, changes = pending
+        # Use the latest cached state of the member, as their roles may have changed during the window
+        member = member.guild.get_member(member.id) or member
+        current = self._get_roles(key, member)
+        to_add = [role for role_id, (role, add) in changes.items() if add and role_id not in current]
+        to_remove = [role for role_id, (role, add) in changes.items() if not add and role_id in current]
+
+        if not to_add and not to_remove:
+            return
+        elif len(to_add) + len(to_remove) == 1:
+            # A single role is changed without sending the member's whole role list
+            if to_add:
+                coro_func = lambda: member.add_roles(*to_add)
+            else:
+                coro_func = lambda: member.remove_roles(*to_remove)
+        else:
+            for role in to_add:
+                current[role.id] = role
+            for role in to_remove:
+                del current[role.id]
+            roles = [role for role in current.values() if not role.is_default()]
+            coro_func = lambda: member.edit(roles=roles)
+
+        try:
+            await self._request(member, coro_func)
+        except (discord.HTTPException, aiohttp.ClientError, asyncio.TimeoutError) as err:
+            logger.error(f"ReactForRole: Failed to update the roles of member {member.id} in guild "
+                         f"{member.guild.id}: {err}")
+            return
+        _, applied = self._applied.get(key, (None, {}))
+        applied.update({role.id: (role, True) for role in to_add})
+        applied.update({role.id: (role, False) for role in to_remove})
+        self._applied[key] = (asyncio.get_event_loop().time(), applied)
+
+    async def _request(self, member: discord.Member, coro_func):
+        """
+        Makes a request within the concurrency limit, retrying if it fails for a temporary reason
+        :param member: The member the request is for
+        :param coro_func: A function returning the request coroutine
+        :return: The result of the request
+        :raises: The error of the request, see retry_discord_request
+        """
+        return await retry_discord_request(coro_func, self.retries, self.backoff, self._get_semaphore(), logger=logger,
+                                           description=f"ReactForRole: Role update for member {member.id}")
+
+    async def flush(self):
+        """
+        Applies every queued role change now, without waiting for the end of their windows. Requests in progress are
+        finished first.
+        :return:
+        """
+        while self._timers:
+            for key, timer in list(self._timers.items()):
+                if key not in self._applying:
+                    timer.cancel()
+                    self._timers[key] = asyncio.ensure_future(self._apply(key))
+            await asyncio.gather(*self._timers.values())
@@ -10,6 +10,9 @@ Commented using reStructuredText (reST)
 
 # Built-in/Generic Imports
 import re
+from typing import *
+
+import discord
 import emoji
 
 # Own modules
@@ -21,4 +24,63 @@ import emoji
 UNICODE_DISCORD_EMOJI_REGEXP: re.Pattern = re.compile(r"^:(\w+):$")
 CUSTOM_EMOJI_REGEXP: re.Pattern = re.compile(r"^<a?:(\w+):(\d+)>$")
 UNICODE_EMOJI_REGEXP: re.Pattern = re.compile(emoji.get_emoji_regexp())
+EMOJI_VARIATION_SELECTOR = "\ufe0f"
 IMAGE_FORMATS = ("image/png", "image/jpeg", "image/gif")
+ROLE_UPDATE_DELAY = 1
+ROLE_UPDATE_CONCURRENCY = 10
+ROLE_UPDATE_RETRIES = 3
+ROLE_UPDATE_BACKOFF = 1
+ROLE_UPDATE_SETTLE = 10
+RECONCILE_YIELD_EVERY = 500
+RFR_MAX_ROLES = 20
+RFR_DEFAULT_TITLE = "React for Role"
+RFR_DEFAULT_DESCRIPTION = "Roles below!"
+RFR_DEFAULT_THUMBNAIL = "https://cdn.discordapp.com/attachments/737280260541907015/752024535985029240/discord1.png"
+PROVISION_CONCURRENCY = 5
+
+
+def get_emoji_raw(partial_emoji) -> str:
+    """
+    Gets the raw string representation of a reaction emoji, in the same format as emoji_raw in the rfr database
+    :param partial_emoji: discord.PartialEmoji of the reaction, or the emoji of a discord.Reaction
+    :return: The demojized name for unicode emoji, or <:name:id> for custom emoji
+    """
+    if isinstance(partial_emoji, str):
+        return emoji.demojize(partial_emoji)
+    if isinstance(partial_emoji, discord.PartialEmoji) and partial_emoji.is_unicode_emoji():
+        return emoji.demojize(partial_emoji.name)
+    return str(partial_emoji)
+
+
+def get_emoji_key(emoji_value) -> str:
+    """
+    Gets the canonical key of an emoji, the same for an emoji_raw from the rfr database and for the emoji of a
+    reaction to it, so emoji-role combos can be looked up with a dict hit. Custom emoji are keyed by ID, so renaming
+    them doesn't break their combos, and unicode emoji by their characters without variation selectors.
+    :param emoji_value: An emoji_raw, a discord.PartialEmoji, the emoji of a discord.Reaction, or a unicode emoji
+    :return: The emoji ID as a string for custom emoji, otherwise the unicode emoji
+    """
+    if isinstance(emoji_value, (discord.PartialEmoji, discord.Emoji)):
+        if emoji_value.id:
+            return str(emoji_value.id)
+        emoji_value = emoji_value.name
+    else:
+        search_result = CUSTOM_EMOJI_REGEXP.match(emoji_value)
+        if search_result:
+            return search_result.group(2)
+        if emoji_value.startswith(":"):
+            emoji_value = emoji.emojize(emoji_value)
+    return emoji_value.replace(EMOJI_VARIATION_SELECTOR, "")
+
+
+def get_reaction_emoji(emoji_raw: str) -> Union[discord.PartialEmoji, str]:
+    """
+    Gets the emoji to react with from its raw string representation in the rfr database
+    :param emoji_raw: The demojized name of a unicode emoji, or <:name:id> for custom emoji
+    :return: The unicode emoji, or a discord.PartialEmoji for custom emoji
+    """
+    search_result = CUSTOM_EMOJI_REGEXP.match(emoji_raw)
+    if search_result:
+        return discord.PartialEmoji(name=search_result.group(1), id=int(search_result.group(2)),
+                                    animated=emoji_raw.startswith("<a:"))
+    return emoji.emojize(emoji_raw)
@@ -1,2 +1,9 @@
-from . import utils, db, twitch_handler, log, models
-from .cog import TwitchAlert, setup
+from . import utils, db, twitch_handler, log, models, eventsub, api
+from . import cog
+from .cog import TwitchAlert
+
+
+def setup(bot):
+    cog.setup(bot)
+    if bot.get_cog("TwitchAlert") is not None:
+        api.setup(bot)
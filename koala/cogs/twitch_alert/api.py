@@ -0,0 +1,74 @@
+# Futures
+# Built-in/Generic Imports
+# Libs
+from aiohttp import web
+from discord.ext.commands import Bot
+
+# Own modules
+from koala.rest.api import parse_request
+from .log import logger
+from .env import TWITCH_EVENTSUB_CALLBACK, TWITCH_EVENTSUB_SECRET
+
+# Constants
+TWITCH_ALERT_ENDPOINT = 'twitch-alert'
+EVENTSUB_ENDPOINT = 'eventsub'  # POST
+METRICS_ENDPOINT = 'metrics'  # GET
+
+# Variables
+
+
+class TwitchAlertEndpoint:
+    """
+    The API endpoints for TwitchAlert
+    """
+    def __init__(self, bot):
+        self._bot = bot
+
+    def register(self, app):
+        """
+        Register the routes for the given application
+        :param app: The aiohttp.web.Application (likely of the sub app)
+        :return: app
+        """
+        app.add_routes([web.post('/{endpoint}'.format(endpoint=EVENTSUB_ENDPOINT), self.post_eventsub),
+                        web.get('/{endpoint}'.format(endpoint=METRICS_ENDPOINT), self.get_metrics)])
+        return app
+
+    async def post_eventsub(self, request: web.Request):
+        """
+        Receives EventSub messages from Twitch. The raw request is passed on so the signature can be verified
+        :param request: The aiohttp request
+        :return: The aiohttp response
+        """
+        twitch_cog = self._bot.get_cog("TwitchAlert")
+        if twitch_cog is None or twitch_cog.eventsub is None:
+            raise web.HTTPNotFound(reason="EventSub is not enabled")
+        return await twitch_cog.eventsub.handle_callback(request)
+
+    @parse_request
+    async def get_metrics(self):
+        """
+        Get the live polling metrics of TwitchAlert
+        :return: The polling metrics of the user and team loops, and the twitch rate limit headroom
+        """
+        twitch_cog = self._bot.get_cog("TwitchAlert")
+        if twitch_cog is None:
+            raise web.HTTPNotFound(reason="TwitchAlert is not loaded")
+        manager = twitch_cog.ta_database_manager
+        return {"rate_limit_headroom": manager.twitch_handler.rate_limit_headroom(),
+                "users": manager.user_poll_scheduler.metrics(),
+                "teams": manager.team_poll_scheduler.metrics()}
+
+
+def setup(bot: Bot):
+    """
+    Load this cog to the KoalaBot.
+    :param bot: the bot client for KoalaBot
+    """
+    if TWITCH_EVENTSUB_CALLBACK is None or TWITCH_EVENTSUB_SECRET is None:
+        logger.info("TwitchAlert EventSub is not configured, polling will be used.")
+    sub_app = web.Application()
+    endpoint = TwitchAlertEndpoint(bot)
+    endpoint.register(sub_app)
+    getattr(bot, "koala_web_app").add_subapp('/{extension}'.format(extension=TWITCH_ALERT_ENDPOINT), sub_app)
+    logger.info("TwitchAlert API is ready.")
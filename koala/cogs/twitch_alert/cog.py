@@ -1,6 +1,8 @@
 # Futures
 
 # Built-in/Generic Imports
+import asyncio
+import functools
 import time
 import re
 
@@ -13,9 +15,10 @@ from koala.utils import error_embed, is_channel_in_guild
 from . import core
 from .log import logger
 from .db import TwitchAlertDBManager
+from .eventsub import TwitchEventSubManager
 from .utils import DEFAULT_MESSAGE, TWITCH_USERNAME_REGEX, \
-    LOOP_CHECK_LIVE_DELAY, REFRESH_TEAMS_DELAY, TEAMS_LOOP_CHECK_LIVE_DELAY
-from .env import TWITCH_KEY, TWITCH_SECRET
+    LOOP_CHECK_LIVE_DELAY, REFRESH_TEAMS_DELAY, TEAMS_LOOP_CHECK_LIVE_DELAY, EVENTSUB_RECONCILE_DELAY
+from .env import TWITCH_KEY, TWITCH_SECRET, TWITCH_EVENTSUB_CALLBACK, TWITCH_EVENTSUB_SECRET, TWITCH_POLL_BUDGET
 
 # Libs
 import discord
@@ -23,6 +26,8 @@ from discord.ext import commands, tasks
 
 
 # Constants
+EVENTSUB_STREAM_RETRIES = 3
+EVENTSUB_STREAM_RETRY_DELAY = 10
 
 
 # Variables
@@ -57,12 +62,17 @@ class TwitchAlert(commands.Cog):
         self.bot = bot
         insert_extension("TwitchAlert", 0, True, True)
         self.ta_database_manager = TwitchAlertDBManager(bot)
-        # self.ta_database_manager.translate_names_to_ids()
         self.loop_thread = None
         self.loop_team_thread = None
         self.running = False
         self.stop_loop = False
 
+        self.eventsub = None
+        if TWITCH_EVENTSUB_CALLBACK and TWITCH_EVENTSUB_SECRET:
+            self.eventsub = TwitchEventSubManager(self.ta_database_manager.twitch_handler,
+                                                  TWITCH_EVENTSUB_CALLBACK, TWITCH_EVENTSUB_SECRET,
+                                                  self.on_stream_online, self.on_stream_offline)
+
     @commands.check(koalabot.is_guild_channel)
     @commands.check(koalabot.is_admin)
     @commands.check(twitch_is_enabled)
@@ -204,7 +214,13 @@ class TwitchAlert(commands.Cog):
         else:
             custom_message = None
 
-        self.ta_database_manager.add_user_to_ta(channel_id, twitch_username, custom_message, ctx.message.guild.id)
+        try:
+            await self.ta_database_manager.add_user_to_ta(channel_id, twitch_username, custom_message,
+                                                          ctx.message.guild.id)
+        except ValueError as err:
+            await ctx.send(embed=error_embed(str(err)))
+            return
+        await self.reconcile_eventsub()
 
         # Response Message
         new_embed = discord.Embed(title="Added User to Twitch Alert", colour=KOALA_GREEN,
@@ -242,6 +258,7 @@ class TwitchAlert(commands.Cog):
             return
 
         await self.ta_database_manager.remove_user_from_ta(channel_id, twitch_username)
+        await self.reconcile_eventsub()
         # Response Message
         new_embed = discord.Embed(title="Removed User from Twitch Alert", colour=KOALA_GREEN,
                                   description=f"Channel: {channel_id}\n"
@@ -295,7 +312,14 @@ class TwitchAlert(commands.Cog):
         else:
             default_message = DEFAULT_MESSAGE
 
-        self.ta_database_manager.add_team_to_ta(channel_id, team_name, default_message, ctx.message.guild.id)
+        team_id = self.ta_database_manager.add_team_to_ta(channel_id, team_name, default_message,
+                                                          ctx.message.guild.id)
+        # The team's members are needed for its alerts and EventSub subscriptions
+        try:
+            await self.ta_database_manager.update_team_members(team_id, team_name)
+        except Exception as err:
+            logger.error(f"TwitchAlert: Failed to get members of team {team_name}", exc_info=err)
+        await self.reconcile_eventsub()
 
         # Response Message
         new_embed = discord.Embed(title="Added Team to Twitch Alert", colour=KOALA_GREEN,
@@ -333,6 +357,7 @@ class TwitchAlert(commands.Cog):
             return
 
         await self.ta_database_manager.remove_team_from_ta(channel_id, team_name)
+        await self.reconcile_eventsub()
         # Response Message
         new_embed = discord.Embed(title="Removed Team from Twitch Alert", colour=KOALA_GREEN,
                                   description=f"Channel: {channel_id}\n"
@@ -402,14 +427,77 @@ class TwitchAlert(commands.Cog):
         self.loop_update_teams.start()
         self.loop_check_team_live.start()
         self.loop_check_live.start()
+        if self.eventsub is not None:
+            self.loop_reconcile_eventsub.start()
         self.running = True
 
     def end_loops(self):
         self.loop_update_teams.cancel()
         self.loop_check_team_live.cancel()
         self.loop_check_live.cancel()
+        self.loop_reconcile_eventsub.cancel()
         self.running = False
 
+    def cog_unload(self):
+        self.end_loops()
+        self.ta_database_manager.poller.shutdown()
+
+    def polling_required(self):
+        """
+        Checks if live statuses need to be polled, which is the case unless EventSub is enabled and healthy
+        :return: True if the polling loops should check live statuses
+        """
+        return self.eventsub is None or not self.eventsub.healthy
+
+    async def reconcile_eventsub(self):
+        """
+        Updates the EventSub subscriptions to match the currently tracked users and team members.
+        If EventSub has just become healthy, a final poll ensures no changes were missed during the switch.
+        :return:
+        """
+        if self.eventsub is None:
+            return
+        was_healthy = self.eventsub.healthy
+        user_ids = core.get_tracked_user_ids()
+        healthy = await asyncio.get_event_loop().run_in_executor(None, self.eventsub.reconcile, user_ids)
+        if healthy and not was_healthy:
+            logger.info("TwitchAlert: EventSub subscriptions enabled, polling paused")
+            await core.create_user_alerts(self.bot, self.ta_database_manager, scheduled=False)
+            await core.create_team_alerts(self.bot, self.ta_database_manager, scheduled=False)
+        elif was_healthy and not healthy:
+            logger.warning("TwitchAlert: EventSub subscriptions failed, polling resumed")
+
+    async def on_stream_online(self, event):
+        """
+        Sends alerts for a stream.online EventSub notification
+        :param event: The EventSub event data
+        :return:
+        """
+        user_id = event.get("broadcaster_user_id")
+        for attempt in range(EVENTSUB_STREAM_RETRIES):
+            # The streams endpoint may not include a stream for a short time after it goes live
+            streams_data = await asyncio.get_event_loop().run_in_executor(
+                None, functools.partial(self.ta_database_manager.twitch_handler.get_streams_data, user_ids=[user_id]))
+            live_streams = [stream for stream in streams_data if stream.get('type') == "live"]
+            if live_streams:
+                alert_details = ({}, {})
+                await core.send_user_stream_alerts(self.bot, self.ta_database_manager, live_streams[0], alert_details)
+                await core.send_team_stream_alerts(self.bot, self.ta_database_manager, live_streams[0], alert_details)
+                return
+            await asyncio.sleep(EVENTSUB_STREAM_RETRY_DELAY)
+        logger.warning(f"TwitchAlert: No stream data found for {event.get('broadcaster_user_login')} "
+                       f"after stream.online notification")
+
+    async def on_stream_offline(self, event):
+        """
+        Removes alerts for a stream.offline EventSub notification
+        :param event: The EventSub event data
+        :return:
+        """
+        user_id = event.get("broadcaster_user_id")
+        await self.ta_database_manager.delete_all_offline_streams([user_id])
+        await self.ta_database_manager.delete_all_offline_team_streams([user_id])
+
     @tasks.loop(minutes=LOOP_CHECK_LIVE_DELAY)
     async def loop_check_live(self):
         """
@@ -417,6 +505,8 @@ class TwitchAlert(commands.Cog):
         sends alerts when online, removing them when offline
         :return:
         """
+        if not self.polling_required():
+            return
         try:
             await core.create_user_alerts(self.bot, self.ta_database_manager)
         except Exception as err:
@@ -425,12 +515,20 @@ class TwitchAlert(commands.Cog):
 
     @tasks.loop(minutes=REFRESH_TEAMS_DELAY)
     async def loop_update_teams(self):
+        if self.ta_database_manager.twitch_handler.rate_limit_headroom() < 1 - TWITCH_POLL_BUDGET:
+            # Team members rarely change, so live alerts get the remaining rate limit
+            logger.warning("TwitchAlert: Twitch rate limit headroom is low, skipped updating teams")
+            return
         start = time.time()
+        # Users added before IDs were stored, or not found on twitch, have no ID until looked up
+        await asyncio.get_event_loop().run_in_executor(None, self.ta_database_manager.translate_names_to_ids)
         # logger.info("TwitchAlert: Started Update Teams")
-        self.ta_database_manager.update_all_teams_members()
+        await self.ta_database_manager.update_all_teams_members()
         time_diff = time.time() - start
         if time_diff > 5:
             logger.warning(f"TwitchAlert: Teams updated in > 5s | {time_diff}s")
+        # Team members may have changed, and new members are not added to the team until refreshed
+        await self.reconcile_eventsub()
 
     @tasks.loop(minutes=TEAMS_LOOP_CHECK_LIVE_DELAY)
     async def loop_check_team_live(self):
@@ -439,11 +537,25 @@ class TwitchAlert(commands.Cog):
 
         :return:
         """
+        if not self.polling_required():
+            return
         try:
             await core.create_team_alerts(self.bot, self.ta_database_manager)
         except Exception as err:
             logger.error("Twitch team live loop error: ", exc_info=err)
 
+    @tasks.loop(minutes=EVENTSUB_RECONCILE_DELAY)
+    async def loop_reconcile_eventsub(self):
+        """
+        A loop that keeps EventSub subscriptions up to date with team changes, and retries failed subscriptions
+
+        :return:
+        """
+        try:
+            await self.reconcile_eventsub()
+        except Exception as err:
+            logger.error("Twitch EventSub reconcile loop error: ", exc_info=err)
+
 def setup(bot: koalabot) -> None:
     """
     Load this cog to the KoalaBot.
@@ -1,3 +1,4 @@
+import asyncio
 import time
 
 import discord
@@ -6,20 +7,177 @@ from sqlalchemy import select, func, or_, and_, null, update, delete
 
 from .log import logger
 from .models import UserInTwitchTeam, TeamInTwitchAlert, TwitchAlerts, UserInTwitchAlert
-from koala.db import assign_session
+from koala.db import assign_session, session_manager
 from koala.models import GuildExtensions
 
 
-@assign_session
-async def create_team_alerts(bot: Bot, ta_database_manager, session):
-    start = time.time()
+def select_user_ids():
+    """
+    Builds the query for all distinct twitch user IDs in user Twitch Alerts of guilds with TwitchAlert enabled
+    :return: The sql select statement
+    """
+    return select(func.distinct(UserInTwitchAlert.twitch_user_id)) \
+        .join(TwitchAlerts, UserInTwitchAlert.channel_id == TwitchAlerts.channel_id) \
+        .join(GuildExtensions, TwitchAlerts.guild_id == GuildExtensions.guild_id) \
+        .where(and_(or_(GuildExtensions.extension_id == 'TwitchAlert', GuildExtensions.extension_id == 'All'),
+                    UserInTwitchAlert.twitch_user_id != null()))
 
-    sql_select_team_users = select(func.distinct(UserInTwitchTeam.twitch_username)) \
+
+def select_team_user_ids():
+    """
+    Builds the query for all distinct team member twitch user IDs in team Twitch Alerts of guilds with TwitchAlert
+    enabled
+    :return: The sql select statement
+    """
+    return select(func.distinct(UserInTwitchTeam.twitch_user_id)) \
         .join(TeamInTwitchAlert, UserInTwitchTeam.team_twitch_alert_id == TeamInTwitchAlert.team_twitch_alert_id) \
         .join(TwitchAlerts, TeamInTwitchAlert.channel_id == TwitchAlerts.channel_id) \
         .join(GuildExtensions, TwitchAlerts.guild_id == GuildExtensions.guild_id) \
-        .where(or_(GuildExtensions.extension_id == 'TwitchAlert', GuildExtensions.extension_id == 'All'))
-    users = session.execute(sql_select_team_users).all()
+        .where(and_(or_(GuildExtensions.extension_id == 'TwitchAlert', GuildExtensions.extension_id == 'All'),
+                    UserInTwitchTeam.twitch_user_id != null()))
+
+
+@assign_session
+def get_tracked_user_ids(session):
+    """
+    Gets every twitch user ID that is tracked by either a user or a team Twitch Alert
+    :param session: The database session
+    :return: A set of twitch user IDs
+    """
+    users = session.execute(select_user_ids()).all()
+    users += session.execute(select_team_user_ids()).all()
+    return {user[0] for user in users}
+
+
+def rename_user(twitch_user_id, twitch_username, session):
+    """
+    Updates the stored username of a twitch user who has changed their username
+    :param twitch_user_id: The twitch user ID of the user
+    :param twitch_username: The new username of the user
+    :param session: The database session
+    :return:
+    """
+    logger.info(f"TwitchAlert: Twitch user {twitch_user_id} renamed to {twitch_username}")
+    for table in (UserInTwitchAlert, UserInTwitchTeam):
+        session.execute(update(table)
+                        .where(and_(table.twitch_user_id == twitch_user_id, table.twitch_username != twitch_username))
+                        .values(twitch_username=twitch_username))
+
+
+async def post_team_stream_alerts(bot: Bot, ta_database_manager, stream_data, alert_details=None):
+    """
+    Posts a live alert for a streamer to every team Twitch Alert they are in that has not yet been alerted.
+    Each call uses its own session, so alerts for many streams can be posted concurrently.
+    :param bot: The discord bot client
+    :param ta_database_manager: The twitch alert database manager
+    :param stream_data: The live stream data from the Twitch API
+    :param alert_details: The user and game details fetched this tick, see create_alert_embed
+    :return: A list of ((channel, team twitch alert id), new message or the exception raised sending it)
+    """
+    current_user_id = stream_data.get("user_id")
+    current_username = str.lower(stream_data.get("user_login"))
+    sql_find_message_id = select(TeamInTwitchAlert.channel_id,
+                                 UserInTwitchTeam.twitch_username,
+                                 UserInTwitchTeam.message_id,
+                                 TeamInTwitchAlert.team_twitch_alert_id,
+                                 TeamInTwitchAlert.custom_message,
+                                 TwitchAlerts.default_message) \
+        .join(TeamInTwitchAlert,
+              UserInTwitchTeam.team_twitch_alert_id == TeamInTwitchAlert.team_twitch_alert_id) \
+        .join(TwitchAlerts, TeamInTwitchAlert.channel_id == TwitchAlerts.channel_id) \
+        .join(GuildExtensions, TwitchAlerts.guild_id == GuildExtensions.guild_id) \
+        .where(and_(and_(or_(GuildExtensions.extension_id == 'TwitchAlert',
+                             GuildExtensions.extension_id == 'All'),
+                         UserInTwitchTeam.twitch_user_id == current_user_id),
+                    UserInTwitchTeam.message_id == null()))
+
+    # sql_find_message_id = """
+    # SELECT TITA.channel_id, UserInTwitchTeam.message_id, TITA.team_twitch_alert_id, custom_message,
+    #   default_message
+    # FROM UserInTwitchTeam
+    # JOIN TeamInTwitchAlert TITA on UserInTwitchTeam.team_twitch_alert_id = TITA.team_twitch_alert_id
+    # JOIN TwitchAlerts TA on TITA.channel_id = TA.channel_id
+    # JOIN (SELECT extension_id, guild_id
+    #       FROM GuildExtensions
+    #       WHERE extension_id = 'TwitchAlert' OR extension_id = 'All') GE ON TA.guild_id = GE.guild_id
+    # WHERE twitch_username = ?"""
+
+    with session_manager() as session:
+        results = session.execute(sql_find_message_id).all()
+
+        if any(result.twitch_username != current_username for result in results):
+            rename_user(current_user_id, current_username, session)
+            session.commit()
+
+    new_message_embed = None
+    alerts = []
+
+    for result in results:
+        channel: discord.TextChannel = bot.get_channel(id=result.channel_id)
+        # If no Alert is posted
+        if result.message_id is None and channel is not None:
+            if new_message_embed is None:
+                if result.custom_message is not None:
+                    message = result.custom_message
+                else:
+                    message = result.default_message
+
+                new_message_embed = await ta_database_manager.create_alert_embed(stream_data, message,
+                                                                                 alert_details)
+            alerts.append((channel, result.team_twitch_alert_id))
+
+    if new_message_embed is None:
+        return []
+
+    new_messages = await asyncio.gather(*[ta_database_manager.delivery.send(channel, new_message_embed)
+                                          for channel, _ in alerts], return_exceptions=True)
+    return list(zip(alerts, new_messages))
+
+
+@assign_session
+def record_team_stream_alerts(current_user_id, posted_alerts, session):
+    """
+    Stores the messages of posted team live alerts, and removes Twitch Alerts of channels the bot can't post in
+    :param current_user_id: The twitch user ID of the streamer
+    :param posted_alerts: The posted alerts, from post_team_stream_alerts
+    :param session: The database session
+    :return:
+    """
+    for (channel, team_twitch_alert_id), new_message in posted_alerts:
+        if isinstance(new_message, discord.errors.Forbidden):
+            logger.warning(f"TwitchAlert: {new_message}  Name: {channel} ID: {channel.id}")
+            sql_remove_invalid_channel = delete(TwitchAlerts).where(
+                TwitchAlerts.channel_id == channel.id)
+            session.execute(sql_remove_invalid_channel)
+        elif isinstance(new_message, Exception):
+            logger.error(f"TwitchAlert: Team alert not sent to channel {channel.id}: {new_message}")
+        else:
+            sql_update_message_id = update(UserInTwitchTeam) \
+                .where(and_(UserInTwitchTeam.team_twitch_alert_id == team_twitch_alert_id,
+                            UserInTwitchTeam.twitch_user_id == current_user_id)) \
+                .values(message_id=new_message.id)
+            session.execute(sql_update_message_id)
+    session.commit()
+
+
+async def send_team_stream_alerts(bot: Bot, ta_database_manager, stream_data, alert_details=None):
+    """
+    Sends a live alert for a streamer to every team Twitch Alert they are in that has not yet been alerted
+    :param bot: The discord bot client
+    :param ta_database_manager: The twitch alert database manager
+    :param stream_data: The live stream data from the Twitch API
+    :param alert_details: The user and game details fetched this tick, see create_alert_embed
+    :return:
+    """
+    posted_alerts = await post_team_stream_alerts(bot, ta_database_manager, stream_data, alert_details)
+    record_team_stream_alerts(stream_data.get("user_id"), posted_alerts)
+
+
+@assign_session
+async def create_team_alerts(bot: Bot, ta_database_manager, session, scheduled=True):
+    start = time.time()
+
+    users = session.execute(select_team_user_ids()).all()
     # sql_select_team_users = "SELECT twitch_username, twitch_team_name " \
     #                         "FROM UserInTwitchTeam " \
     #                         "JOIN TeamInTwitchAlert TITA " \
@@ -29,192 +187,202 @@ async def create_team_alerts(bot: Bot, ta_database_manager, session):
     #                         "WHERE extension_id = 'TwitchAlert' " \
     #                         "  OR extension_id = 'All') GE on TA.guild_id = GE.guild_id "
 
-    usernames = [str.lower(user[0]) for user in users]
+    user_ids = [user[0] for user in users]
 
-    if not usernames:
+    scheduler = ta_database_manager.team_poll_scheduler
+    if scheduled:
+        user_ids = scheduler.due(user_ids)
+
+    if not user_ids:
         return
 
-    streams_data = ta_database_manager.twitch_handler.get_streams_data(usernames)
+    streams_data, unknown_user_ids = await ta_database_manager.poller.poll_streams(user_ids)
 
     if streams_data is None:
         return
+    user_ids = [user_id for user_id in user_ids if user_id not in unknown_user_ids]
 
+    live_streams = []
     for stream_data in streams_data:
         try:
             if stream_data.get('type') == "live":
-                current_username = str.lower(stream_data.get("user_login"))
-                logger.debug("Creating team stream alert for %s" % current_username)
-                old_len = len(usernames)
-                usernames.remove(current_username)
-                if len(usernames) == old_len:
-                    logger.error(f"TwitchAlert: {stream_data.get('user_login')} not found in the user teams list")
-                sql_find_message_id = select(TeamInTwitchAlert.channel_id,
-                                             UserInTwitchTeam.message_id,
-                                             TeamInTwitchAlert.team_twitch_alert_id,
-                                             TeamInTwitchAlert.custom_message,
-                                             TwitchAlerts.default_message) \
-                    .join(TeamInTwitchAlert,
-                          UserInTwitchTeam.team_twitch_alert_id == TeamInTwitchAlert.team_twitch_alert_id) \
-                    .join(TwitchAlerts, TeamInTwitchAlert.channel_id == TwitchAlerts.channel_id) \
-                    .join(GuildExtensions, TwitchAlerts.guild_id == GuildExtensions.guild_id) \
-                    .where(and_(and_(or_(GuildExtensions.extension_id == 'TwitchAlert',
-                                         GuildExtensions.extension_id == 'All'),
-                                     UserInTwitchTeam.twitch_username == current_username),
-                                UserInTwitchTeam.message_id == null()))
-
-                # sql_find_message_id = """
-                # SELECT TITA.channel_id, UserInTwitchTeam.message_id, TITA.team_twitch_alert_id, custom_message,
-                #   default_message
-                # FROM UserInTwitchTeam
-                # JOIN TeamInTwitchAlert TITA on UserInTwitchTeam.team_twitch_alert_id = TITA.team_twitch_alert_id
-                # JOIN TwitchAlerts TA on TITA.channel_id = TA.channel_id
-                # JOIN (SELECT extension_id, guild_id
-                #       FROM GuildExtensions
-                #       WHERE extension_id = 'TwitchAlert' OR extension_id = 'All') GE ON TA.guild_id = GE.guild_id
-                # WHERE twitch_username = ?"""
-
-                results = session.execute(sql_find_message_id).all()
-
-                new_message_embed = None
-
-                for result in results:
-                    channel_id = result.channel_id
-                    message_id = result.message_id
-                    team_twitch_alert_id = result.team_twitch_alert_id
-                    custom_message = result.custom_message
-                    channel_default_message = result.default_message
-                    channel: discord.TextChannel = bot.get_channel(id=channel_id)
-                    try:
-                        # If no Alert is posted
-                        if message_id is None:
-                            if new_message_embed is None:
-                                if custom_message is not None:
-                                    message = custom_message
-                                else:
-                                    message = channel_default_message
-
-                                new_message_embed = await ta_database_manager.create_alert_embed(stream_data, message)
-
-                            if new_message_embed is not None and channel is not None:
-                                new_message = await channel.send(embed=new_message_embed)
-
-                                sql_update_message_id = update(UserInTwitchTeam) \
-                                    .where(and_(UserInTwitchTeam.team_twitch_alert_id == team_twitch_alert_id,
-                                                UserInTwitchTeam.twitch_username == current_username)) \
-                                    .values(message_id=new_message.id)
-                                session.execute(sql_update_message_id)
-                                session.commit()
-                    except discord.errors.Forbidden as err:
-                        logger.warning(f"TwitchAlert: {err}  Name: {channel} ID: {channel.id}")
-                        sql_remove_invalid_channel = delete(TwitchAlerts).where(
-                            TwitchAlerts.channel_id == channel.id)
-                        session.execute(sql_remove_invalid_channel)
-                        session.commit()
+                logger.debug("Creating team stream alert for %s" % stream_data.get("user_login"))
+                user_ids.remove(stream_data.get("user_id"))
+                live_streams.append(stream_data)
         except Exception as err:
             logger.error(f"TwitchAlert: Team Loop error {err}")
 
+    # Streamers in several alerts, and games played by several streamers, are only fetched once a tick
+    alert_details = ({}, {})
+    results = await asyncio.gather(*[post_team_stream_alerts(bot, ta_database_manager, stream_data, alert_details)
+                                     for stream_data in live_streams], return_exceptions=True)
+    # Alerts are recorded once they have all been posted, as the session can't be shared between them
+    for stream_data, posted_alerts in zip(live_streams, results):
+        if isinstance(posted_alerts, Exception):
+            logger.error(f"TwitchAlert: Team Loop error {posted_alerts}")
+        else:
+            record_team_stream_alerts(stream_data.get("user_id"), posted_alerts, session=session)
+    scheduler.update([stream_data.get("user_id") for stream_data in live_streams], user_ids)
+
     # Deals with remaining offline streams
-    await ta_database_manager.delete_all_offline_team_streams(usernames)
+    await ta_database_manager.delete_all_offline_team_streams(user_ids)
     time_diff = time.time() - start
     if time_diff > 5:
         logger.warning(f"TwitchAlert: Teams Loop Finished in > 5s | {time_diff}s")
 
 
+async def post_user_stream_alerts(bot: Bot, ta_database_manager, stream_data, alert_details=None):
+    """
+    Posts a live alert for a streamer to every user Twitch Alert they are in that has not yet been alerted.
+    Each call uses its own session, so alerts for many streams can be posted concurrently.
+    :param bot: The discord bot client
+    :param ta_database_manager: The twitch alert database manager
+    :param stream_data: The live stream data from the Twitch API
+    :param alert_details: The user and game details fetched this tick, see create_alert_embed
+    :return: A list of (channel, new message or the exception raised sending it)
+    """
+    current_user_id = stream_data.get("user_id")
+    current_username = str.lower(stream_data.get("user_login"))
+    sql_find_message_id = select(UserInTwitchAlert.channel_id,
+                                 UserInTwitchAlert.twitch_username,
+                                 UserInTwitchAlert.message_id,
+                                 UserInTwitchAlert.custom_message,
+                                 TwitchAlerts.default_message) \
+        .join(TwitchAlerts, UserInTwitchAlert.channel_id == TwitchAlerts.channel_id) \
+        .join(GuildExtensions, TwitchAlerts.guild_id == GuildExtensions.guild_id) \
+        .where(and_(and_(or_(GuildExtensions.extension_id == 'TwitchAlert',
+                             GuildExtensions.extension_id == 'All'),
+                         UserInTwitchAlert.twitch_user_id == current_user_id),
+                    UserInTwitchAlert.message_id == null()))
+    # "SELECT UserInTwitchAlert.channel_id, message_id, custom_message, default_message " \
+    # "FROM UserInTwitchAlert " \
+    # "JOIN TwitchAlerts TA on UserInTwitchAlert.channel_id = TA.channel_id " \
+    # "JOIN (SELECT extension_id, guild_id FROM GuildExtensions " \
+    # "WHERE extension_id = 'TwitchAlert' " \
+    # "  OR extension_id = 'All') GE on TA.guild_id = GE.guild_id " \
+    # "WHERE twitch_username = ?;"
+
+    with session_manager() as session:
+        results = session.execute(sql_find_message_id).all()
+
+        if any(result.twitch_username != current_username for result in results):
+            rename_user(current_user_id, current_username, session)
+            session.commit()
+
+    new_message_embed = None
+    alerts = []
+
+    for result in results:
+        channel = bot.get_channel(id=result.channel_id)
+        # If no Alert is posted
+        if result.message_id is None and channel is not None:
+            if new_message_embed is None:
+                if result.custom_message is not None:
+                    message = result.custom_message
+                else:
+                    message = result.default_message
+
+                new_message_embed = await ta_database_manager.create_alert_embed(stream_data, message,
+                                                                                 alert_details)
+            alerts.append(channel)
+
+    if new_message_embed is None:
+        return []
+
+    new_messages = await asyncio.gather(*[ta_database_manager.delivery.send(channel, new_message_embed)
+                                          for channel in alerts], return_exceptions=True)
+    return list(zip(alerts, new_messages))
+
+
 @assign_session
-async def create_user_alerts(bot: Bot, ta_database_manager, session):
+def record_user_stream_alerts(current_user_id, posted_alerts, session):
+    """
+    Stores the messages of posted user live alerts, and removes Twitch Alerts of channels the bot can't post in
+    :param current_user_id: The twitch user ID of the streamer
+    :param posted_alerts: The posted alerts, from post_user_stream_alerts
+    :param session: The database session
+    :return:
+    """
+    for channel, new_message in posted_alerts:
+        if isinstance(new_message, discord.errors.Forbidden):
+            logger.warning(f"TwitchAlert: {new_message}  Name: {channel} ID: {channel.id}")
+            sql_remove_invalid_channel = delete(TwitchAlerts).where(
+                TwitchAlerts.channel_id == channel.id)
+            session.execute(sql_remove_invalid_channel)
+        elif isinstance(new_message, Exception):
+            logger.error(f"TwitchAlert: User alert not sent to channel {channel.id}: {new_message}")
+        else:
+            sql_update_message_id = update(UserInTwitchAlert).where(and_(
+                UserInTwitchAlert.channel_id == channel.id,
+                UserInTwitchAlert.twitch_user_id == current_user_id)) \
+                .values(message_id=new_message.id)
+            session.execute(sql_update_message_id)
+    session.commit()
+
+
+async def send_user_stream_alerts(bot: Bot, ta_database_manager, stream_data, alert_details=None):
+    """
+    Sends a live alert for a streamer to every user Twitch Alert they are in that has not yet been alerted
+    :param bot: The discord bot client
+    :param ta_database_manager: The twitch alert database manager
+    :param stream_data: The live stream data from the Twitch API
+    :param alert_details: The user and game details fetched this tick, see create_alert_embed
+    :return:
+    """
+    posted_alerts = await post_user_stream_alerts(bot, ta_database_manager, stream_data, alert_details)
+    record_user_stream_alerts(stream_data.get("user_id"), posted_alerts)
+
+
+@assign_session
+async def create_user_alerts(bot: Bot, ta_database_manager, session, scheduled=True):
     start = time.time()
     # logger.info("TwitchAlert: User Loop Started")
-    sql_find_users = select(func.distinct(UserInTwitchAlert.twitch_username)) \
-        .join(TwitchAlerts, UserInTwitchAlert.channel_id == TwitchAlerts.channel_id) \
-        .join(GuildExtensions, TwitchAlerts.guild_id == GuildExtensions.guild_id) \
-        .where(or_(GuildExtensions.extension_id == 'TwitchAlert', GuildExtensions.extension_id == 'All'))
     # "SELECT twitch_username " \
     #              "FROM UserInTwitchAlert " \
     #              "JOIN TwitchAlerts TA on UserInTwitchAlert.channel_id = TA.channel_id " \
     #              "JOIN (SELECT extension_id, guild_id FROM GuildExtensions " \
     #              "WHERE extension_id = 'twitch_alert' OR extension_id = 'All') GE on TA.guild_id = GE.guild_id;"
-    users = session.execute(sql_find_users).all()
+    users = session.execute(select_user_ids()).all()
+
+    user_ids = [user[0] for user in users]
 
-    usernames = [str.lower(user[0]) for user in users]
+    scheduler = ta_database_manager.user_poll_scheduler
+    if scheduled:
+        user_ids = scheduler.due(user_ids)
 
-    if not usernames:
+    if not user_ids:
         return
 
-    user_streams = ta_database_manager.twitch_handler.get_streams_data(usernames)
+    user_streams, unknown_user_ids = await ta_database_manager.poller.poll_streams(user_ids)
     if user_streams is None:
         return
+    user_ids = [user_id for user_id in user_ids if user_id not in unknown_user_ids]
 
     # Deals with online streams
+    live_streams = []
     for streams_details in user_streams:
         try:
             if streams_details.get('type') == "live":
-                current_username = str.lower(streams_details.get("user_login"))
-                old_len = len(usernames)
-                usernames.remove(current_username)
-                if len(usernames) == old_len:
-                    logger.error(f"TwitchAlert: {streams_details.get('user_login')} not found in the user list")
-
-                sql_find_message_id = select(UserInTwitchAlert.channel_id,
-                                             UserInTwitchAlert.message_id,
-                                             UserInTwitchAlert.custom_message,
-                                             TwitchAlerts.default_message) \
-                    .join(TwitchAlerts, UserInTwitchAlert.channel_id == TwitchAlerts.channel_id) \
-                    .join(GuildExtensions, TwitchAlerts.guild_id == GuildExtensions.guild_id) \
-                    .where(and_(and_(or_(GuildExtensions.extension_id == 'TwitchAlert',
-                                         GuildExtensions.extension_id == 'All'),
-                                     UserInTwitchAlert.twitch_username == current_username),
-                                UserInTwitchAlert.message_id == null()))
-                # "SELECT UserInTwitchAlert.channel_id, message_id, custom_message, default_message " \
-                # "FROM UserInTwitchAlert " \
-                # "JOIN TwitchAlerts TA on UserInTwitchAlert.channel_id = TA.channel_id " \
-                # "JOIN (SELECT extension_id, guild_id FROM GuildExtensions " \
-                # "WHERE extension_id = 'TwitchAlert' " \
-                # "  OR extension_id = 'All') GE on TA.guild_id = GE.guild_id " \
-                # "WHERE twitch_username = ?;"
-
-                results = session.execute(sql_find_message_id).all()
-
-                new_message_embed = None
-
-                for result in results:
-                    channel_id = result.channel_id
-                    message_id = result.message_id
-                    custom_message = result.custom_message
-                    channel_default_message = result.default_message
-
-                    channel = bot.get_channel(id=channel_id)
-                    try:
-                        # If no Alert is posted
-                        if message_id is None:
-                            if new_message_embed is None:
-                                if custom_message is not None:
-                                    message = custom_message
-                                else:
-                                    message = channel_default_message
-
-                                new_message_embed = await ta_database_manager.create_alert_embed(streams_details,
-                                                                                                 message)
-
-                            if new_message_embed is not None and channel is not None:
-                                new_message = await channel.send(embed=new_message_embed)
-                                sql_update_message_id = update(UserInTwitchAlert).where(and_(
-                                    UserInTwitchAlert.channel_id == channel_id,
-                                    UserInTwitchAlert.twitch_username == current_username)) \
-                                    .values(message_id=new_message.id)
-                                session.execute(sql_update_message_id)
-                                session.commit()
-                    except discord.errors.Forbidden as err:
-                        logger.warning(f"TwitchAlert: {err}  Name: {channel} ID: {channel.id}")
-                        sql_remove_invalid_channel = delete(TwitchAlerts).where(
-                            TwitchAlerts.channel_id == channel.id)
-                        session.execute(sql_remove_invalid_channel)
-                        session.commit()
+                user_ids.remove(streams_details.get("user_id"))
+                live_streams.append(streams_details)
 
         except Exception as err:
             logger.error(f"TwitchAlert: User Loop error {err}")
 
+    # Streamers in several alerts, and games played by several streamers, are only fetched once a tick
+    alert_details = ({}, {})
+    results = await asyncio.gather(*[post_user_stream_alerts(bot, ta_database_manager, streams_details, alert_details)
+                                     for streams_details in live_streams], return_exceptions=True)
+    # Alerts are recorded once they have all been posted, as the session can't be shared between them
+    for streams_details, posted_alerts in zip(live_streams, results):
+        if isinstance(posted_alerts, Exception):
+            logger.error(f"TwitchAlert: User Loop error {posted_alerts}")
+        else:
+            record_user_stream_alerts(streams_details.get("user_id"), posted_alerts, session=session)
+    scheduler.update([streams_details.get("user_id") for streams_details in live_streams], user_ids)
+
     # Deals with remaining offline streams
-    await ta_database_manager.delete_all_offline_streams(usernames)
+    await ta_database_manager.delete_all_offline_streams(user_ids)
     time_diff = time.time() - start
     if time_diff > 5:
         logger.warning(f"TwitchAlert: User Loop Finished in > 5s | {time_diff}s")
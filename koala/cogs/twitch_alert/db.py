@@ -1,20 +1,25 @@
 # Futures
 
 # Built-in/Generic Imports
+import asyncio
+import functools
 import re
 
 # Own modules
 from koala.db import session_manager
 
 from .twitch_handler import TwitchAPIHandler
+from .delivery import AlertDelivery
+from .poller import StreamPoller
+from .scheduler import PollScheduler
 from .models import TwitchAlerts, TeamInTwitchAlert, UserInTwitchTeam, UserInTwitchAlert
-from .utils import DEFAULT_MESSAGE, TWITCH_USERNAME_REGEX, create_live_embed
+from .utils import DEFAULT_MESSAGE, TWITCH_USERNAME_REGEX, TEAMS_REFRESH_CONCURRENCY, create_live_embed
 from .log import logger
-from .env import TWITCH_KEY, TWITCH_SECRET
+from .env import TWITCH_KEY, TWITCH_SECRET, TWITCH_POLL_WORKERS, TWITCH_POLL_MODE
 
 # Libs
 import discord
-from sqlalchemy import select, delete, and_, null
+from sqlalchemy import select, delete, update, and_, null
 from sqlalchemy.orm import selectinload, joinedload
 
 
@@ -23,42 +28,13 @@ from sqlalchemy.orm import selectinload, joinedload
 # Variables
 
 
-def delete_invalid_accounts():
+def team_members(users):
     """
-    Removes invalid teams & users (where the names are not valid according to the twitch Regex)
-    :return:
+    Gets the members of a team from the twitch team data
+    :param users: The users of the team from the Twitch API
+    :return: A dict of twitch user ID to username of each member
     """
-    with session_manager() as session:
-        usernames = session.execute(select(UserInTwitchAlert.twitch_username))
-        teams = session.execute(select(TeamInTwitchAlert.twitch_team_name))
-        users_in_teams = session.execute(select(UserInTwitchTeam.twitch_username))
-
-        invalid_usernames = [user for user in usernames
-                             if not re.search(TWITCH_USERNAME_REGEX, user.twitch_username)]
-        invalid_teams = [team.twitch_team_name for team in teams
-                         if not re.search(TWITCH_USERNAME_REGEX, team.twitch_team_name)]
-        invalid_users_in_teams = [user.twitch_username for user in users_in_teams
-                                  if not re.search(TWITCH_USERNAME_REGEX, user.twitch_username)]
-
-        if invalid_usernames:
-            logger.warning(f'Deleting Invalid Users')
-        if invalid_teams:
-            logger.warning(f'Deleting Invalid Teams')
-        if invalid_users_in_teams:
-            logger.warning(f'Deleting Invalid Users in Teams')
-
-        delete_invalid_usernames = delete(UserInTwitchAlert)\
-            .where(UserInTwitchAlert.twitch_username.in_(invalid_usernames))
-        delete_invalid_teams = delete(TeamInTwitchAlert)\
-            .where(TeamInTwitchAlert.twitch_team_name.in_(invalid_teams))
-        # This should be nothing
-        delete_invalid_users_in_teams = delete(TeamInTwitchAlert)\
-            .where(TeamInTwitchAlert.twitch_team_name.in_(invalid_teams))
-
-        session.execute(delete_invalid_usernames)
-        session.execute(delete_invalid_teams)
-        session.execute(delete_invalid_users_in_teams)
-        session.commit()
+    return {user_info.get("user_id"): user_info.get("user_login") for user_info in users}
 
 
 class TwitchAlertDBManager:
@@ -71,9 +47,12 @@ class TwitchAlertDBManager:
         Initialises local variables
         :param bot_client:
         """
-        delete_invalid_accounts()
-
         self.twitch_handler = TwitchAPIHandler(TWITCH_KEY, TWITCH_SECRET)
+        self.poller = StreamPoller(self.twitch_handler, TWITCH_POLL_WORKERS, TWITCH_POLL_MODE,
+                                   TWITCH_KEY, TWITCH_SECRET)
+        self.delivery = AlertDelivery()
+        self.user_poll_scheduler = PollScheduler(self.twitch_handler)
+        self.team_poll_scheduler = PollScheduler(self.twitch_handler)
         self.bot = bot_client
 
     def new_ta(self, guild_id, channel_id, default_message=None, replace=False):
@@ -119,9 +98,18 @@ class TwitchAlertDBManager:
         else:
             return DEFAULT_MESSAGE
 
-    def add_user_to_ta(self, channel_id, twitch_username, custom_message, guild_id):
+    def get_user_ids(self, usernames):
+        """
+        Gets the unique twitch user IDs of users, in batched requests
+        :param usernames: The lowercase twitch usernames
+        :return: A dict of username to user ID for every username that exists on twitch
         """
-        Add a twitch user to a given Twitch Alert
+        users = self.twitch_handler.get_user_data(usernames=list(usernames))
+        return {str.lower(user.get("login")): user.get("id") for user in users}
+
+    async def add_user_to_ta(self, channel_id, twitch_username, custom_message, guild_id):
+        """
+        Add a twitch user to a given Twitch Alert, looking up their twitch user ID off the event loop
         :param channel_id: The discord channel ID of the twitch Alert
         :param twitch_username: The Twitch username of the user to be added
         :param custom_message: The custom Message of the user's live notification.
@@ -129,10 +117,20 @@ class TwitchAlertDBManager:
         :param guild_id: The guild ID of the channel
         :return:
         :raises: KeyError if channel ID is not defined in TwitchAlerts and guild_id is not provided
+        :raises: ValueError if the twitch username is invalid or the user does not exist on twitch
         """
+        twitch_username = str.lower(twitch_username)
+        if not re.search(TWITCH_USERNAME_REGEX, twitch_username):
+            raise ValueError(f"{twitch_username} is not a valid twitch username")
+        user_ids = await asyncio.get_event_loop().run_in_executor(None, self.get_user_ids, [twitch_username])
+        twitch_user_id = user_ids.get(twitch_username)
+        if twitch_user_id is None:
+            raise ValueError(f"Twitch user {twitch_username} does not exist")
+
         self.new_ta(guild_id, channel_id)
         with session_manager() as session:
-            new_user = UserInTwitchAlert(channel_id=channel_id, twitch_username=str.lower(twitch_username))
+            new_user = UserInTwitchAlert(channel_id=channel_id, twitch_username=twitch_username,
+                                         twitch_user_id=twitch_user_id)
 
             if custom_message:
                 new_user.custom_message = custom_message
@@ -163,6 +161,8 @@ class TwitchAlertDBManager:
         :param channel_id: discord channel ID which has the message
         :return:
         """
+        if message_id is None:
+            return
         with session_manager() as session:
             try:
                 channel = self.bot.get_channel(int(channel_id))
@@ -172,8 +172,7 @@ class TwitchAlertDBManager:
                     session.execute(sql_remove_invalid_channel)
                     session.commit()
                     return
-                message = await channel.fetch_message(message_id)
-                await message.delete()
+                await self.delivery.delete(channel, message_id)
             except discord.errors.NotFound as err:
                 logger.warning(f"TwitchAlert: Message ID {message_id} does not exist, skipping \nError: {err}")
             except discord.errors.Forbidden as err:
@@ -210,18 +209,24 @@ class TwitchAlertDBManager:
         :param custom_message: The custom Message of the team's live notification.
             None = use default Twitch Alert message
         :param guild_id: The guild ID of the channel
-        :return:
+        :return: The team twitch alert id of the new team
         :raises: KeyError if channel ID is not defined in TwitchAlerts and guild_id is not provided
+        :raises: ValueError if the twitch team name is invalid
         """
+        twitch_team = str.lower(twitch_team)
+        if not re.search(TWITCH_USERNAME_REGEX, twitch_team):
+            raise ValueError(f"{twitch_team} is not a valid twitch team name")
+
         self.new_ta(guild_id, channel_id)
         with session_manager() as session:
-            new_team = TeamInTwitchAlert(channel_id=channel_id, twitch_team_name=str.lower(twitch_team))
+            new_team = TeamInTwitchAlert(channel_id=channel_id, twitch_team_name=twitch_team)
 
             if custom_message:
                 new_team.custom_message = custom_message
 
             session.add(new_team)
             session.commit()
+            return new_team.team_twitch_alert_id
 
     async def remove_team_from_ta(self, channel_id, team_name):
         """
@@ -248,7 +253,7 @@ class TwitchAlertDBManager:
             session.delete(team)
             session.commit()
 
-    def update_team_members(self, twitch_team_id, team_name):
+    async def update_team_members(self, twitch_team_id, team_name):
         """
         Users in a team are updated to ensure they are assigned to the correct team
         :param twitch_team_id: the team twitch alert id
@@ -256,35 +261,88 @@ class TwitchAlertDBManager:
         :return:
         """
         if re.search(TWITCH_USERNAME_REGEX, team_name):
-            users = self.twitch_handler.get_team_users(team_name)
-            for user_info in users:
-                with session_manager() as session:
-                    user = session.execute(
-                        select(UserInTwitchTeam)
-                        .filter_by(team_twitch_alert_id=twitch_team_id, twitch_username=user_info.get("user_login")))\
-                        .scalars()\
-                        .one_or_none()
-
-                    if user is None:
-                        session.add(UserInTwitchTeam(
-                            team_twitch_alert_id=twitch_team_id, twitch_username=user_info.get("user_login")))
-                        session.commit()
-
-    def update_all_teams_members(self):
-        """
-        Updates all teams with the current team members
+            users = await asyncio.get_event_loop().run_in_executor(
+                None, self.twitch_handler.get_team_users, team_name)
+            await self.set_team_members(twitch_team_id, team_members(users))
+
+    async def set_team_members(self, twitch_team_id, members):
+        """
+        Sets the members of a team twitch alert to exactly the given users, in a single transaction.
+        Live alerts of members who have left the team are deleted, and renamed members are updated.
+        :param twitch_team_id: the team twitch alert id
+        :param members: a dict of twitch user ID to username of the current members of the team
+        :return:
+        """
+        members = {str(user_id): str.lower(username) for user_id, username in members.items()}
+        member_ids = {username: user_id for user_id, username in members.items()}
+        with session_manager() as session:
+            team = session.execute(select(TeamInTwitchAlert)
+                                   .filter_by(team_twitch_alert_id=twitch_team_id)
+                                   .options(selectinload(TeamInTwitchAlert.users))).scalars().one_or_none()
+            if team is None:
+                return
+            current = {}
+            departed = []
+            for user in team.users:
+                # Members stored before user IDs were are matched by username
+                user_id = user.twitch_user_id or member_ids.get(user.twitch_username)
+                if user_id in members:
+                    current[user_id] = user
+                else:
+                    departed.append(user)
+
+            for user in departed:
+                if user.message_id is not None:
+                    await self.delete_message(user.message_id, team.channel_id)
+                session.delete(user)
+            # A departed member's username may have been taken by a new member
+            session.flush()
+            for user_id, user in current.items():
+                user.twitch_user_id = user_id
+                user.twitch_username = members[user_id]
+            session.add_all([UserInTwitchTeam(team_twitch_alert_id=twitch_team_id,
+                                              twitch_username=username, twitch_user_id=user_id)
+                             for user_id, username in members.items() if user_id not in current])
+            session.commit()
+
+    async def update_all_teams_members(self):
+        """
+        Updates all teams with the current team members.
+        Each team is only requested from twitch once, no matter how many twitch alerts it is in
         :return:
         """
         with session_manager() as session:
-            teams_info = session.execute(select(TeamInTwitchAlert)).scalars().all()
+            teams_info = session.execute(select(TeamInTwitchAlert.team_twitch_alert_id,
+                                                TeamInTwitchAlert.twitch_team_name)).all()
 
+        teams = {}
         for team_info in teams_info:
-            self.update_team_members(team_info.team_twitch_alert_id, team_info.twitch_team_name)
+            teams.setdefault(team_info.twitch_team_name, []).append(team_info.team_twitch_alert_id)
 
-    async def delete_all_offline_team_streams(self, usernames):
+        semaphore = asyncio.Semaphore(TEAMS_REFRESH_CONCURRENCY)
+
+        async def update_team(team_name, twitch_team_ids):
+            if not re.search(TWITCH_USERNAME_REGEX, team_name):
+                return
+            try:
+                async with semaphore:
+                    users = await asyncio.get_event_loop().run_in_executor(
+                        None, self.twitch_handler.get_team_users, team_name)
+            except Exception as err:
+                # Members are kept as they are if the team can't be fetched
+                logger.warning(f"TwitchAlert: Team {team_name} could not be updated: {err}")
+                return
+            members = team_members(users)
+            for twitch_team_id in twitch_team_ids:
+                await self.set_team_members(twitch_team_id, members)
+
+        await asyncio.gather(*[update_team(team_name, twitch_team_ids)
+                               for team_name, twitch_team_ids in teams.items()])
+
+    async def delete_all_offline_team_streams(self, user_ids):
         """
         A method that deletes all currently offline streams
-        :param usernames: The usernames of the team members
+        :param user_ids: The twitch user IDs of the team members
         :return:
         """
         with session_manager() as session:
@@ -292,7 +350,7 @@ class TwitchAlertDBManager:
                 select(UserInTwitchTeam).where(
                     and_(
                         UserInTwitchTeam.message_id != null(),
-                        UserInTwitchTeam.twitch_username.in_(usernames))
+                        UserInTwitchTeam.twitch_user_id.in_(user_ids))
                     ).options(
                         joinedload(UserInTwitchTeam.team)
                     )
@@ -301,20 +359,24 @@ class TwitchAlertDBManager:
             if not results:
                 return
             logger.debug("Deleting offline streams: %s" % results)
+            deleted = []
             for result in results:
                 if result.team:
-                    await self.delete_message(result.message_id, result.team.channel_id)
-                    result.message_id = None
+                    deleted.append(result)
                 else:
                     logger.debug("Result team not found: %s", result)
                     logger.debug("Existing teams: %s", session.execute(select(TeamInTwitchAlert)).scalars().all())
                     # session.delete(result)
+            await asyncio.gather(*[self.delete_message(result.message_id, result.team.channel_id)
+                                   for result in deleted])
+            for result in deleted:
+                result.message_id = None
             session.commit()
 
-    async def delete_all_offline_streams(self, usernames):
+    async def delete_all_offline_streams(self, user_ids):
         """
         A method that deletes all currently offline streams
-        :param usernames: The usernames of the twitch members
+        :param user_ids: The twitch user IDs of the twitch members
         :return:
         """
         with session_manager() as session:
@@ -324,81 +386,70 @@ class TwitchAlertDBManager:
                 ).where(
                     and_(
                         UserInTwitchAlert.message_id != null(),
-                        UserInTwitchAlert.twitch_username.in_(usernames)))
+                        UserInTwitchAlert.twitch_user_id.in_(user_ids)))
             ).scalars().all()
 
             if results is None:
                 return
+            await asyncio.gather(*[self.delete_message(result.message_id, result.channel_id)
+                                   for result in results])
             for result in results:
-                await self.delete_message(result.message_id, result.channel_id)
                 result.message_id = None
             session.commit()
 
-    # def translate_names_to_ids(self):
-    #     """
-    #     Translates usernames and team_names to twitch unique IDs
-    #     """
-    #     # todo: Create a backup before
-    #     with session_manager() as session:
-    #         if len(session.execute("SELECT name "
-    #                            "FROM sqlite_master "
-    #                            "WHERE type='table' AND (name='UserInTwitchAlert' OR name='TeamInTwitchAlert');"
-    #                            ).all()) == 0:
-    #             return
-    #
-    #     table_name = "UserInTwitchAlert"
-    #     fields = self.db_execute_select(f"PRAGMA table_info({table_name});")
-    #     if fields[1][1] == 'twitch_username':
-    #         self.user_names_to_ids()
-    #     elif fields[1][1] != 'twitch_user_id':
-    #         raise NameError(f"Unexpected field {fields[1][1]} in ")
-    #
-    #     table_name = "TeamInTwitchAlert"
-    #     fields = self.db_execute_select(f"PRAGMA table_info({table_name});")
-    #     if fields[2][1] == 'twitch_team_name':
-    #         self.team_names_to_ids()
-    #     elif fields[2][1] != 'twitch_team_id':
-    #         raise NameError(f"Unexpected field {fields[1][1]} in ")
-    #
-    #     # todo: remove all current messages from UserInTwitchTeam & update from empty
-    #
-    # def user_names_to_ids(self):
-    #     with session_manager() as session:
-    #         users_in_twitch_alert = session.execute(select(UserInTwitchAlert)).all()
-    #         for user in users_in_twitch_alert:
-    #             try:
-    #                 session.execute(update(UserInTwitchAlert).where(
-    #                     UserInTwitchAlert.twitch_username == user.twitch_username).values(
-    #                     twitch_username=(self.twitch_handler.get_user_data(usernames=[user.twitch_username]))[0].get("id")))
-    #                 session.commit()
-    #             except Exception as err:
-    #                 logger.error(f"User not found on Twitch {user}, deleted")
-    #         session.execute("ALTER TABLE UserInTwitchAlert RENAME COLUMN twitch_username TO twitch_user_id")
-    #         session.commit()
-    #
-    # def team_names_to_ids(self):
-    #     with session_manager() as session:
-    #         team_in_twitch_alert = session.execute(select(TeamInTwitchAlert)).all()
-    #         for team in team_in_twitch_alert:
-    #             try:
-    #                 session.execute(update(TeamInTwitchAlert).where(
-    #                     TeamInTwitchAlert == team.twitch_team_name).values(
-    #                     twitch_team_name=self.twitch_handler.get_team_data(team.twitch_team_name).get("id")))
-    #                 session.commit()
-    #             except Exception as err:
-    #                 logger.error(f"Team not found on Twitch {team}, deleted")
-    #         session.execute("ALTER TABLE TeamInTwitchAlert RENAME COLUMN twitch_team_name TO twitch_team_id")
-    #         session.commit()
-
-    async def create_alert_embed(self, stream_data, message):
+    def translate_names_to_ids(self):
+        """
+        Stores the twitch user IDs of users added before IDs were stored, so their alerts follow them
+        through username changes. Users that are not valid or are not found on twitch keep no ID, and are looked up
+        again the next time this is called. Does nothing once every valid user has an ID.
+        :return:
+        """
+        with session_manager() as session:
+            usernames = set(session.execute(select(UserInTwitchAlert.twitch_username)
+                                            .where(UserInTwitchAlert.twitch_user_id == null())).scalars().all())
+            usernames.update(session.execute(select(UserInTwitchTeam.twitch_username)
+                                             .where(UserInTwitchTeam.twitch_user_id == null())).scalars().all())
+            usernames = {username for username in usernames if re.search(TWITCH_USERNAME_REGEX, username)}
+            if not usernames:
+                return
+
+            try:
+                user_ids = self.get_user_ids(list(usernames))
+            except Exception as err:
+                logger.error("TwitchAlert: Twitch user IDs could not be stored, retrying later", exc_info=err)
+                return
+
+            for table in (UserInTwitchAlert, UserInTwitchTeam):
+                for username, user_id in user_ids.items():
+                    session.execute(update(table)
+                                    .where(and_(table.twitch_username == username, table.twitch_user_id == null()))
+                                    .values(twitch_user_id=user_id))
+            session.commit()
+
+        if user_ids:
+            logger.info(f"TwitchAlert: Stored twitch user IDs of {len(user_ids)} users")
+        missing = usernames - user_ids.keys()
+        if missing:
+            logger.info(f"TwitchAlert: Users not found on twitch, retrying later: {', '.join(sorted(missing))}")
+
+    async def create_alert_embed(self, stream_data, message, alert_details=None):
         """
         Creates and sends an alert message
         :param stream_data: The twitch stream data to have in the message
         :param message: The custom message to be added as a description
+        :param alert_details: A dict of twitch user ID and a dict of game ID to the requests for their details, shared
+            by the alerts of a tick so each user and game is only fetched once
         :return: The discord message id of the sent message
         """
-        user_details = self.twitch_handler.get_user_data(
-            stream_data.get("user_name"))[0]
-        game_details = self.twitch_handler.get_game_data(
-            stream_data.get("game_id"))
-        return create_live_embed(stream_data, user_details, game_details, message)
\ No newline at end of file
+        users, games = alert_details if alert_details is not None else ({}, {})
+        user_id = stream_data.get("user_id")
+        game_id = stream_data.get("game_id")
+        loop = asyncio.get_event_loop()
+        if user_id not in users:
+            users[user_id] = loop.run_in_executor(None, functools.partial(self.twitch_handler.get_user_data,
+                                                                          ids=[user_id]))
+        if game_id not in games:
+            games[game_id] = loop.run_in_executor(None, self.twitch_handler.get_game_data, game_id)
+        user_details = (await users[user_id])[0]
+        game_details = await games[game_id]
+        return create_live_embed(stream_data, user_details, game_details, message)
@@ -0,0 +1,85 @@
+# Futures
+
+# Built-in/Generic Imports
+import asyncio
+
+# Own modules
+from koala.utils import retry_discord_request
+from .log import logger
+from .utils import DELIVERY_CONCURRENCY, DELIVERY_CHANNEL_CONCURRENCY, DELIVERY_RETRIES, DELIVERY_BACKOFF
+
+# Libs
+import discord
+
+# Constants
+
+# Variables
+
+
+class AlertDelivery:
+    """
+    Sends and deletes Twitch Alert messages concurrently, limited globally and per channel,
+    retrying failed requests with exponential backoff
+    """
+
+    def __init__(self, concurrency=DELIVERY_CONCURRENCY, channel_concurrency=DELIVERY_CHANNEL_CONCURRENCY,
+                 retries=DELIVERY_RETRIES, backoff=DELIVERY_BACKOFF):
+        """
+        Initialises local variables
+        :param concurrency: The maximum number of requests in progress at once
+        :param channel_concurrency: The maximum number of requests in progress at once for a single channel
+        :param retries: The number of times a failed request is retried
+        :param backoff: The delay in seconds before the first retry, doubled for each retry after
+        """
+        self.concurrency = concurrency
+        self.channel_concurrency = channel_concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self._loop = None
+        self._semaphore = None
+        self._channel_semaphores = {}
+
+    def _get_semaphores(self, channel_id):
+        """
+        Gets the global and channel semaphores, creating them for the running event loop
+        :param channel_id: The discord channel ID of the request
+        :return: The global semaphore and channel semaphore
+        """
+        loop = asyncio.get_event_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._channel_semaphores = {}
+        if channel_id not in self._channel_semaphores:
+            self._channel_semaphores[channel_id] = asyncio.Semaphore(self.channel_concurrency)
+        return self._semaphore, self._channel_semaphores[channel_id]
+
+    async def _request(self, channel_id, coro_func):
+        """
+        Makes a request within the concurrency limits, retrying if it fails for a temporary reason
+        :param channel_id: The discord channel ID of the request
+        :param coro_func: A function returning the request coroutine
+        :return: The result of the request
+        :raises: The error of the request, see retry_discord_request
+        """
+        semaphore, channel_semaphore = self._get_semaphores(channel_id)
+        return await retry_discord_request(coro_func, self.retries, self.backoff, channel_semaphore, semaphore,
+                                           logger=logger, description=f"TwitchAlert: Request to channel {channel_id}")
+
+    async def send(self, channel: discord.TextChannel, embed: discord.Embed):
+        """
+        Sends an alert embed to a channel
+        :param channel: The channel to send the alert to
+        :param embed: The alert embed
+        :return: The sent message
+        """
+        return await self._request(channel.id, lambda: channel.send(embed=embed))
+
+    async def delete(self, channel: discord.TextChannel, message_id):
+        """
+        Deletes an alert message without fetching it first
+        :param channel: The channel containing the alert
+        :param message_id: The discord message ID of the alert
+        :return:
+        """
+        await self._request(channel.id, lambda: channel.get_partial_message(int(message_id)).delete())
@@ -5,3 +5,9 @@ load_dotenv()
 
 TWITCH_KEY = os.environ.get('TWITCH_TOKEN')
 TWITCH_SECRET = os.environ.get('TWITCH_SECRET')
+TWITCH_EVENTSUB_CALLBACK = os.environ.get('TWITCH_EVENTSUB_CALLBACK')
+TWITCH_EVENTSUB_SECRET = os.environ.get('TWITCH_EVENTSUB_SECRET')
+TWITCH_POLL_WORKERS = int(os.environ.get('TWITCH_POLL_WORKERS', 0))
+TWITCH_POLL_MODE = os.environ.get('TWITCH_POLL_MODE', "process")
+TWITCH_RATE_LIMIT = int(os.environ.get('TWITCH_RATE_LIMIT', 800))
+TWITCH_POLL_BUDGET = float(os.environ.get('TWITCH_POLL_BUDGET', 0.8))
@@ -0,0 +1,223 @@
+# Futures
+
+# Built-in/Generic Imports
+import asyncio
+import datetime
+import hashlib
+import hmac
+import json
+from collections import OrderedDict
+
+# Own modules
+from .log import logger
+
+# Libs
+from aiohttp import web
+
+# Constants
+STREAM_ONLINE = "stream.online"
+STREAM_OFFLINE = "stream.offline"
+SUBSCRIPTION_TYPES = (STREAM_ONLINE, STREAM_OFFLINE)
+
+MESSAGE_ID_HEADER = "Twitch-Eventsub-Message-Id"
+MESSAGE_TIMESTAMP_HEADER = "Twitch-Eventsub-Message-Timestamp"
+MESSAGE_SIGNATURE_HEADER = "Twitch-Eventsub-Message-Signature"
+MESSAGE_TYPE_HEADER = "Twitch-Eventsub-Message-Type"
+
+MESSAGE_TYPE_VERIFICATION = "webhook_callback_verification"
+MESSAGE_TYPE_NOTIFICATION = "notification"
+MESSAGE_TYPE_REVOCATION = "revocation"
+
+ACTIVE_STATUSES = ("enabled", "webhook_callback_verification_pending")
+MAX_MESSAGE_AGE = datetime.timedelta(minutes=10)
+SEEN_MESSAGES_LIMIT = 1000
+
+# Variables
+
+
+def sign_message(secret, message_id, timestamp, body):
+    """
+    Creates the signature Twitch attaches to an EventSub message
+    :param secret: The secret given when the subscription was created
+    :param message_id: The Twitch-Eventsub-Message-Id header
+    :param timestamp: The Twitch-Eventsub-Message-Timestamp header
+    :param body: The raw request body
+    :return: The signature in the form sha256=<hex digest>
+    """
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    hmac_message = message_id.encode("utf-8") + timestamp.encode("utf-8") + body
+    return "sha256=" + hmac.new(secret.encode("utf-8"), msg=hmac_message, digestmod=hashlib.sha256).hexdigest()
+
+
+def parse_timestamp(timestamp):
+    """
+    Parses an EventSub RFC3339 timestamp, which may have nanosecond precision
+    :param timestamp: The timestamp string (e.g. 2019-11-16T10:11:12.634234626Z)
+    :return: The naive UTC datetime, or None if invalid
+    """
+    try:
+        return datetime.datetime.strptime(timestamp[:19], "%Y-%m-%dT%H:%M:%S")
+    except (TypeError, ValueError):
+        return None
+
+
+class TwitchEventSubManager:
+    """
+    Keeps stream.online/stream.offline EventSub subscriptions in line with the tracked streamers
+    and handles the notifications Twitch sends to the callback route
+    """
+
+    def __init__(self, twitch_handler, callback_url, secret, on_online, on_offline):
+        """
+        Initialises local variables
+        :param twitch_handler: The TwitchAPIHandler used to manage subscriptions
+        :param callback_url: The public url that routes to the EventSub callback endpoint
+        :param secret: The secret used to sign and verify notifications
+        :param on_online: coroutine function called with the event data when a stream goes online
+        :param on_offline: coroutine function called with the event data when a stream goes offline
+        """
+        self.twitch_handler = twitch_handler
+        self.callback_url = callback_url
+        self.secret = secret
+        self.on_online = on_online
+        self.on_offline = on_offline
+        self.subscriptions = {}
+        self.healthy = False
+        self._reconciled = False
+        self._pending = set()
+        self._verified = set()
+        self._seen_messages = OrderedDict()
+
+    def reconcile(self, user_ids):
+        """
+        Creates missing subscriptions and deletes unneeded ones so that exactly the given
+        users are subscribed to. Polling is expected to take over while this is unhealthy.
+        :param user_ids: The twitch user IDs that should be subscribed to
+        :return: True if every wanted subscription is enabled
+        """
+        try:
+            wanted = {(sub_type, str(user_id)) for sub_type in SUBSCRIPTION_TYPES for user_id in user_ids}
+
+            existing = {}
+            for subscription in self.twitch_handler.get_eventsub_subscriptions():
+                key = (subscription.get("type"),
+                       subscription.get("condition", {}).get("broadcaster_user_id"))
+                transport = subscription.get("transport", {})
+                if key in wanted and key not in existing \
+                        and subscription.get("status") in ACTIVE_STATUSES \
+                        and transport.get("callback") == self.callback_url:
+                    existing[key] = subscription
+                elif key[0] in SUBSCRIPTION_TYPES:
+                    self.twitch_handler.delete_eventsub_subscription(subscription.get("id"))
+
+            healthy = True
+            for key in wanted - existing.keys():
+                try:
+                    existing[key] = self.twitch_handler.create_eventsub_subscription(
+                        key[0], key[1], self.callback_url, self.secret)
+                except Exception as err:
+                    logger.warning(f"TwitchAlert: EventSub subscription {key} failed: {err}")
+                    healthy = False
+
+            self.subscriptions = {key: subscription.get("id") for key, subscription in existing.items()}
+            # Verification challenges may arrive before the subscription request has returned
+            self._pending = {subscription.get("id") for subscription in existing.values()
+                             if subscription.get("status") != "enabled"} - self._verified
+            self._verified &= set(self.subscriptions.values())
+            self._reconciled = healthy
+        except Exception as err:
+            logger.error("TwitchAlert: EventSub reconciliation failed, polling will be used", exc_info=err)
+            self._reconciled = False
+        self.healthy = self._reconciled and not self._pending
+        return self.healthy
+
+    def verify_signature(self, headers, body):
+        """
+        Checks a request was signed by Twitch with our secret and is recent
+        :param headers: The request headers
+        :param body: The raw request body
+        :return: True if the request is valid
+        """
+        message_id = headers.get(MESSAGE_ID_HEADER)
+        timestamp = headers.get(MESSAGE_TIMESTAMP_HEADER)
+        signature = headers.get(MESSAGE_SIGNATURE_HEADER)
+        if not (message_id and timestamp and signature):
+            return False
+
+        sent_at = parse_timestamp(timestamp)
+        if sent_at is None or abs(datetime.datetime.utcnow() - sent_at) > MAX_MESSAGE_AGE:
+            return False
+
+        expected = sign_message(self.secret, message_id, timestamp, body)
+        return hmac.compare_digest(expected, signature.lower())
+
+    def _is_duplicate(self, message_id):
+        """
+        Records a message id, as Twitch may resend a notification
+        :param message_id: The Twitch-Eventsub-Message-Id header
+        :return: True if this message has already been received
+        """
+        if message_id in self._seen_messages:
+            return True
+        self._seen_messages[message_id] = None
+        while len(self._seen_messages) > SEEN_MESSAGES_LIMIT:
+            self._seen_messages.popitem(last=False)
+        return False
+
+    async def handle_callback(self, request: web.Request):
+        """
+        Handles a message sent by Twitch to the EventSub callback route
+        :param request: The aiohttp request
+        :return: The aiohttp response
+        """
+        body = await request.read()
+        if not self.verify_signature(request.headers, body):
+            logger.warning("TwitchAlert: EventSub message signature invalid, discarding message")
+            return web.Response(status=403)
+
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return web.Response(status=400)
+
+        message_type = request.headers.get(MESSAGE_TYPE_HEADER)
+        subscription = data.get("subscription", {})
+
+        if message_type == MESSAGE_TYPE_VERIFICATION:
+            logger.debug(f"TwitchAlert: EventSub subscription {subscription.get('id')} verified")
+            self._verified.add(subscription.get("id"))
+            self._pending.discard(subscription.get("id"))
+            self.healthy = self._reconciled and not self._pending
+            return web.Response(text=data.get("challenge"), content_type="text/plain")
+
+        if self._is_duplicate(request.headers.get(MESSAGE_ID_HEADER)):
+            return web.Response(status=204)
+
+        if message_type == MESSAGE_TYPE_REVOCATION:
+            logger.warning(f"TwitchAlert: EventSub subscription {subscription.get('id')} revoked "
+                           f"({subscription.get('status')}), falling back to polling")
+            key = (subscription.get("type"), subscription.get("condition", {}).get("broadcaster_user_id"))
+            self.subscriptions.pop(key, None)
+            self._reconciled = False
+            self.healthy = False
+        elif message_type == MESSAGE_TYPE_NOTIFICATION:
+            # Twitch expects a response within a few seconds, so alerts are sent in the background
+            asyncio.ensure_future(self._dispatch(subscription.get("type"), data.get("event", {})))
+
+        return web.Response(status=204)
+
+    async def _dispatch(self, sub_type, event):
+        """
+        Calls the callback for a notification
+        :param sub_type: The EventSub subscription type of the notification
+        :param event: The event data of the notification
+        :return:
+        """
+        try:
+            if sub_type == STREAM_ONLINE:
+                await self.on_online(event)
+            elif sub_type == STREAM_OFFLINE:
+                await self.on_offline(event)
+        except Exception as err:
+            logger.error("TwitchAlert: EventSub notification error", exc_info=err)
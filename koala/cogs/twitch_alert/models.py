@@ -20,13 +20,14 @@ class UserInTwitchAlert:
     __tablename__ = 'UserInTwitchAlert'
     channel_id = Column(Integer, ForeignKey("TwitchAlerts.channel_id"), primary_key=True)
     twitch_username = Column(String, primary_key=True)
+    twitch_user_id = Column(String, nullable=True, index=True)
     custom_message = Column(String, nullable=True)
     message_id = Column(Integer, nullable=True)
     twitch_alert = orm.relationship("TwitchAlerts")
 
     def __repr__(self):
-        return "<UserInTwitchAlert(%s, %s, %s, %s)>" % \
-               (self.channel_id, self.twitch_username, self.custom_message, self.message_id)
+        return "<UserInTwitchAlert(%s, %s, %s, %s, %s)>" % \
+               (self.channel_id, self.twitch_username, self.twitch_user_id, self.custom_message, self.message_id)
 
 
 @mapper_registry.mapped
@@ -37,6 +38,7 @@ class TeamInTwitchAlert:
     twitch_team_name = Column(String)
     custom_message = Column(String, nullable=True)
     twitch_alert = orm.relationship("TwitchAlerts")
+    users = orm.relationship("UserInTwitchTeam", back_populates="team")
 
     def __repr__(self):
         return "<TeamInTwitchAlert(%s, %s, %s, %s)>" % \
@@ -48,12 +50,13 @@ class UserInTwitchTeam:
     __tablename__ = 'UserInTwitchTeam'
     team_twitch_alert_id = Column(Integer, ForeignKey("TeamInTwitchAlert.team_twitch_alert_id"), primary_key=True)
     twitch_username = Column(String, primary_key=True)
+    twitch_user_id = Column(String, nullable=True, index=True)
     message_id = Column(Integer, nullable=True)
-    team = orm.relationship("TeamInTwitchAlert")
+    team = orm.relationship("TeamInTwitchAlert", back_populates="users")
 
     def __repr__(self):
-        return "<UserInTwitchTeam(%s, %s, %s)>" % \
-               (self.team_twitch_alert_id, self.twitch_username, self.message_id)
+        return "<UserInTwitchTeam(%s, %s, %s, %s)>" % \
+               (self.team_twitch_alert_id, self.twitch_username, self.twitch_user_id, self.message_id)
 
 
 setup()
@@ -0,0 +1,162 @@
+# Futures
+
+# Built-in/Generic Imports
+import asyncio
+import bisect
+import functools
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Own modules
+from .log import logger
+from .twitch_handler import TwitchAPIHandler
+from .utils import split_to_100s
+
+# Libs
+
+# Constants
+POLL_MODE_THREAD = "thread"
+POLL_MODE_PROCESS = "process"
+VIRTUAL_NODES = 100
+
+# Variables
+_worker_handler = None
+
+
+def _init_worker(client_id, client_secret):
+    """
+    Creates the twitch API handler of a poller worker process, so it is authenticated once per process
+    :param client_id: The twitch client ID
+    :param client_secret: The twitch client secret
+    """
+    global _worker_handler
+    _worker_handler = TwitchAPIHandler(client_id, client_secret)
+
+
+def _poll_streams(user_ids):
+    """
+    Gets the stream data of the given users within a poller worker process
+    :param user_ids: The twitch user IDs in this worker's partition
+    :return: The JSON data of the streams
+    """
+    return _worker_handler.get_streams_data(user_ids=user_ids)
+
+
+def _hash(key):
+    return int(hashlib.md5(key.encode("utf-8")).hexdigest()[:16], 16)
+
+
+class HashRing:
+    """
+    A consistent hash ring that assigns twitch users to workers, so that adding or removing a
+    worker only moves the users of that worker
+    """
+
+    def __init__(self, workers, virtual_nodes=VIRTUAL_NODES):
+        """
+        Initialises local variables
+        :param workers: The number of workers in the ring
+        :param virtual_nodes: The number of points on the ring per worker
+        """
+        self.workers = workers
+        self._ring = sorted((_hash(f"{worker}-{node}"), worker)
+                            for worker in range(workers) for node in range(virtual_nodes))
+        self._keys = [key for key, _ in self._ring]
+
+    def get_worker(self, user_id):
+        """
+        Gets the worker responsible for a user
+        :param user_id: The twitch user ID
+        :return: The index of the worker
+        """
+        index = bisect.bisect(self._keys, _hash(str(user_id))) % len(self._keys)
+        return self._ring[index][1]
+
+    def partition(self, user_ids):
+        """
+        Splits users into the slices of each worker, with each user in exactly one slice
+        :param user_ids: The twitch user IDs
+        :return: A dict of worker index to the list of user IDs it is responsible for
+        """
+        slices = {}
+        for user_id in dict.fromkeys(user_ids):
+            slices.setdefault(self.get_worker(user_id), []).append(user_id)
+        return slices
+
+
+class StreamPoller:
+    """
+    Polls the live status of streamers, partitioned across worker threads or processes.
+    With no workers, the twitch handler is polled directly as before.
+    """
+
+    def __init__(self, twitch_handler: TwitchAPIHandler, workers=0, mode=POLL_MODE_PROCESS,
+                 client_id=None, client_secret=None):
+        """
+        Initialises local variables
+        :param twitch_handler: The TwitchAPIHandler of the bot process
+        :param workers: The number of poller workers, 0 to poll in the bot process
+        :param mode: POLL_MODE_THREAD or POLL_MODE_PROCESS
+        :param client_id: The twitch client ID, used by worker processes
+        :param client_secret: The twitch client secret, used by worker processes
+        """
+        self.twitch_handler = twitch_handler
+        self.mode = mode
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.ring = HashRing(workers) if workers else None
+        # Each worker has its own single-worker executor so it always polls the same slice
+        self._executors = [self._create_executor() for _ in range(workers)]
+
+    def _create_executor(self):
+        if self.mode == POLL_MODE_PROCESS:
+            return ProcessPoolExecutor(max_workers=1, initializer=_init_worker,
+                                       initargs=(self.client_id, self.client_secret))
+        return ThreadPoolExecutor(max_workers=1)
+
+    async def poll_streams(self, user_ids):
+        """
+        Gets all stream information from a list of given users
+        :param user_ids: The list of twitch user IDs
+        :return: The JSON data of the streams, with no stream included twice,
+            and the set of user IDs whose worker failed so their live status is unknown
+        """
+        loop = asyncio.get_event_loop()
+        if self.ring is None:
+            return await loop.run_in_executor(None, functools.partial(
+                self.twitch_handler.get_streams_data, user_ids=user_ids)), set()
+
+        slices = self.ring.partition(user_ids)
+        futures = []
+        for worker, worker_user_ids in slices.items():
+            if self.mode == POLL_MODE_PROCESS:
+                # Requests made by worker processes count towards the same rate limit
+                self.twitch_handler.record_requests(len(split_to_100s(worker_user_ids)))
+                futures.append(loop.run_in_executor(self._executors[worker], _poll_streams, worker_user_ids))
+            else:
+                futures.append(loop.run_in_executor(self._executors[worker], functools.partial(
+                    self.twitch_handler.get_streams_data, user_ids=worker_user_ids)))
+        results = await asyncio.gather(*futures, return_exceptions=True)
+
+        streams = {}
+        failed = set()
+        for (worker, worker_user_ids), result in zip(slices.items(), results):
+            if isinstance(result, Exception):
+                logger.error(f"TwitchAlert: Poller worker {worker} failed: {result}")
+                failed.update(worker_user_ids)
+                if isinstance(result, BrokenProcessPool):
+                    self._executors[worker] = self._create_executor()
+                continue
+            for stream in result:
+                streams.setdefault(stream.get("id"), stream)
+        return list(streams.values()), failed
+
+    def shutdown(self):
+        """
+        Stops all poller workers
+        """
+        for executor in self._executors:
+            executor.shutdown(wait=False)
+        self._executors = []
+        self.ring = None
@@ -0,0 +1,152 @@
+# Futures
+
+# Built-in/Generic Imports
+import datetime
+from collections import Counter
+
+# Own modules
+from .log import logger
+from .env import TWITCH_POLL_BUDGET
+from .utils import POLL_TIER_LIVE, POLL_TIER_ACTIVE, POLL_TIER_NORMAL, POLL_TIER_DORMANT, POLL_TIER_INTERVALS, \
+    JUST_OFFLINE_WINDOW, DORMANT_AFTER, ACTIVE_HOUR_MIN_DAYS, MAX_POLL_BACKOFF
+
+# Libs
+
+# Constants
+
+# Variables
+
+
+class PollScheduler:
+    """
+    Decides which streamers are polled on each live loop tick. Streamers who are live, have just gone offline,
+    or usually go live around this hour are polled more often than dormant streamers, and every tier
+    backs off while the twitch rate limit headroom is low.
+    """
+
+    def __init__(self, twitch_handler, intervals=None, budget=TWITCH_POLL_BUDGET):
+        """
+        Initialises local variables
+        :param twitch_handler: The TwitchAPIHandler whose rate limit headroom is checked
+        :param intervals: A dict of tier to the number of ticks between polls of a streamer in that tier
+        :param budget: The fraction of the rate limit that can be used before polling backs off
+        """
+        self.twitch_handler = twitch_handler
+        self.intervals = intervals or POLL_TIER_INTERVALS
+        self.budget = budget
+        self.tick = 0
+        self.backoff = 1
+        self.live = set()
+        self.first_seen = {}
+        self.last_live = {}
+        self.offline_at = {}
+        self.last_polled = {}
+        self.live_hours = {}
+        self._recorded_hour = {}
+        self.poll_counts = Counter()
+        self.tick_counts = Counter()
+
+    def get_tier(self, user_id, now):
+        """
+        Gets the polling tier of a streamer
+        :param user_id: The twitch user ID of the streamer
+        :param now: The current UTC time
+        :return: The tier
+        """
+        if user_id in self.live:
+            return POLL_TIER_LIVE
+        offline_at = self.offline_at.get(user_id)
+        if offline_at is not None and now - offline_at < JUST_OFFLINE_WINDOW:
+            return POLL_TIER_ACTIVE
+        live_hours = self.live_hours.get(user_id)
+        if live_hours and (live_hours[now.hour] >= ACTIVE_HOUR_MIN_DAYS
+                           or live_hours[(now.hour + 1) % 24] >= ACTIVE_HOUR_MIN_DAYS):
+            return POLL_TIER_ACTIVE
+        if now - self.last_live.get(user_id, self.first_seen.get(user_id, now)) > DORMANT_AFTER:
+            return POLL_TIER_DORMANT
+        return POLL_TIER_NORMAL
+
+    def _update_backoff(self):
+        """
+        Doubles the backoff while the rate limit headroom is below the budget, and halves it otherwise
+        :return:
+        """
+        if self.twitch_handler.rate_limit_headroom() < 1 - self.budget:
+            if self.backoff < MAX_POLL_BACKOFF:
+                self.backoff *= 2
+                logger.warning(f"TwitchAlert: Twitch rate limit headroom is low, polling {self.backoff}x less often")
+        elif self.backoff > 1:
+            self.backoff //= 2
+
+    def due(self, user_ids, now=None):
+        """
+        Starts a tick, getting the streamers that should be polled in it
+        :param user_ids: The twitch user IDs of every tracked streamer
+        :param now: The current UTC time
+        :return: The list of user IDs to poll
+        """
+        now = now or datetime.datetime.utcnow()
+        self.tick += 1
+        self._update_backoff()
+        self.tick_counts = Counter()
+
+        tracked = set(user_ids)
+        for user_id in self.last_polled.keys() - tracked:
+            self.forget(user_id)
+
+        due = []
+        for user_id in tracked:
+            self.first_seen.setdefault(user_id, now)
+            tier = self.get_tier(user_id, now)
+            last_polled = self.last_polled.get(user_id)
+            if last_polled is None or self.tick - last_polled >= self.intervals[tier] * self.backoff:
+                self.last_polled[user_id] = self.tick
+                self.tick_counts[tier] += 1
+                due.append(user_id)
+        self.poll_counts.update(self.tick_counts)
+        return due
+
+    def update(self, live_user_ids, offline_user_ids, now=None):
+        """
+        Records the result of polling streamers
+        :param live_user_ids: The twitch user IDs of polled streamers that are live
+        :param offline_user_ids: The twitch user IDs of polled streamers that are offline
+        :param now: The current UTC time
+        :return:
+        """
+        now = now or datetime.datetime.utcnow()
+        for user_id in live_user_ids:
+            self.live.add(user_id)
+            self.last_live[user_id] = now
+            # Each hour is only counted once a day, so the count is the number of days live at that hour
+            if self._recorded_hour.get(user_id) != (now.date(), now.hour):
+                self._recorded_hour[user_id] = (now.date(), now.hour)
+                self.live_hours.setdefault(user_id, Counter())[now.hour] += 1
+        for user_id in offline_user_ids:
+            if user_id in self.live:
+                self.live.discard(user_id)
+                self.offline_at[user_id] = now
+
+    def forget(self, user_id):
+        """
+        Removes a streamer that is no longer tracked
+        :param user_id: The twitch user ID of the streamer
+        :return:
+        """
+        self.live.discard(user_id)
+        for history in (self.first_seen, self.last_live, self.offline_at, self.last_polled,
+                        self.live_hours, self._recorded_hour):
+            history.pop(user_id, None)
+
+    def metrics(self, now=None):
+        """
+        Gets the polling metrics of this scheduler
+        :param now: The current UTC time
+        :return: A dict of the metrics
+        """
+        now = now or datetime.datetime.utcnow()
+        return {"tick": self.tick,
+                "backoff": self.backoff,
+                "streamers": dict(Counter(self.get_tier(user_id, now) for user_id in self.last_polled)),
+                "last_tick_polls": dict(self.tick_counts),
+                "total_polls": dict(self.poll_counts)}
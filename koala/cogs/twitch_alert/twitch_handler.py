@@ -1,13 +1,18 @@
 # Futures
 
 # Built-in/Generic Imports
+import time
+from collections import deque
 
 # Own modules
-from .utils import split_to_100s
+from .utils import split_to_100s, RATE_LIMIT_WINDOW, TWITCH_REQUEST_TIMEOUT
 from .log import logger
+from .env import TWITCH_RATE_LIMIT
 
 # Libs
+import requests
 from twitchAPI.twitch import Twitch
+from twitchAPI.helper import TWITCH_API_BASE_URL
 from twitchAPI.types import TwitchAPIException
 
 # Constants
@@ -20,26 +25,61 @@ class TwitchAPIHandler:
     A wrapper to interact with the twitch API
     """
 
-    def __init__(self, client_id: str, client_secret: str):
+    def __init__(self, client_id: str, client_secret: str, rate_limit=TWITCH_RATE_LIMIT):
+        """
+        Initialises local variables
+        :param client_id: The twitch client ID
+        :param client_secret: The twitch client secret
+        :param rate_limit: The number of requests twitch allows per minute
+        """
         self.twitch = Twitch(client_id, client_secret)
+        self.rate_limit = rate_limit
+        self._requests = deque()
+
+    def record_requests(self, count=1):
+        """
+        Records requests made to the twitch API, so the rate limit headroom can be estimated
+        :param count: The number of requests made
+        :return:
+        """
+        now = time.time()
+        self._requests.extend([now] * count)
 
-    def get_streams_data(self, usernames):
+    def rate_limit_headroom(self):
+        """
+        Estimates how much of the rate limit is unused, from the requests made in the last minute
+        :return: The fraction of the rate limit remaining, from 0 to 1
         """
-        Gets all stream information from a list of given usernames
+        window_start = time.time() - RATE_LIMIT_WINDOW
+        while self._requests and self._requests[0] < window_start:
+            self._requests.popleft()
+        return max(0.0, 1 - len(self._requests) / self.rate_limit)
+
+    def get_streams_data(self, usernames=None, user_ids=None):
+        """
+        Gets all stream information from a list of given usernames or user IDs
         :param usernames: The list of usernames
+        :param user_ids: The list of unique twitch user IDs
         :return: The JSON data of the request
         """
+        if user_ids:
+            key, values = "user_id", user_ids
+        else:
+            key, values = "user_login", usernames or []
+
         result = []
-        batches = split_to_100s(usernames)
+        batches = split_to_100s(values)
         for batch in batches:
             batch_result = []
             try:
-                batch_result.extend(self.twitch.get_streams(user_login=batch).get("data"))
+                self.record_requests()
+                batch_result.extend(self.twitch.get_streams(first=100, **{key: batch}).get("data"))
             except TwitchAPIException:
                 logger.error(f"Streams data not received for batch, invalid request")
                 for user in batch:
                     try:
-                        batch_result.extend(self.twitch.get_streams(user_login=user).get("data"))
+                        self.record_requests()
+                        batch_result.extend(self.twitch.get_streams(**{key: [user]}).get("data"))
                     except TwitchAPIException:
                         logger.error("User data cannot be found, invalid request")
 
@@ -60,12 +100,14 @@ class TwitchAPIHandler:
         if usernames:
             user_list = split_to_100s(usernames)
             for u_batch in user_list:
+                self.record_requests()
                 result += self.twitch.get_users(logins=u_batch).get("data")
 
         if ids:
             id_list = split_to_100s(ids)
             for id_batch in id_list:
-                result += self.twitch.get_users(logins=id_batch).get("data")
+                self.record_requests()
+                result += self.twitch.get_users(user_ids=id_batch).get("data")
 
         return result
 
@@ -76,6 +118,7 @@ class TwitchAPIHandler:
         :return: The JSON information of the game's data
         """
         if game_id != "":
+            self.record_requests()
             game_data = self.twitch.get_games(game_ids=game_id)
             return game_data.get("data")[0]
         else:
@@ -95,5 +138,71 @@ class TwitchAPIHandler:
         :param team_id: The team name of the twitch team
         :return: the JSON information of the users
         """
+        self.record_requests()
         a = self.twitch.get_teams(name=team_id)
         return a.get("data")[0]
+
+    def get_eventsub_subscriptions(self):
+        """
+        Gets every EventSub subscription of this application, following pagination
+        :return: The JSON data of the subscriptions
+        """
+        result = []
+        cursor = None
+        while True:
+            self.record_requests()
+            page = self.twitch.get_eventsub_subscriptions(after=cursor)
+            result.extend(page.get("data", []))
+            cursor = page.get("pagination", {}).get("cursor")
+            if not cursor:
+                return result
+
+    def get_app_headers(self):
+        """
+        Gets the headers of a request to the Twitch API with the app's access token
+        :return: dict of headers
+        """
+        return {
+            'Client-ID': self.twitch.app_id,
+            'Content-Type': 'application/json',
+            'Authorization': f'Bearer {self.twitch.get_app_token()}'
+        }
+
+    def create_eventsub_subscription(self, sub_type, broadcaster_id, callback_url, secret):
+        """
+        Creates a webhook EventSub subscription for a given broadcaster
+        :param sub_type: The EventSub subscription type (e.g. stream.online)
+        :param broadcaster_id: The unique twitch id of the broadcaster
+        :param callback_url: The public url Twitch will send notifications to
+        :param secret: The secret used by Twitch to sign notifications
+        :return: The JSON data of the created subscription
+        :raises: TwitchAPIException if the subscription could not be created
+        """
+        data = {
+            'type': sub_type,
+            'version': '1',
+            'condition': {'broadcaster_user_id': str(broadcaster_id)},
+            'transport': {
+                'method': 'webhook',
+                'callback': callback_url,
+                'secret': secret
+            }
+        }
+        self.record_requests()
+        response = requests.post(TWITCH_API_BASE_URL + 'eventsub/subscriptions', headers=self.get_app_headers(),
+                                 json=data, timeout=TWITCH_REQUEST_TIMEOUT)
+        result = response.json()
+        if response.status_code >= 400 or not result.get("data"):
+            raise TwitchAPIException(result.get("message", f"EventSub subscription failed ({response.status_code})"))
+        return result.get("data")[0]
+
+    def delete_eventsub_subscription(self, subscription_id):
+        """
+        Deletes an EventSub subscription
+        :param subscription_id: The id of the subscription
+        :return: True if deleted
+        """
+        self.record_requests()
+        response = requests.delete(TWITCH_API_BASE_URL + 'eventsub/subscriptions', headers=self.get_app_headers(),
+                                   params={'id': subscription_id}, timeout=TWITCH_REQUEST_TIMEOUT)
+        return response.status_code == 204
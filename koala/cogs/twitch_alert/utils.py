@@ -1,6 +1,7 @@
 # Futures
 
 # Built-in/Generic Imports
+import datetime
 
 # Libs
 import discord
@@ -17,6 +18,31 @@ TWITCH_USERNAME_REGEX = "^[a-z0-9][a-z0-9_-]{3,24}$"
 LOOP_CHECK_LIVE_DELAY = 1
 TEAMS_LOOP_CHECK_LIVE_DELAY = 1
 REFRESH_TEAMS_DELAY = 5
+EVENTSUB_RECONCILE_DELAY = 10
+TEAMS_REFRESH_CONCURRENCY = 5
+TWITCH_REQUEST_TIMEOUT = 10
+
+DELIVERY_CONCURRENCY = 20
+DELIVERY_CHANNEL_CONCURRENCY = 2
+DELIVERY_RETRIES = 3
+DELIVERY_BACKOFF = 1
+
+POLL_TIER_LIVE = "live"
+POLL_TIER_ACTIVE = "active"
+POLL_TIER_NORMAL = "normal"
+POLL_TIER_DORMANT = "dormant"
+# Number of live loop ticks between polls of a streamer in each tier
+POLL_INTERVAL_LIVE = 1
+POLL_INTERVAL_ACTIVE = 1
+POLL_INTERVAL_NORMAL = 2
+POLL_INTERVAL_DORMANT = 10
+POLL_TIER_INTERVALS = {POLL_TIER_LIVE: POLL_INTERVAL_LIVE, POLL_TIER_ACTIVE: POLL_INTERVAL_ACTIVE,
+                       POLL_TIER_NORMAL: POLL_INTERVAL_NORMAL, POLL_TIER_DORMANT: POLL_INTERVAL_DORMANT}
+JUST_OFFLINE_WINDOW = datetime.timedelta(minutes=30)
+DORMANT_AFTER = datetime.timedelta(days=7)
+ACTIVE_HOUR_MIN_DAYS = 2
+MAX_POLL_BACKOFF = 8
+RATE_LIMIT_WINDOW = 60
 
 # Variables
 
@@ -1,2 +1,9 @@
-from . import utils, db, log, models
-from .cog import Voting, setup
+from . import utils, db, log, models, api
+from . import cog
+from .cog import Voting
+
+
+def setup(bot):
+    cog.setup(bot)
+    if bot.get_cog("Vote") is not None:
+        api.setup(bot)
@@ -0,0 +1,148 @@
+# Futures
+# Built-in/Generic Imports
+import json
+
+# Libs
+from aiohttp import web
+from discord.ext.commands import Bot
+
+# Own modules
+from koala.db import extension_enabled
+from koala.rest.api import parse_request
+from .log import logger
+from .utils import VOTE_RESULTS_STREAM_HEARTBEAT
+
+# Constants
+VOTE_ENDPOINT = 'vote'
+RESULTS_ENDPOINT = 'results'  # GET
+RESULTS_STREAM_ENDPOINT = 'results/stream'  # GET
+
+# Variables
+
+
+def get_tally(vote):
+    """
+    Gets the current tally of a vote
+    :param vote: the vote
+    :return: dict of the vote and the count of each of its options
+    """
+    return {"vote_id": vote.id, "guild_id": vote.guild, "title": vote.title, "end_time": vote.end_time,
+            "sent_to": len(vote.sent_to),
+            "options": [{"opt_id": option.id, "head": option.head, "body": option.body,
+                         "count": vote.tally.get(option.id, 0)} for option in vote.options]}
+
+
+def get_tally_changes(vote, changes):
+    """
+    Gets changes to the tally of a vote, with the current count of each option that changed
+    :param vote: the vote
+    :param changes: dict of option id to change in count
+    :return: dict of the vote and the changed options
+    """
+    return {"vote_id": vote.id,
+            "changes": [{"opt_id": opt_id, "change": change, "count": vote.tally.get(opt_id, 0)}
+                        for opt_id, change in changes.items()]}
+
+
+def format_event(event, data):
+    """
+    Formats a server-sent event
+    :param event: the name of the event
+    :param data: the data of the event, which is sent as JSON
+    :return: the event as bytes
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+class VoteEndpoint:
+    """
+    The API endpoints for Vote
+    """
+    def __init__(self, bot):
+        self._bot = bot
+
+    def register(self, app):
+        """
+        Register the routes for the given application
+        :param app: The aiohttp.web.Application (likely of the sub app)
+        :return: app
+        """
+        app.add_routes([web.get('/{endpoint}'.format(endpoint=RESULTS_ENDPOINT), self.get_results),
+                        web.get('/{endpoint}'.format(endpoint=RESULTS_STREAM_ENDPOINT), self.get_results_stream)])
+        return app
+
+    def get_sent_vote(self, guild_id, vote_id):
+        """
+        Gets a sent vote of a guild, from the arguments of a request
+        :param guild_id: The ID of the guild
+        :param vote_id: The ID of the vote
+        :return: The vote
+        """
+        vote_cog = self._bot.get_cog("Vote")
+        if vote_cog is None:
+            raise web.HTTPNotFound(reason="Vote is not loaded")
+        if not guild_id.isdigit() or not vote_id.isdigit():
+            raise web.HTTPBadRequest(reason="guild_id and vote_id must be IDs")
+        if not extension_enabled(int(guild_id), "Vote"):
+            raise web.HTTPForbidden(reason="Vote is not enabled in this guild")
+        vote = vote_cog.vote_manager.sent_votes.get(int(vote_id))
+        if vote is None or vote.guild != int(guild_id):
+            raise web.HTTPNotFound(reason="Vote not found")
+        return vote
+
+    @parse_request
+    async def get_results(self, guild_id, vote_id):
+        """
+        Get the current tally of a sent vote, without fetching any vote messages
+        :param guild_id: The ID of the guild
+        :param vote_id: The ID of the vote
+        :return: The vote and the count of each of its options
+        """
+        return get_tally(self.get_sent_vote(guild_id, vote_id))
+
+    async def get_results_stream(self, request):
+        """
+        Stream the tally of a sent vote as server-sent events. A 'tally' event with the whole tally is sent first,
+        then a 'delta' event whenever reactions change it, and an 'end' event once the vote is closed. A 'tally'
+        event is sent again if the results are audited.
+        :param request: The request, with the guild_id and vote_id arguments
+        :return: The event stream
+        """
+        unsatisfied_args = {"guild_id", "vote_id"} - set(request.query.keys())
+        if unsatisfied_args:
+            raise web.HTTPBadRequest(reason="Unsatisfied Arguments: %s" % unsatisfied_args)
+        vote = self.get_sent_vote(request.query["guild_id"], request.query["vote_id"])
+        tally_feed = self._bot.get_cog("Vote").vote_manager.tally_feed
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+        subscription = tally_feed.subscribe(vote.id)
+        try:
+            await response.write(format_event("tally", get_tally(vote)))
+            while not subscription.closed:
+                changes = await subscription.get_changes(VOTE_RESULTS_STREAM_HEARTBEAT)
+                if changes is None:
+                    await response.write(format_event("tally", get_tally(vote)))
+                elif changes:
+                    await response.write(format_event("delta", get_tally_changes(vote, changes)))
+                elif not subscription.closed:
+                    # Comments keep proxies from closing an idle stream
+                    await response.write(b": keep-alive\n\n")
+            await response.write(format_event("end", {"vote_id": vote.id}))
+        except ConnectionResetError:
+            logger.debug(f"Results stream of vote {vote.id} was closed by the client")
+        finally:
+            tally_feed.unsubscribe(subscription)
+        return response
+
+
+def setup(bot: Bot):
+    """
+    Load this cog to the KoalaBot.
+    :param bot: the bot client for KoalaBot
+    """
+    sub_app = web.Application()
+    endpoint = VoteEndpoint(bot)
+    endpoint.register(sub_app)
+    getattr(bot, "koala_web_app").add_subapp('/{extension}'.format(extension=VOTE_ENDPOINT), sub_app)
+    logger.info("Vote API is ready.")
@@ -5,22 +5,26 @@ Koala Bot Vote Cog code and additional base cog functions
 Commented using reStructuredText (reST)
 """
 # Built-in/Generic Imports
+import asyncio
 import time
 
 # Libs
 import discord
 import parsedatetime.parsedatetime
-from discord.ext import commands, tasks
-from sqlalchemy import select, delete, update
+from discord.ext import commands
+from sqlalchemy import select
 
 # Own modules
 import koalabot
 from koala.db import session_manager, insert_extension
-from .db import VoteManager, get_results, create_embed, add_reactions
+from .delivery import VoteDelivery
+from .db import VoteManager, get_results, audit_results, create_embed, add_reactions
 from .log import logger
+from .message_updates import VoteMessageUpdater
 from .models import Votes
 from .option import Option
-from .utils import make_result_embed
+from .scheduler import VoteEndScheduler
+from .utils import make_result_embed, VOTE_END_RETRY_DELAY
 
 
 # Constants
@@ -76,65 +80,82 @@ class Voting(commands.Cog, name="Vote"):
         """
         self.bot = bot
         insert_extension("Vote", 0, True, True)
-        self.vote_manager = VoteManager()
+        self.vote_manager = VoteManager(VoteEndScheduler(self.end_vote))
         self.vote_manager.load_from_db()
-        self.running = False
+        self.deliveries = {}
+        self.vote_message_updater = VoteMessageUpdater(bot, self.vote_manager)
 
     @commands.Cog.listener()
     async def on_ready(self):
-        if not self.running:
-            self.vote_end_loop.start()
-            self.running = True
+        if not self.vote_manager.end_scheduler.running:
+            self.vote_manager.end_scheduler.start()
+        for v_id in self.vote_manager.delivering_votes:
+            if v_id not in self.deliveries:
+                self.start_delivery(self.vote_manager.get_vote_from_id(v_id))
+
+    def start_delivery(self, vote, progress_message=None):
+        """
+        Sends a vote to the users it's yet to be delivered to in the background
+        :param vote: the vote to deliver
+        :param progress_message: the message to report progress in, found from the stored delivery if not given
+        :return: the task delivering the vote
+        """
+        def finished(task):
+            self.deliveries.pop(vote.id, None)
+            if not task.cancelled() and task.exception():
+                logger.error(f"error delivering vote {vote.id}", exc_info=task.exception())
+
+        task = asyncio.ensure_future(VoteDelivery(self.bot, self.vote_manager, vote, progress_message).run())
+        self.deliveries[vote.id] = task
+        task.add_done_callback(finished)
+        return task
 
     def cog_unload(self):
-        self.vote_end_loop.cancel()
-        self.running = False
+        self.vote_manager.end_scheduler.stop()
 
-    @tasks.loop(seconds=60.0)
-    async def vote_end_loop(self):
+    async def end_vote(self, v_id):
+        """
+        Closes a sent vote that has reached its end time, and sends the results to the chair, author or guild owner
+        If the results can't be sent, the vote is tried again a day later
+        A vote still being delivered isn't sent to anyone else, so the results are of the users who were sent it
+        :param v_id: id of the vote
+        """
+        if v_id not in self.vote_manager.sent_votes.keys():
+            return
+        vote = self.vote_manager.get_vote_from_id(v_id)
+        delivery = self.deliveries.get(v_id)
+        if delivery is not None:
+            delivery.cancel()
+            await asyncio.gather(delivery, return_exceptions=True)
+        if v_id in self.vote_manager.delivering_votes:
+            self.vote_manager.finish_delivery(vote)
+        title = vote.title
+        results = get_results(vote)
+        embed = await make_result_embed(vote, results)
         try:
-            with session_manager() as session:
-                now = time.time()
-                votes = session.execute(select(Votes.vote_id, Votes.author_id, Votes.guild_id, Votes.title, Votes.end_time)
-                                        .where(Votes.end_time < now)).all()
-                for v_id, a_id, g_id, title, end_time in votes:
-                    if v_id in self.vote_manager.sent_votes.keys():
-                        vote = self.vote_manager.get_vote_from_id(v_id)
-                        results = await get_results(self.bot, vote)
-                        embed = await make_result_embed(vote, results)
-                        try:
-                            if vote.chair:
-                                try:
-                                    chair = await self.bot.fetch_user(vote.chair)
-                                    await chair.send(f"Your vote {title} has closed")
-                                    await chair.send(embed=embed)
-                                except discord.Forbidden:
-                                    user = await self.bot.fetch_user(vote.author)
-                                    await user.send(f"Your vote {title} has closed")
-                                    await user.send(embed=embed)
-                            else:
-                                try:
-                                    user = await self.bot.fetch_user(vote.author)
-                                    await user.send(f"Your vote {title} has closed")
-                                    await user.send(embed=embed)
-                                except discord.Forbidden:
-                                    guild = await self.bot.fetch_guild(vote.guild)
-                                    user = await self.bot.fetch_user(guild.owner_id)
-                                    await user.send(f"A vote in your guild titled {title} has closed and the chair is unavailable.")
-                                    await user.send(embed=embed)
-                            session.execute(delete(Votes).filter_by(vote_id=vote.id))
-                            session.commit()
-                            self.vote_manager.cancel_sent_vote(vote.id)
-                        except Exception as e:
-                            session.execute(update(Votes).filter_by(vote_id=vote.id).values(end_time=time.time() + 86400))
-                            session.commit()
-                            logger.error(f"error in vote loop: {e}")
+            if vote.chair:
+                try:
+                    chair = await self.bot.fetch_user(vote.chair)
+                    await chair.send(f"Your vote {title} has closed")
+                    await chair.send(embed=embed)
+                except discord.Forbidden:
+                    user = await self.bot.fetch_user(vote.author)
+                    await user.send(f"Your vote {title} has closed")
+                    await user.send(embed=embed)
+            else:
+                try:
+                    user = await self.bot.fetch_user(vote.author)
+                    await user.send(f"Your vote {title} has closed")
+                    await user.send(embed=embed)
+                except discord.Forbidden:
+                    guild = await self.bot.fetch_guild(vote.guild)
+                    user = await self.bot.fetch_user(guild.owner_id)
+                    await user.send(f"A vote in your guild titled {title} has closed and the chair is unavailable.")
+                    await user.send(embed=embed)
+            self.vote_manager.cancel_sent_vote(vote.id)
         except Exception as e:
-            logger.error("Exception in outer vote loop: %s" % e, exc_info=e)
-
-    @vote_end_loop.before_loop
-    async def before_vote_loop(self):
-        await self.bot.wait_until_ready()
+            self.vote_manager.set_end_time(vote, time.time() + VOTE_END_RETRY_DELAY)
+            logger.error(f"error ending vote: {e}")
 
     @commands.Cog.listener()
     async def on_raw_reaction_add(self, payload):
@@ -142,7 +163,9 @@ class Voting(commands.Cog, name="Vote"):
         Listens for when a reaction is added to a message
         :param payload: payload of data about the reaction
         """
-        await self.update_vote_message(payload.message_id, payload.user_id)
+        vote = self.vote_manager.record_reaction(payload.message_id, payload.user_id, str(payload.emoji), True)
+        if vote:
+            self.vote_message_updater.queue(vote, payload.user_id, payload.channel_id, payload.message_id)
 
     @commands.Cog.listener()
     async def on_raw_reaction_remove(self, payload):
@@ -150,7 +173,9 @@ class Voting(commands.Cog, name="Vote"):
         Listens for when a reaction is removed from a message
         :param payload: payload of data about the reaction
         """
-        await self.update_vote_message(payload.message_id, payload.user_id)
+        vote = self.vote_manager.record_reaction(payload.message_id, payload.user_id, str(payload.emoji), False)
+        if vote:
+            self.vote_message_updater.queue(vote, payload.user_id, payload.channel_id, payload.message_id)
 
     @commands.check(koalabot.is_admin)
     @commands.check(vote_is_enabled)
@@ -308,7 +333,7 @@ class Voting(commands.Cog, name="Vote"):
         # if (end_time - now) < 599:
         #     await ctx.send("Please set the end time to be at least 10 minutes in the future.")
         #     return
-        vote.set_end_time(end_time)
+        self.vote_manager.set_end_time(vote, end_time)
         await ctx.send(f"Vote set to end at {time.strftime('%Y-%m-%d %H:%M:%S', end_time_readable)} UTC")
 
     @currently_configuring()
@@ -366,9 +391,6 @@ class Voting(commands.Cog, name="Vote"):
             await ctx.send("Please add more than 1 option to vote for")
             return
 
-        self.vote_manager.configuring_votes.pop(ctx.author.id)
-        self.vote_manager.sent_votes[vote.id] = vote
-
         users = [x for x in ctx.guild.members if not x.bot]
         if vote.target_voice_channel:
             vc_users = discord.utils.get(ctx.guild.voice_channels, id=vote.target_voice_channel).members
@@ -380,14 +402,10 @@ class Voting(commands.Cog, name="Vote"):
                 role_users += role.members
             role_users = list(dict.fromkeys(role_users))
             users = list(set(role_users) & set(users))
-        for user in users:
-            try:
-                msg = await user.send(f"You have been asked to participate in this vote from {ctx.guild.name}.\nPlease react to make your choice (You can change your mind until the vote is closed)", embed=create_embed(vote))
-                vote.register_sent(user.id, msg.id)
-                await add_reactions(vote, msg)
-            except discord.Forbidden:
-                logger.error(f"tried to send vote to user {user.id} but direct messages are turned off.")
-        await ctx.send(f"Sent vote to {len(users)} users")
+        progress = await ctx.send(f"Sending vote to {len(users)} users")
+        vote = self.vote_manager.start_delivery(ctx.author.id, [user.id for user in users], ctx.channel.id,
+                                                progress.id)
+        self.start_delivery(vote, progress)
 
     @commands.check(vote_is_enabled)
     @has_current_votes()
@@ -405,7 +423,7 @@ class Voting(commands.Cog, name="Vote"):
             return
 
         vote = self.vote_manager.get_vote_from_id(vote_id)
-        results = await get_results(self.bot, vote)
+        results = get_results(vote)
         self.vote_manager.cancel_sent_vote(vote.id)
         embed = await make_result_embed(vote, results)
         if vote.chair:
@@ -436,31 +454,30 @@ class Voting(commands.Cog, name="Vote"):
             return
 
         vote = self.vote_manager.get_vote_from_id(vote_id)
-        results = await get_results(self.bot, vote)
+        results = get_results(vote)
         embed = await make_result_embed(vote, results)
         await ctx.send(embed=embed)
 
-    async def update_vote_message(self, message_id, user_id):
-        """
-        Updates the vote message with the currently selected option
-        :param message_id: id of the message that was reacted on
-        :param user_id: id of the user who reacted
-        """
-        vote = self.vote_manager.was_sent_to(message_id)
-        user = self.bot.get_user(user_id)
-        if vote and not user.bot:
-            msg = await user.fetch_message(message_id)
-            embed = msg.embeds[0]
-            choice = None
-            for reaction in msg.reactions:
-                if reaction.count > 1:
-                    choice = reaction
-                    break
-            if choice:
-                embed.set_footer(text=f"You will be voting for {choice.emoji} - {vote.options[VoteManager.emote_reference[choice.emoji]].head}")
-            else:
-                embed.set_footer(text="There are no valid choices selected")
-            await msg.edit(embed=embed)
+    @commands.check(vote_is_enabled)
+    @has_current_votes()
+    @vote.command(name="auditResults")
+    async def audit_vote_results(self, ctx, *, title):
+        """
+        Checks the results of a vote against the reactions on every message it was sent in, then shows them
+        This is slow for large votes, use it if reactions may have been missed while the bot was offline
+        """
+        vote_id = self.vote_manager.vote_lookup[(ctx.author.id, title)]
+        if vote_id not in self.vote_manager.sent_votes.keys():
+            await ctx.send("You have no sent votes of that title to audit")
+            return
+
+        vote = self.vote_manager.get_vote_from_id(vote_id)
+        await ctx.send(f"Auditing {len(vote.sent_to)} vote messages. This may take a while.")
+        corrected = await audit_results(self.bot, vote)
+        if corrected:
+            self.vote_manager.tally_feed.reset(vote.id)
+        embed = await make_result_embed(vote, get_results(vote))
+        await ctx.send(f"Corrected the choices of {corrected} users", embed=embed)
 
 
 def setup(bot: koalabot) -> None:
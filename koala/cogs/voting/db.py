@@ -5,20 +5,22 @@ Koala Bot Vote Cog code and additional base cog functions
 Commented using reStructuredText (reST)
 """
 # Built-in/Generic Imports
-from random import randint
+from collections import defaultdict
 
 # Libs
 import discord
-from sqlalchemy import select, delete
+from sqlalchemy import select, delete, insert, update, func
 
 # Own modules
 from koala.db import session_manager
 from .log import logger
-from .models import Votes, VoteTargetRoles, VoteOptions, VoteSent
+from .models import Votes, VoteTargetRoles, VoteOptions, VoteSent, VoteChoices, VoteDeliveries, VoteRecipients
 from .option import Option
+from .scheduler import VoteEndScheduler
+from .tally_feed import VoteTallyFeed
 from .two_way import TwoWay
 from .vote import Vote
-from .utils import MAX_ID_VALUE, MIN_ID_VALUE
+from .utils import IdGenerator
 
 # Constants
 
@@ -47,89 +49,124 @@ def create_embed(vote):
     return embed
 
 
-async def get_results(bot, vote):
+def get_results(vote):
     """
-    Gathers the results from all users who were sent the vote
+    Gets the results of a vote from the choices recorded as users reacted
     :param vote: the vote object
-    :param bot: the discord.commands.Bot that sent out the vote messages
     :return: dict of results
     """
-    results = {}
-    for u_id, msg_id in vote.sent_to.items():
+    return vote.get_results()
+
+
+async def audit_results(bot, vote):
+    """
+    Corrects the recorded choices of a vote from the reactions on every message it was sent in, e.g. for reactions
+    made while the bot was offline. Messages are fetched one at a time, so this is slow for large votes.
+    :param bot: the discord.commands.Bot that sent out the vote messages
+    :param vote: the vote object
+    :return: the number of users whose choices were corrected
+    """
+    corrected = 0
+    for u_id, msg_id in list(vote.sent_to.items()):
         user = bot.get_user(u_id)
-        if user:
-            msg = await user.fetch_message(msg_id)
-            for reaction in msg.reactions:
-                if reaction.count > 1:
-                    opt = vote.options[VoteManager.emote_reference[reaction.emoji]]
-                    if opt in results.keys():
-                        results[opt] += 1
-                    else:
-                        results[opt] = 1
-                    break
-        else:
+        if not user:
             logger.error("User %s not found for msg_id: %s" % (u_id, msg_id))
-    return results
+            continue
+        try:
+            msg = await user.fetch_message(msg_id)
+        except discord.HTTPException as e:
+            logger.error("Couldn't fetch msg_id %s for user %s: %s" % (msg_id, u_id, e))
+            continue
+        chosen = set()
+        for reaction in msg.reactions:
+            option = VoteManager.get_option(vote, str(reaction.emoji))
+            if option and reaction.count > 1:
+                chosen.add(option.id)
+        if vote.set_choices(u_id, chosen):
+            corrected += 1
+    return corrected
 
 
 class VoteManager:
-    def __init__(self):
+    def __init__(self, end_scheduler=None):
         """
         Manages votes for the bot
+        :param end_scheduler: the VoteEndScheduler ending sent votes at their end time
         """
+        self.end_scheduler = end_scheduler or VoteEndScheduler()
         self.configuring_votes = {}
         self.sent_votes = {}
         self.vote_lookup = {}
+        # message id -> the sent vote the message is for
+        self.message_votes = {}
+        # ids of sent votes still being delivered
+        self.delivering_votes = set()
+        self.id_generator = IdGenerator()
+        self.tally_feed = VoteTallyFeed()
 
     emote_reference = TwoWay({0: "1️⃣", 1: "2️⃣", 2: "3️⃣",
                               3: "4️⃣", 4: "5️⃣", 5: "6️⃣",
                               6: "7️⃣", 7: "8️⃣", 8: "9️⃣", 9: "🔟"})
 
     def generate_unique_opt_id(self):
-        with session_manager() as session:
-            used_ids = session.execute(select(VoteOptions.opt_id)).all()
-            return self.gen_id(len(used_ids) > (MAX_ID_VALUE - MIN_ID_VALUE))
+        """
+        Generates an id for a new option
+        :return: the option id
+        """
+        return self.id_generator.next_id()
 
     def gen_vote_id(self):
-        return self.gen_id(len(self.configuring_votes.keys()) == (MAX_ID_VALUE - MIN_ID_VALUE))
-
-    def gen_id(self, cond):
-        if cond:
-            return None
-        while True:
-            temp_id = randint(MIN_ID_VALUE, MAX_ID_VALUE)
-            if temp_id not in self.configuring_votes.keys():
-                return temp_id
+        """
+        Generates an id for a new vote
+        :return: the vote id
+        """
+        return self.id_generator.next_id()
 
     def load_from_db(self):
+        """
+        Loads every vote from the database, with one query per table
+        :return: None
+        """
         with session_manager() as session:
-            existing_votes = session.execute(select(Votes.vote_id, Votes.author_id, Votes.guild_id,
-                                                    Votes.title, Votes.chair_id, Votes.voice_id, Votes.end_time)).all()
-            for v_id, a_id, g_id, title, chair_id, voice_id, end_time in existing_votes:
-                vote = Vote(v_id, title, a_id, g_id)
-                vote.set_chair(chair_id)
-                vote.set_vc(voice_id)
-                self.vote_lookup[(a_id, title)] = v_id
-
-                target_roles = session.execute(select(VoteTargetRoles.role_id).filter_by(vote_id=v_id)).all()
-                if target_roles:
-                    for r_id in target_roles:
-                        vote.add_role(r_id[0])
-
-                options = session.execute(select(VoteOptions.opt_id, VoteOptions.option_title,
-                                                 VoteOptions.option_desc).filter_by(vote_id=v_id)).all()
-                if options:
-                    for o_id, o_title, o_desc in options:
-                        vote.add_option(Option(o_title, o_desc, opt_id=o_id))
-
-                delivered = session.execute(select(VoteSent.vote_receiver_id, VoteSent.vote_receiver_message)
-                                            .filter_by(vote_id=v_id)).all()
-                if delivered:
-                    self.sent_votes[v_id] = vote
-                    for rec_id, msg_id in delivered:
-                        vote.register_sent(rec_id, msg_id)
-                else:
-                    self.configuring_votes[a_id] = vote
+            # Rows are read through the connection, as ORM result processing dominates with many recipients
+            connection = session.connection()
+            existing_votes = connection.execute(select(Votes.vote_id, Votes.author_id, Votes.guild_id,
+                                                       Votes.title, Votes.chair_id, Votes.voice_id, Votes.end_time)).all()
+            target_roles = defaultdict(list)
+            for v_id, r_id in connection.execute(select(VoteTargetRoles.vote_id, VoteTargetRoles.role_id)):
+                target_roles[v_id].append(r_id)
+            options = defaultdict(list)
+            for v_id, o_id, o_title, o_desc in connection.execute(
+                    select(VoteOptions.vote_id, VoteOptions.opt_id, VoteOptions.option_title, VoteOptions.option_desc)
+                    .order_by(VoteOptions.vote_id, VoteOptions.opt_id)):
+                options[v_id].append(Option(o_title, o_desc, opt_id=o_id))
+            delivered = defaultdict(dict)
+            for v_id, rec_id, msg_id in connection.execute(
+                    select(VoteSent.vote_id, VoteSent.vote_receiver_id, VoteSent.vote_receiver_message)):
+                delivered[v_id][rec_id] = msg_id
+            choices = defaultdict(list)
+            for v_id, voter_id, opt_id in connection.execute(
+                    select(VoteChoices.vote_id, VoteChoices.voter_id, VoteChoices.opt_id)):
+                choices[v_id].append((voter_id, opt_id))
+            deliveries = set(connection.execute(select(VoteDeliveries.vote_id)).scalars())
+
+        for v_id, a_id, g_id, title, chair_id, voice_id, end_time in existing_votes:
+            self.id_generator.seen(v_id)
+            for option in options.get(v_id, []):
+                self.id_generator.seen(option.id)
+            vote = Vote(v_id, title, a_id, g_id)
+            vote.hydrate(chair_id, voice_id, end_time, target_roles.get(v_id, []), options.get(v_id, []),
+                         delivered.get(v_id, {}), choices.get(v_id, []))
+            self.vote_lookup[(a_id, title)] = v_id
+            if vote.sent_to or v_id in deliveries:
+                self.sent_votes[v_id] = vote
+                self.message_votes.update(dict.fromkeys(vote.sent_to.values(), vote))
+                if end_time is not None:
+                    self.end_scheduler.schedule(v_id, end_time)
+                if v_id in deliveries:
+                    self.delivering_votes.add(v_id)
+            else:
+                self.configuring_votes[a_id] = vote
 
     def get_vote_from_id(self, v_id):
         """
@@ -168,6 +205,108 @@ class VoteManager:
             session.commit()
             return vote
 
+    def mark_sent(self, author_id):
+        """
+        Moves a user's configuring vote to the sent votes, so it ends at its end time
+        :param author_id: id of the author of the vote
+        :return: the vote
+        """
+        vote = self.configuring_votes.pop(author_id)
+        self.sent_votes[vote.id] = vote
+        if vote.end_time is not None:
+            self.end_scheduler.schedule(vote.id, vote.end_time)
+        return vote
+
+    def start_delivery(self, author_id, recipient_ids, channel_id, progress_message_id=None):
+        """
+        Marks a user's configuring vote as sent, and stores who it's to be delivered to so delivery can be resumed
+        :param author_id: id of the author of the vote
+        :param recipient_ids: ids of the users to send the vote to
+        :param channel_id: id of the channel delivery progress is reported in
+        :param progress_message_id: id of the message delivery progress is reported in
+        :return: the vote
+        """
+        with session_manager() as session:
+            vote = self.mark_sent(author_id)
+            self.delivering_votes.add(vote.id)
+            session.add(VoteDeliveries(vote_id=vote.id, channel_id=channel_id,
+                                       progress_message_id=progress_message_id))
+            if recipient_ids:
+                session.execute(insert(VoteRecipients), [{"vote_id": vote.id, "recipient_id": r_id, "failed": False}
+                                                         for r_id in recipient_ids])
+            session.commit()
+            return vote
+
+    def get_delivery(self, vote):
+        """
+        Gets the stored state of a vote's delivery
+        :param vote: the vote being delivered
+        :return: (channel id, progress message id, ids of users yet to be sent the vote, number of failed deliveries)
+        """
+        with session_manager() as session:
+            channel_id, progress_message_id = session.execute(
+                select(VoteDeliveries.channel_id, VoteDeliveries.progress_message_id).filter_by(vote_id=vote.id)).one()
+            pending = session.execute(select(VoteRecipients.recipient_id)
+                                      .filter_by(vote_id=vote.id, failed=False)).scalars().all()
+            failed = session.execute(select(func.count()).select_from(VoteRecipients)
+                                     .filter_by(vote_id=vote.id, failed=True)).scalar()
+            return channel_id, progress_message_id, pending, failed
+
+    def record_delivery(self, vote, user_id, msg_id):
+        """
+        Marks a user as having been sent a message to vote on during a delivery
+        :param vote: the vote the message is for
+        :param user_id: user who was sent the message
+        :param msg_id: the id of the message that was sent
+        :return: None
+        """
+        with session_manager() as session:
+            vote.sent_to[user_id] = msg_id
+            # The message is sent without a choice shown
+            vote.displayed_choices[user_id] = None
+            self.message_votes[msg_id] = vote
+            session.add(VoteSent(vote_id=vote.id, vote_receiver_id=user_id, vote_receiver_message=msg_id))
+            session.execute(delete(VoteRecipients).filter_by(vote_id=vote.id, recipient_id=user_id))
+            session.commit()
+
+    def record_failed_delivery(self, vote, user_id):
+        """
+        Marks a user as not being able to be sent a vote, so it isn't tried again when delivery is resumed
+        :param vote: the vote being delivered
+        :param user_id: user who couldn't be sent the vote
+        :return: None
+        """
+        with session_manager() as session:
+            session.execute(update(VoteRecipients).filter_by(vote_id=vote.id, recipient_id=user_id)
+                            .values(failed=True))
+            session.commit()
+
+    def finish_delivery(self, vote):
+        """
+        Removes the stored state of a vote's delivery once every user has been sent it or failed
+        :param vote: the vote that was delivered
+        :return: None
+        """
+        with session_manager() as session:
+            self.delivering_votes.discard(vote.id)
+            session.execute(delete(VoteDeliveries).filter_by(vote_id=vote.id))
+            session.execute(delete(VoteRecipients).filter_by(vote_id=vote.id))
+            session.commit()
+
+    def set_end_time(self, vote, end_time=None):
+        """
+        Sets the end time of a vote, rescheduling it if it has been sent
+        :param vote: the vote
+        :param end_time: time in unix time, or None for no end time
+        :return: None
+        """
+        vote.set_end_time(end_time)
+        if vote.id in self.sent_votes:
+            if end_time is None:
+                self.end_scheduler.unschedule(vote.id)
+            else:
+                self.end_scheduler.schedule(vote.id, end_time)
+
     def cancel_sent_vote(self, v_id):
         """
         Removed a vote from the list of active votes
@@ -182,23 +321,74 @@ class VoteManager:
         self.cancel_vote(vote)
 
     def cancel_vote(self, vote):
+        """
+        Removes a vote, deleting it and everything stored about it
+        :param vote: the vote
+        :return: None
+        """
+        self.vote_lookup.pop((vote.author, vote.title))
+        self.end_scheduler.unschedule(vote.id)
+        self.delivering_votes.discard(vote.id)
+        self.tally_feed.close(vote.id)
+        for msg_id in vote.sent_to.values():
+            self.message_votes.pop(msg_id, None)
+        # Child rows are deleted explicitly, as SQLite doesn't enforce the foreign keys that would cascade them
         with session_manager() as session:
-            self.vote_lookup.pop((vote.author, vote.title))
+            for table in (VoteTargetRoles, VoteOptions, VoteSent, VoteChoices, VoteDeliveries, VoteRecipients):
+                session.execute(delete(table).filter_by(vote_id=vote.id))
             session.execute(delete(Votes).filter_by(vote_id=vote.id))
-            session.execute(delete(VoteTargetRoles).filter_by(vote_id=vote.id))
-            session.execute(delete(VoteOptions).filter_by(vote_id=vote.id))
-            session.execute(delete(VoteSent).filter_by(vote_id=vote.id))
             session.commit()
 
+    def register_sent(self, vote, user_id, msg_id):
+        """
+        Marks a user as having been sent a message to vote on, so reactions on it are counted for the vote
+        :param vote: the vote the message is for
+        :param user_id: user who was sent the message
+        :param msg_id: the id of the message that was sent
+        :return: None
+        """
+        vote.register_sent(user_id, msg_id)
+        self.message_votes[msg_id] = vote
+
     def was_sent_to(self, msg_id):
         """
         Checks if a given message was sent by the bot for a vote, so it knows if it should listen for reactions on it.
         :param msg_id: the message that has been reacted on
         :return: the relevant vote for the message, if there is one
         """
-        for vote in self.sent_votes.values():
-            if msg_id in vote.sent_to.values():
-                return vote
-        return None
+        return self.message_votes.get(msg_id)
 
+    @staticmethod
+    def get_option(vote, emoji):
+        """
+        Gets the option of a vote a reaction emoji stands for
+        :param vote: the vote that was reacted on
+        :param emoji: the emoji of the reaction, as a string
+        :return: the Option, or None if the emoji isn't one of the vote's options
+        """
+        index = VoteManager.emote_reference.get(emoji)
+        if isinstance(index, int) and index < len(vote.options):
+            return vote.options[index]
+        return None
 
+    def record_reaction(self, msg_id, user_id, emoji, added):
+        """
+        Records the recipient of a vote message reacting with, or removing their reaction for, an option
+        :param msg_id: the message that has been reacted on
+        :param user_id: the user who reacted
+        :param emoji: the emoji of the reaction, as a string
+        :param added: True if the reaction was added, False if it was removed
+        :return: the relevant vote for the message, if the reaction was a choice on one
+        """
+        vote = self.was_sent_to(msg_id)
+        if not vote or vote.sent_to.get(user_id) != msg_id:
+            return None
+        option = self.get_option(vote, emoji)
+        if not option:
+            return None
+        if added:
+            changes = vote.add_choice(user_id, option)
+        else:
+            changes = vote.remove_choice(user_id, option)
+        self.tally_feed.publish(vote.id, changes)
+        return vote
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+
+"""
+Koala Bot Vote Cog code and additional base cog functions
+Commented using reStructuredText (reST)
+"""
+# Built-in/Generic Imports
+import asyncio
+
+# Libs
+import aiohttp
+import discord
+
+# Own modules
+from koala.utils import retry_discord_request
+from .db import create_embed, add_reactions
+from .log import logger
+from .utils import VOTE_DELIVERY_CONCURRENCY, VOTE_DELIVERY_RETRIES, VOTE_DELIVERY_BACKOFF, \
+    VOTE_DELIVERY_PROGRESS_INTERVAL
+
+# Constants
+
+# Variables
+
+
+class VoteDelivery:
+    def __init__(self, bot, vote_manager, vote, progress_message=None, concurrency=VOTE_DELIVERY_CONCURRENCY,
+                 retries=VOTE_DELIVERY_RETRIES, backoff=VOTE_DELIVERY_BACKOFF,
+                 progress_interval=VOTE_DELIVERY_PROGRESS_INTERVAL):
+        """
+        Sends a vote to the users it's to be delivered to, a few at a time. Each user's delivery is stored as it
+        happens, so delivery can be resumed after a restart.
+        :param bot: the bot sending the vote
+        :param vote_manager: the VoteManager storing the delivery
+        :param vote: the vote to send
+        :param progress_message: the message to report progress in, found from the stored delivery if not given
+        :param concurrency: the maximum number of users being sent the vote at once
+        :param retries: the number of times a request that failed for a temporary reason is retried
+        :param backoff: the delay in seconds before the first retry, doubled for each retry after
+        :param progress_interval: the time in seconds between edits of the progress message
+        """
+        self.bot = bot
+        self.vote_manager = vote_manager
+        self.vote = vote
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.progress_interval = progress_interval
+        self.total = 0
+        self.failed = 0
+        self.progress_message = progress_message
+
+    @property
+    def delivered(self):
+        return len(self.vote.sent_to)
+
+    async def run(self):
+        """
+        Sends the vote to every user it hasn't been sent to yet, then reports how many users it was delivered to
+        :return: None
+        """
+        channel_id, progress_message_id, recipient_ids, self.failed = self.vote_manager.get_delivery(self.vote)
+        self.total = self.delivered + self.failed + len(recipient_ids)
+        channel = self.bot.get_channel(channel_id)
+        if not self.progress_message and channel and progress_message_id:
+            self.progress_message = channel.get_partial_message(progress_message_id)
+        guild = self.bot.get_guild(self.vote.guild)
+        content = f"You have been asked to participate in this vote from {guild.name if guild else 'a server'}.\n" \
+                  f"Please react to make your choice (You can change your mind until the vote is closed)"
+        embed = create_embed(self.vote)
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        progress = asyncio.ensure_future(self.report_progress())
+        try:
+            await asyncio.gather(*[self.deliver(semaphore, r_id, content, embed) for r_id in recipient_ids])
+        finally:
+            progress.cancel()
+
+        if self.vote.id not in self.vote_manager.delivering_votes:
+            # The vote was cancelled while it was being delivered
+            return
+        self.vote_manager.finish_delivery(self.vote)
+        result = f"Sent vote to {self.delivered} users"
+        if self.failed:
+            result += f", {self.failed} couldn't be sent it"
+        await self.edit_progress(result)
+
+    async def deliver(self, semaphore, user_id, content, embed):
+        """
+        Sends the vote to a user and adds the option reactions, storing whether it was sent
+        :param semaphore: the semaphore limiting how many users are sent the vote at once
+        :param user_id: id of the user to send the vote to
+        :param content: the text of the vote message
+        :param embed: the embed of the vote message
+        :return: None
+        """
+        async with semaphore:
+            if self.vote.id not in self.vote_manager.delivering_votes:
+                return
+            try:
+                user = self.bot.get_user(user_id) or await self.retry(lambda: self.bot.fetch_user(user_id))
+                msg = await self.retry(lambda: user.send(content, embed=embed))
+            except (discord.HTTPException, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.error(f"tried to send vote to user {user_id} but it failed: {e}")
+                self.vote_manager.record_failed_delivery(self.vote, user_id)
+                self.failed += 1
+                return
+            if self.vote.id not in self.vote_manager.delivering_votes:
+                return
+            self.vote_manager.record_delivery(self.vote, user_id, msg.id)
+            try:
+                await self.retry(lambda: add_reactions(self.vote, msg))
+            except (discord.HTTPException, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.error(f"sent vote to user {user_id} but couldn't add the reactions: {e}")
+
+    async def retry(self, coro_func):
+        """
+        Awaits a request, retrying with exponential backoff if it fails for a temporary reason
+        :param coro_func: a function returning the request coroutine
+        :return: the result of the request
+        """
+        return await retry_discord_request(coro_func, self.retries, self.backoff, logger=logger,
+                                           description=f"Vote {self.vote.id} request")
+
+    async def report_progress(self):
+        """
+        Edits the progress message periodically while the vote is being delivered
+        :return: None
+        """
+        last = None
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            current = (self.delivered, self.failed)
+            if current != last:
+                await self.edit_progress(f"Sending vote: sent to {self.delivered}/{self.total} users, "
+                                         f"{self.failed} failed")
+                last = current
+
+    async def edit_progress(self, content):
+        """
+        Edits the progress message, if there is one
+        :param content: the new content of the message
+        :return: None
+        """
+        if not self.progress_message:
+            return
+        try:
+            await self.progress_message.edit(content=content)
+        except discord.HTTPException as e:
+            logger.error(f"couldn't edit vote progress message: {e}")
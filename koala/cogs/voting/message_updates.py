@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+
+"""
+Koala Bot Vote Cog code and additional base cog functions
+Commented using reStructuredText (reST)
+"""
+# Built-in/Generic Imports
+import asyncio
+
+# Libs
+import discord
+
+# Own modules
+from .db import VoteManager, create_embed
+from .log import logger
+from .utils import VOTE_MESSAGE_UPDATE_DELAY
+
+# Constants
+
+# Variables
+
+
+class VoteMessageUpdater:
+    def __init__(self, bot, vote_manager, delay=VOTE_MESSAGE_UPDATE_DELAY):
+        """
+        Shows voters their current choice on their vote message. Updates are delayed so a burst of reactions results
+        in at most one edit, which is skipped if the choice shown is already current.
+        :param bot: the bot that sent the vote messages
+        :param vote_manager: the VoteManager the votes are in
+        :param delay: the time in seconds reactions are collected for before the message is edited
+        """
+        self.bot = bot
+        self.vote_manager = vote_manager
+        self.delay = delay
+        # message id -> task editing the message
+        self._timers = {}
+
+    def queue(self, vote, user_id, channel_id, message_id):
+        """
+        Queues an update of a vote message after its recipient reacted on it
+        :param vote: the vote the message is for
+        :param user_id: id of the user who reacted
+        :param channel_id: id of the DM channel of the message
+        :param message_id: id of the message that was reacted on
+        :return: None
+        """
+        if message_id not in self._timers:
+            self._timers[message_id] = asyncio.ensure_future(
+                self._update_later(vote, user_id, channel_id, message_id))
+
+    async def _update_later(self, vote, user_id, channel_id, message_id):
+        await asyncio.sleep(self.delay)
+        await self.update(vote, user_id, channel_id, message_id)
+
+    async def update(self, vote, user_id, channel_id, message_id):
+        """
+        Edits the footer of a vote message to show the voter's current choice, if it isn't shown already
+        :param vote: the vote the message is for
+        :param user_id: id of the voter
+        :param channel_id: id of the DM channel of the message
+        :param message_id: id of the vote message
+        :return: None
+        """
+        self._timers.pop(message_id, None)
+        if self.vote_manager.was_sent_to(message_id) is not vote:
+            return
+        choice = vote.get_choice(user_id)
+        opt_id = choice.id if choice else None
+        if user_id in vote.displayed_choices and vote.displayed_choices[user_id] == opt_id:
+            return
+
+        embed = create_embed(vote)
+        if choice:
+            emoji = VoteManager.emote_reference[vote.options.index(choice)]
+            embed.set_footer(text=f"You will be voting for {emoji} - {choice.head}")
+        else:
+            embed.set_footer(text="There are no valid choices selected")
+        try:
+            channel = self.bot.get_channel(channel_id)
+            if not channel:
+                user = self.bot.get_user(user_id) or await self.bot.fetch_user(user_id)
+                channel = await user.create_dm()
+            await channel.get_partial_message(message_id).edit(embed=embed)
+            vote.displayed_choices[user_id] = opt_id
+        except discord.HTTPException as e:
+            logger.error(f"couldn't update vote message {message_id} for user {user_id}: {e}")
@@ -1,21 +1,21 @@
-from sqlalchemy import Column, Integer, Float, String
+from sqlalchemy import Column, Integer, Float, String, Boolean, ForeignKey, Index
 from koala.models import mapper_registry
 from koala.db import setup
 
-# FIXME: Previous approach had no primary keys, this sets all as primary key but shouldn't affect existing databases
-# FIXME: When refactoring database, set a primary key
+# Existing databases are migrated to this schema with `alembic upgrade head`
 
 
 @mapper_registry.mapped
 class Votes:
     __tablename__ = 'Votes'
-    vote_id = Column(Integer, primary_key=True)
-    author_id = Column(Integer, primary_key=True)
-    guild_id = Column(Integer, primary_key=True)
-    title = Column(String, primary_key=True)
-    chair_id = Column(Integer, nullable=True, primary_key=True)
-    voice_id = Column(Integer, nullable=True, primary_key=True)
-    end_time = Column(Float, nullable=True, primary_key=True)
+    __table_args__ = (Index('ix_Votes_author_id_title', 'author_id', 'title'),)
+    vote_id = Column(Integer, primary_key=True, autoincrement=False)
+    author_id = Column(Integer, nullable=False)
+    guild_id = Column(Integer, nullable=False, index=True)
+    title = Column(String, nullable=False)
+    chair_id = Column(Integer, nullable=True)
+    voice_id = Column(Integer, nullable=True)
+    end_time = Column(Float, nullable=True, index=True)
 
     def __repr__(self):
         return "<Votes(%s, %s, %s, %s, %s, %s, %s)>" % \
@@ -25,7 +25,7 @@ class Votes:
 @mapper_registry.mapped
 class VoteTargetRoles:
     __tablename__ = 'VoteTargetRoles'
-    vote_id = Column(Integer, primary_key=True)
+    vote_id = Column(Integer, ForeignKey("Votes.vote_id", ondelete="CASCADE"), primary_key=True)
     role_id = Column(Integer, primary_key=True)
 
     def __repr__(self):
@@ -36,10 +36,10 @@ class VoteTargetRoles:
 @mapper_registry.mapped
 class VoteOptions:
     __tablename__ = 'VoteOptions'
-    vote_id = Column(Integer, primary_key=True)
+    vote_id = Column(Integer, ForeignKey("Votes.vote_id", ondelete="CASCADE"), primary_key=True)
     opt_id = Column(Integer, primary_key=True)
-    option_title = Column(String, primary_key=True)
-    option_desc = Column(String, primary_key=True)
+    option_title = Column(String)
+    option_desc = Column(String)
 
     def __repr__(self):
         return "<VoteOptions(%s, %s, %s, %s)>" % \
@@ -49,13 +49,49 @@ class VoteOptions:
 @mapper_registry.mapped
 class VoteSent:
     __tablename__ = 'VoteSent'
-    vote_id = Column(Integer, primary_key=True)
+    vote_id = Column(Integer, ForeignKey("Votes.vote_id", ondelete="CASCADE"), primary_key=True)
     vote_receiver_id = Column(Integer, primary_key=True)
-    vote_receiver_message = Column(Integer, primary_key=True)
+    vote_receiver_message = Column(Integer, index=True)
 
     def __repr__(self):
         return "<VoteSent(%s, %s, %s)>" % \
                (self.vote_id, self.vote_receiver_id, self.vote_receiver_message)
 
 
+@mapper_registry.mapped
+class VoteChoices:
+    __tablename__ = 'VoteChoices'
+    vote_id = Column(Integer, ForeignKey("Votes.vote_id", ondelete="CASCADE"), primary_key=True)
+    voter_id = Column(Integer, primary_key=True)
+    opt_id = Column(Integer, primary_key=True)
+
+    def __repr__(self):
+        return "<VoteChoices(%s, %s, %s)>" % \
+               (self.vote_id, self.voter_id, self.opt_id)
+
+
+@mapper_registry.mapped
+class VoteDeliveries:
+    __tablename__ = 'VoteDeliveries'
+    vote_id = Column(Integer, ForeignKey("Votes.vote_id", ondelete="CASCADE"), primary_key=True)
+    channel_id = Column(Integer)
+    progress_message_id = Column(Integer, nullable=True)
+
+    def __repr__(self):
+        return "<VoteDeliveries(%s, %s, %s)>" % \
+               (self.vote_id, self.channel_id, self.progress_message_id)
+
+
+@mapper_registry.mapped
+class VoteRecipients:
+    __tablename__ = 'VoteRecipients'
+    vote_id = Column(Integer, ForeignKey("Votes.vote_id", ondelete="CASCADE"), primary_key=True)
+    recipient_id = Column(Integer, primary_key=True)
+    failed = Column(Boolean, default=False)
+
+    def __repr__(self):
+        return "<VoteRecipients(%s, %s, %s)>" % \
+               (self.vote_id, self.recipient_id, self.failed)
+
+
 setup()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+
+"""
+Koala Bot Vote Cog code and additional base cog functions
+Commented using reStructuredText (reST)
+"""
+# Built-in/Generic Imports
+import asyncio
+import heapq
+import time
+
+# Libs
+
+# Own modules
+from .log import logger
+from .utils import VOTE_END_MAX_SLEEP
+
+# Constants
+
+# Variables
+
+
+class VoteEndScheduler:
+    def __init__(self, callback=None):
+        """
+        Calls back when each sent vote reaches its end time. End times are kept in a min-heap, with a single timer
+        armed for the earliest one, so nothing runs while no vote is due.
+        :param callback: coroutine function called with the id of each vote that has ended
+        """
+        self.callback = callback
+        # vote id -> end time, and a heap of (end time, vote id) which may hold stale entries for rescheduled votes
+        self.end_times = {}
+        self._heap = []
+        self._timer = None
+        self._loop = None
+
+    @property
+    def running(self):
+        return self._loop is not None
+
+    def start(self):
+        """
+        Starts calling back for votes that have ended, including any that ended before it was started
+        :return: None
+        """
+        self._loop = asyncio.get_event_loop()
+        self._arm()
+
+    def stop(self):
+        """
+        Stops calling back, keeping the end times so it can be started again
+        :return: None
+        """
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        self._loop = None
+
+    def schedule(self, vote_id, end_time):
+        """
+        Sets the end time of a vote, replacing any previous one
+        :param vote_id: id of the vote
+        :param end_time: end time in unix time
+        :return: None
+        """
+        self.end_times[vote_id] = end_time
+        heapq.heappush(self._heap, (end_time, vote_id))
+        if self._heap[0] == (end_time, vote_id):
+            self._arm()
+
+    def unschedule(self, vote_id):
+        """
+        Removes the end time of a vote, if it has one
+        :param vote_id: id of the vote
+        :return: None
+        """
+        # The heap entry is skipped once it's reached
+        self.end_times.pop(vote_id, None)
+
+    def next_end_time(self):
+        """
+        Gets the earliest scheduled end time
+        :return: end time in unix time, or None if no votes are scheduled
+        """
+        while self._heap and self.end_times.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def _arm(self):
+        """
+        Arms the timer for the earliest end time
+        :return: None
+        """
+        if not self.running:
+            return
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        end_time = self.next_end_time()
+        if end_time is not None:
+            # Sleeps are capped so changes to the system clock are noticed
+            delay = min(max(end_time - time.time(), 0), VOTE_END_MAX_SLEEP)
+            self._timer = self._loop.call_later(delay, self._fire)
+
+    def _fire(self):
+        """
+        Calls back for every vote that has ended, then arms the timer for the next one
+        :return: None
+        """
+        self._timer = None
+        now = time.time()
+        end_time = self.next_end_time()
+        while end_time is not None and end_time <= now:
+            _, vote_id = heapq.heappop(self._heap)
+            del self.end_times[vote_id]
+            asyncio.ensure_future(self._call_back(vote_id))
+            end_time = self.next_end_time()
+        self._arm()
+
+    async def _call_back(self, vote_id):
+        """
+        Calls back for a vote that has ended, logging any errors
+        :param vote_id: id of the vote
+        :return: None
+        """
+        try:
+            await self.callback(vote_id)
+        except Exception as e:
+            logger.error("Exception ending vote %s: %s" % (vote_id, e), exc_info=e)
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+
+"""
+Koala Bot Vote Cog code and additional base cog functions
+Commented using reStructuredText (reST)
+"""
+# Built-in/Generic Imports
+import asyncio
+from collections import defaultdict
+
+# Libs
+
+# Own modules
+
+# Constants
+
+# Variables
+
+
+class TallySubscription:
+    def __init__(self, vote_id):
+        """
+        The changes to the tally of a vote not yet taken by a subscriber. Changes made while the subscriber is busy
+        are merged, so a slow subscriber gets fewer, larger changes instead of a growing backlog.
+        :param vote_id: id of the vote subscribed to
+        """
+        self.vote_id = vote_id
+        self.closed = False
+        # option id -> change in count, or None once the whole tally has changed
+        self._changes = {}
+        self._event = asyncio.Event()
+
+    def add_changes(self, changes):
+        if self._changes is not None:
+            for opt_id, change in changes.items():
+                self._changes[opt_id] = self._changes.get(opt_id, 0) + change
+        self._event.set()
+
+    def reset(self):
+        self._changes = None
+        self._event.set()
+
+    def close(self):
+        self.closed = True
+        self._event.set()
+
+    async def get_changes(self, timeout=None):
+        """
+        Waits for the tally to change
+        :param timeout: the time in seconds to wait for, or None to wait until it changes
+        :return: dict of option id to change in count, empty if there were none before the timeout or they cancelled
+        out, or None if the whole tally should be fetched again
+        """
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return {}
+        self._event.clear()
+        changes, self._changes = self._changes, {}
+        return {opt_id: change for opt_id, change in changes.items() if change} if changes is not None else None
+
+
+class VoteTallyFeed:
+    def __init__(self):
+        """
+        Passes changes to the tallies of sent votes on to subscribers, e.g. the results stream of the API
+        """
+        # vote id -> TallySubscriptions
+        self.subscriptions = defaultdict(set)
+
+    def subscribe(self, vote_id):
+        """
+        Subscribes to changes to the tally of a vote
+        :param vote_id: id of the vote
+        :return: the TallySubscription
+        """
+        subscription = TallySubscription(vote_id)
+        self.subscriptions[vote_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """
+        Stops a subscription receiving changes
+        :param subscription: the TallySubscription
+        :return: None
+        """
+        subscriptions = self.subscriptions.get(subscription.vote_id)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self.subscriptions[subscription.vote_id]
+
+    def publish(self, vote_id, changes):
+        """
+        Passes changes to the tally of a vote on to its subscribers
+        :param vote_id: id of the vote
+        :param changes: dict of option id to change in count
+        :return: None
+        """
+        if changes:
+            for subscription in self.subscriptions.get(vote_id, ()):
+                subscription.add_changes(changes)
+
+    def reset(self, vote_id):
+        """
+        Tells the subscribers of a vote that its tally has been recounted
+        :param vote_id: id of the vote
+        :return: None
+        """
+        for subscription in self.subscriptions.get(vote_id, ()):
+            subscription.reset()
+
+    def close(self, vote_id):
+        """
+        Ends the subscriptions to a vote, once it has closed
+        :param vote_id: id of the vote
+        :return: None
+        """
+        for subscription in self.subscriptions.pop(vote_id, ()):
+            subscription.close()
@@ -5,6 +5,7 @@ Koala Bot Vote Cog code and additional base cog functions
 Commented using reStructuredText (reST)
 """
 # Built-in/Generic Imports
+import time
 
 # Libs
 import discord
@@ -12,12 +13,45 @@ import discord
 # Own modules
 
 # Constants
-MIN_ID_VALUE = 100000000000000000
-MAX_ID_VALUE = 999999999999999999
+VOTE_END_MAX_SLEEP = 3600
+VOTE_END_RETRY_DELAY = 86400
+VOTE_DELIVERY_CONCURRENCY = 5
+VOTE_DELIVERY_RETRIES = 3
+VOTE_DELIVERY_BACKOFF = 2.0
+VOTE_DELIVERY_PROGRESS_INTERVAL = 10
+VOTE_MESSAGE_UPDATE_DELAY = 1.0
+VOTE_RESULTS_STREAM_HEARTBEAT = 15
 
 # Variables
 
 
+class IdGenerator:
+    def __init__(self):
+        """
+        Generates snowflake-style ids, the milliseconds since the discord epoch followed by a 22 bit counter, which
+        increase over time without needing to look at the ids already used. Legacy random ids are all below the
+        snowflakes of the current time.
+        """
+        self.last_id = 0
+
+    def next_id(self):
+        """
+        Generates an id, greater than every id generated or seen before
+        :return: the id
+        """
+        snowflake = (int(time.time() * 1000) - discord.utils.DISCORD_EPOCH) << 22
+        self.last_id = max(snowflake, self.last_id + 1)
+        return self.last_id
+
+    def seen(self, used_id):
+        """
+        Records an id already in use, so later ids are greater than it even if the clock has gone back
+        :param used_id: the id in use
+        :return: None
+        """
+        self.last_id = max(self.last_id, used_id)
+
+
 async def make_result_embed(vote, results):
     """
     Create a discord.Embed object from a set of results for a vote
@@ -11,7 +11,7 @@ from sqlalchemy import select, delete, update
 
 # Own modules
 from koala.db import session_manager
-from .models import Votes, VoteTargetRoles, VoteSent, VoteOptions
+from .models import Votes, VoteTargetRoles, VoteSent, VoteOptions, VoteChoices
 
 
 # Constants
@@ -41,6 +41,39 @@ class Vote:
 
         self.sent_to = {}
 
+        # voter id -> ids of the options they reacted with, and option id -> number of voters choosing it
+        self.choices = {}
+        self.tally = {}
+        # voter id -> id of the option shown as their choice on their vote message, None if none is
+        self.displayed_choices = {}
+
+    def hydrate(self, chair_id, voice_id, end_time, target_roles, options, sent_to, choices):
+        """
+        Restores the state of the vote as loaded from the database, without writing back to it
+        :param chair_id: chair of the vote
+        :param voice_id: target voice channel of the vote
+        :param end_time: end time of the vote in unix time
+        :param target_roles: list of target role ids
+        :param options: list of Option objects, in order
+        :param sent_to: dict of user id to the id of the message they were sent
+        :param choices: list of (voter id, option id) the voters reacted with
+        :return: None
+        """
+        self.chair = chair_id
+        self.target_voice_channel = voice_id
+        self.end_time = end_time
+        self.target_roles = list(target_roles)
+        self.options = list(options)
+        self.sent_to = dict(sent_to)
+        self.choices = {}
+        for voter_id, opt_id in choices:
+            self.choices.setdefault(voter_id, set()).add(opt_id)
+        self.tally = {}
+        for voter_id in self.choices:
+            option = self.get_choice(voter_id)
+            if option:
+                self.tally[option.id] = self.tally.get(option.id, 0) + 1
+
     def is_ready(self):
         """
         Check if the vote is ready to be sent out
@@ -154,3 +187,95 @@ class Vote:
             if not in_db:
                 session.add(VoteSent(vote_id=self.id, vote_receiver_id=user_id, vote_receiver_message=msg_id))
                 session.commit()
+
+    def get_choice(self, voter_id):
+        """
+        Gets the option a voter is currently voting for, which is the first in option order of those they reacted with
+        :param voter_id: the id of the voter
+        :return: the chosen Option, or None if they haven't chosen
+        """
+        chosen = self.choices.get(voter_id)
+        if chosen:
+            for option in self.options:
+                if option.id in chosen:
+                    return option
+        return None
+
+    def get_results(self):
+        """
+        Gets the number of votes for each option with at least one vote
+        :return: dict of Option to count
+        """
+        return {option: self.tally[option.id] for option in self.options if self.tally.get(option.id)}
+
+    def add_choice(self, voter_id, option):
+        """
+        Records a voter reacting with an option
+        :param voter_id: the id of the voter
+        :param option: the Option they reacted with
+        :return: dict of option id to change in the tally
+        """
+        chosen = self.choices.get(voter_id, set())
+        if option.id in chosen:
+            return {}
+        with session_manager() as session:
+            changes = self._update_choices(voter_id, chosen | {option.id})
+            session.add(VoteChoices(vote_id=self.id, voter_id=voter_id, opt_id=option.id))
+            session.commit()
+        return changes
+
+    def remove_choice(self, voter_id, option):
+        """
+        Records a voter removing their reaction for an option
+        :param voter_id: the id of the voter
+        :param option: the Option they removed their reaction for
+        :return: dict of option id to change in the tally
+        """
+        chosen = self.choices.get(voter_id, set())
+        if option.id not in chosen:
+            return {}
+        with session_manager() as session:
+            changes = self._update_choices(voter_id, chosen - {option.id})
+            session.execute(delete(VoteChoices).filter_by(vote_id=self.id, voter_id=voter_id, opt_id=option.id))
+            session.commit()
+        return changes
+
+    def set_choices(self, voter_id, opt_ids):
+        """
+        Replaces the options a voter reacted with
+        :param voter_id: the id of the voter
+        :param opt_ids: the ids of the options they reacted with
+        :return: True if their choices changed, False otherwise
+        """
+        if self.choices.get(voter_id, set()) == opt_ids:
+            return False
+        with session_manager() as session:
+            self._update_choices(voter_id, set(opt_ids))
+            session.execute(delete(VoteChoices).filter_by(vote_id=self.id, voter_id=voter_id))
+            for opt_id in opt_ids:
+                session.add(VoteChoices(vote_id=self.id, voter_id=voter_id, opt_id=opt_id))
+            session.commit()
+        return True
+
+    def _update_choices(self, voter_id, opt_ids):
+        """
+        Sets the options a voter reacted with, moving their vote in the tally if their choice changes
+        :param voter_id: the id of the voter
+        :param opt_ids: the ids of the options they reacted with
+        :return: dict of option id to change in the tally
+        """
+        previous = self.get_choice(voter_id)
+        if opt_ids:
+            self.choices[voter_id] = opt_ids
+        else:
+            self.choices.pop(voter_id, None)
+        current = self.get_choice(voter_id)
+        changes = {}
+        if previous is not current:
+            if previous:
+                self.tally[previous.id] -= 1
+                changes[previous.id] = -1
+            if current:
+                self.tally[current.id] = self.tally.get(current.id, 0) + 1
+                changes[current.id] = 1
+        return changes
@@ -9,11 +9,15 @@ Commented using reStructuredText (reST)
 
 # Built-in/Generic Imports
 import argparse
+import asyncio
+import logging
+from contextlib import AsyncExitStack
 from pathlib import Path
 
 # Libs
 from typing import Tuple, Optional
 from pathlib import PurePath
+import aiohttp
 import discord
 from discord.ext import commands
 import datetime
@@ -90,6 +94,52 @@ async def wait_for_message(bot: discord.Client, ctx: commands.Context, timeout:
     return msg, None
 
 
+def is_temporary_error(err: Exception) -> bool:
+    """
+    Checks if a failed Discord request may succeed if retried, i.e. it was rate limited, Discord had an error, or the
+    connection failed or timed out
+    :param err: The error of the request
+    :return: True if the request should be retried
+    """
+    if isinstance(err, discord.HTTPException):
+        return err.status == 429 or err.status >= 500
+    return isinstance(err, (aiohttp.ClientError, asyncio.TimeoutError))
+
+
+async def retry_discord_request(coro_func, retries: int, backoff: float, *semaphores: asyncio.Semaphore,
+                                logger: logging.Logger = None, description: str = "Discord request"):
+    """
+    Makes a Discord request, retrying with exponential backoff if it fails for a temporary reason. A rate limited
+    request waits at least as long as Discord asks before it is retried.
+    :param coro_func: A function returning the request coroutine
+    :param retries: The number of times a failed request is retried
+    :param backoff: The delay in seconds before the first retry, doubled for each retry after
+    :param semaphores: Semaphores limiting the requests in progress, which aren't held while waiting to retry
+    :param logger: The logger retries are logged to
+    :param description: What the request is, for the log
+    :return: The result of the request
+    :raises: The error of the request immediately if it isn't temporary, otherwise the last error once out of retries
+    """
+    attempt = 0
+    while True:
+        try:
+            async with AsyncExitStack() as stack:
+                for semaphore in semaphores:
+                    await stack.enter_async_context(semaphore)
+                return await coro_func()
+        except (discord.HTTPException, aiohttp.ClientError, asyncio.TimeoutError) as err:
+            if attempt >= retries or not is_temporary_error(err):
+                raise
+            delay = backoff * 2 ** attempt
+            response = getattr(err, "response", None)
+            if getattr(err, "status", None) == 429 and response is not None:
+                delay = max(delay, float(response.headers.get("Retry-After", 0)))
+            if logger:
+                logger.warning(f"{description} failed, retrying in {delay}s: {err}")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
 def format_config_path(directory: str, *filename: str):
     """
     Format the path to be used by the database.
@@ -20,6 +20,7 @@ from koala.cogs import ReactForRole
 from koala.cogs.react_for_role.models import GuildRFRRequiredRoles, GuildRFRMessages, RFRMessageEmojiRoles
 from koala.db import session_manager
 from tests.tests_utils.last_ctx_cog import LastCtxCog
+from .utils import DBManager
 
 from tests.log import logger
 
@@ -41,6 +42,9 @@ def utils_cog(bot):
 def rfr_cog(bot):
     rfr_cog = ReactForRole(bot)
     bot.add_cog(rfr_cog)
+    # Rfr messages the tests add through DBManager are indexed for the cog
+    DBManager.index = rfr_cog.rfr_database_manager.index
+    DBManager.guild_roles = rfr_cog.rfr_database_manager.guild_roles
     dpytest.configure(bot)
     logger.info("Tests starting")
     return rfr_cog
@@ -8,12 +8,14 @@ Commented using reStructuredText (reST)
 # Futures
 
 # Built-in/Generic Imports
+import asyncio
 import random
 
 # Libs
 import aiohttp
 import discord
 import discord.ext.test as dpytest
+import emoji
 import mock
 import pytest
 from discord.ext import commands
@@ -23,6 +25,7 @@ from discord.ext.test import factories as dpyfactory
 import koalabot
 from koala.colours import KOALA_GREEN
 from koala.db import session_manager
+from koala.cogs.react_for_role.utils import get_emoji_key
 from tests.tests_utils import utils as testutils
 from .utils import DBManager, independent_get_guild_rfr_message, independent_get_guild_rfr_required_role
 from tests.log import logger
@@ -626,3 +629,142 @@ async def test_can_have_rfr_role(num_roles, num_required, rfr_cog):
             else:
                 assert rfr_cog.can_have_rfr_role(member) == any(
                     x in required for x in member.roles), f"\n\r{member.roles}\n\r{required}"
+
+
+@pytest.mark.asyncio
+async def test_reaction_on_other_message_skips_db(rfr_cog):
+    config: dpytest.RunnerConfig = dpytest.get_config()
+    guild: discord.Guild = config.guilds[0]
+    member: discord.Member = config.members[0]
+    message = dpytest.back.make_message("Not an rfr message", member, guild.text_channels[0])
+    with mock.patch("koala.cogs.react_for_role.db.session_manager") as mock_session:
+        with mock.patch("koala.cogs.ReactForRole.get_role_member_info", mock.AsyncMock()) as member_info:
+            await dpytest.add_reaction(member, message, "👍")
+            await dpytest.remove_reaction(member, message, "👍")
+            mock_session.assert_not_called()
+            member_info.assert_not_called()
+
+
+@pytest.mark.parametrize("emoji_value, expected",
+                         [(":thumbs_up:", "👍"), ("👍", "👍"), (":red_heart:", "❤"), ("❤️", "❤"), ("❤", "❤"),
+                          ("<:koala:123>", "123"), ("<a:koala:123>", "123"),
+                          (discord.PartialEmoji(name="❤️"), "❤"), (discord.PartialEmoji(name="koala", id=123), "123")])
+def test_get_emoji_key(emoji_value, expected):
+    assert get_emoji_key(emoji_value) == expected
+
+
+@pytest.mark.asyncio
+async def test_get_role_member_info(rfr_cog):
+    config: dpytest.RunnerConfig = dpytest.get_config()
+    guild: discord.Guild = config.guilds[0]
+    channel: discord.TextChannel = guild.text_channels[0]
+    member: discord.Member = config.members[0]
+    msg_id = dpyfactory.make_id()
+    unicode_role = testutils.fake_guild_role(guild)
+    custom_role = testutils.fake_guild_role(guild)
+    custom_emoji = discord.PartialEmoji(name="koala", id=dpyfactory.make_id())
+    DBManager.add_rfr_message(guild.id, channel.id, msg_id)
+    _, _, _, er_id = DBManager.get_rfr_message(guild.id, channel.id, msg_id)
+    DBManager.add_rfr_message_emoji_role(er_id, emoji.demojize("👍"), unicode_role.id)
+    DBManager.add_rfr_message_emoji_role(er_id, str(custom_emoji), custom_role.id)
+
+    with mock.patch("discord.abc.Messageable.fetch_message") as fetch_message:
+        assert await rfr_cog.get_role_member_info(discord.PartialEmoji(name="👍"), guild.id, channel.id, msg_id,
+                                                  member.id) == (member, unicode_role)
+        assert await rfr_cog.get_role_member_info(custom_emoji, guild.id, channel.id, msg_id,
+                                                  member.id) == (member, custom_role)
+        # A renamed custom emoji still has the same ID
+        renamed_emoji = discord.PartialEmoji(name="renamed", id=custom_emoji.id)
+        assert await rfr_cog.get_role_member_info(renamed_emoji, guild.id, channel.id, msg_id,
+                                                  member.id) == (member, custom_role)
+        assert await rfr_cog.get_role_member_info(discord.PartialEmoji(name="👎"), guild.id, channel.id, msg_id,
+                                                  member.id) is None
+        assert await rfr_cog.get_role_member_info(discord.PartialEmoji(name="👍"), guild.id, channel.id, msg_id,
+                                                  dpyfactory.make_id()) is None
+        fetch_message.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_reaction_gives_and_removes_role(rfr_cog):
+    config: dpytest.RunnerConfig = dpytest.get_config()
+    guild: discord.Guild = config.guilds[0]
+    member: discord.Member = await dpytest.member_join()
+    role = testutils.fake_guild_role(guild)
+    rfr_message = dpytest.back.make_message("FakeContent", config.client.user, guild.text_channels[0])
+    DBManager.add_rfr_message(guild.id, rfr_message.channel.id, rfr_message.id)
+    _, _, _, er_id = DBManager.get_rfr_message(guild.id, rfr_message.channel.id, rfr_message.id)
+    DBManager.add_rfr_message_emoji_role(er_id, emoji.demojize("👍"), role.id)
+
+    with mock.patch("discord.abc.Messageable.fetch_message") as fetch_message:
+        await dpytest.add_reaction(member, rfr_message, "👍")
+        await rfr_cog.role_updates.flush()
+        assert role in member.roles
+        assert rfr_cog.member_reactions.get(guild.id, member.id) == \
+               {(rfr_message.channel.id, rfr_message.id, get_emoji_key("👍"))}
+        await dpytest.remove_reaction(member, rfr_message, "👍")
+        await rfr_cog.role_updates.flush()
+        assert role not in member.roles
+        assert not rfr_cog.member_reactions.get(guild.id, member.id)
+        fetch_message.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_unload_applies_queued_role_changes(rfr_cog):
+    config: dpytest.RunnerConfig = dpytest.get_config()
+    guild: discord.Guild = config.guilds[0]
+    member: discord.Member = await dpytest.member_join()
+    role = testutils.fake_guild_role(guild)
+    rfr_message = dpytest.back.make_message("FakeContent", config.client.user, guild.text_channels[0])
+    DBManager.add_rfr_message(guild.id, rfr_message.channel.id, rfr_message.id)
+    _, _, _, er_id = DBManager.get_rfr_message(guild.id, rfr_message.channel.id, rfr_message.id)
+    DBManager.add_rfr_message_emoji_role(er_id, emoji.demojize("👍"), role.id)
+    rfr_cog.role_updates.delay = 60
+
+    await dpytest.add_reaction(member, rfr_message, "👍")
+    assert role not in member.roles
+    rfr_cog.cog_unload()
+    await asyncio.sleep(0.1)
+    assert role in member.roles
+    assert not rfr_cog.role_updates._timers
+
+
+@pytest.mark.asyncio
+async def test_disallowed_member_loses_rfr_roles_and_reactions(rfr_cog):
+    config: dpytest.RunnerConfig = dpytest.get_config()
+    guild: discord.Guild = config.guilds[0]
+    channel: discord.TextChannel = guild.text_channels[0]
+    required_role = testutils.fake_guild_role(guild)
+    other_role = testutils.fake_guild_role(guild)
+    DBManager.add_guild_rfr_required_role(guild.id, required_role.id)
+
+    messages = []
+    roles = []
+    for i in range(3):
+        message = dpytest.back.make_message("FakeContent", config.client.user, channel)
+        DBManager.add_rfr_message(guild.id, channel.id, message.id)
+        _, _, _, er_id = DBManager.get_rfr_message(guild.id, channel.id, message.id)
+        message_roles = [testutils.fake_guild_role(guild) for _ in range(2)]
+        DBManager.add_rfr_message_emoji_role(er_id, emoji.demojize("👍"), message_roles[0].id)
+        DBManager.add_rfr_message_emoji_role(er_id, emoji.demojize("👎"), message_roles[1].id)
+        messages.append(message)
+        roles.append(message_roles)
+
+    member: discord.Member = await dpytest.member_join()
+    await member.add_roles(other_role, roles[0][0], roles[1][1])
+    # The member reacted for one of their roles, and for a role they don't have, but not for their other role
+    rfr_cog.member_reactions.add(guild.id, member.id, channel.id, messages[0].id, get_emoji_key("👍"))
+    rfr_cog.member_reactions.add(guild.id, member.id, channel.id, messages[1].id, get_emoji_key("👍"))
+
+    with mock.patch("discord.abc.Messageable.fetch_message") as fetch_message, \
+            mock.patch("discord.PartialMessage.remove_reaction", mock.AsyncMock()) as remove_reaction, \
+            mock.patch("discord.Member.edit", mock.AsyncMock()) as edit:
+        await dpytest.add_reaction(member, messages[2], "👍")
+        await rfr_cog.role_updates.flush()
+
+        fetch_message.assert_not_called()
+        # Both rfr roles are taken in a single edit
+        edit.assert_awaited_once()
+        assert set(edit.await_args.kwargs["roles"]) == {other_role}
+        # Only the member's reactions, and the new reaction, are removed
+        assert sorted((call.args[0], call.args[1].id) for call in remove_reaction.await_args_list) == \
+               [("👍", member.id)] * 3
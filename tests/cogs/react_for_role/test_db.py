@@ -21,6 +21,7 @@ from discord.ext.test import factories as dpyfactory
 
 # Own modules
 from koala.cogs.react_for_role.db import ReactForRoleDBManager
+from koala.cogs.react_for_role.index import RFRMessageIndex
 from koala.db import session_manager
 from tests.tests_utils import utils as testutils
 
@@ -229,6 +230,91 @@ async def test_rfr_db_functions_rfr_message_emoji_roles():
                 rfr_message_emoji_roles[1][2]) not in independent_get_rfr_message_emoji_role(session)
 
 
+@pytest.mark.asyncio
+async def test_rfr_message_index():
+    guild: discord.Guild = dpytest.get_config().guilds[0]
+    channel: discord.TextChannel = dpytest.get_config().channels[0]
+    msg_id = dpyfactory.make_id()
+    role_id_1 = dpyfactory.make_id()
+    role_id_2 = dpyfactory.make_id()
+    index = DBManager.index
+
+    assert not DBManager.is_rfr_message(guild.id, channel.id, msg_id)
+    DBManager.add_rfr_message(guild.id, channel.id, msg_id)
+    assert DBManager.is_rfr_message(guild.id, channel.id, msg_id)
+    er_id = index.get_emoji_role_id(guild.id, channel.id, msg_id)
+    assert er_id == DBManager.get_rfr_message(guild.id, channel.id, msg_id)[3]
+
+    DBManager.add_rfr_message_emoji_role(er_id, ":thumbs_up:", role_id_1)
+    DBManager.add_rfr_message_emoji_role(er_id, "<:custom:1234>", role_id_2)
+    assert index.get_role_id(guild.id, channel.id, msg_id, "\U0001F44D") == role_id_1
+    assert index.get_role_id(guild.id, channel.id, msg_id, "1234") == role_id_2
+
+    # The index is rebuilt from the database on startup
+    index.clear()
+    DBManager.load_rfr_message_index()
+    assert index.get_role_id(guild.id, channel.id, msg_id, "\U0001F44D") == role_id_1
+
+    DBManager.remove_rfr_message_emoji_role(er_id, emoji_raw=":thumbs_up:")
+    assert index.get_role_id(guild.id, channel.id, msg_id, "\U0001F44D") is None
+    DBManager.remove_rfr_message_emoji_role(er_id, role_id=role_id_2)
+    assert index.get_role_id(guild.id, channel.id, msg_id, "1234") is None
+
+    DBManager.remove_rfr_message(guild.id, channel.id, msg_id)
+    assert not DBManager.is_rfr_message(guild.id, channel.id, msg_id)
+
+
+def test_rfr_message_index_remove_emoji_of_shared_role():
+    index = RFRMessageIndex()
+    index.add_message(1, 2, 3, 4)
+    index.add_emoji_role(4, ":thumbs_up:", 10)
+    index.add_emoji_role(4, "<:custom:1234>", 10)
+    index.add_emoji_role(4, ":red_heart:", 11)
+    index.add_emoji_role(4, "\u2764\ufe0f", 11)
+
+    # Only the removed emoji stops giving the role
+    index.remove_emoji_role(4, emoji_raw=":thumbs_up:")
+    assert index.get_role_id(1, 2, 3, "\U0001F44D") is None
+    assert index.get_role_id(1, 2, 3, "1234") == 10
+    # Another form of the same emoji still gives its role
+    index.remove_emoji_role(4, emoji_raw=":red_heart:")
+    assert index.get_role_id(1, 2, 3, "\u2764") == 11
+
+
+def test_rfr_message_index_not_shared():
+    manager = ReactForRoleDBManager()
+    assert manager.index is not DBManager.index
+    assert manager.guild_roles is not DBManager.guild_roles
+
+
+@pytest.mark.asyncio
+async def test_guild_rfr_role_cache():
+    guild: discord.Guild = dpytest.get_config().guilds[0]
+    channel: discord.TextChannel = dpytest.get_config().channels[0]
+    role_ids = [dpyfactory.make_id() for _ in range(3)]
+    DBManager.add_rfr_message(guild.id, channel.id, dpyfactory.make_id())
+    DBManager.add_rfr_message(guild.id, channel.id, dpyfactory.make_id())
+    er_ids = [message[3] for message in DBManager.get_guild_rfr_messages(guild.id)]
+    DBManager.add_rfr_message_emoji_role(er_ids[0], ":thumbs_up:", role_ids[0])
+    DBManager.add_rfr_message_emoji_role(er_ids[1], ":thumbs_up:", role_ids[1])
+    DBManager.add_guild_rfr_required_role(guild.id, role_ids[2])
+
+    with mock.patch("koala.cogs.react_for_role.db.session_manager", wraps=session_manager) as sessions:
+        guild_roles = DBManager.get_guild_rfr_role_sets(guild.id)
+        assert sorted(DBManager.get_guild_rfr_roles(guild.id)) == sorted(role_ids[:2])
+        assert DBManager.get_guild_rfr_required_roles(guild.id) == [role_ids[2]]
+        assert guild_roles.required_role_set == {role_ids[2]}
+        # Both sets are loaded by one query, then served from the cache
+        assert sessions.call_count == 1
+
+    DBManager.remove_rfr_message_emoji_role(er_ids[0], role_id=role_ids[0])
+    assert DBManager.get_guild_rfr_roles(guild.id) == [role_ids[1]]
+    DBManager.remove_guild_rfr_required_role(guild.id, role_ids[2])
+    assert DBManager.get_guild_rfr_required_roles(guild.id) == []
+    DBManager.remove_rfr_message(guild.id, channel.id, DBManager.get_guild_rfr_messages(guild.id)[1][2])
+    assert DBManager.get_guild_rfr_roles(guild.id) == []
+
+
 @pytest.mark.asyncio
 async def test_rfr_db_functions_guild_rfr_required_roles():
     with session_manager() as session:
@@ -288,6 +374,7 @@ async def test_rfr_without_req_role(num_roles, num_required, rfr_cog):
                         mock.AsyncMock(return_value=(member, role_to_add))):
             with mock.patch("discord.Member.add_roles", mock.AsyncMock()) as add_role_mock:
                 await dpytest.add_reaction(member, rfr_message, react_emoji)
+                await rfr_cog.role_updates.flush()
                 assert all([m in member.roles for m in mem_roles])
                 add_role_mock.assert_not_called()
                 assert role_to_add not in member.roles
@@ -333,5 +420,6 @@ async def test_rfr_with_req_role(num_roles, num_required, rfr_cog):
         with mock.patch("koala.cogs.ReactForRole.get_role_member_info",
                         mock.AsyncMock(return_value=(member, role_to_add))):
             await dpytest.add_reaction(member, rfr_message, react_emoji)
+            await rfr_cog.role_updates.flush()
             assert all([m in member.roles for m in mem_roles])
             assert role_to_add in member.roles
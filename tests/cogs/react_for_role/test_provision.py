@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+
+"""
+Testing KoalaBot ReactForRole bulk provisioning
+
+Commented using reStructuredText (reST)
+"""
+# Futures
+
+# Built-in/Generic Imports
+import asyncio
+import json
+
+# Libs
+import discord
+import discord.ext.test as dpytest
+import emoji
+import mock
+import pytest
+from aiohttp import web
+
+# Own modules
+import koalabot
+from koala.cogs.react_for_role.api import ReactForRoleEndpoint
+from koala.cogs.react_for_role.provision import RFRSpecError, parse_rfr_spec, validate_rfr_spec
+from tests.tests_utils import utils as testutils
+from .utils import DBManager
+
+# Constants
+YAML_SPEC = """
+messages:
+  - channel: {channel}
+    title: Pronouns
+    roles:
+      - emoji: ":thumbs_up:"
+        role: {role_1}
+      - emoji: "\U0001F600"
+        role: "<@&{role_2}>"
+"""
+
+# Variables
+
+
+@pytest.fixture(autouse=True)
+def mock_overwrite_perms(rfr_cog):
+    rfr_cog.provisioner.overwrite_channel_add_reaction_perms = mock.AsyncMock()
+    return rfr_cog.provisioner.overwrite_channel_add_reaction_perms
+
+
+@pytest.fixture
+def api_client(bot, aiohttp_client, loop):
+    return loop.run_until_complete(aiohttp_client(ReactForRoleEndpoint(bot).register(web.Application())))
+
+
+def make_spec(channel, *messages):
+    return {"messages": [{"channel": channel.id, "title": title,
+                          "roles": [{"emoji": emoji_str, "role": role.id} for emoji_str, role in roles]}
+                         for title, roles in messages]}
+
+
+def get_reaction_emojis(message: discord.Message):
+    return [emoji.demojize(str(reaction.emoji)) for reaction in message.reactions if reaction.me]
+
+
+def test_parse_rfr_spec():
+    assert parse_rfr_spec('{"messages": []}') == {"messages": []}
+    assert parse_rfr_spec('```yaml\nmessages:\n  - title: a\n```') == {"messages": [{"title": "a"}]}
+    with pytest.raises(RFRSpecError):
+        parse_rfr_spec("messages: [")
+    with pytest.raises(RFRSpecError):
+        parse_rfr_spec("- just a list")
+
+
+@pytest.mark.asyncio
+async def test_validate_rfr_spec(bot, rfr_cog):
+    guild: discord.Guild = dpytest.get_config().guilds[0]
+    channel: discord.TextChannel = guild.text_channels[0]
+    role_1 = testutils.fake_guild_role(guild)
+    role_2 = testutils.fake_guild_role(guild)
+
+    spec = parse_rfr_spec(YAML_SPEC.format(channel=channel.name, role_1=role_1.name, role_2=role_2.id))
+    message_specs = validate_rfr_spec(bot, guild, spec, DBManager)
+    assert len(message_specs) == 1
+    assert message_specs[0].channel == channel
+    assert message_specs[0].emoji_roles == [(":thumbs_up:", role_1), (":grinning_face:", role_2)]
+
+    spec["messages"][0]["roles"].append({"emoji": "notanemoji", "role": "Not a role"})
+    spec["messages"][0]["roles"].append({"emoji": ":thumbs_up:", "role": role_1.id})
+    spec["messages"].append({"channel": 1, "message_id": 2, "roles": []})
+    with pytest.raises(RFRSpecError) as exc:
+        validate_rfr_spec(bot, guild, spec, DBManager)
+    assert exc.value.errors == ["messages[0].roles[2].emoji: 'notanemoji' isn't an emoji I can use",
+                                "messages[0].roles[2].role: Couldn't find role 'Not a role'",
+                                "messages[0].roles[3].emoji: Duplicate emoji :thumbs_up:",
+                                f"messages[0].roles[3].role: Duplicate role {role_1.name}",
+                                "messages[1].channel: Couldn't find text channel 1",
+                                "messages[1].roles: Must be a non-empty list"]
+
+    spec = make_spec(channel, ("Too many", [("\U0001F600", testutils.fake_guild_role(guild)) for _ in range(21)]))
+    with pytest.raises(RFRSpecError) as exc:
+        validate_rfr_spec(bot, guild, spec, DBManager)
+    assert "messages[0].roles: An rfr message can only have 20 roles" in exc.value.errors
+
+
+@pytest.mark.asyncio
+async def test_provision_is_idempotent(bot, rfr_cog, mock_overwrite_perms):
+    guild: discord.Guild = dpytest.get_config().guilds[0]
+    channel: discord.TextChannel = guild.text_channels[0]
+    roles = [testutils.fake_guild_role(guild) for _ in range(2)]
+    spec = make_spec(channel, ("Colours", [("\U0001F600", roles[0])]), ("Pronouns", [(":red_heart:", roles[1])]))
+
+    report = await rfr_cog.provisioner.provision(guild, validate_rfr_spec(bot, guild, spec, DBManager))
+    assert (report["created"], report["updated"], report["unchanged"], report["failed"]) == (2, 0, 0, 0)
+    mock_overwrite_perms.assert_awaited_once_with(guild, channel)
+    colours_id = report["messages"][0]["message_id"]
+    colours = await channel.fetch_message(colours_id)
+    assert colours.embeds[0].title == "Colours"
+    assert [field.value for field in colours.embeds[0].fields] == [roles[0].mention]
+    assert get_reaction_emojis(colours) == [":grinning_face:"]
+    er_id = DBManager.get_rfr_message(guild.id, channel.id, colours_id)[3]
+    assert DBManager.get_rfr_message_emoji_roles(er_id) == [(er_id, ":grinning_face:", roles[0].id)]
+
+    with mock.patch("discord.abc.Messageable.send") as mock_send, \
+            mock.patch("discord.Message.edit") as mock_edit, \
+            mock.patch("discord.Message.add_reaction") as mock_add_reaction:
+        report = await rfr_cog.provisioner.provision(guild, validate_rfr_spec(bot, guild, spec, DBManager))
+    assert report["unchanged"] == 2
+    mock_send.assert_not_called()
+    mock_edit.assert_not_called()
+    mock_add_reaction.assert_not_called()
+
+    # Move the role of the first message to another emoji
+    spec["messages"][0]["roles"] = [{"emoji": ":thumbs_up:", "role": roles[0].id}]
+    with mock.patch("discord.Message.clear_reaction", mock.AsyncMock()) as mock_clear_reaction, \
+            mock.patch("discord.Message.add_reaction", mock.AsyncMock()) as mock_add_reaction:
+        report = await rfr_cog.provisioner.provision(guild, validate_rfr_spec(bot, guild, spec, DBManager))
+    assert (report["created"], report["updated"], report["unchanged"]) == (0, 1, 1)
+    assert report["messages"][0] == {"channel_id": channel.id, "message_id": colours_id, "status": "updated",
+                                     "added": [":thumbs_up:"], "removed": [":grinning_face:"]}
+    mock_clear_reaction.assert_awaited_once_with("\U0001F600")
+    mock_add_reaction.assert_awaited_once_with("\U0001F44D")
+    assert DBManager.get_rfr_message_emoji_roles(er_id) == [(er_id, ":thumbs_up:", roles[0].id)]
+    assert DBManager.get_rfr_reaction_role_id(guild.id, channel.id, colours_id, "\U0001F44D") == roles[0].id
+    colours = await channel.fetch_message(colours_id)
+    assert [field.name for field in colours.embeds[0].fields] == ["\U0001F44D"]
+
+
+@pytest.mark.asyncio
+async def test_provision_channels_concurrently(bot, rfr_cog):
+    guild: discord.Guild = dpytest.get_config().guilds[0]
+    channels = [guild.text_channels[0], dpytest.backend.make_text_channel(name="roles", guild=guild)]
+    roles = [testutils.fake_guild_role(guild) for _ in range(3)]
+    spec = {"messages": [make_spec(channel, ("Roles", [("\U0001F600", roles[0]), (":thumbs_up:", roles[1]),
+                                                       (":red_heart:", roles[2])]))["messages"][0]
+                         for channel in channels]}
+    in_progress = set()
+    overlapped = []
+
+    async def add_reaction(message, reaction_emoji):
+        in_progress.add(message.channel.id)
+        overlapped.append(len(in_progress) > 1)
+        await asyncio.sleep(0)
+        in_progress.discard(message.channel.id)
+
+    with mock.patch("discord.Message.add_reaction", side_effect=add_reaction, autospec=True) as mock_add_reaction:
+        report = await rfr_cog.provisioner.provision(guild, validate_rfr_spec(bot, guild, spec, DBManager))
+    assert report["created"] == len(channels)
+    # Reactions are added in order within a message, with the channels provisioned at the same time
+    assert [call.args[1] for call in mock_add_reaction.call_args_list[::len(channels)]] == \
+           ["\U0001F600", "\U0001F44D", "\u2764\ufe0f"]
+    assert any(overlapped)
+
+
+@pytest.mark.asyncio
+async def test_provision_command(bot, rfr_cog):
+    guild: discord.Guild = dpytest.get_config().guilds[0]
+    channel: discord.TextChannel = guild.text_channels[0]
+    role = testutils.fake_guild_role(guild)
+
+    await dpytest.message(koalabot.COMMAND_PREFIX + "rfr provision foo: bar")
+    assert dpytest.verify().message().content("Found some issues with your spec, nothing was changed:\n"
+                                              "The spec must have a non-empty list of messages")
+    spec = json.dumps(make_spec(channel, ("Roles", [(":thumbs_up:", role)])))
+    await dpytest.message(koalabot.COMMAND_PREFIX + f"rfr provision ```json\n{spec}```")
+    assert dpytest.verify().message().content("Okay, provisioning 1 react for role messages. This may take a while.")
+    assert dpytest.verify().message()
+    assert dpytest.verify().message().content("Okay, done. 1 created, 0 updated, 0 unchanged, 0 failed.")
+    assert len(DBManager.get_guild_rfr_messages(guild.id)) == 1
+
+
+async def test_post_provision(api_client):
+    client = api_client
+    guild: discord.Guild = dpytest.get_config().guilds[0]
+    channel: discord.TextChannel = guild.text_channels[0]
+    role = testutils.fake_guild_role(guild)
+    spec = json.dumps(make_spec(channel, ("Roles", [(":thumbs_up:", role)])))
+
+    with mock.patch("koala.cogs.react_for_role.api.extension_enabled", return_value=False):
+        resp = await client.post('/provision', data={"guild_id": str(guild.id), "spec": spec})
+    assert resp.status == 403
+
+    with mock.patch("koala.cogs.react_for_role.api.extension_enabled", return_value=True):
+        resp = await client.post('/provision', data={"guild_id": str(guild.id), "spec": "messages: []"})
+        assert resp.status == 422
+        assert (await resp.json()) == {"errors": ["The spec must have a non-empty list of messages"]}
+
+        resp = await client.post('/provision', data={"guild_id": str(guild.id), "spec": spec})
+        assert resp.status == 200
+        report = await resp.json()
+    assert report["created"] == 1
+    assert DBManager.is_rfr_message(guild.id, channel.id, report["messages"][0]["message_id"])
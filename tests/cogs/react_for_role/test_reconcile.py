@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+
+"""
+Testing KoalaBot ReactForRole startup reconciliation
+
+Commented using reStructuredText (reST)
+"""
+# Futures
+
+# Built-in/Generic Imports
+import asyncio
+
+# Libs
+import discord
+import emoji
+import mock
+import pytest
+
+# Own modules
+from koala.cogs.react_for_role.index import RFRMemberReactions, RFRMessageIndex
+from koala.cogs.react_for_role.reconcile import RFRReconciler
+from koala.cogs.react_for_role.utils import get_emoji_key
+
+# Constants
+GUILD_ID = 1
+CHANNEL_ID = 2
+ROLE_ID = 3
+OTHER_ROLE_ID = 4
+
+# Variables
+
+
+class FakeUsers:
+    """
+    The async iterator returned by Reaction.users
+    """
+
+    def __init__(self, users):
+        self._users = iter(users)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._users)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+def make_member(member_id, bot=False):
+    member = mock.MagicMock()
+    member.id = member_id
+    member.bot = bot
+    return member
+
+
+def make_reaction(reaction_emoji, users):
+    reaction = mock.MagicMock()
+    reaction.emoji = reaction_emoji
+    reaction.users = lambda: FakeUsers(users)
+    return reaction
+
+
+@pytest.fixture
+def guild():
+    guild = mock.MagicMock()
+    guild.id = GUILD_ID
+    guild.members = {member_id: make_member(member_id) for member_id in range(100, 110)}
+    guild.get_member.side_effect = guild.members.get
+    roles = {}
+    for role_id in (ROLE_ID, OTHER_ROLE_ID):
+        role = mock.MagicMock()
+        role.id = role_id
+        role.members = []
+        roles[role_id] = role
+    guild.roles = roles
+    guild.get_role.side_effect = roles.get
+    return guild
+
+
+@pytest.fixture
+def reconciler(guild):
+    bot = mock.MagicMock()
+    bot.get_guild.return_value = guild
+    db_manager = mock.MagicMock()
+    db_manager.index = RFRMessageIndex()
+    db_manager.get_guild_rfr_emoji_roles.side_effect = db_manager.index.get_guild_emoji_roles
+    db_manager.get_rfr_reconcile_checkpoint.return_value = []
+    return RFRReconciler(bot, db_manager, mock.MagicMock(), lambda member: member.id != 109)
+
+
+def add_message(reconciler, message_id, emoji_roles, reactions):
+    index = reconciler.rfr_database_manager.index
+    index.add_message(GUILD_ID, CHANNEL_ID, message_id, message_id)
+    for emoji_raw, role_id in emoji_roles.items():
+        index.add_emoji_role(message_id, emoji_raw, role_id)
+    message = mock.MagicMock()
+    message.reactions = reactions
+    return message
+
+
+@pytest.mark.asyncio
+async def test_reconcile_roles_with_reactions(reconciler, guild):
+    members = guild.members
+    guild.roles[ROLE_ID].members = [members[100], members[101], members[102]]
+    guild.roles[OTHER_ROLE_ID].members = [members[105]]
+    message = add_message(reconciler, 10, {emoji.demojize("👍"): ROLE_ID, "<:koala:123>": OTHER_ROLE_ID},
+                          [make_reaction("👍", [members[101], members[102], members[103], members[109],
+                                                make_member(999, bot=True)])])
+    guild.get_channel.return_value.fetch_message = mock.AsyncMock(return_value=message)
+
+    await reconciler.start()
+
+    role_updates = reconciler.role_updates
+    # 103 reacted without the role, 109 did too but isn't allowed rfr roles
+    assert role_updates.add.call_args_list == [mock.call(members[103], guild.roles[ROLE_ID])]
+    # Roles held without a reaction are kept unless removing roles is enabled
+    role_updates.remove.assert_not_called()
+    assert reconciler.progress == {"messages": 1, "reconciled": 1, "added": 1, "removed": 0, "failed": 0}
+    assert not reconciler.checkpoint
+    reconciler.rfr_database_manager.add_rfr_reconcile_checkpoint.assert_called_once_with(GUILD_ID, CHANNEL_ID, 10)
+    reconciler.rfr_database_manager.clear_rfr_reconcile_checkpoint.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_reconcile_records_member_reactions(reconciler, guild):
+    members = guild.members
+    reconciler.member_reactions = RFRMemberReactions()
+    message = add_message(reconciler, 10, {emoji.demojize("👍"): ROLE_ID, "<:koala:123>": OTHER_ROLE_ID},
+                          [make_reaction("👍", [members[101], members[102]])])
+    guild.get_channel.return_value.fetch_message = mock.AsyncMock(return_value=message)
+
+    await reconciler.start()
+
+    for member_id in (101, 102):
+        assert reconciler.member_reactions.get(GUILD_ID, member_id) == {(CHANNEL_ID, 10, get_emoji_key("👍"))}
+    assert not reconciler.member_reactions.get(GUILD_ID, 103)
+
+
+@pytest.mark.asyncio
+async def test_reconcile_removes_rfr_only_roles(reconciler, guild):
+    members = guild.members
+    reconciler.remove_roles = True
+    guild.roles[ROLE_ID].members = [members[100], members[101]]
+    guild.roles[OTHER_ROLE_ID].members = [members[105]]
+    message = add_message(reconciler, 10, {emoji.demojize("👍"): ROLE_ID, "<:koala:123>": OTHER_ROLE_ID},
+                          [make_reaction("👍", [members[101]])])
+    # The other role is also given by another rfr message, so it could be held through that
+    add_message(reconciler, 11, {emoji.demojize("👍"): OTHER_ROLE_ID}, [])
+    guild.get_channel.return_value.fetch_message = mock.AsyncMock(
+        side_effect=[message, add_message(reconciler, 11, {}, [])])
+
+    await reconciler.start()
+
+    assert reconciler.role_updates.remove.call_args_list == [mock.call(members[100], guild.roles[ROLE_ID])]
+    assert reconciler.progress["removed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_reconcile_resumes_from_checkpoint(reconciler, guild):
+    fetched = []
+    first_fetch = asyncio.Event()
+    release = asyncio.Event()
+
+    async def fetch_message(message_id):
+        fetched.append(message_id)
+        first_fetch.set()
+        if len(fetched) == 1:
+            await release.wait()
+        return add_message(reconciler, message_id, {}, [])
+
+    for message_id in (10, 11, 12):
+        add_message(reconciler, message_id, {emoji.demojize("👍"): ROLE_ID}, [])
+    guild.get_channel.return_value.fetch_message = fetch_message
+
+    reconciler.start()
+    await first_fetch.wait()
+    reconciler.stop()
+    await asyncio.sleep(0)
+    assert not reconciler.running
+    reconciler.checkpoint.add((GUILD_ID, CHANNEL_ID, 11))
+
+    await reconciler.start()
+    assert fetched == [10, 10, 12]
+
+
+@pytest.mark.asyncio
+async def test_reconcile_resumes_from_stored_checkpoint(reconciler, guild):
+    for message_id in (10, 11):
+        add_message(reconciler, message_id, {emoji.demojize("👍"): ROLE_ID}, [])
+    guild.get_channel.return_value.fetch_message = mock.AsyncMock(return_value=add_message(reconciler, 11, {}, []))
+    # Message 10 was reconciled before a restart
+    reconciler.rfr_database_manager.get_rfr_reconcile_checkpoint.return_value = [(GUILD_ID, CHANNEL_ID, 10)]
+
+    await reconciler.start()
+    guild.get_channel.return_value.fetch_message.assert_awaited_once_with(11)
+    assert reconciler.progress["reconciled"] == 2
+
+
+@pytest.mark.asyncio
+async def test_reconcile_failure_continues(reconciler, guild):
+    response = mock.MagicMock(status=404, reason="Not Found")
+    add_message(reconciler, 10, {emoji.demojize("👍"): ROLE_ID}, [])
+    add_message(reconciler, 11, {emoji.demojize("👍"): ROLE_ID}, [])
+    guild.get_channel.return_value.fetch_message = mock.AsyncMock(
+        side_effect=[discord.NotFound(response, "Unknown Message"), add_message(reconciler, 11, {}, [])])
+
+    await reconciler.start()
+    assert reconciler.progress["reconciled"] == 2
+    assert reconciler.progress["failed"] == 1
@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+
+"""
+Testing KoalaBot ReactForRole coalesced role updates
+
+Commented using reStructuredText (reST)
+"""
+# Futures
+
+# Built-in/Generic Imports
+import asyncio
+import random
+
+# Libs
+import discord
+import mock
+import pytest
+
+# Own modules
+from koala.cogs.react_for_role.role_updates import RoleUpdateQueue
+
+# Constants
+GUILD_ID = 1
+
+# Variables
+
+
+class FakeRole:
+    def __init__(self, role_id, default=False):
+        self.id = role_id
+        self.default = default
+
+    def is_default(self):
+        return self.default
+
+
+class FakeMember:
+    """
+    A member whose role requests are counted and applied immediately
+    """
+
+    def __init__(self, member_id, guild, roles, calls):
+        self.id = member_id
+        self.guild = guild
+        self.roles = list(roles)
+        self.calls = calls
+
+    async def add_roles(self, *roles):
+        self.calls["add_roles"] += 1
+        self.roles += [role for role in roles if role not in self.roles]
+
+    async def remove_roles(self, *roles):
+        self.calls["remove_roles"] += 1
+        self.roles = [role for role in self.roles if role not in roles]
+
+    async def edit(self, roles):
+        self.calls["edit"] += 1
+        self.roles = [self.guild.default_role] + list(roles)
+
+
+@pytest.fixture
+def calls():
+    return {"add_roles": 0, "remove_roles": 0, "edit": 0}
+
+
+@pytest.fixture
+def guild():
+    guild = mock.MagicMock()
+    guild.id = GUILD_ID
+    guild.default_role = FakeRole(GUILD_ID, default=True)
+    guild.members = {}
+    guild.get_member.side_effect = guild.members.get
+    return guild
+
+
+@pytest.fixture
+def make_member(guild, calls):
+    def make_member(member_id):
+        member = FakeMember(member_id, guild, [guild.default_role], calls)
+        guild.members[member_id] = member
+        return member
+    return make_member
+
+
+@pytest.mark.asyncio
+async def test_single_change_uses_single_role_request(make_member, calls):
+    queue = RoleUpdateQueue(delay=0)
+    member = make_member(1)
+    role = FakeRole(10)
+    queue.add(member, role)
+    await asyncio.sleep(0.01)
+    assert role in member.roles
+    assert calls == {"add_roles": 1, "remove_roles": 0, "edit": 0}
+
+
+@pytest.mark.asyncio
+async def test_changes_coalesced(make_member, calls):
+    queue = RoleUpdateQueue(delay=10)
+    member = make_member(1)
+    kept = FakeRole(10)
+    member.roles.append(kept)
+    roles = [FakeRole(i) for i in range(11, 15)]
+    for role in roles:
+        queue.add(member, role)
+    queue.remove(member, roles[0])
+    queue.remove(member, kept)
+    queue.add(member, kept)
+    await queue.flush()
+
+    assert set(member.roles) == {member.guild.default_role, kept, *roles[1:]}
+    assert calls == {"add_roles": 0, "remove_roles": 0, "edit": 1}
+
+
+@pytest.mark.asyncio
+async def test_member_requests_serialised(make_member):
+    queue = RoleUpdateQueue(delay=0)
+    member = make_member(1)
+    roles = [FakeRole(i) for i in range(10, 14)]
+    in_progress = 0
+    most_in_progress = 0
+    edits = []
+
+    # The cached roles aren't changed, as if discord hadn't sent the member's update yet
+    async def edit(roles):
+        nonlocal in_progress, most_in_progress
+        in_progress += 1
+        most_in_progress = max(most_in_progress, in_progress)
+        await asyncio.sleep(0.05)
+        edits.append(set(roles))
+        in_progress -= 1
+
+    member.edit = edit
+    queue.add(member, roles[0])
+    queue.add(member, roles[1])
+    await asyncio.sleep(0.01)
+    queue.add(member, roles[2])
+    queue.add(member, roles[3])
+    await queue.flush()
+
+    assert most_in_progress == 1
+    assert edits == [{roles[0], roles[1]}, set(roles)]
+
+
+@pytest.mark.asyncio
+async def test_no_request_when_unchanged(make_member, calls):
+    queue = RoleUpdateQueue(delay=10)
+    member = make_member(1)
+    role = FakeRole(10)
+    queue.add(member, role)
+    queue.remove(member, role)
+    await queue.flush()
+    assert calls == {"add_roles": 0, "remove_roles": 0, "edit": 0}
+
+
+@pytest.mark.asyncio
+async def test_retries_temporary_failure(make_member, calls):
+    queue = RoleUpdateQueue(delay=0, backoff=0)
+    member = make_member(1)
+    role = FakeRole(10)
+    response = mock.MagicMock(status=500, reason="Internal Server Error")
+    member.add_roles = mock.AsyncMock(side_effect=[discord.HTTPException(response, "error"), None])
+    queue.add(member, role)
+    await queue.flush()
+    assert member.add_roles.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_forbidden_not_retried(make_member):
+    queue = RoleUpdateQueue(delay=0, backoff=0)
+    member = make_member(1)
+    response = mock.MagicMock(status=403, reason="Forbidden")
+    member.add_roles = mock.AsyncMock(side_effect=discord.Forbidden(response, "Missing Permissions"))
+    queue.add(member, FakeRole(10))
+    await queue.flush()
+    member.add_roles.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_concurrency_limited(make_member):
+    queue = RoleUpdateQueue(delay=0, concurrency=3)
+    in_progress = 0
+    most_in_progress = 0
+
+    async def add_roles(*roles):
+        nonlocal in_progress, most_in_progress
+        in_progress += 1
+        most_in_progress = max(most_in_progress, in_progress)
+        await asyncio.sleep(0.01)
+        in_progress -= 1
+
+    for member_id in range(20):
+        member = make_member(member_id)
+        member.add_roles = add_roles
+        queue.add(member, FakeRole(10))
+    await queue.flush()
+    assert most_in_progress == 3
+
+
+@pytest.mark.asyncio
+async def test_reaction_burst_throughput(make_member, calls):
+    rng = random.Random(0)
+    queue = RoleUpdateQueue(delay=10)
+    members = [make_member(member_id) for member_id in range(500)]
+    roles = [FakeRole(role_id) for role_id in range(1000, 1020)]
+
+    # 5000 reactions: members clicking several roles quickly, and sometimes changing their mind
+    reactions = 0
+    for _ in range(10):
+        for member in members:
+            role = rng.choice(roles)
+            if rng.random() < 0.8:
+                queue.add(member, role)
+            else:
+                queue.remove(member, role)
+            reactions += 1
+    await queue.flush()
+
+    # Without coalescing, every reaction would be its own request
+    requests = sum(calls.values())
+    assert reactions == 5000
+    assert requests <= len(members)
+    assert requests * 10 <= reactions
@@ -216,9 +216,13 @@ async def test_add_team_to_twitch_alert(twitch_cog):
                                              f"Message: {twitch_alert.utils.DEFAULT_MESSAGE}",
                                  colour=KOALA_GREEN)
     # Creates Twitch Alert
-    await dpytest.message(f"{koalabot.COMMAND_PREFIX}twitch addTeam faze {channel.id}", channel=-1,
-                          member=member)
+    with mock.patch.object(twitch_cog.ta_database_manager, 'update_team_members', mock.AsyncMock()) as update, \
+            mock.patch.object(twitch_cog, 'reconcile_eventsub', mock.AsyncMock()) as reconcile:
+        await dpytest.message(f"{koalabot.COMMAND_PREFIX}twitch addTeam faze {channel.id}", channel=-1,
+                              member=member)
     assert dpytest.verify().message().embed(assert_embed)
+    update.assert_awaited_once_with(mock.ANY, "faze")
+    reconcile.assert_awaited_once()
 
 
 @pytest.mark.asyncio()
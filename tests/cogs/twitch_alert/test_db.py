@@ -8,6 +8,7 @@ Commented using reStructuredText (reST)
 # Futures
 
 # Built-in/Generic Imports
+import asyncio
 
 # Libs
 import discord.ext.test as dpytest
@@ -21,9 +22,11 @@ from sqlalchemy import select, update, insert, delete, and_, or_
 # Own modules
 from koala.cogs.twitch_alert.cog import TwitchAlert
 from koala.cogs.twitch_alert.db import TwitchAlertDBManager
-from koala.cogs.twitch_alert import utils
+from koala.cogs.twitch_alert.twitch_handler import TwitchAPIHandler
+from koala.cogs.twitch_alert import core, utils
 from koala.cogs.twitch_alert.models import TwitchAlerts, TeamInTwitchAlert, UserInTwitchTeam, UserInTwitchAlert
 from koala.db import session_manager, setup
+from koala.models import GuildExtensions
 
 # Constants
 DB_PATH = "Koala.db"
@@ -109,9 +112,10 @@ def test_new_ta_replace(twitch_alert_db_manager_tables):
     assert result.default_message == test_message
 
 
-def test_add_user_to_ta_default_message(twitch_alert_db_manager_tables):
+@pytest.mark.asyncio()
+async def test_add_user_to_ta_default_message(twitch_alert_db_manager_tables):
     twitch_alert_db_manager_tables.new_ta(1234, 1234567891, None)
-    twitch_alert_db_manager_tables.add_user_to_ta(1234567891, "monstercat", None, 1234)
+    await twitch_alert_db_manager_tables.add_user_to_ta(1234567891, "monstercat", None, 1234)
 
     sql_find_twitch_alert = select(UserInTwitchAlert.twitch_username, UserInTwitchAlert.custom_message)\
         .where(and_(UserInTwitchAlert.channel_id == 1234567891, UserInTwitchAlert.twitch_username == 'monstercat'))
@@ -121,9 +125,10 @@ def test_add_user_to_ta_default_message(twitch_alert_db_manager_tables):
     assert result.custom_message is None
 
 
-def test_add_user_to_ta_custom_message(twitch_alert_db_manager_tables):
+@pytest.mark.asyncio()
+async def test_add_user_to_ta_custom_message(twitch_alert_db_manager_tables):
     twitch_alert_db_manager_tables.new_ta(1234, 1234567892, None)
-    twitch_alert_db_manager_tables.add_user_to_ta(1234567892, "monstercat", "FiddleSticks {user} is live!", 1234)
+    await twitch_alert_db_manager_tables.add_user_to_ta(1234567892, "monstercat", "FiddleSticks {user} is live!", 1234)
 
     sql_find_twitch_alert = select(UserInTwitchAlert.twitch_username, UserInTwitchAlert.custom_message)\
         .where(and_(UserInTwitchAlert.channel_id == 1234567892, UserInTwitchAlert.twitch_username == 'monstercat'))
@@ -133,9 +138,81 @@ def test_add_user_to_ta_custom_message(twitch_alert_db_manager_tables):
     assert result.custom_message == "FiddleSticks {user} is live!"
 
 
+@pytest.mark.asyncio()
+async def test_add_user_to_ta_stores_user_id(twitch_alert_db_manager_tables):
+    with mock.patch.object(TwitchAPIHandler, 'get_user_data',
+                           return_value=[{'login': 'monstercat', 'id': '27446517'}]) as mock1:
+        await twitch_alert_db_manager_tables.add_user_to_ta(1234567893, "Monstercat", None, 1234)
+    mock1.assert_called_once_with(usernames=['monstercat'])
+
+    with session_manager() as session:
+        result = session.execute(select(UserInTwitchAlert.twitch_user_id)
+                                 .filter_by(channel_id=1234567893, twitch_username='monstercat')).one()
+    assert result.twitch_user_id == '27446517'
+
+
+@pytest.mark.asyncio()
+async def test_add_user_to_ta_unknown_user(twitch_alert_db_manager_tables):
+    with mock.patch.object(TwitchAPIHandler, 'get_user_data', return_value=[]), \
+            pytest.raises(ValueError, match="Twitch user notauser does not exist"):
+        await twitch_alert_db_manager_tables.add_user_to_ta(1234567894, "notauser", None, 1234)
+
+    with session_manager() as session:
+        assert session.execute(select(UserInTwitchAlert).filter_by(channel_id=1234567894)).one_or_none() is None
+
+
+@pytest.mark.asyncio()
+async def test_add_user_to_ta_invalid_username(twitch_alert_db_manager_tables):
+    with mock.patch.object(TwitchAPIHandler, 'get_user_data') as mock1, \
+            pytest.raises(ValueError, match="not a valid twitch username"):
+        await twitch_alert_db_manager_tables.add_user_to_ta(1234567895, "not a user!", None, 1234)
+    mock1.assert_not_called()
+
+
+def test_translate_names_to_ids(twitch_alert_db_manager_tables):
+    with session_manager() as session:
+        session.execute(insert(UserInTwitchAlert).values(channel_id=1, twitch_username='monstercat'))
+        session.execute(insert(UserInTwitchAlert).values(channel_id=1, twitch_username='deleteduser'))
+        session.execute(insert(UserInTwitchAlert).values(channel_id=1, twitch_username='invalid user'))
+        session.execute(insert(UserInTwitchTeam).values(team_twitch_alert_id=1, twitch_username='monstercat'))
+        session.commit()
+
+    with mock.patch.object(TwitchAPIHandler, 'get_user_data',
+                           return_value=[{'login': 'monstercat', 'id': '27446517'}]) as mock1:
+        twitch_alert_db_manager_tables.translate_names_to_ids()
+    mock1.assert_called_once()
+    assert sorted(mock1.call_args.kwargs['usernames']) == ['deleteduser', 'monstercat']
+
+    with session_manager() as session:
+        users = session.execute(select(UserInTwitchAlert.twitch_username, UserInTwitchAlert.twitch_user_id)).all()
+        team_users = session.execute(select(UserInTwitchTeam.twitch_user_id)).scalars().all()
+    assert sorted((user.twitch_username, user.twitch_user_id) for user in users) == \
+           [('deleteduser', None), ('invalid user', None), ('monstercat', '27446517')]
+    assert team_users == ['27446517']
+
+    # Users not found are looked up again
+    with mock.patch.object(TwitchAPIHandler, 'get_user_data', return_value=[]) as mock1:
+        twitch_alert_db_manager_tables.translate_names_to_ids()
+    mock1.assert_called_once()
+    assert mock1.call_args.kwargs['usernames'] == ['deleteduser']
+
+
+def test_translate_names_to_ids_twitch_error(twitch_alert_db_manager_tables):
+    with session_manager() as session:
+        session.execute(insert(UserInTwitchAlert).values(channel_id=1, twitch_username='monstercat'))
+        session.commit()
+
+    with mock.patch.object(TwitchAPIHandler, 'get_user_data', side_effect=ConnectionError()):
+        twitch_alert_db_manager_tables.translate_names_to_ids()
+
+    with session_manager() as session:
+        result = session.execute(select(UserInTwitchAlert.twitch_user_id)).scalars().all()
+    assert result == [None]
+
+
 @pytest.mark.asyncio()
 async def test_remove_user_from_ta(twitch_alert_db_manager_tables):
-    test_add_user_to_ta_default_message(twitch_alert_db_manager_tables)
+    await test_add_user_to_ta_default_message(twitch_alert_db_manager_tables)
     await twitch_alert_db_manager_tables.remove_user_from_ta(1234567891, "monstercat")
 
     sql_find_twitch_alert = select(UserInTwitchAlert.twitch_username, UserInTwitchAlert.custom_message)\
@@ -146,9 +223,13 @@ async def test_remove_user_from_ta(twitch_alert_db_manager_tables):
 
 @pytest.mark.asyncio()
 async def test_delete_message(twitch_alert_db_manager_tables):
-    with mock.patch.object(discord.TextChannel, 'fetch_message') as mock1:
+    with mock.patch.object(discord.TextChannel, 'get_partial_message') as mock1, \
+            mock.patch.object(discord.TextChannel, 'fetch_message') as mock2:
+        mock1.return_value.delete = mock.AsyncMock()
         await twitch_alert_db_manager_tables.delete_message(1234, dpytest.get_config().channels[0].id)
     mock1.assert_called_with(1234)
+    mock1.return_value.delete.assert_awaited_once()
+    mock2.assert_not_called()
 
 
 def test_add_team_to_ta(twitch_alert_db_manager_tables):
@@ -228,7 +309,7 @@ async def test_update_team_members(twitch_alert_db_manager_tables):
         session.execute(sql_insert_monstercat_team)
         session.commit()
 
-        twitch_alert_db_manager_tables.update_team_members(604, "monstercat")
+        await twitch_alert_db_manager_tables.update_team_members(604, "monstercat")
 
         sql_select_monstercat_team = select(UserInTwitchTeam).where(and_(UserInTwitchTeam.team_twitch_alert_id == 604,
                                                                          UserInTwitchTeam.twitch_username == 'monstercat'))
@@ -249,7 +330,7 @@ async def test_update_all_teams_members(twitch_alert_db_manager_tables):
         session.execute(sql_insert_monstercat_team)
         session.commit()
 
-        twitch_alert_db_manager_tables.update_all_teams_members()
+        await twitch_alert_db_manager_tables.update_all_teams_members()
 
         sql_select_monstercats_team = select(UserInTwitchTeam.twitch_username).where(and_(
                 or_(UserInTwitchTeam.team_twitch_alert_id == 614, UserInTwitchTeam.team_twitch_alert_id == 616),
@@ -259,19 +340,104 @@ async def test_update_all_teams_members(twitch_alert_db_manager_tables):
         assert len(result) == 2
 
 
+@pytest.mark.asyncio()
+async def test_update_all_teams_members_fetches_team_once(twitch_alert_db_manager_tables):
+    with session_manager() as session:
+        session.execute(insert(TeamInTwitchAlert).values(
+            team_twitch_alert_id=620, channel_id=621, twitch_team_name='koala'))
+        session.execute(insert(TeamInTwitchAlert).values(
+            team_twitch_alert_id=622, channel_id=623, twitch_team_name='koala'))
+        session.commit()
+
+    with mock.patch.object(TwitchAPIHandler, 'get_team_users',
+                           return_value=[{'user_id': '1', 'user_login': 'koala1'},
+                                         {'user_id': '2', 'user_login': 'koala2'}]) as mock1:
+        await twitch_alert_db_manager_tables.update_all_teams_members()
+    mock1.assert_called_once_with('koala')
+
+    with session_manager() as session:
+        result = session.execute(select(UserInTwitchTeam.twitch_username).where(
+            UserInTwitchTeam.team_twitch_alert_id.in_([620, 622]))).all()
+    assert sorted(user.twitch_username for user in result) == ['koala1', 'koala1', 'koala2', 'koala2']
+
+
+@pytest.mark.asyncio()
+async def test_update_all_teams_members_removes_departed(twitch_alert_db_manager_tables):
+    with session_manager() as session:
+        session.execute(insert(TeamInTwitchAlert).values(
+            team_twitch_alert_id=624, channel_id=625, twitch_team_name='koala'))
+        session.execute(insert(UserInTwitchTeam).values(
+            team_twitch_alert_id=624, twitch_username='stays', twitch_user_id='1', message_id=None))
+        session.execute(insert(UserInTwitchTeam).values(
+            team_twitch_alert_id=624, twitch_username='leaves', twitch_user_id='2', message_id=1))
+        session.commit()
+
+    with mock.patch.object(TwitchAPIHandler, 'get_team_users',
+                           return_value=[{'user_id': '1', 'user_login': 'stays'},
+                                         {'user_id': '3', 'user_login': 'joins'}]), \
+            mock.patch.object(TwitchAlertDBManager, 'delete_message') as mock1:
+        await twitch_alert_db_manager_tables.update_all_teams_members()
+    mock1.assert_called_once_with(1, 625)
+
+    with session_manager() as session:
+        result = session.execute(select(UserInTwitchTeam.twitch_username).where(
+            UserInTwitchTeam.team_twitch_alert_id == 624)).all()
+    assert sorted(user.twitch_username for user in result) == ['joins', 'stays']
+
+
+@pytest.mark.asyncio()
+async def test_update_all_teams_members_renamed(twitch_alert_db_manager_tables):
+    with session_manager() as session:
+        session.execute(insert(TeamInTwitchAlert).values(
+            team_twitch_alert_id=628, channel_id=629, twitch_team_name='koala'))
+        session.execute(insert(UserInTwitchTeam).values(
+            team_twitch_alert_id=628, twitch_username='oldname', twitch_user_id='1', message_id=1))
+        session.commit()
+
+    with mock.patch.object(TwitchAPIHandler, 'get_team_users',
+                           return_value=[{'user_id': '1', 'user_login': 'newname'}]), \
+            mock.patch.object(TwitchAlertDBManager, 'delete_message') as mock1:
+        await twitch_alert_db_manager_tables.update_all_teams_members()
+    mock1.assert_not_called()
+
+    with session_manager() as session:
+        result = session.execute(select(UserInTwitchTeam).filter_by(team_twitch_alert_id=628)).scalars().all()
+        assert [(user.twitch_username, user.twitch_user_id, user.message_id) for user in result] == \
+            [('newname', '1', 1)]
+
+
+@pytest.mark.asyncio()
+async def test_update_all_teams_members_keeps_members_on_error(twitch_alert_db_manager_tables):
+    with session_manager() as session:
+        session.execute(insert(TeamInTwitchAlert).values(
+            team_twitch_alert_id=626, channel_id=627, twitch_team_name='koala'))
+        session.execute(insert(UserInTwitchTeam).values(
+            team_twitch_alert_id=626, twitch_username='stays', message_id=None))
+        session.commit()
+
+    with mock.patch.object(TwitchAPIHandler, 'get_team_users', side_effect=IndexError()):
+        await twitch_alert_db_manager_tables.update_all_teams_members()
+
+    with session_manager() as session:
+        result = session.execute(select(UserInTwitchTeam.twitch_username).where(
+            UserInTwitchTeam.team_twitch_alert_id == 626)).all()
+    assert [user.twitch_username for user in result] == ['stays']
+
+
 @pytest.mark.asyncio()
 async def test_delete_all_offline_streams(twitch_alert_db_manager_tables, bot: discord.ext.commands.Bot):
     message_id = (await dpytest.message("test_msg", bot.guilds[0].channels[0])).id
     sql_add_message = insert(UserInTwitchAlert).values(
         channel_id=bot.guilds[0].channels[0].id,
         twitch_username='monstercat',
+        twitch_user_id='27446517',
         custom_message=None,
         message_id=message_id)
     with session_manager() as session:
         session.execute(sql_add_message)
         session.commit()
 
-        await twitch_alert_db_manager_tables.delete_all_offline_streams(['monstercat'])
+        await twitch_alert_db_manager_tables.delete_all_offline_streams(['27446517'])
 
         sql_select_messages = select(UserInTwitchAlert).where(and_(
             UserInTwitchAlert.twitch_username == 'monstercat',
@@ -295,8 +461,10 @@ async def test_delete_all_offline_streams_team(twitch_alert_db_manager_tables, b
     with session_manager() as session:
         session.execute(sql_add_message)
         session.commit()
+        user_id = session.execute(select(UserInTwitchTeam.twitch_user_id).where(
+            UserInTwitchTeam.twitch_username == 'monstercat')).scalars().first()
 
-        await twitch_alert_db_manager_tables.delete_all_offline_team_streams(['monstercat'])
+        await twitch_alert_db_manager_tables.delete_all_offline_team_streams([user_id])
 
         sql_select_messages = select(UserInTwitchTeam.message_id, UserInTwitchTeam.twitch_username).where(
             and_(or_(UserInTwitchTeam.team_twitch_alert_id == 614, UserInTwitchTeam.team_twitch_alert_id == 616),
@@ -308,6 +476,57 @@ async def test_delete_all_offline_streams_team(twitch_alert_db_manager_tables, b
         assert result[1].message_id is None
 
 
+@pytest.mark.asyncio
+async def test_send_user_stream_alerts_renamed(twitch_alert_db_manager_tables, bot: discord.ext.commands.Bot):
+    channel = bot.guilds[0].channels[0]
+    with session_manager() as session:
+        session.execute(insert(GuildExtensions).values(extension_id='TwitchAlert', guild_id=bot.guilds[0].id))
+        session.execute(insert(TwitchAlerts).values(guild_id=bot.guilds[0].id, channel_id=channel.id))
+        session.execute(insert(UserInTwitchAlert).values(channel_id=channel.id, twitch_username='oldname',
+                                                         twitch_user_id='27446517'))
+        session.commit()
+
+    stream_data = {'id': '3215560150671170227', 'user_id': '27446517', 'user_login': 'newname', 'type': 'live'}
+    with mock.patch.object(TwitchAlertDBManager, 'create_alert_embed',
+                           mock.AsyncMock(return_value=discord.Embed(title="newname is live"))):
+        await core.send_user_stream_alerts(bot, twitch_alert_db_manager_tables, stream_data)
+
+    with session_manager() as session:
+        result = session.execute(select(UserInTwitchAlert).filter_by(channel_id=channel.id)).scalars().one()
+        assert result.twitch_username == 'newname'
+        assert result.message_id is not None
+
+
+@pytest.mark.asyncio
+async def test_create_user_alerts_concurrent(twitch_alert_db_manager_tables, bot: discord.ext.commands.Bot):
+    channels = [bot.guilds[0].channels[0],
+                dpytest.backend.make_text_channel(name="TestChannel2", guild=bot.guilds[0])]
+    with session_manager() as session:
+        session.execute(insert(GuildExtensions).values(extension_id='TwitchAlert', guild_id=bot.guilds[0].id))
+        for channel in channels:
+            session.execute(insert(TwitchAlerts).values(guild_id=bot.guilds[0].id, channel_id=channel.id))
+            session.execute(insert(UserInTwitchAlert).values(channel_id=channel.id, twitch_username='monstercat',
+                                                             twitch_user_id='27446517'))
+            session.execute(insert(UserInTwitchAlert).values(channel_id=channel.id, twitch_username='renamed',
+                                                             twitch_user_id='27446518'))
+        session.commit()
+
+    streams = [{'id': '1', 'user_id': '27446517', 'user_login': 'monstercat', 'type': 'live'},
+               {'id': '2', 'user_id': '27446518', 'user_login': 'newname', 'type': 'live'}]
+    with mock.patch.object(twitch_alert_db_manager_tables.poller, 'poll_streams',
+                           mock.AsyncMock(return_value=(streams, set()))), \
+            mock.patch.object(TwitchAlertDBManager, 'create_alert_embed',
+                              mock.AsyncMock(return_value=discord.Embed(title="live"))):
+        await core.create_user_alerts(bot, twitch_alert_db_manager_tables, scheduled=False)
+
+    with session_manager() as session:
+        results = session.execute(select(UserInTwitchAlert)).scalars().all()
+        assert len(results) == 4
+        assert all(result.message_id is not None for result in results)
+        assert sorted(result.twitch_username for result in results) == ['monstercat', 'monstercat',
+                                                                        'newname', 'newname']
+
+
 @pytest.mark.asyncio
 async def test_create_alert_embed(twitch_alert_db_manager_tables):
     stream_data = {'id': '3215560150671170227', 'user_id': '27446517',
@@ -315,3 +534,20 @@ async def test_create_alert_embed(twitch_alert_db_manager_tables):
                    'title': 'Music 24/7'}
 
     assert type(await twitch_alert_db_manager_tables.create_alert_embed(stream_data, None)) is discord.Embed
+
+
+@pytest.mark.asyncio
+async def test_create_alert_embed_details_fetched_once(twitch_alert_db_manager_tables):
+    stream_data = {'id': '3215560150671170227', 'user_id': '27446517',
+                   "user_name": "Monstercat", 'user_login': "monstercat", 'game_id': "26936", 'type': 'live',
+                   'title': 'Music 24/7'}
+    alert_details = ({}, {})
+    with mock.patch.object(TwitchAPIHandler, 'get_user_data',
+                           return_value=[{'id': '27446517', 'profile_image_url': 'url'}]) as get_user_data, \
+            mock.patch.object(TwitchAPIHandler, 'get_game_data', return_value={'name': 'Music'}) as get_game_data:
+        embeds = await asyncio.gather(*[twitch_alert_db_manager_tables.create_alert_embed(stream_data, None,
+                                                                                          alert_details)
+                                        for _ in range(3)])
+    assert all(embed.fields[1].value == 'Music' for embed in embeds)
+    get_user_data.assert_called_once_with(ids=['27446517'])
+    get_game_data.assert_called_once_with("26936")
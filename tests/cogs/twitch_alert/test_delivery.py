@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+
+"""
+Testing KoalaBot twitch_alert alert delivery
+
+Commented using reStructuredText (reST)
+"""
+# Futures
+
+# Built-in/Generic Imports
+import asyncio
+
+# Libs
+import discord
+import discord.ext.test as dpytest
+import mock
+import pytest
+
+# Own modules
+from koala.cogs.twitch_alert.delivery import AlertDelivery
+
+# Constants
+
+# Variables
+
+
+class FakeChannel:
+    """
+    A channel that records the number of requests made to it at once
+    """
+    def __init__(self, channel_id, tracker, delay=0.01, errors=None):
+        self.id = channel_id
+        self.tracker = tracker
+        self.delay = delay
+        self.errors = list(errors or [])
+        self.sent = 0
+
+    async def send(self, embed):
+        self.tracker["current"] += 1
+        self.tracker["max"] = max(self.tracker["max"], self.tracker["current"])
+        self.tracker.setdefault(self.id, 0)
+        self.tracker[self.id] += 1
+        self.tracker["max_" + str(self.id)] = max(self.tracker.get("max_" + str(self.id), 0), self.tracker[self.id])
+        try:
+            await asyncio.sleep(self.delay)
+            if self.errors:
+                raise self.errors.pop(0)
+            self.sent += 1
+            return self.sent
+        finally:
+            self.tracker["current"] -= 1
+            self.tracker[self.id] -= 1
+
+
+def http_error(error_type, status):
+    response = mock.MagicMock(status=status, reason="error")
+    return error_type(response, "error")
+
+
+@pytest.fixture
+def tracker():
+    return {"current": 0, "max": 0}
+
+
+@pytest.mark.asyncio
+async def test_send_limits_concurrency(tracker):
+    delivery = AlertDelivery(concurrency=5, channel_concurrency=2)
+    channels = [FakeChannel(channel_id, tracker) for channel_id in range(10)]
+    await asyncio.gather(*[delivery.send(channel, None) for channel in channels for _ in range(4)])
+    assert sum(channel.sent for channel in channels) == 40
+    assert tracker["max"] == 5
+    assert all(tracker["max_" + str(channel.id)] <= 2 for channel in channels)
+
+
+@pytest.mark.asyncio
+async def test_send_is_concurrent(tracker):
+    delivery = AlertDelivery(concurrency=50, channel_concurrency=1)
+    channels = [FakeChannel(channel_id, tracker, delay=0.05) for channel_id in range(50)]
+    loop = asyncio.get_event_loop()
+    start = loop.time()
+    await asyncio.gather(*[delivery.send(channel, None) for channel in channels])
+    assert loop.time() - start < 0.05 * 10
+
+
+@pytest.mark.asyncio
+async def test_send_retries(tracker):
+    delivery = AlertDelivery(retries=2, backoff=0)
+    channel = FakeChannel(1, tracker, delay=0, errors=[http_error(discord.HTTPException, 500),
+                                                       http_error(discord.HTTPException, 503)])
+    assert await delivery.send(channel, None) == 1
+
+
+@pytest.mark.asyncio
+async def test_send_out_of_retries(tracker):
+    delivery = AlertDelivery(retries=1, backoff=0)
+    channel = FakeChannel(1, tracker, delay=0, errors=[http_error(discord.HTTPException, 500),
+                                                       http_error(discord.HTTPException, 500)])
+    with pytest.raises(discord.HTTPException):
+        await delivery.send(channel, None)
+
+
+@pytest.mark.asyncio
+async def test_send_forbidden_not_retried(tracker):
+    delivery = AlertDelivery(retries=3, backoff=0)
+    channel = FakeChannel(1, tracker, delay=0, errors=[http_error(discord.Forbidden, 403)])
+    with pytest.raises(discord.Forbidden):
+        await delivery.send(channel, None)
+    assert channel.errors == []
+    assert channel.sent == 0
+
+
+@pytest.mark.asyncio
+async def test_send_rate_limited_retried(tracker):
+    delivery = AlertDelivery(retries=1, backoff=0)
+    channel = FakeChannel(1, tracker, delay=0, errors=[http_error(discord.HTTPException, 429)])
+    assert await delivery.send(channel, None) == 1
+
+
+@pytest.mark.asyncio
+async def test_send_bad_request_not_retried(tracker):
+    delivery = AlertDelivery(retries=3, backoff=0)
+    channel = FakeChannel(1, tracker, delay=0, errors=[http_error(discord.HTTPException, 400),
+                                                       http_error(discord.HTTPException, 500)])
+    with pytest.raises(discord.HTTPException):
+        await delivery.send(channel, None)
+    assert len(channel.errors) == 1
+    assert channel.sent == 0
+
+
+@pytest.mark.asyncio
+async def test_delete_without_fetch(bot: discord.ext.commands.Bot):
+    channel = dpytest.get_config().channels[0]
+    message = await channel.send("test_msg")
+    with mock.patch.object(discord.TextChannel, 'fetch_message') as mock1:
+        await AlertDelivery().delete(channel, message.id)
+    mock1.assert_not_called()
+    with pytest.raises(discord.errors.NotFound):
+        await channel.fetch_message(message.id)
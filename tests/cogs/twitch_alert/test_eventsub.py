@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+
+"""
+Testing KoalaBot twitch_alert EventSub, using a local fake EventSub sender
+
+Commented using reStructuredText (reST)
+"""
+# Futures
+
+# Built-in/Generic Imports
+import asyncio
+import datetime
+import json
+import uuid
+
+# Libs
+import mock
+import pytest
+from aiohttp import web
+
+# Own modules
+from koala.cogs.twitch_alert import eventsub
+from koala.cogs.twitch_alert.api import TwitchAlertEndpoint
+
+# Constants
+SECRET = "test_eventsub_secret"
+CALLBACK_URL = "https://koalabot.uk/twitch-alert/eventsub"
+
+# Variables
+
+
+class FakeEventSubSender:
+    """
+    Sends EventSub messages to a client in the same way as Twitch
+    """
+    def __init__(self, client, secret=SECRET):
+        self.client = client
+        self.secret = secret
+
+    async def send(self, message_type, data, message_id=None, timestamp=None, signature=None):
+        body = json.dumps(data)
+        message_id = message_id or str(uuid.uuid4())
+        timestamp = timestamp or datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%f000Z")
+        headers = {
+            eventsub.MESSAGE_ID_HEADER: message_id,
+            eventsub.MESSAGE_TIMESTAMP_HEADER: timestamp,
+            eventsub.MESSAGE_SIGNATURE_HEADER:
+                signature or eventsub.sign_message(self.secret, message_id, timestamp, body),
+            eventsub.MESSAGE_TYPE_HEADER: message_type,
+            "Content-Type": "application/json"
+        }
+        return await self.client.post("/eventsub", data=body, headers=headers)
+
+    async def challenge(self, sub_id, challenge="test_challenge"):
+        return await self.send(eventsub.MESSAGE_TYPE_VERIFICATION, {
+            "challenge": challenge,
+            "subscription": {"id": sub_id, "status": "webhook_callback_verification_pending"}})
+
+    async def notify(self, sub_type, login, user_id="1", **kwargs):
+        return await self.send(eventsub.MESSAGE_TYPE_NOTIFICATION, {
+            "subscription": {"id": sub_type + user_id, "type": sub_type,
+                             "condition": {"broadcaster_user_id": user_id}},
+            "event": {"broadcaster_user_id": user_id, "broadcaster_user_login": login}}, **kwargs)
+
+    async def revoke(self, sub_type, user_id="1"):
+        return await self.send(eventsub.MESSAGE_TYPE_REVOCATION, {
+            "subscription": {"id": sub_type + user_id, "type": sub_type, "status": "authorization_revoked",
+                             "condition": {"broadcaster_user_id": user_id}}})
+
+
+@pytest.fixture
+def twitch_handler():
+    handler = mock.MagicMock()
+    handler.get_eventsub_subscriptions.return_value = []
+    handler.create_eventsub_subscription.side_effect = \
+        lambda sub_type, user_id, callback, secret: {"id": sub_type + user_id, "type": sub_type,
+                                                     "status": "webhook_callback_verification_pending",
+                                                     "condition": {"broadcaster_user_id": user_id}}
+    return handler
+
+
+@pytest.fixture
+def eventsub_manager(twitch_handler):
+    return eventsub.TwitchEventSubManager(twitch_handler, CALLBACK_URL, SECRET,
+                                          mock.AsyncMock(), mock.AsyncMock())
+
+
+@pytest.fixture
+def sender(eventsub_manager, aiohttp_client, loop):
+    app = web.Application()
+    app.add_routes([web.post('/eventsub', eventsub_manager.handle_callback)])
+    return FakeEventSubSender(loop.run_until_complete(aiohttp_client(app)))
+
+
+def test_reconcile_creates_subscriptions(eventsub_manager, twitch_handler):
+    assert not eventsub_manager.reconcile(["1", "2"])
+    assert twitch_handler.create_eventsub_subscription.call_count == 4
+    assert set(eventsub_manager.subscriptions.keys()) == {(eventsub.STREAM_ONLINE, "1"), (eventsub.STREAM_OFFLINE, "1"),
+                                                          (eventsub.STREAM_ONLINE, "2"), (eventsub.STREAM_OFFLINE, "2")}
+
+
+def test_reconcile_removes_unwanted_subscriptions(eventsub_manager, twitch_handler):
+    twitch_handler.get_eventsub_subscriptions.return_value = [
+        {"id": "keep", "type": eventsub.STREAM_ONLINE, "status": "enabled",
+         "condition": {"broadcaster_user_id": "1"}, "transport": {"callback": CALLBACK_URL}},
+        {"id": "keep2", "type": eventsub.STREAM_OFFLINE, "status": "enabled",
+         "condition": {"broadcaster_user_id": "1"}, "transport": {"callback": CALLBACK_URL}},
+        {"id": "old", "type": eventsub.STREAM_ONLINE, "status": "enabled",
+         "condition": {"broadcaster_user_id": "99"}, "transport": {"callback": CALLBACK_URL}},
+        {"id": "failed", "type": eventsub.STREAM_OFFLINE, "status": "webhook_callback_verification_failed",
+         "condition": {"broadcaster_user_id": "1"}, "transport": {"callback": CALLBACK_URL}}]
+    assert eventsub_manager.reconcile(["1"])
+    twitch_handler.create_eventsub_subscription.assert_not_called()
+    twitch_handler.delete_eventsub_subscription.assert_has_calls([mock.call("old"), mock.call("failed")],
+                                                                 any_order=True)
+
+
+def test_reconcile_failure_is_unhealthy(eventsub_manager, twitch_handler):
+    twitch_handler.get_eventsub_subscriptions.side_effect = Exception("Twitch is down")
+    assert not eventsub_manager.reconcile(["1"])
+    assert not eventsub_manager.healthy
+
+
+def test_reconcile_subscription_failure_is_unhealthy(eventsub_manager, twitch_handler):
+    twitch_handler.create_eventsub_subscription.side_effect = Exception("Subscription limit")
+    assert not eventsub_manager.reconcile(["1"])
+
+
+async def test_challenge_enables_subscriptions(sender, eventsub_manager):
+    eventsub_manager.reconcile(["1"])
+    resp = await sender.challenge(eventsub.STREAM_ONLINE + "1", challenge="abc123")
+    assert resp.status == 200
+    assert await resp.text() == "abc123"
+    assert not eventsub_manager.healthy
+    await sender.challenge(eventsub.STREAM_OFFLINE + "1")
+    assert eventsub_manager.healthy
+
+
+async def test_invalid_signature(sender, eventsub_manager):
+    resp = await sender.notify(eventsub.STREAM_ONLINE, "monstercat", signature="sha256=1234")
+    assert resp.status == 403
+    await asyncio.sleep(0)
+    eventsub_manager.on_online.assert_not_called()
+
+
+async def test_wrong_secret(sender, eventsub_manager):
+    sender.secret = "not_the_secret"
+    resp = await sender.challenge("abc")
+    assert resp.status == 403
+
+
+async def test_old_message(sender, eventsub_manager):
+    old = (datetime.datetime.utcnow() - datetime.timedelta(hours=1)).strftime("%Y-%m-%dT%H:%M:%SZ")
+    resp = await sender.notify(eventsub.STREAM_ONLINE, "monstercat", timestamp=old)
+    assert resp.status == 403
+
+
+async def test_stream_online(sender, eventsub_manager):
+    resp = await sender.notify(eventsub.STREAM_ONLINE, "monstercat")
+    assert resp.status == 204
+    await asyncio.sleep(0)
+    eventsub_manager.on_online.assert_awaited_once()
+    assert eventsub_manager.on_online.call_args[0][0].get("broadcaster_user_login") == "monstercat"
+    eventsub_manager.on_offline.assert_not_called()
+
+
+async def test_stream_offline(sender, eventsub_manager):
+    resp = await sender.notify(eventsub.STREAM_OFFLINE, "monstercat")
+    assert resp.status == 204
+    await asyncio.sleep(0)
+    eventsub_manager.on_offline.assert_awaited_once()
+    eventsub_manager.on_online.assert_not_called()
+
+
+async def test_duplicate_message(sender, eventsub_manager):
+    await sender.notify(eventsub.STREAM_ONLINE, "monstercat", message_id="dup")
+    await sender.notify(eventsub.STREAM_ONLINE, "monstercat", message_id="dup")
+    await asyncio.sleep(0)
+    eventsub_manager.on_online.assert_awaited_once()
+
+
+async def test_revocation_falls_back_to_polling(sender, eventsub_manager):
+    eventsub_manager.reconcile(["1"])
+    await sender.challenge(eventsub.STREAM_ONLINE + "1")
+    await sender.challenge(eventsub.STREAM_OFFLINE + "1")
+    assert eventsub_manager.healthy
+    resp = await sender.revoke(eventsub.STREAM_ONLINE)
+    assert resp.status == 204
+    assert not eventsub_manager.healthy
+
+
+async def test_endpoint_disabled(aiohttp_client):
+    bot = mock.MagicMock()
+    bot.get_cog.return_value = None
+    app = TwitchAlertEndpoint(bot).register(web.Application())
+    client = await aiohttp_client(app)
+    resp = await client.post("/eventsub", data="{}")
+    assert resp.status == 404
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+
+"""
+Testing KoalaBot twitch_alert partitioned polling
+
+Commented using reStructuredText (reST)
+"""
+# Futures
+
+# Built-in/Generic Imports
+import threading
+
+# Libs
+import mock
+import pytest
+
+# Own modules
+from koala.cogs.twitch_alert.poller import HashRing, StreamPoller, POLL_MODE_THREAD
+
+# Constants
+USER_IDS = [str(i) for i in range(10000)]
+
+# Variables
+
+
+def fake_streams_data(user_ids):
+    return [{"id": "stream_" + user_id, "user_id": user_id, "user_login": "user" + user_id, "type": "live",
+             "thread": threading.get_ident()}
+            for user_id in user_ids if int(user_id) % 10 == 0]
+
+
+def test_partition_each_user_once():
+    slices = HashRing(4).partition(USER_IDS + USER_IDS[:100])
+    partitioned = [user_id for user_ids in slices.values() for user_id in user_ids]
+    assert sorted(partitioned) == sorted(USER_IDS)
+
+
+def test_partition_is_balanced():
+    slices = HashRing(4).partition(USER_IDS)
+    assert len(slices) == 4
+    for user_ids in slices.values():
+        assert len(USER_IDS) / 4 * 0.75 < len(user_ids) < len(USER_IDS) / 4 * 1.25
+
+
+def test_partition_is_stable():
+    assert HashRing(4).partition(USER_IDS) == HashRing(4).partition(USER_IDS)
+
+
+def test_partition_adding_worker_moves_few():
+    before = HashRing(4)
+    after = HashRing(5)
+    moved = [user_id for user_id in USER_IDS if before.get_worker(user_id) != after.get_worker(user_id)]
+    # Only users taken by the new worker should move
+    assert all(after.get_worker(user_id) == 4 for user_id in moved)
+    assert len(moved) < len(USER_IDS) / 5 * 1.25
+
+
+@pytest.mark.asyncio
+async def test_poll_streams_no_workers():
+    handler = mock.MagicMock()
+    handler.get_streams_data.side_effect = lambda user_ids: fake_streams_data(user_ids)
+    streams, unknown = await StreamPoller(handler).poll_streams(USER_IDS[:100])
+    handler.get_streams_data.assert_called_once_with(user_ids=USER_IDS[:100])
+    assert len(streams) == 10
+    assert unknown == set()
+
+
+@pytest.mark.asyncio
+async def test_poll_streams_thread_workers():
+    handler = mock.MagicMock()
+    handler.get_streams_data.side_effect = lambda user_ids: fake_streams_data(user_ids)
+    poller = StreamPoller(handler, workers=4, mode=POLL_MODE_THREAD)
+    try:
+        streams, unknown = await poller.poll_streams(USER_IDS)
+    finally:
+        poller.shutdown()
+    assert handler.get_streams_data.call_count == 4
+    assert sorted(stream.get("user_id") for stream in streams) == \
+        sorted(user_id for user_id in USER_IDS if int(user_id) % 10 == 0)
+    assert len({stream.get("thread") for stream in streams}) == 4
+    assert unknown == set()
+
+
+@pytest.mark.asyncio
+async def test_poll_streams_no_duplicates():
+    handler = mock.MagicMock()
+    handler.get_streams_data.side_effect = lambda user_ids: fake_streams_data(user_ids) + fake_streams_data(user_ids)
+    poller = StreamPoller(handler, workers=2, mode=POLL_MODE_THREAD)
+    try:
+        streams, _ = await poller.poll_streams(USER_IDS[:100])
+    finally:
+        poller.shutdown()
+    assert len(streams) == 10
+
+
+@pytest.mark.asyncio
+async def test_poll_streams_failed_worker():
+    ring = HashRing(2)
+    failing = [user_id for user_id in USER_IDS[:100] if ring.get_worker(user_id) == 0]
+
+    def streams_data(user_ids):
+        if user_ids == failing:
+            raise ConnectionError()
+        return fake_streams_data(user_ids)
+
+    handler = mock.MagicMock()
+    handler.get_streams_data.side_effect = streams_data
+    poller = StreamPoller(handler, workers=2, mode=POLL_MODE_THREAD)
+    try:
+        streams, unknown = await poller.poll_streams(USER_IDS[:100])
+    finally:
+        poller.shutdown()
+    assert unknown == set(failing)
+    assert all(stream.get("user_id") not in failing for stream in streams)
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+
+"""
+Testing KoalaBot twitch_alert adaptive poll scheduling
+
+Commented using reStructuredText (reST)
+"""
+# Futures
+
+# Built-in/Generic Imports
+import datetime
+
+# Libs
+import mock
+import pytest
+from aiohttp import web
+
+# Own modules
+from koala.cogs.twitch_alert.api import TwitchAlertEndpoint
+from koala.cogs.twitch_alert.scheduler import PollScheduler
+from koala.cogs.twitch_alert.twitch_handler import TwitchAPIHandler
+from koala.cogs.twitch_alert.utils import POLL_TIER_LIVE, POLL_TIER_ACTIVE, POLL_TIER_NORMAL, POLL_TIER_DORMANT, \
+    MAX_POLL_BACKOFF
+
+# Constants
+NOW = datetime.datetime(2021, 6, 1, 18, 0)
+INTERVALS = {POLL_TIER_LIVE: 1, POLL_TIER_ACTIVE: 1, POLL_TIER_NORMAL: 2, POLL_TIER_DORMANT: 10}
+
+# Variables
+
+
+@pytest.fixture
+def twitch_handler():
+    handler = mock.MagicMock()
+    handler.rate_limit_headroom.return_value = 1
+    return handler
+
+
+@pytest.fixture
+def scheduler(twitch_handler):
+    return PollScheduler(twitch_handler, INTERVALS, budget=0.8)
+
+
+def polls(scheduler, user_ids, ticks, now=NOW):
+    counts = dict.fromkeys(user_ids, 0)
+    for _ in range(ticks):
+        for user_id in scheduler.due(user_ids, now):
+            counts[user_id] += 1
+    return counts
+
+
+def test_first_tick_polls_everyone(scheduler):
+    assert sorted(scheduler.due(["1", "2", "3"], NOW)) == ["1", "2", "3"]
+
+
+def test_tiers(scheduler):
+    scheduler.due(["live", "offline", "normal", "dormant"], NOW - datetime.timedelta(days=8))
+    scheduler.update(["live", "offline"], [], NOW - datetime.timedelta(hours=1))
+    scheduler.update([], ["offline"], NOW - datetime.timedelta(minutes=10))
+    scheduler.update(["normal"], [], NOW - datetime.timedelta(days=1))
+    scheduler.update([], ["normal"], NOW - datetime.timedelta(days=1))
+
+    assert scheduler.get_tier("live", NOW) == POLL_TIER_LIVE
+    assert scheduler.get_tier("offline", NOW) == POLL_TIER_ACTIVE
+    assert scheduler.get_tier("normal", NOW) == POLL_TIER_NORMAL
+    assert scheduler.get_tier("dormant", NOW) == POLL_TIER_DORMANT
+
+
+def test_usually_live_hour_is_active(scheduler):
+    scheduler.due(["1"], NOW - datetime.timedelta(days=3))
+    for days in (3, 2):
+        live = NOW - datetime.timedelta(days=days) + datetime.timedelta(minutes=10)
+        scheduler.update(["1"], [], live)
+        scheduler.update(["1"], [], live + datetime.timedelta(minutes=5))
+        scheduler.update([], ["1"], live + datetime.timedelta(minutes=20))
+
+    assert scheduler.live_hours["1"][18] == 2
+    assert scheduler.get_tier("1", NOW) == POLL_TIER_ACTIVE
+    assert scheduler.get_tier("1", NOW + datetime.timedelta(hours=6)) == POLL_TIER_NORMAL
+
+
+def test_tiers_polled_at_their_intervals(scheduler):
+    scheduler.due(["live", "normal", "dormant"], NOW - datetime.timedelta(days=8))
+    scheduler.update(["live", "normal"], [], NOW - datetime.timedelta(days=1))
+    scheduler.update([], ["normal"], NOW - datetime.timedelta(days=1))
+    scheduler.update(["live"], [], NOW)
+
+    assert polls(scheduler, ["live", "normal", "dormant"], 20) == {"live": 20, "normal": 10, "dormant": 2}
+    # The first tick, before anyone was seen live, polled everyone as normal
+    assert scheduler.metrics(NOW)["total_polls"] == {POLL_TIER_LIVE: 20, POLL_TIER_NORMAL: 13, POLL_TIER_DORMANT: 2}
+
+
+def test_backoff_on_low_headroom(scheduler, twitch_handler):
+    twitch_handler.rate_limit_headroom.return_value = 0.1
+    counts = polls(scheduler, ["1"], 10)
+    assert scheduler.backoff == MAX_POLL_BACKOFF
+    assert counts["1"] < 5
+
+    twitch_handler.rate_limit_headroom.return_value = 1
+    polls(scheduler, ["1"], 10)
+    assert scheduler.backoff == 1
+
+
+def test_untracked_users_forgotten(scheduler):
+    scheduler.due(["1", "2"], NOW)
+    scheduler.update(["1"], ["2"], NOW)
+    scheduler.due(["2"], NOW)
+    assert "1" not in scheduler.live
+    assert "1" not in scheduler.last_polled
+
+
+def test_metrics(scheduler):
+    scheduler.due(["1", "2"], NOW)
+    scheduler.update(["1"], ["2"], NOW)
+    metrics = scheduler.metrics(NOW)
+    assert metrics["tick"] == 1
+    assert metrics["backoff"] == 1
+    assert metrics["streamers"] == {POLL_TIER_LIVE: 1, POLL_TIER_NORMAL: 1}
+    assert metrics["last_tick_polls"] == {POLL_TIER_NORMAL: 2}
+
+
+def test_rate_limit_headroom():
+    with mock.patch("twitchAPI.twitch.Twitch.authenticate_app"):
+        handler = TwitchAPIHandler("client_id", "client_secret", rate_limit=10)
+    assert handler.rate_limit_headroom() == 1
+    handler.record_requests(8)
+    assert handler.rate_limit_headroom() == pytest.approx(0.2)
+    handler.record_requests(5)
+    assert handler.rate_limit_headroom() == 0
+
+
+async def test_get_metrics(twitch_handler, aiohttp_client):
+    manager = mock.MagicMock()
+    manager.twitch_handler = twitch_handler
+    manager.user_poll_scheduler = PollScheduler(twitch_handler, INTERVALS)
+    manager.team_poll_scheduler = PollScheduler(twitch_handler, INTERVALS)
+    manager.user_poll_scheduler.due(["1"])
+    bot = mock.MagicMock()
+    bot.get_cog.return_value.ta_database_manager = manager
+
+    client = await aiohttp_client(TwitchAlertEndpoint(bot).register(web.Application()))
+    resp = await client.get('/metrics')
+    assert resp.status == 200
+    metrics = await resp.json()
+    assert metrics["rate_limit_headroom"] == 1
+    assert metrics["users"]["last_tick_polls"] == {POLL_TIER_NORMAL: 1}
+    assert metrics["teams"]["tick"] == 0
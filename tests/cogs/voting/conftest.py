@@ -13,15 +13,19 @@ import pytest
 from sqlalchemy import delete
 
 # Own modules
-from koala.cogs.voting.models import Votes, VoteSent, VoteOptions, VoteTargetRoles
+from koala.cogs.voting.models import Votes, VoteSent, VoteOptions, VoteTargetRoles, VoteChoices, \
+    VoteDeliveries, VoteRecipients
 from koala.db import session_manager
 
 
 @pytest.fixture(autouse=True)
 def clear_tables():
     with session_manager() as session:
-        session.execute(delete(Votes))
         session.execute(delete(VoteTargetRoles))
         session.execute(delete(VoteOptions))
         session.execute(delete(VoteSent))
+        session.execute(delete(VoteChoices))
+        session.execute(delete(VoteDeliveries))
+        session.execute(delete(VoteRecipients))
+        session.execute(delete(Votes))
         session.commit()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+"""
+Testing KoalaBot VoteCog API
+
+Commented using reStructuredText (reST)
+"""
+# Futures
+
+# Built-in/Generic Imports
+import asyncio
+import json
+
+# Libs
+import discord.ext.test as dpytest
+import mock
+import pytest
+from aiohttp import web
+
+# Own modules
+from koala.cogs import Voting
+from koala.cogs.voting.api import VoteEndpoint
+from koala.cogs.voting.option import Option
+
+
+@pytest.fixture
+def vote_cog(bot):
+    cog = Voting(bot)
+    bot.add_cog(cog)
+    return cog
+
+
+@pytest.fixture
+def vote(vote_cog):
+    guild = dpytest.get_config().guilds[0]
+    vote = vote_cog.vote_manager.create_vote(222, guild.id, "API Test")
+    vote.add_option(Option("head", "body", 888))
+    vote.add_option(Option("head2", "body2", 887))
+    vote_cog.vote_manager.start_delivery(222, [777, 778], 444)
+    vote_cog.vote_manager.record_delivery(vote, 777, 666)
+    vote_cog.vote_manager.record_delivery(vote, 778, 667)
+    return vote
+
+
+@pytest.fixture
+def api_client(bot, vote_cog, aiohttp_client, loop):
+    return loop.run_until_complete(aiohttp_client(VoteEndpoint(bot).register(web.Application())))
+
+
+async def read_event(resp):
+    lines = []
+    while True:
+        line = (await asyncio.wait_for(resp.content.readline(), 1)).decode().rstrip("\n")
+        if not line:
+            break
+        if not line.startswith(":"):
+            lines.append(line)
+    event, data = lines
+    return event[len("event: "):], json.loads(data[len("data: "):])
+
+
+async def test_get_results(api_client, vote_cog, vote):
+    vote_cog.vote_manager.record_reaction(666, 777, "1️⃣", True)
+    vote_cog.vote_manager.record_reaction(667, 778, "1️⃣", True)
+
+    with mock.patch("koala.cogs.voting.api.extension_enabled", return_value=False):
+        resp = await api_client.get('/results', params={"guild_id": str(vote.guild), "vote_id": str(vote.id)})
+    assert resp.status == 403
+
+    with mock.patch("koala.cogs.voting.api.extension_enabled", return_value=True):
+        resp = await api_client.get('/results', params={"guild_id": "1", "vote_id": str(vote.id)})
+        assert resp.status == 404
+        resp = await api_client.get('/results', params={"guild_id": str(vote.guild), "vote_id": str(vote.id)})
+        assert resp.status == 200
+        assert (await resp.json()) == {"vote_id": vote.id, "guild_id": vote.guild, "title": "API Test",
+                                       "end_time": None, "sent_to": 2,
+                                       "options": [{"opt_id": 888, "head": "head", "body": "body", "count": 2},
+                                                   {"opt_id": 887, "head": "head2", "body": "body2", "count": 0}]}
+
+
+async def test_get_results_stream(api_client, vote_cog, vote):
+    with mock.patch("koala.cogs.voting.api.extension_enabled", return_value=True):
+        resp = await api_client.get('/results/stream', params={"guild_id": str(vote.guild), "vote_id": str(vote.id)})
+    assert resp.status == 200
+    assert resp.headers["Content-Type"] == "text/event-stream"
+    event, data = await read_event(resp)
+    assert event == "tally"
+    assert [option["count"] for option in data["options"]] == [0, 0]
+
+    vote_cog.vote_manager.record_reaction(666, 777, "1️⃣", True)
+    assert await read_event(resp) == ("delta", {"vote_id": vote.id,
+                                                "changes": [{"opt_id": 888, "change": 1, "count": 1}]})
+
+    # Changes made before the stream is written to are sent together
+    vote_cog.vote_manager.record_reaction(667, 778, "2️⃣", True)
+    vote_cog.vote_manager.record_reaction(666, 777, "1️⃣", False)
+    vote_cog.vote_manager.record_reaction(666, 777, "2️⃣", True)
+    assert await read_event(resp) == ("delta", {"vote_id": vote.id,
+                                                "changes": [{"opt_id": 887, "change": 2, "count": 2},
+                                                            {"opt_id": 888, "change": -1, "count": 0}]})
+
+    vote_cog.vote_manager.cancel_sent_vote(vote.id)
+    assert await read_event(resp) == ("end", {"vote_id": vote.id})
+    assert not vote_cog.vote_manager.tally_feed.subscriptions
@@ -7,9 +7,13 @@ Commented using reStructuredText (reST)
 # Futures
 
 # Built-in/Generic Imports
+import asyncio
+import time
 
 # Libs
+import discord
 import discord.ext.test as dpytest
+import mock
 import pytest
 from discord.ext import commands
 from sqlalchemy import select
@@ -131,3 +135,120 @@ async def test_discord_cancel_vote():
         f"to configure it.")
     await dpytest.message(f"{koalabot.COMMAND_PREFIX}vote cancel Test Vote")
     assert dpytest.verify().message().content("Vote Test Vote has been cancelled.")
+
+
+@pytest.mark.asyncio
+async def test_discord_vote_reactions_tally(cog):
+    config = dpytest.get_config()
+    guild = config.guilds[0]
+    author = guild.members[0]
+    await dpytest.message(f"{koalabot.COMMAND_PREFIX}vote create Test Vote")
+    await dpytest.message(f"{koalabot.COMMAND_PREFIX}vote addOption test+test")
+    await dpytest.message(f"{koalabot.COMMAND_PREFIX}vote addOption test2+test2")
+    await dpytest.message(f"{koalabot.COMMAND_PREFIX}vote send")
+    await asyncio.gather(*cog.deliveries.values())
+    vote = cog.vote_manager.get_vote_from_id(cog.vote_manager.vote_lookup[(author.id, "Test Vote")])
+    msg = await author.fetch_message(vote.sent_to[author.id])
+    await dpytest.empty_queue()
+
+    await dpytest.add_reaction(author, msg, "2️⃣")
+    assert vote.get_choice(author.id) == vote.options[1]
+    with mock.patch("discord.User.fetch_message") as mock_fetch_message:
+        await dpytest.message(f"{koalabot.COMMAND_PREFIX}vote checkResults Test Vote")
+    mock_fetch_message.assert_not_called()
+    results = dpytest.get_embed()
+    assert [(field.name, field.value) for field in results.fields] == [("test2", "1 votes"), ("test", "0 votes")]
+
+
+@pytest.mark.asyncio
+async def test_end_vote(cog):
+    config = dpytest.get_config()
+    guild = config.guilds[0]
+    author = guild.members[0]
+    await dpytest.message(f"{koalabot.COMMAND_PREFIX}vote create Test Vote")
+    await dpytest.message(f"{koalabot.COMMAND_PREFIX}vote addOption test+test")
+    await dpytest.message(f"{koalabot.COMMAND_PREFIX}vote addOption test2+test2")
+    await dpytest.message(f"{koalabot.COMMAND_PREFIX}vote setEndTime in 5 minutes")
+    await dpytest.message(f"{koalabot.COMMAND_PREFIX}vote send")
+    await asyncio.gather(*cog.deliveries.values())
+    v_id = cog.vote_manager.vote_lookup[(author.id, "Test Vote")]
+    assert v_id in cog.vote_manager.end_scheduler.end_times
+    await dpytest.empty_queue()
+
+    await cog.end_vote(v_id)
+    assert dpytest.verify().message().content("Your vote Test Vote has closed")
+    assert dpytest.get_embed().title == "Test Vote Results:"
+    assert v_id not in cog.vote_manager.sent_votes
+    assert v_id not in cog.vote_manager.end_scheduler.end_times
+    with session_manager() as session:
+        assert not session.execute(select(Votes).filter_by(vote_id=v_id)).all()
+
+
+@pytest.mark.asyncio
+async def test_end_vote_retries_later(cog):
+    config = dpytest.get_config()
+    guild = config.guilds[0]
+    author = guild.members[0]
+    await dpytest.message(f"{koalabot.COMMAND_PREFIX}vote create Test Vote")
+    await dpytest.message(f"{koalabot.COMMAND_PREFIX}vote addOption test+test")
+    await dpytest.message(f"{koalabot.COMMAND_PREFIX}vote addOption test2+test2")
+    await dpytest.message(f"{koalabot.COMMAND_PREFIX}vote send")
+    await asyncio.gather(*cog.deliveries.values())
+    v_id = cog.vote_manager.vote_lookup[(author.id, "Test Vote")]
+    assert v_id not in cog.vote_manager.end_scheduler.end_times
+
+    with mock.patch("discord.User.send", side_effect=discord.HTTPException(mock.Mock(), "")):
+        await cog.end_vote(v_id)
+    assert v_id in cog.vote_manager.sent_votes
+    assert cog.vote_manager.end_scheduler.end_times[v_id] > time.time() + 3600
+
+
+@pytest.mark.asyncio
+async def test_end_vote_while_delivering(cog):
+    config = dpytest.get_config()
+    guild = config.guilds[0]
+    author = guild.members[0]
+    await dpytest.message(f"{koalabot.COMMAND_PREFIX}vote create Test Vote")
+    await dpytest.message(f"{koalabot.COMMAND_PREFIX}vote addOption test+test")
+    await dpytest.message(f"{koalabot.COMMAND_PREFIX}vote addOption test2+test2")
+    await dpytest.message(f"{koalabot.COMMAND_PREFIX}vote setEndTime in 5 minutes")
+    v_id = cog.vote_manager.vote_lookup[(author.id, "Test Vote")]
+
+    # The vote is still being sent when it ends
+    with mock.patch("koala.cogs.voting.delivery.VoteDelivery.deliver", side_effect=asyncio.Event().wait):
+        await dpytest.message(f"{koalabot.COMMAND_PREFIX}vote send")
+        delivery = cog.deliveries[v_id]
+        await asyncio.sleep(0)
+        assert not delivery.done()
+        await dpytest.empty_queue()
+        await cog.end_vote(v_id)
+
+    assert delivery.cancelled()
+    assert v_id not in cog.deliveries
+    assert dpytest.verify().message().content("Your vote Test Vote has closed")
+    assert dpytest.get_embed().title == "Test Vote Results:"
+    assert v_id not in cog.vote_manager.sent_votes
+    assert v_id not in cog.vote_manager.delivering_votes
+
+
+@pytest.mark.asyncio
+async def test_discord_send_vote(cog):
+    config = dpytest.get_config()
+    guild = config.guilds[0]
+    author = guild.members[0]
+    await dpytest.message(f"{koalabot.COMMAND_PREFIX}vote create Test Vote")
+    await dpytest.message(f"{koalabot.COMMAND_PREFIX}vote addOption test+test")
+    await dpytest.message(f"{koalabot.COMMAND_PREFIX}vote addOption test2+test2")
+    await dpytest.empty_queue()
+    with mock.patch("discord.Message.edit", autospec=True) as mock_edit:
+        await dpytest.message(f"{koalabot.COMMAND_PREFIX}vote send")
+        progress = dpytest.get_message()
+        assert progress.content == "Sending vote to 1 users"
+        await asyncio.gather(*cog.deliveries.values())
+    assert dpytest.verify().message().content(
+        f"You have been asked to participate in this vote from {guild.name}.\nPlease react to make your choice "
+        f"(You can change your mind until the vote is closed)")
+    mock_edit.assert_awaited_once_with(progress, content="Sent vote to 1 users")
+    vote = cog.vote_manager.get_vote_from_id(cog.vote_manager.vote_lookup[(author.id, "Test Vote")])
+    assert list(vote.sent_to) == [author.id]
+    assert not cog.vote_manager.delivering_votes
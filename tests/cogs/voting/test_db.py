@@ -9,10 +9,14 @@ Commented using reStructuredText (reST)
 # Built-in/Generic Imports
 
 # Libs
-from sqlalchemy import select
+import mock
+import pytest
+from sqlalchemy import select, update
 
 # Own modules
-from koala.cogs.voting.models import Votes, VoteSent, VoteOptions
+from koala.cogs.voting.db import VoteManager, get_results, audit_results
+from koala.cogs.voting.models import Votes, VoteSent, VoteOptions, VoteChoices, VoteTargetRoles, VoteDeliveries, \
+    VoteRecipients
 from koala.cogs.voting.option import Option
 from koala.db import session_manager
 from .utils import populate_vote_tables, vote_manager
@@ -75,11 +79,19 @@ def test_votemanager_create_vote():
 def test_votemanager_cancel_sent_vote():
     with session_manager() as session:
         populate_vote_tables(session)
+        session.add(VoteChoices(vote_id=111, voter_id=777, opt_id=887))
+        session.add(VoteDeliveries(vote_id=111, channel_id=444))
+        session.add(VoteRecipients(vote_id=111, recipient_id=777))
+        session.commit()
         vote_manager.load_from_db()
         vote_manager.cancel_sent_vote(111)
         assert 111 not in vote_manager.sent_votes.keys()
         in_db = session.execute(select(Votes).filter_by(vote_id=111)).all()
         assert not in_db
+        # Everything stored about the vote is deleted with it
+        for table in (VoteTargetRoles, VoteOptions, VoteSent, VoteChoices, VoteDeliveries, VoteRecipients):
+            assert not session.execute(select(table).filter_by(vote_id=111)).all()
+        assert session.execute(select(VoteOptions).filter_by(vote_id=112)).all()
 
 
 def test_votemanager_cancel_configuring_vote():
@@ -108,6 +120,8 @@ def test_vote_set_chair():
         assert in_db
         vote.set_chair()
         assert not vote.chair
+        # vote_id is the only primary key, so the row loaded above is refreshed
+        session.expire_all()
         in_db = session.execute(select(Votes).filter_by(vote_id=vote.id)).scalar()
         assert not in_db.chair_id
 
@@ -121,6 +135,8 @@ def test_vote_set_vc():
         assert in_db
         vote.set_vc()
         assert not vote.target_voice_channel
+        # vote_id is the only primary key, so the row loaded above is refreshed
+        session.expire_all()
         in_db = session.execute(select(Votes).filter_by(vote_id=vote.id)).scalar()
         assert not in_db.voice_id
 
@@ -151,3 +167,100 @@ def test_vote_register_sent():
         assert vote.sent_to[555] == 666
         in_db = session.execute(select(VoteSent).filter_by(vote_receiver_message=666)).all()
         assert in_db
+
+
+def test_votemanager_record_reaction():
+    with session_manager() as session:
+        populate_vote_tables(session)
+        session.add(VoteChoices(vote_id=111, voter_id=777, opt_id=887))
+        session.commit()
+        vote_manager.load_from_db()
+        vote = vote_manager.sent_votes[111]
+        assert get_results(vote) == {vote.options[0]: 1}
+        assert not vote_manager.record_reaction(666, 778, "1️⃣", True)
+        assert not vote_manager.record_reaction(666, 777, "3️⃣", True)
+        assert vote_manager.record_reaction(666, 777, "1️⃣", False) == vote
+        assert not get_results(vote)
+        assert vote_manager.record_reaction(666, 777, "2️⃣", True) == vote
+        assert get_results(vote) == {vote.options[1]: 1}
+        in_db = session.execute(select(VoteChoices.opt_id).filter_by(vote_id=111, voter_id=777)).all()
+        assert in_db == [(888,)]
+        vote_manager.cancel_sent_vote(111)
+        assert not session.execute(select(VoteChoices).filter_by(vote_id=111)).all()
+
+
+@pytest.mark.asyncio
+async def test_audit_results():
+    with session_manager() as session:
+        populate_vote_tables(session)
+        vote_manager.load_from_db()
+        vote = vote_manager.sent_votes[111]
+        reactions = [mock.Mock(emoji="1️⃣", count=1), mock.Mock(emoji="2️⃣", count=2)]
+        user = mock.Mock(fetch_message=mock.AsyncMock(return_value=mock.Mock(reactions=reactions)))
+        bot = mock.Mock(get_user=mock.Mock(return_value=user))
+        assert await audit_results(bot, vote) == 1
+        user.fetch_message.assert_awaited_once_with(666)
+        assert get_results(vote) == {vote.options[1]: 1}
+        assert await audit_results(bot, vote) == 0
+
+
+def test_votemanager_register_sent():
+    vote = vote_manager.create_vote(111, 222, "Register Sent Test")
+    vote_manager.sent_votes[vote.id] = vote
+    vote_manager.register_sent(vote, 555, 666)
+    assert vote.sent_to[555] == 666
+    assert vote_manager.was_sent_to(666) == vote
+    vote_manager.cancel_sent_vote(vote.id)
+    assert not vote_manager.was_sent_to(666)
+
+
+def test_votemanager_load_from_db_does_not_write():
+    with session_manager() as session:
+        populate_vote_tables(session)
+        session.add(VoteChoices(vote_id=111, voter_id=777, opt_id=888))
+        session.execute(update(Votes).filter_by(vote_id=111).values(end_time=1234.5))
+        session.commit()
+    manager = VoteManager()
+    with mock.patch("koala.cogs.voting.vote.session_manager") as mock_session_manager:
+        manager.load_from_db()
+    mock_session_manager.assert_not_called()
+    vote = manager.sent_votes[111]
+    assert vote.end_time == 1234.5
+    assert [option.id for option in vote.options] == [887, 888]
+    assert vote.get_choice(777) == vote.options[1]
+    assert manager.was_sent_to(666) == vote
+    assert manager.configuring_votes[223].chair == 555
+
+
+def test_votemanager_schedules_sent_votes():
+    with session_manager() as session:
+        populate_vote_tables(session)
+        session.execute(update(Votes).values(end_time=1234.5))
+        session.commit()
+    manager = VoteManager()
+    manager.load_from_db()
+    # Votes that haven't been sent don't end
+    assert manager.end_scheduler.end_times == {111: 1234.5}
+    vote = manager.configuring_votes[223]
+    manager.set_end_time(vote, 2345.5)
+    assert 112 not in manager.end_scheduler.end_times
+    manager.mark_sent(223)
+    assert manager.end_scheduler.end_times == {111: 1234.5, 112: 2345.5}
+    manager.set_end_time(vote, 3456.5)
+    assert manager.end_scheduler.next_end_time() == 1234.5
+    manager.cancel_sent_vote(111)
+    assert manager.end_scheduler.next_end_time() == 3456.5
+
+
+def test_votemanager_ids_increase():
+    with session_manager() as session:
+        populate_vote_tables(session)
+        session.add(Votes(vote_id=2 ** 62, author_id=224, guild_id=333, title="Test Vote 3"))
+        session.commit()
+    manager = VoteManager()
+    manager.load_from_db()
+    ids = [manager.gen_vote_id() for _ in range(1000)] + [manager.generate_unique_opt_id() for _ in range(1000)]
+    assert ids == sorted(set(ids))
+    # Ids are greater than those in use, even when the clock is behind them
+    assert ids[0] == 2 ** 62 + 1
+    assert VoteManager().gen_vote_id() > 999999999999999999
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+"""
+Testing KoalaBot VoteCog
+
+Commented using reStructuredText (reST)
+"""
+# Futures
+
+# Built-in/Generic Imports
+import asyncio
+
+# Libs
+import discord
+import mock
+import pytest
+from sqlalchemy import select
+
+# Own modules
+from koala.cogs.voting.db import VoteManager
+from koala.cogs.voting.delivery import VoteDelivery
+from koala.cogs.voting.models import VoteSent, VoteDeliveries, VoteRecipients
+from koala.cogs.voting.option import Option
+from koala.db import session_manager
+
+
+def make_vote(manager, recipient_ids):
+    vote = manager.create_vote(222, 333, "Delivery Test")
+    vote.add_option(Option("head", "body", 888))
+    vote.add_option(Option("head2", "body2", 887))
+    return manager.start_delivery(222, recipient_ids, 444, 555)
+
+
+def make_bot(send):
+    users = {}
+
+    def get_user(user_id):
+        async def user_send(*_, **__):
+            result = send(user_id)
+            return await result if asyncio.iscoroutine(result) else result
+
+        if user_id not in users:
+            users[user_id] = mock.Mock(id=user_id, send=mock.AsyncMock(side_effect=user_send))
+        return users[user_id]
+
+    return mock.Mock(get_user=get_user, get_guild=mock.Mock(return_value=None),
+                     get_channel=mock.Mock(return_value=None)), users
+
+
+def http_exception(status):
+    return discord.HTTPException(mock.Mock(status=status, reason="reason", headers={}), "message")
+
+
+@pytest.mark.asyncio
+async def test_vote_delivery_resumes():
+    manager = VoteManager()
+    vote = make_vote(manager, [1, 2, 3])
+    manager.record_delivery(vote, 1, 1001)
+    manager.record_failed_delivery(vote, 2)
+
+    # The bot restarts
+    manager = VoteManager()
+    manager.load_from_db()
+    vote = manager.get_vote_from_id(vote.id)
+    assert vote.id in manager.delivering_votes
+    bot, users = make_bot(lambda user_id: mock.Mock(id=1000 + user_id, add_reaction=mock.AsyncMock()))
+    delivery = VoteDelivery(bot, manager, vote)
+    await delivery.run()
+    assert list(users) == [3]
+    assert vote.sent_to == {1: 1001, 3: 1003}
+    assert (delivery.total, delivery.delivered, delivery.failed) == (3, 2, 1)
+    assert manager.was_sent_to(1003) == vote
+    assert vote.id not in manager.delivering_votes
+    with session_manager() as session:
+        assert session.execute(select(VoteSent.vote_receiver_id).filter_by(vote_id=vote.id)).scalars().all() == [1, 3]
+        assert not session.execute(select(VoteDeliveries)).all()
+        assert not session.execute(select(VoteRecipients)).all()
+
+
+@pytest.mark.asyncio
+async def test_vote_delivery_retries_and_failures():
+    manager = VoteManager()
+    vote = make_vote(manager, [1, 2, 3])
+    attempts = []
+
+    def send(user_id):
+        attempts.append(user_id)
+        if user_id == 1 and attempts.count(1) == 1:
+            raise http_exception(429)
+        if user_id == 2:
+            raise discord.Forbidden(mock.Mock(status=403, reason="reason"), "message")
+        return mock.Mock(id=1000 + user_id, add_reaction=mock.AsyncMock(side_effect=http_exception(400)))
+
+    bot, users = make_bot(send)
+    progress_message = mock.Mock(edit=mock.AsyncMock())
+    delivery = VoteDelivery(bot, manager, vote, progress_message, backoff=0)
+    await delivery.run()
+    assert sorted(attempts) == [1, 1, 2, 3]
+    assert vote.sent_to == {1: 1001, 3: 1003}
+    progress_message.edit.assert_awaited_once_with(content="Sent vote to 2 users, 1 couldn't be sent it")
+
+
+@pytest.mark.asyncio
+async def test_vote_delivery_concurrency_and_progress():
+    manager = VoteManager()
+    vote = make_vote(manager, list(range(1, 21)))
+    in_progress = set()
+    most_in_progress = 0
+
+    async def send(user_id):
+        nonlocal most_in_progress
+        in_progress.add(user_id)
+        most_in_progress = max(most_in_progress, len(in_progress))
+        await asyncio.sleep(0.01)
+        in_progress.discard(user_id)
+        return mock.Mock(id=1000 + user_id, add_reaction=mock.AsyncMock())
+
+    bot, users = make_bot(send)
+    progress_message = mock.Mock(edit=mock.AsyncMock())
+    delivery = VoteDelivery(bot, manager, vote, progress_message, concurrency=5, progress_interval=0.015)
+    await delivery.run()
+    assert most_in_progress == 5
+    assert len(vote.sent_to) == 20
+    edits = [call.kwargs["content"] for call in progress_message.edit.await_args_list]
+    assert edits[0].startswith("Sending vote: sent to ")
+    assert edits[-1] == "Sent vote to 20 users"
+
+
+@pytest.mark.asyncio
+async def test_vote_delivery_stops_when_cancelled():
+    manager = VoteManager()
+    vote = make_vote(manager, [1, 2, 3])
+
+    def send(user_id):
+        manager.cancel_sent_vote(vote.id)
+        return mock.Mock(id=1000 + user_id, add_reaction=mock.AsyncMock())
+
+    bot, users = make_bot(send)
+    await VoteDelivery(bot, manager, vote, concurrency=1).run()
+    assert list(users) == [1]
+    assert not vote.sent_to
+    with session_manager() as session:
+        assert not session.execute(select(VoteSent)).all()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+"""
+Testing KoalaBot VoteCog
+
+Commented using reStructuredText (reST)
+"""
+# Futures
+
+# Built-in/Generic Imports
+import asyncio
+
+# Libs
+import mock
+import pytest
+
+# Own modules
+from koala.cogs.voting.db import VoteManager
+from koala.cogs.voting.message_updates import VoteMessageUpdater
+from koala.cogs.voting.option import Option
+
+
+@pytest.fixture
+def vote_manager():
+    manager = VoteManager()
+    vote = manager.create_vote(222, 333, "Message Update Test")
+    vote.add_option(Option("head", "body", 888))
+    vote.add_option(Option("head2", "body2", 887))
+    manager.start_delivery(222, [777], 444)
+    manager.record_delivery(vote, 777, 666)
+    return manager
+
+
+@pytest.fixture
+def message():
+    return mock.Mock(edit=mock.AsyncMock())
+
+
+@pytest.fixture
+def updater(vote_manager, message):
+    channel = mock.Mock(get_partial_message=mock.Mock(return_value=message))
+    return VoteMessageUpdater(mock.Mock(get_channel=mock.Mock(return_value=channel)), vote_manager, delay=0.01)
+
+
+@pytest.mark.asyncio
+async def test_updates_are_debounced(vote_manager, updater, message):
+    for emoji, added in (("1️⃣", True), ("1️⃣", False), ("2️⃣", True)):
+        vote = vote_manager.record_reaction(666, 777, emoji, added)
+        updater.queue(vote, 777, 555, 666)
+    await asyncio.sleep(0.02)
+    message.edit.assert_awaited_once()
+    assert message.edit.await_args.kwargs["embed"].footer.text == "You will be voting for 2️⃣ - head2"
+    updater.bot.get_channel.assert_called_once_with(555)
+    updater.bot.get_channel.return_value.get_partial_message.assert_called_once_with(666)
+
+
+@pytest.mark.asyncio
+async def test_updates_only_edit_changes(vote_manager, updater, message):
+    vote = vote_manager.get_vote_from_id(vote_manager.vote_lookup[(222, "Message Update Test")])
+    # The message is sent without a choice
+    await updater.update(vote, 777, 555, 666)
+    message.edit.assert_not_awaited()
+
+    vote_manager.record_reaction(666, 777, "1️⃣", True)
+    await updater.update(vote, 777, 555, 666)
+    # Choosing a later option doesn't change the choice
+    vote_manager.record_reaction(666, 777, "2️⃣", True)
+    await updater.update(vote, 777, 555, 666)
+    assert message.edit.await_count == 1
+    vote_manager.record_reaction(666, 777, "1️⃣", False)
+    vote_manager.record_reaction(666, 777, "2️⃣", False)
+    await updater.update(vote, 777, 555, 666)
+    assert message.edit.await_args.kwargs["embed"].footer.text == "There are no valid choices selected"
+
+    vote_manager.cancel_sent_vote(vote.id)
+    vote.choices[777] = {888}
+    await updater.update(vote, 777, 555, 666)
+    assert message.edit.await_count == 2
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+"""
+Testing KoalaBot VoteCog
+
+Commented using reStructuredText (reST)
+"""
+# Futures
+
+# Built-in/Generic Imports
+import asyncio
+import time
+
+# Libs
+import mock
+import pytest
+
+# Own modules
+from koala.cogs.voting.scheduler import VoteEndScheduler
+
+
+@pytest.mark.asyncio
+async def test_scheduler_ends_votes_in_order():
+    ended = []
+    scheduler = VoteEndScheduler(mock.AsyncMock(side_effect=ended.append))
+    now = time.time()
+    scheduler.schedule(1, now + 0.1)
+    scheduler.schedule(2, now + 0.05)
+    scheduler.schedule(3, now - 10)
+    # Nothing ends until the scheduler is started
+    await asyncio.sleep(0.01)
+    assert not ended
+    scheduler.start()
+    await asyncio.sleep(0.01)
+    assert ended == [3]
+    await asyncio.sleep(0.15)
+    assert ended == [3, 2, 1]
+    assert scheduler.next_end_time() is None
+    assert scheduler._timer is None
+    scheduler.stop()
+
+
+@pytest.mark.asyncio
+async def test_scheduler_reschedule_and_unschedule():
+    ended = []
+    scheduler = VoteEndScheduler(mock.AsyncMock(side_effect=ended.append))
+    scheduler.start()
+    now = time.time()
+    scheduler.schedule(1, now + 0.02)
+    scheduler.schedule(2, now + 0.02)
+    scheduler.schedule(1, now + 0.05)
+    scheduler.unschedule(2)
+    assert scheduler.next_end_time() == now + 0.05
+    await asyncio.sleep(0.03)
+    assert not ended
+    await asyncio.sleep(0.05)
+    assert ended == [1]
+    scheduler.stop()
+
+
+@pytest.mark.asyncio
+async def test_scheduler_logs_callback_errors():
+    scheduler = VoteEndScheduler(mock.AsyncMock(side_effect=[Exception("fail"), None]))
+    scheduler.start()
+    scheduler.schedule(1, time.time())
+    scheduler.schedule(2, time.time())
+    await asyncio.sleep(0.01)
+    assert scheduler.callback.await_count == 2
+    scheduler.stop()
@@ -12,7 +12,7 @@ Commented using reStructuredText (reST)
 from sqlalchemy import select
 
 # Own modules
-from koala.cogs.voting.models import VoteTargetRoles
+from koala.cogs.voting.models import VoteTargetRoles, VoteChoices
 from koala.cogs.voting.option import Option
 from koala.cogs.voting.vote import Vote
 from koala.db import session_manager
@@ -43,3 +43,26 @@ def test_vote_remove_role():
         assert 777 not in vote.target_roles
         in_db = session.execute(select(VoteTargetRoles).filter_by(vote_id=111, role_id=777)).all()
         assert not in_db
+
+
+def test_vote_choices_tally():
+    with session_manager() as session:
+        vote = Vote(111, "Test Vote", 222, 333)
+        opt1, opt2 = Option("head", "body", 888), Option("head2", "body2", 887)
+        vote.add_option(opt1)
+        vote.add_option(opt2)
+        vote.add_choice(1, opt2)
+        vote.add_choice(2, opt2)
+        assert vote.get_results() == {opt2: 2}
+        # A voter reacting with several options chooses the first of them in option order
+        vote.add_choice(1, opt1)
+        assert vote.get_choice(1) == opt1
+        assert vote.get_results() == {opt1: 1, opt2: 1}
+        vote.remove_choice(1, opt1)
+        vote.remove_choice(2, opt2)
+        assert vote.get_results() == {opt2: 1}
+        in_db = session.execute(select(VoteChoices.voter_id, VoteChoices.opt_id).filter_by(vote_id=111)).all()
+        assert in_db == [(1, 887)]
+        assert vote.set_choices(1, {888})
+        assert not vote.set_choices(1, {888})
+        assert vote.get_results() == {opt1: 1}
@@ -8,9 +8,11 @@ Commented using reStructuredText (reST)
 # Futures
 
 # Built-in/Generic Imports
+import asyncio
 import os
 
 # Libs
+import aiohttp
 import discord
 import discord.ext.test as dpytest
 import mock
@@ -19,7 +21,8 @@ from discord.ext import commands
 
 # Own modules
 import koalabot
-from koala.utils import __parse_args, get_arg_config_path, format_config_path, wait_for_message
+from koala.utils import __parse_args, get_arg_config_path, format_config_path, wait_for_message, \
+    retry_discord_request
 from tests.tests_utils.last_ctx_cog import LastCtxCog
 from tests.log import logger
 # Constants
@@ -78,6 +81,67 @@ async def test_wait_for_message_none(utils_cog):
     assert not msg
     assert channel == ctx.channel
 
+def http_error(error_type, status, retry_after=0):
+    response = mock.MagicMock(status=status, reason="error", headers={"Retry-After": retry_after})
+    return error_type(response, "error")
+
+
+@pytest.mark.parametrize("error", [http_error(discord.HTTPException, 429), http_error(discord.HTTPException, 503),
+                                   aiohttp.ClientConnectionError(), asyncio.TimeoutError()])
+@pytest.mark.asyncio
+async def test_retry_discord_request_temporary_error(error):
+    request = mock.AsyncMock(side_effect=[error, error, "result"])
+    assert await retry_discord_request(request, 2, 0) == "result"
+    assert request.await_count == 3
+
+
+@pytest.mark.parametrize("error", [http_error(discord.Forbidden, 403), http_error(discord.NotFound, 404),
+                                   http_error(discord.HTTPException, 400)])
+@pytest.mark.asyncio
+async def test_retry_discord_request_not_retried(error):
+    request = mock.AsyncMock(side_effect=error)
+    with pytest.raises(type(error)):
+        await retry_discord_request(request, 2, 0)
+    request.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_retry_discord_request_out_of_retries():
+    request = mock.AsyncMock(side_effect=http_error(discord.HTTPException, 500))
+    with pytest.raises(discord.HTTPException):
+        await retry_discord_request(request, 2, 0)
+    assert request.await_count == 3
+
+
+@pytest.mark.asyncio
+async def test_retry_discord_request_backoff():
+    request = mock.AsyncMock(side_effect=[http_error(discord.HTTPException, 500),
+                                          http_error(discord.HTTPException, 429, retry_after=5), None])
+    with mock.patch("asyncio.sleep", mock.AsyncMock()) as sleep:
+        await retry_discord_request(request, 3, 1)
+    # Rate limited requests wait as long as discord asks, if that's longer than the backoff
+    assert sleep.await_args_list == [mock.call(1), mock.call(5.0)]
+
+
+@pytest.mark.asyncio
+async def test_retry_discord_request_semaphores_released_while_waiting():
+    semaphores = [asyncio.Semaphore(1), asyncio.Semaphore(1)]
+    held = []
+
+    async def request():
+        held.append([semaphore.locked() for semaphore in semaphores])
+        if len(held) == 1:
+            raise http_error(discord.HTTPException, 500)
+
+    async def sleep(_):
+        held.append([semaphore.locked() for semaphore in semaphores])
+
+    with mock.patch("asyncio.sleep", sleep):
+        await retry_discord_request(request, 1, 1, *semaphores)
+    assert held == [[True, True], [False, False], [True, True]]
+    assert not any(semaphore.locked() for semaphore in semaphores)
+
+
 @pytest.fixture(autouse=True)
 def utils_cog(bot):
     utils_cog = LastCtxCog(bot)